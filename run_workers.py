@@ -1,4 +1,5 @@
 import asyncio
+import signal
 
 from src.utils.logging.base_logger import setup_logger
 logger = setup_logger(__name__)
@@ -7,6 +8,7 @@ from src.workers.execution_worker import execution_task
 from src.workers.conversation_consolidator import ConversationConsolidator
 from src.utils.database import conversation_db
 from src.services.ai_service.prompts.cache_manager import check_and_regenerate_cache_if_needed
+from src.config.settings import settings
   
 
 async def run_consolidator():
@@ -14,8 +16,17 @@ async def run_consolidator():
     consolidator = ConversationConsolidator(conversation_db)
     while True:
         logger.info("Running conversation consolidator...")
-        await consolidator.consolidate_all_ready_conversations()
-        await asyncio.sleep(60 * 15) # Run every 15 minutes
+        try:
+            results = await consolidator.consolidate_all_ready_conversations()
+            logger.info(f"Consolidator metrics: {await consolidator.get_metrics()}")
+        except Exception as e:
+            logger.error(f"Consolidation cycle failed: {e}", exc_info=True)
+            results = {}
+        # A full batch means there is more backlog; go again right away instead of waiting the interval.
+        if results.get('users', 0) >= settings.CONSOLIDATION_USERS_PER_CYCLE and results.get('successful'):
+            await asyncio.sleep(5)
+        else:
+            await asyncio.sleep(settings.CONSOLIDATION_INTERVAL_SECONDS)
 
 async def main():
     """
@@ -23,11 +34,25 @@ async def main():
     This should be run in a separate process from the web server.
     """
     logger.info("Starting all background workers...")
+    try:
+        await conversation_db.init_database()
+    except Exception as e:
+        logger.error(f"Failed to ensure database indexes: {e}", exc_info=True)
     await check_and_regenerate_cache_if_needed()
-    await asyncio.gather(
+    workers = asyncio.gather(
         execution_task(),
         run_consolidator()
     )
 
+    # On SIGTERM/SIGINT cancel the workers; the execution worker drains in-flight sessions before exiting.
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, workers.cancel)
+
+    try:
+        await workers
+    except asyncio.CancelledError:
+        logger.info("Background workers stopped.")
+
 if __name__ == "__main__":
     asyncio.run(main())
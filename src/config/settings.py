@@ -78,6 +78,119 @@ class Settings:
     MAX_FILES_PER_REQUEST = 10                  # Maximum 10 files per request
     UPLOAD_CHUNK_SIZE = 8192                    # 8KB chunks for streaming
 
+    # Encoded media payload cache (conversation history rebuilds)
+    MEDIA_PAYLOAD_CACHE_MAX_BYTES = int(os.getenv("MEDIA_PAYLOAD_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    MEDIA_PAYLOAD_CACHE_MAX_ITEM_BYTES = int(os.getenv("MEDIA_PAYLOAD_CACHE_MAX_ITEM_BYTES", str(48 * 1024 * 1024)))
+    MEDIA_PAYLOAD_CACHE_DIR = os.getenv("MEDIA_PAYLOAD_CACHE_DIR")  # optional on-disk tier
+    MEDIA_PAYLOAD_CACHE_DISK_MAX_BYTES = int(os.getenv("MEDIA_PAYLOAD_CACHE_DISK_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+    # Opt-in: when > 0, only this many of the most recent media messages in history are sent
+    # inline and older ones use their auto_description; 0 (default) sends all media inline
+    MEDIA_HISTORY_INLINE_RECENT = int(os.getenv("MEDIA_HISTORY_INLINE_RECENT", "0"))
+
+    # Blob storage streaming (shared client, chunked upload/download)
+    BLOB_STREAM_CHUNK_SIZE = int(os.getenv("BLOB_STREAM_CHUNK_SIZE", str(4 * 1024 * 1024)))
+    BLOB_MAX_CONCURRENCY = int(os.getenv("BLOB_MAX_CONCURRENCY", "4"))
+    # Locally signed read SAS URLs are reused until less than MIN_REMAINING of their lifetime is left
+    BLOB_SAS_EXPIRY_HOURS = float(os.getenv("BLOB_SAS_EXPIRY_HOURS", "48"))
+    BLOB_SAS_MIN_REMAINING_SECONDS = int(os.getenv("BLOB_SAS_MIN_REMAINING_SECONDS", str(6 * 3600)))
+    BLOB_SAS_CACHE_MAX_ENTRIES = int(os.getenv("BLOB_SAS_CACHE_MAX_ENTRIES", "10000"))
+
+    # User service read-through cache (user records, preferences, access decision)
+    USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+    USER_ACCESS_CACHE_TTL_SECONDS = float(os.getenv("USER_ACCESS_CACHE_TTL_SECONDS", "30"))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "5000"))
+
+    # Per-turn write-behind buffer for conversation messages
+    MESSAGE_WRITE_BUFFER_FLUSH_INTERVAL_SECONDS = float(os.getenv("MESSAGE_WRITE_BUFFER_FLUSH_INTERVAL_SECONDS", "1.0"))
+    MESSAGE_WRITE_BUFFER_MAX_PENDING = int(os.getenv("MESSAGE_WRITE_BUFFER_MAX_PENDING", "50"))
+
+    # Websocket streaming: token coalescing on the worker, shared pubsub fan-out on the API
+    STREAM_COALESCE_WINDOW_MS = float(os.getenv("STREAM_COALESCE_WINDOW_MS", "15"))
+    STREAM_COALESCE_MAX_BYTES = int(os.getenv("STREAM_COALESCE_MAX_BYTES", "2048"))
+    WS_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("WS_SUBSCRIBER_QUEUE_SIZE", "1000"))
+
+    # Google API executor (googleapiclient calls run on a bounded thread pool)
+    GOOGLE_API_MAX_WORKERS = int(os.getenv("GOOGLE_API_MAX_WORKERS", "16"))
+    GOOGLE_API_PER_USER_CONCURRENCY = int(os.getenv("GOOGLE_API_PER_USER_CONCURRENCY", "4"))
+    GOOGLE_API_SLOW_CALL_SECONDS = float(os.getenv("GOOGLE_API_SLOW_CALL_SECONDS", "5.0"))
+
+    # Gmail batched message fetches (users.messages.get through the batch endpoint)
+    GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "100"))
+    GMAIL_BATCH_MAX_RETRIES = int(os.getenv("GMAIL_BATCH_MAX_RETRIES", "3"))
+    GMAIL_BATCH_RETRY_BACKOFF_SECONDS = float(os.getenv("GMAIL_BATCH_RETRY_BACKOFF_SECONDS", "1.0"))
+
+    # Praxos bridge client: pooled keep-alive transport and per-user search result cache
+    PRAXOS_HTTP_MAX_CONNECTIONS = int(os.getenv("PRAXOS_HTTP_MAX_CONNECTIONS", "100"))
+    PRAXOS_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("PRAXOS_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    PRAXOS_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("PRAXOS_HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+    PRAXOS_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("PRAXOS_SEARCH_CACHE_TTL_SECONDS", "60"))
+    PRAXOS_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("PRAXOS_SEARCH_CACHE_MAX_ENTRIES", "2000"))
+
+    # Authenticated integration clients reused across agent runs of the same user
+    INTEGRATION_CLIENT_CACHE_TTL_SECONDS = float(os.getenv("INTEGRATION_CLIENT_CACHE_TTL_SECONDS", "900"))
+    INTEGRATION_CLIENT_NEGATIVE_TTL_SECONDS = float(os.getenv("INTEGRATION_CLIENT_NEGATIVE_TTL_SECONDS", "10"))
+    INTEGRATION_CLIENT_CACHE_MAX_ENTRIES = int(os.getenv("INTEGRATION_CLIENT_CACHE_MAX_ENTRIES", "5000"))
+
+    # Embedding-based tool shortlist scored alongside granular planning (recall logging; optional planning skip)
+    TOOL_SHORTLIST_ENABLED = os.getenv("TOOL_SHORTLIST_ENABLED", "false").lower() == "true"
+    TOOL_SHORTLIST_TOP_K = int(os.getenv("TOOL_SHORTLIST_TOP_K", "25"))
+    TOOL_SHORTLIST_MIN_SCORE = float(os.getenv("TOOL_SHORTLIST_MIN_SCORE", "0.3"))
+    # Skip planning when no tool scores at least this much (0 disables; tune from tool_shortlist_recall logs)
+    TOOL_SHORTLIST_SKIP_PLANNING_BELOW = float(os.getenv("TOOL_SHORTLIST_SKIP_PLANNING_BELOW", "0"))
+    TOOL_SHORTLIST_SKIP_PLANNING_MAX_WORDS = int(os.getenv("TOOL_SHORTLIST_SKIP_PLANNING_MAX_WORDS", "6"))
+
+    # Conversation history cache (recent message windows, refreshed incrementally)
+    HISTORY_CACHE_TTL_SECONDS = int(os.getenv("HISTORY_CACHE_TTL_SECONDS", "1800"))
+    HISTORY_CACHE_MAX_ENTRIES = int(os.getenv("HISTORY_CACHE_MAX_ENTRIES", "5000"))
+    # Share windows and invalidations between workers through Redis; when false the cache is
+    # process-local and only safe with a single worker
+    HISTORY_CACHE_REDIS_ENABLED = os.getenv("HISTORY_CACHE_REDIS_ENABLED", "true").lower() == "true"
+    # Re-read this far behind the newest cached message to catch late-flushed writes
+    HISTORY_CACHE_OVERLAP_SECONDS = float(os.getenv("HISTORY_CACHE_OVERLAP_SECONDS", "5"))
+
+    # Agent run cancellation (pub/sub push, plus one per-process poll of the keys that writers which only set them rely on)
+    CANCELLATION_POLL_INTERVAL_SECONDS = float(os.getenv("CANCELLATION_POLL_INTERVAL_SECONDS", "0.5"))
+    CANCELLATION_KEY_TTL_SECONDS = int(os.getenv("CANCELLATION_KEY_TTL_SECONDS", "300"))
+
+    # Conversation consolidation worker pool
+    CONSOLIDATION_INTERVAL_SECONDS = int(os.getenv("CONSOLIDATION_INTERVAL_SECONDS", "900"))
+    CONSOLIDATION_USERS_PER_CYCLE = int(os.getenv("CONSOLIDATION_USERS_PER_CYCLE", "200"))
+    CONSOLIDATION_MAX_CONCURRENT_USERS = int(os.getenv("CONSOLIDATION_MAX_CONCURRENT_USERS", "8"))
+    CONSOLIDATION_PRAXOS_CONCURRENCY = int(os.getenv("CONSOLIDATION_PRAXOS_CONCURRENCY", "4"))
+    CONSOLIDATION_BLOB_CONCURRENCY = int(os.getenv("CONSOLIDATION_BLOB_CONCURRENCY", "8"))
+    # Per-user lease; renewed before each conversation, so it only needs to cover one
+    CONSOLIDATION_LEASE_SECONDS = int(os.getenv("CONSOLIDATION_LEASE_SECONDS", "600"))
+
+    # Conversations idle this long are checked for a topic change before being continued
+    CONVERSATION_INACTIVITY_TIMEOUT_SECONDS = int(os.getenv("CONVERSATION_INACTIVITY_TIMEOUT_SECONDS", "900"))
+    # In-process cache of each user's active conversation id, checked against a version in Redis
+    # that retiring the conversation bumps
+    ACTIVE_CONVERSATION_CACHE_TTL_SECONDS = int(os.getenv("ACTIVE_CONVERSATION_CACHE_TTL_SECONDS", "60"))
+    ACTIVE_CONVERSATION_CACHE_MAX_ENTRIES = int(os.getenv("ACTIVE_CONVERSATION_CACHE_MAX_ENTRIES", "10000"))
+
+    # Media bus backend: "memory" (per process, cleared after each turn) or "redis" (shared, kept for the TTL)
+    MEDIA_BUS_BACKEND = os.getenv("MEDIA_BUS_BACKEND", "memory").lower()
+    MEDIA_BUS_REDIS_TTL_SECONDS = int(os.getenv("MEDIA_BUS_REDIS_TTL_SECONDS", "86400"))
+
+    # Rate limiter (GCRA in one Lua call); extra tokens a burst of acquires may reserve for local use (0 disables)
+    RATE_LIMITER_LOCAL_RESERVATION = int(os.getenv("RATE_LIMITER_LOCAL_RESERVATION", "0"))
+    RATE_LIMITER_RESERVATION_SECONDS = float(os.getenv("RATE_LIMITER_RESERVATION_SECONDS", "2"))
+    # Burst limit on top of the hourly HTTP limit (0 disables)
+    RATE_LIMIT_HTTP_REQUESTS_PER_MINUTE = int(os.getenv("RATE_LIMIT_HTTP_REQUESTS_PER_MINUTE", "120"))
+
+    # Messaging-webhook media fetched and stored by the worker, this many files at a time
+    MEDIA_INGESTION_MAX_CONCURRENCY = int(os.getenv("MEDIA_INGESTION_MAX_CONCURRENCY", "8"))
+
+    # Circuit breakers: share state, failure counts and the half-open probe through Redis
+    CIRCUIT_BREAKER_SHARED_STATE = os.getenv("CIRCUIT_BREAKER_SHARED_STATE", "false").lower() == "true"
+    # How stale each process's cached view of the shared state may get
+    CIRCUIT_BREAKER_SYNC_INTERVAL_SECONDS = float(os.getenv("CIRCUIT_BREAKER_SYNC_INTERVAL_SECONDS", "1"))
+    # How often each execution worker publishes its breaker snapshot (GET /internal/circuit-breakers)
+    CIRCUIT_BREAKER_METRICS_INTERVAL_SECONDS = float(os.getenv("CIRCUIT_BREAKER_METRICS_INTERVAL_SECONDS", "60"))
+
+    # Explain the hot query shapes after ensuring indexes at startup and log any not index-covered
+    DB_CHECK_QUERY_PLANS = os.getenv("DB_CHECK_QUERY_PLANS", "false").lower() == "true"
+
     # Sync settings
     SYNC_THRESHOLD_MINUTES = 2
     
@@ -104,6 +217,20 @@ class Settings:
     # Queue Mode: 'azure' for production, 'in_memory' for local development
     QUEUE_MODE = os.getenv("QUEUE_MODE", "azure")
 
+    # Execution worker: sessions processed in parallel per process (one in-flight run per session)
+    EXECUTION_WORKER_CONCURRENCY = int(os.getenv("EXECUTION_WORKER_CONCURRENCY", "8"))
+    EXECUTION_WORKER_DRAIN_TIMEOUT_SECONDS = int(os.getenv("EXECUTION_WORKER_DRAIN_TIMEOUT_SECONDS", "120"))
+
+    # Session consumer: sessions held open concurrently and per-session grouping (debounce) windows
+    EVENT_QUEUE_MAX_CONCURRENT_SESSIONS = int(os.getenv("EVENT_QUEUE_MAX_CONCURRENT_SESSIONS", str(EXECUTION_WORKER_CONCURRENCY)))
+    EVENT_QUEUE_FIRST_MESSAGE_WAIT_SECONDS = float(os.getenv("EVENT_QUEUE_FIRST_MESSAGE_WAIT_SECONDS", "5"))
+    EVENT_QUEUE_BASE_DEBOUNCE_SECONDS = float(os.getenv("EVENT_QUEUE_BASE_DEBOUNCE_SECONDS", "0.4"))
+    EVENT_QUEUE_FORWARDED_DEBOUNCE_SECONDS = float(os.getenv("EVENT_QUEUE_FORWARDED_DEBOUNCE_SECONDS", "2.5"))
+    EVENT_QUEUE_MAX_DEBOUNCE_SECONDS = float(os.getenv("EVENT_QUEUE_MAX_DEBOUNCE_SECONDS", "4.0"))
+    EVENT_QUEUE_MAX_GROUP_WINDOW_SECONDS = float(os.getenv("EVENT_QUEUE_MAX_GROUP_WINDOW_SECONDS", "30"))
+    # Messages stay locked until their group has run; locks are renewed for at most this long
+    EVENT_QUEUE_LOCK_RENEWAL_SECONDS = float(os.getenv("EVENT_QUEUE_LOCK_RENEWAL_SECONDS", "900"))
+
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     # Rate limits for webhooks
     MAX_GMAIL_WEBHOOKS_PER_HOUR = 1000
@@ -3,21 +3,15 @@ import asyncio
 from datetime import datetime
 from typing import List, Optional, Dict, Any, Tuple,Literal
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
 import json
 from langgraph.prebuilt import ToolNode
 from src.config.settings import settings
 from src.core.context import UserContext
-from src.tools.tool_factory import AgentToolsFactory
-from src.services.conversation_manager import ConversationManager
 from src.utils.database import db_manager
 from src.services.integration_service import integration_service
 from src.utils.logging import setup_logger
 from src.core.praxos_client import PraxosClient
 from src.core.models.agent_runner_models import AgentFinalResponse, AgentState, FileLink,GraphConfig
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chat_models import init_chat_model
 
 import uuid
 from src.core.prompts.system_prompt import create_system_prompt
@@ -27,9 +21,10 @@ from src.services.user_service import user_service
 from src.services.ai_service.ai_service import ai_service
 # from src.core.callbacks.ToolMonitorCallback import ToolMonitorCallback
 from src.core.callbacks.ImmediatePersistenceCallback import ImmediatePersistenceCallback
-from src.core.nodes import call_model, generate_final_response, obtain_data, should_continue_router
 from src.utils.file_msg_utils import generate_file_messages,get_conversation_history,process_media_output, generate_user_messages_parallel,update_history, extract_text_from_chunk,extract_thinking_from_chunk
 from src.core.media_bus import media_bus
+from src.core.agent_runtime import agent_runtime, StageTimer
+from src.core.run_cancellation import run_cancellation, ExecutionCancelledError
 logger = setup_logger(__name__)
 
 # Tools that are pure plumbing — the user already sees their effect directly
@@ -43,44 +38,21 @@ HIDDEN_FROM_STREAM_TOOLS = {
 
 
 
-class ExecutionCancelledError(Exception):
-    """Exception raised when an agent execution is cancelled by the user."""
-    pass
-
-
 class LangGraphAgentRunner:
     def __init__(self,trace_id: str, has_media: bool = False,override_user_id: Optional[str] = None):
-        
-        self.tools_factory = AgentToolsFactory(config=settings, db_manager=db_manager)
-        self.conversation_manager = ConversationManager(db_manager.db, integration_service)
+        # Model clients, tools factory and the compiled graph are built once per process.
+        runtime = agent_runtime.ensure_built()
+        self.tools_factory = runtime.tools_factory
+        self.conversation_manager = runtime.conversation_manager
         self.trace_id = trace_id
-        ### this is here to force langchain lazy importer to pre import before portkey corrupts.
-        llm = init_chat_model("gpt-4o", model_provider="openai")
-        from src.utils.portkey_headers_isolation import create_port_key_headers
-        portkey_headers , portkey_gateway_url = create_port_key_headers(trace_id=trace_id)
-        ### note that this is not OpenAI, this is azure. we will use portkey to access OAI Azure.
-        self.llm = init_chat_model("@azureopenai/gpt-5-mini", api_key=settings.PORTKEY_API_KEY, base_url=portkey_gateway_url, default_headers=portkey_headers, model_provider="openai")
-        ### temporary, investigating refusals.
-        self.media_llm =ChatGoogleGenerativeAI(
-            model="gemini-3.1-pro-preview",
-            api_key=settings.GEMINI_API_KEY,
-            temperature=0.2,
-            include_thoughts=True
-            )
-        # self.media_llm = self.llm
-        self.fast_llm = ChatGoogleGenerativeAI(
-            model="gemini-3-flash-preview",
-            api_key=settings.GEMINI_API_KEY,
-            temperature=0.2,
-            thinking_level = 'minimal',
-            include_thoughts=True)
+        self.media_llm = runtime.media_llm
+        self.fast_llm = runtime.fast_llm
         self.llm = self.media_llm
-        
-        # else:
-        #     logger.info("Using GPT-5 Mini for admin user logging")
         if has_media:
             self.llm = self.media_llm   
-        self.structured_llm = self.fast_llm.with_structured_output(AgentFinalResponse)
+        self.structured_llm = runtime.structured_llm
+        self.app = runtime.graph
+        self.timer = StageTimer()
 
 
 
@@ -135,16 +107,18 @@ class LangGraphAgentRunner:
                 logger.info(f"Running LangGraph agent runner for user {user_context.user_id} with input {input_text} and source {source}")
 
             # --- Data preparation ---
-            conversation_id = metadata.get("conversation_id") or await self.conversation_manager.get_or_create_conversation(user_context.user_id, source, input)
+            with self.timer.stage("conversation"):
+                conversation_id = metadata.get("conversation_id") or await self.conversation_manager.get_or_create_conversation(user_context.user_id, source, input)
             metadata['conversation_id'] = conversation_id
             # Get conversation history first (before adding new messages)
-            history, has_media = await get_conversation_history(conversation_manager=self.conversation_manager, conversation_id=conversation_id)
+            with self.timer.stage("history"):
+                history, has_media = await get_conversation_history(conversation_manager=self.conversation_manager, conversation_id=conversation_id)
 
             
 
 
                   
-            user_preferences = user_service.get_user_preferences(user_context.user_id)    
+            user_preferences = await user_service.get_user_preferences_async(user_context.user_id)    
             timezone_name = user_preferences.get('timezone', 'America/New_York') if user_preferences else 'America/New_York'
             user_tz = pytz.timezone(timezone_name)
             current_time_user = datetime.now(user_tz).isoformat()
@@ -272,9 +246,10 @@ class LangGraphAgentRunner:
                     schedule_msg = HumanMessage(content=f"[PRAXOS SYSTEM NOTIFICATION]: This command was previously set to be triggered by an event. The triggering event has now occurred, and you must perform the requested actions. You must not ask the user for confirmation. If the request was of the form 'if X happens, remind me to ...', you must interpret this as a command to send the user a message now, and you must not set up a future reminder.")
                 history.append(schedule_msg)
             try:
-                user_integration_names = await integration_service.get_user_integration_names(user_context.user_id)
-                logger.info(f"User {user_context.user_id} has integrations: {user_integration_names}")
-                plan, required_tool_ids, plan_str = await ai_service.granular_planning(history, user_integration_names, source=source, stream_buffer=self.stream_buffer)
+                with self.timer.stage("planning"):
+                    user_integration_names = await integration_service.get_user_integration_names(user_context.user_id)
+                    logger.info(f"User {user_context.user_id} has integrations: {user_integration_names}")
+                    plan, required_tool_ids, plan_str = await ai_service.granular_planning(history, user_integration_names, source=source, stream_buffer=self.stream_buffer)
                 if plan and plan.query_type and plan.query_type == 'command':
                     conversational = False
             except Exception as e:
@@ -310,15 +285,16 @@ class LangGraphAgentRunner:
             # Shared mutable buffer — tools append to it, we flush after streaming
             file_attachment_buffer = []
 
-            tools = await self.tools_factory.create_tools(
-                user_context,
-                metadata,
-                timezone_name,
-                request_id=self.trace_id,
-                required_tool_ids=required_tool_ids,
-                conversation_manager=self.conversation_manager,
-                file_buffer=file_attachment_buffer,
-            )
+            with self.timer.stage("tools"):
+                tools = await self.tools_factory.create_tools(
+                    user_context,
+                    metadata,
+                    timezone_name,
+                    request_id=self.trace_id,
+                    required_tool_ids=required_tool_ids,
+                    conversation_manager=self.conversation_manager,
+                    file_buffer=file_attachment_buffer,
+                )
             logger.info(f"Tools loaded based on planning. ")
             # NEW: Type-driven parameter resolution
             resolution_context = None
@@ -385,26 +361,13 @@ class LangGraphAgentRunner:
 
             system_prompt = create_system_prompt(user_context, source, metadata, tool_descriptions, plan, resolution_guidance)
 
-            workflow = StateGraph(AgentState)
-            workflow.add_node("agent", call_model)
-            workflow.add_node("router", should_continue_router)
-            workflow.add_node("obtain_data", obtain_data)   # NEW
-            workflow.add_node("action", tool_executor)
-            workflow.add_node("finalize", generate_final_response)
-
-            workflow.set_entry_point("agent")
-            workflow.add_edge("agent", "router")
-            workflow.add_edge("obtain_data", "action")  # obtain_data always drives a single tool turn
-            workflow.add_edge("action", "router")
-            workflow.add_edge("finalize", END)
-
-
-                        
-            app = workflow.compile()
+            # The graph is compiled once in the agent runtime; this turn's tools ride in GraphConfig.
+            app = self.app
             if input_text is None:
                 input_text = "placeholder for empty input"
             graph_config = GraphConfig(
                 llm_with_tools=llm_with_tools,
+                tool_node=tool_executor,
                 structured_llm=self.structured_llm,
                 system_prompt=system_prompt,
                 initial_state_len=len(history),
@@ -442,37 +405,23 @@ class LangGraphAgentRunner:
                 conversation_id=conversation_id,
                 user_id=user_context.user_id
             )
-            cancel_event = asyncio.Event()
-            
-            async def watch_for_cancellation(conv_id: str):
-                from src.utils.redis_client import redis_client
-                while not cancel_event.is_set():
-                    try:
-                        # Check Redis for the cancellation flag
-                        if await redis_client.get(f"cancel_exec:{conv_id}"):
-                            logger.info(f"Cancellation flag detected in Redis for conversation {conv_id}")
-                            cancel_event.set()
-                            break
-                    except Exception as e:
-                        logger.warning(f"Error checking cancellation flag: {e}")
-                    await asyncio.sleep(0.5)
-            
-            watcher_task = asyncio.create_task(watch_for_cancellation(conversation_id))
-            
-            try:
-                final_state = await self._run_with_streaming(app, initial_state, callbacks=[persistence_callback], cancel_event=cancel_event)
-            finally:
-                watcher_task.cancel()
+            # Stop requests arrive by pub/sub and cancel the graph task in place (tools included).
+            async with run_cancellation.track(conversation_id) as active_run:
+                with self.timer.stage("graph"):
+                    final_state = await active_run.run(
+                        self._run_with_streaming(app, initial_state, callbacks=[persistence_callback], cancel_event=active_run.event)
+                    )
 
             # Persist only NEW intermediate messages from this execution (tool calls, results, etc.)
             new_messages = final_state['messages'][len(initial_state['messages']):]
-            await update_history(
-                conversation_manager=self.conversation_manager,
-                new_messages=new_messages,
-                conversation_id=conversation_id,
-                user_context=user_context,
-                final_state=final_state
-            )
+            with self.timer.stage("persist_history"):
+                await update_history(
+                    conversation_manager=self.conversation_manager,
+                    new_messages=new_messages,
+                    conversation_id=conversation_id,
+                    user_context=user_context,
+                    final_state=final_state
+                )
 
             final_response = final_state['final_response']
             output_blobs = []
@@ -502,7 +451,7 @@ class LangGraphAgentRunner:
                 }
                 # URLs already persisted by generate_* tools via media_bus; skip to avoid duplicate MEDIA rows.
                 already_persisted_urls = {
-                    ref.url for ref in media_bus.list_media(conversation_id) if ref.url
+                    ref.url for ref in await media_bus.list_media(conversation_id) if ref.url
                 }
                 for f in file_attachment_buffer:
                     final_response.file_links.append(FileLink(
@@ -564,14 +513,16 @@ class LangGraphAgentRunner:
         finally:
             execution_record["completed_at"] = datetime.utcnow()
             execution_record["duration_seconds"] = (execution_record["completed_at"] - start_time).total_seconds()
+            execution_record["stage_timings"] = self.timer.timings
+            logger.info(f"Execution {execution_id} stage timings: {self.timer.timings} (runtime build, paid once per process: {agent_runtime.build_timings})")
             await db_manager.db["execution_history"].update_one(
                 {"execution_id": execution_id},
                 {"$set": execution_record}
             )
 
-            # Clean up media bus for this conversation
+            # Clean up media bus for this conversation (a shared backend keeps it for the next turn)
             try:
-                cleared_count = media_bus.clear_conversation(conversation_id)
+                cleared_count = await media_bus.end_turn(conversation_id)
                 if cleared_count > 0:
                     logger.info(f"Cleared {cleared_count} media references from bus for conversation {conversation_id}")
             except Exception as e:
@@ -0,0 +1,117 @@
+"""
+Process-wide agent runtime.
+Builds the chat model clients, tools factory and compiled LangGraph once per process and hands
+them to every LangGraphAgentRunner; per-turn state (tools, prompt, LLM binding) travels in GraphConfig.
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from langgraph.graph import StateGraph, END
+
+from src.config.settings import settings
+from src.core.models.agent_runner_models import AgentFinalResponse, AgentState
+from src.core.nodes import call_model, generate_final_response, obtain_data, should_continue_router, execute_tools
+from src.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class StageTimer:
+    """Collects wall-clock durations of the named stages of a single agent turn."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(self.timings.get(name, 0.0) + time.perf_counter() - started, 4)
+
+
+class AgentRuntime:
+    """Lazily-built, shared LLM clients and compiled agent graph."""
+
+    def __init__(self):
+        self._built = False
+        self.media_llm = None
+        self.fast_llm = None
+        self.structured_llm = None
+        self.tools_factory = None
+        self.conversation_manager = None
+        self.graph = None
+        self.build_timings: Dict[str, float] = {}
+
+    def ensure_built(self) -> "AgentRuntime":
+        if not self._built:
+            self._build()
+        return self
+
+    def _build(self):
+        from langchain.chat_models import init_chat_model
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        from src.tools.tool_factory import AgentToolsFactory
+        from src.services.conversation_manager import ConversationManager
+        from src.services.integration_service import integration_service
+        from src.utils.database import db_manager
+
+        timer = StageTimer()
+        with timer.stage("lazy_imports"):
+            ### this is here to force langchain lazy importer to pre import before portkey corrupts.
+            init_chat_model("gpt-4o", model_provider="openai")
+
+        with timer.stage("llm_clients"):
+            self.media_llm = ChatGoogleGenerativeAI(
+                model="gemini-3.1-pro-preview",
+                api_key=settings.GEMINI_API_KEY,
+                temperature=0.2,
+                include_thoughts=True
+                )
+            self.fast_llm = ChatGoogleGenerativeAI(
+                model="gemini-3-flash-preview",
+                api_key=settings.GEMINI_API_KEY,
+                temperature=0.2,
+                thinking_level = 'minimal',
+                include_thoughts=True)
+            self.structured_llm = self.fast_llm.with_structured_output(AgentFinalResponse)
+
+        with timer.stage("services"):
+            self.tools_factory = AgentToolsFactory(config=settings, db_manager=db_manager)
+            self.conversation_manager = ConversationManager(db_manager.db, integration_service)
+
+        with timer.stage("graph_compile"):
+            self.graph = self._compile_graph()
+
+        self.build_timings = timer.timings
+        self._built = True
+        logger.info(f"Agent runtime built once for this process: {self.build_timings}")
+
+    def _compile_graph(self):
+        """Graph topology is fixed; tools and LLMs are read from state['config'] at invoke time."""
+        workflow = StateGraph(AgentState)
+        workflow.add_node("agent", call_model)
+        workflow.add_node("router", should_continue_router)
+        workflow.add_node("obtain_data", obtain_data)
+        workflow.add_node("action", execute_tools)
+        workflow.add_node("finalize", generate_final_response)
+
+        workflow.set_entry_point("agent")
+        workflow.add_edge("agent", "router")
+        workflow.add_edge("obtain_data", "action")  # obtain_data always drives a single tool turn
+        workflow.add_edge("action", "router")
+        workflow.add_edge("finalize", END)
+        return workflow.compile()
+
+    def get_state(self) -> Dict[str, Optional[object]]:
+        """Get runtime state for monitoring"""
+        return {
+            'built': self._built,
+            'build_timings': dict(self.build_timings),
+        }
+
+
+# Global instance
+agent_runtime = AgentRuntime()
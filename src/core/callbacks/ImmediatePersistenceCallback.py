@@ -6,7 +6,8 @@ from src.utils.logging import setup_logger
 from src.core.models import MessageCategory
 import pymongo
 from src.config.settings import settings
-from datetime import datetime
+from src.utils.message_write_buffer import get_active_write_buffer
+from datetime import datetime, timedelta
 from bson import ObjectId
 import asyncio
 
@@ -15,18 +16,40 @@ logger = setup_logger(__name__)
 class ImmediatePersistenceCallback(AsyncCallbackHandler):
     """
     Callback handler to immediately persist tool execution results to the database.
-    Uses synchronous PyMongo in a thread pool to avoid asyncio loop mismatch errors.
+    Inside a buffered turn the message joins the turn's write buffer, which flushes within
+    MESSAGE_WRITE_BUFFER_FLUSH_INTERVAL_SECONDS. Otherwise it uses synchronous PyMongo in a
+    thread pool to avoid asyncio loop mismatch errors.
     """
 
     def __init__(self, conversation_id: str, user_id: str, conversation_manager=None):
         self.conversation_id = conversation_id
         self.user_id = user_id
+        self.conversation_manager = conversation_manager
         # We create a sync client on the fly or could share one if carefully managed.
         # Creating one per event is safe for low volume, but for production, a global sync client is better.
         # For now, let's create a global-ish sync client pattern or just new connection.
         self.connection_string = settings.MONGO_CONNECTION_STRING
         self.db_name = settings.MONGO_DB_NAME
 
+    def _build_message_doc(self, content: str, metadata: Dict, message_category: str) -> Dict:
+        return {
+            "conversation_id": ObjectId(self.conversation_id),
+            "user_id": ObjectId(self.user_id),
+            "role": "assistant",
+            "content": content,
+            "message_type": "text",
+            "message_category": message_category,
+            "metadata": metadata,
+            "timestamp": datetime.utcnow()
+        }
+
+    async def _persist(self, content: str, metadata: Dict, message_category: str):
+        buffer = get_active_write_buffer()
+        if buffer is not None and buffer.add(self._build_message_doc(content, metadata, message_category)) is not None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._persist_sync, content, metadata, message_category)
+
     def _persist_sync(self, content: str, metadata: Dict, message_category: str):
         """Synchronous DB insertion"""
         client = None
@@ -36,23 +59,18 @@ class ImmediatePersistenceCallback(AsyncCallbackHandler):
             messages_col = db["messages"]
             conversations_col = db["conversations"]
             
-            message_doc = {
-                "conversation_id": ObjectId(self.conversation_id),
-                "user_id": ObjectId(self.user_id),
-                "role": "assistant",
-                "content": content,
-                "message_type": "text",
-                "message_category": message_category,
-                "metadata": metadata,
-                "timestamp": datetime.utcnow()
-            }
+            message_doc = self._build_message_doc(content, metadata, message_category)
             
             messages_col.insert_one(message_doc)
             
-            # Update last activity
+            # Update last activity (and the expiry derived from it)
+            now = datetime.utcnow()
             conversations_col.update_one(
                 {"_id": ObjectId(self.conversation_id)},
-                {"$set": {"last_activity": datetime.utcnow()}}
+                {"$set": {
+                    "last_activity": now,
+                    "expires_at": now + timedelta(seconds=settings.CONVERSATION_INACTIVITY_TIMEOUT_SECONDS),
+                }}
             )
             logger.info("Successfully persisted message via sync callback")
             
@@ -77,16 +95,13 @@ class ImmediatePersistenceCallback(AsyncCallbackHandler):
                 return
                 
             generated_message = response.generations[0][0].message
-            loop = asyncio.get_running_loop()
             
             if hasattr(generated_message, 'tool_calls') and generated_message.tool_calls:
                 logger.info(f"Persisting AI Message with {len(generated_message.tool_calls)} tool calls")
                 content = generated_message.content if generated_message.content else ""
                 metadata = {"tool_calls": [tc for tc in generated_message.tool_calls]}
                 
-                await loop.run_in_executor(
-                    None, 
-                    self._persist_sync, 
+                await self._persist(
                     str(content), 
                     metadata, 
                     MessageCategory.TOOL_EXECUTION.value
@@ -95,9 +110,7 @@ class ImmediatePersistenceCallback(AsyncCallbackHandler):
             elif generated_message.content:
                 logger.info("Persisting AI Text Message")
                 metadata = {}
-                await loop.run_in_executor(
-                    None, 
-                    self._persist_sync, 
+                await self._persist(
                     str(generated_message.content), 
                     metadata, 
                     MessageCategory.CONVERSATION.value
@@ -137,10 +150,7 @@ class ImmediatePersistenceCallback(AsyncCallbackHandler):
             if tool_name == "browse_website_with_ai":
                 metadata["asynchronous_task_status"] = "requested"
 
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(
-                None, 
-                self._persist_sync, 
+            await self._persist(
                 str(output), 
                 metadata, 
                 MessageCategory.TOOL_EXECUTION.value
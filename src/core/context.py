@@ -18,7 +18,7 @@ async def create_user_context(user_id: str) -> UserContext:
     """
     from src.services.user_service import user_service
     from src.services.integration_service import integration_service
-    user_record = user_service.get_user_by_id(user_id) # Assuming phone number is the user_id for now
+    user_record = await user_service.get_user_by_id_async(user_id) # Assuming phone number is the user_id for now
     if not user_record:
         return None
 
@@ -2,12 +2,13 @@ import json
 import logging
 import asyncio
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Set
 
 from src.config.settings import settings
 from src.utils.logging.base_logger import setup_logger
 from azure.servicebus.exceptions import OperationTimeoutError
 from src.services.user_service import user_service
+from src.core.service_bus_pool import service_bus_pool
 
 logger = setup_logger(__name__)
 
@@ -36,6 +37,13 @@ class InMemoryEventQueue:
         self._scheduled_tasks[event.get("id", str(timestamp))] = task
         logger.info(f"Scheduled event in-memory for {timestamp.isoformat()}")
 
+    async def publish_many(self, events: List[Dict[str, Any]], session_id: str = None, timestamp: Optional[datetime] = None):
+        for event in events:
+            if timestamp:
+                await self.publish_scheduled_event(event, timestamp)
+            else:
+                await self.publish(event, session_id)
+
     async def consume(self):
         logger.info("In-memory event consumer started. Waiting for messages...")
         while True:
@@ -49,10 +57,19 @@ class InMemoryEventQueue:
             except Exception as e:
                 logger.error(f"Error processing in-memory event: {e}", exc_info=True)
 
+    async def close(self, timeout: Optional[float] = None):
+        pass
+
 
 class AzureEventQueue:
     """An Azure Service Bus-based event queue that supports immediate and scheduled messages."""
 
+    def __init__(self):
+        self._groups: Optional[asyncio.Queue] = None
+        self._acceptors: List[asyncio.Task] = []
+        self._stopped: Set[asyncio.Task] = set()
+        self._lock_renewer = None
+
     def _generate_session_id(self, event: Dict[str, Any], session_id: str = None) -> str:
         """Generate a session ID based on event data if not provided"""
         if session_id:
@@ -69,8 +86,11 @@ class AzureEventQueue:
             return f"system_{source}"
     
     def _calculate_adaptive_delay(self, messages: List[Dict[str, Any]]) -> float:
-        """Calculate adaptive delay based on message characteristics, max 500ms"""
-        base_delay = 0.1  # 100ms base delay
+        """
+        Calculate how long to keep a session's grouping window open after its latest message.
+        Sub-second for plain text; longer for forwarded chains and files, which tend to arrive in bursts.
+        """
+        base_delay = settings.EVENT_QUEUE_BASE_DEBOUNCE_SECONDS
         
         if not messages:
             return base_delay
@@ -83,7 +103,7 @@ class AzureEventQueue:
         
         # Check for files in any message
         has_files = any(
-            'files' in msg.get('payload', {}) and msg.get('payload', {}).get('files')
+            isinstance(msg.get('payload'), dict) and msg['payload'].get('files')
             for msg in messages
         )
         
@@ -95,33 +115,32 @@ class AzureEventQueue:
         
         # Add delay for forwarded messages (they often come in groups)
         if is_forwarded:
-            delay += 0.2  # +200ms for forwards
+            delay += settings.EVENT_QUEUE_FORWARDED_DEBOUNCE_SECONDS
             
         # Add delay for files (uploads can have network delays)
         if has_files:
-            delay += 0.1  # +100ms for files
+            delay += 0.5  # +500ms for files
             
         # Add small delay for message sequences (diminishing returns)
         if message_count > 1:
-            sequence_delay = min(0.1, 0.02 * message_count)  # +20ms per message, max 100ms
+            sequence_delay = min(0.3, 0.05 * message_count)  # +50ms per message, max 300ms
             delay += sequence_delay
         
-        # Cap at 500ms maximum
-        delay = min(0.5, delay)
+        delay = min(settings.EVENT_QUEUE_MAX_DEBOUNCE_SECONDS, delay)
         
         logger.debug(f"Delay calculation: base={base_delay}, forwarded={is_forwarded}, "
                     f"files={has_files}, count={message_count}, final={delay}")
         
         return delay
     
-    def _should_be_suspended(self, event: Dict[str, Any]):
+    async def _should_be_suspended(self, event: Dict[str, Any]):
         user_id = event.get('user_id')
 
         if not user_id:
             logger.error(f'there is no user id, access is granted')
             return False
         
-        user_access = user_service.can_have_access(user_id=user_id)
+        user_access = await user_service.can_have_access_async(user_id=user_id)
         return not user_access
     
     async def _send_suspend_reply(self, event):
@@ -143,27 +162,21 @@ class AzureEventQueue:
         Session ID is auto-generated based on user_id and source if not provided.
         """
 
-        if self._should_be_suspended(event):
+        if await self._should_be_suspended(event):
             from src.core.suspended_event_queue import suspended_event_queue
             await suspended_event_queue.publish(event)
             await self._send_suspend_reply(event)
             return
 
-        from azure.servicebus.aio import ServiceBusClient
         from azure.servicebus import ServiceBusMessage
         try:
             # Always ensure we have a session ID
             final_session_id = self._generate_session_id(event, session_id)
-            
-            async with ServiceBusClient.from_connection_string(settings.AZURE_SERVICEBUS_CONNECTION_STRING) as client:
-                sender = client.get_queue_sender(settings.AZURE_SERVICEBUS_QUEUE_NAME)
-                async with sender:
-                    message_body = json.dumps(event)
-                    message = ServiceBusMessage(message_body)
-                    message.session_id = final_session_id
-                    
-                    await sender.send_messages(message)
-                    logger.info(f"Published event to session: {final_session_id}")
+
+            message = ServiceBusMessage(json.dumps(event))
+            message.session_id = final_session_id
+            await service_bus_pool.send(settings.AZURE_SERVICEBUS_QUEUE_NAME, message)
+            logger.info(f"Published event to session: {final_session_id}")
         except Exception as e:
             logger.error(f"Failed to publish event to Azure Service Bus: {e}", exc_info=True)
 
@@ -171,28 +184,55 @@ class AzureEventQueue:
         """
         Publish an event to the Service Bus queue, at a specific timestamp.
         """
-        if self._should_be_suspended(event):
+        if await self._should_be_suspended(event):
             from src.core.suspended_event_queue import suspended_event_queue
             await suspended_event_queue.publish_scheduled_event(event, timestamp)
             await self._send_suspend_reply(event)
             return
         
-        from azure.servicebus.aio import ServiceBusClient
         from azure.servicebus import ServiceBusMessage
         try:
             final_session_id = self._generate_session_id(event, None)
-            async with ServiceBusClient.from_connection_string(settings.AZURE_SERVICEBUS_CONNECTION_STRING) as client:
-                sender = client.get_queue_sender(settings.AZURE_SERVICEBUS_QUEUE_NAME)
-                async with sender:
-                    message_body = json.dumps(event)
-                    message = ServiceBusMessage(message_body)
-                    message.scheduled_enqueue_time_utc = timestamp
-                    message.session_id = final_session_id
-                    await sender.send_messages(message)
-                    logger.info(f"Scheduled event to be enqueued at {timestamp.isoformat()}")
+            message = ServiceBusMessage(json.dumps(event))
+            message.scheduled_enqueue_time_utc = timestamp
+            message.session_id = final_session_id
+            await service_bus_pool.send(settings.AZURE_SERVICEBUS_QUEUE_NAME, message)
+            logger.info(f"Scheduled event to be enqueued at {timestamp.isoformat()}")
         except Exception as e:
             logger.error(f"Failed to publish scheduled event to Azure Service Bus: {e}", exc_info=True)
 
+    async def publish_many(self, events: List[Dict[str, Any]], session_id: str = None, timestamp: Optional[datetime] = None):
+        """
+        Publish several events in as few ServiceBusMessageBatch sends as possible (fan-out cases).
+        Each event gets its own generated session unless session_id is given; timestamp schedules them all.
+        """
+        if not events:
+            return
+
+        from azure.servicebus import ServiceBusMessage
+        messages = []
+        for event in events:
+            if await self._should_be_suspended(event):
+                from src.core.suspended_event_queue import suspended_event_queue
+                if timestamp:
+                    await suspended_event_queue.publish_scheduled_event(event, timestamp)
+                else:
+                    await suspended_event_queue.publish(event)
+                await self._send_suspend_reply(event)
+                continue
+
+            message = ServiceBusMessage(json.dumps(event))
+            message.session_id = self._generate_session_id(event, session_id)
+            if timestamp:
+                message.scheduled_enqueue_time_utc = timestamp
+            messages.append(message)
+
+        try:
+            batches = await service_bus_pool.send_batched(settings.AZURE_SERVICEBUS_QUEUE_NAME, messages)
+            logger.info(f"Published {len(messages)} event(s) in {batches} batch(es)")
+        except Exception as e:
+            logger.error(f"Failed to publish event batch to Azure Service Bus: {e}", exc_info=True)
+
     # async def consume(self):
     #     """
     #     A generator that yields consumed messages from the queue.
@@ -220,140 +260,251 @@ class AzureEventQueue:
     async def consume(self):
         """
         A generator that yields messages grouped by session (user).
+        Holds up to EVENT_QUEUE_MAX_CONCURRENT_SESSIONS sessions open at once, each with its own
+        adaptive grouping window, and yields each group as soon as its window closes.
         Falls back to individual message processing if sessions aren't enabled.
+
+        Each group carries a 'processed' future. Its messages are completed once the consumer
+        resolves it with True, and abandoned (redelivered) when it resolves with False or the
+        consumer shuts down first, so a message is never settled before it has been processed.
+        """
+        from azure.servicebus.aio import AutoLockRenewer
+        max_sessions = max(1, settings.EVENT_QUEUE_MAX_CONCURRENT_SESSIONS)
+        # Bounded so acceptors stop taking new sessions while the worker is saturated.
+        groups: asyncio.Queue = asyncio.Queue(maxsize=max_sessions)
+        self._groups = groups
+        self._lock_renewer = AutoLockRenewer(max_lock_renewal_duration=settings.EVENT_QUEUE_LOCK_RENEWAL_SECONDS)
+        acceptors = [
+            asyncio.create_task(self._session_acceptor(index, groups))
+            for index in range(max_sessions)
+        ]
+        self._acceptors = acceptors
+        logger.info(f"Session consumer started with {max_sessions} concurrent session(s)")
+        try:
+            while True:
+                yield await groups.get()
+        finally:
+            # Acceptors holding a group the consumer already took keep waiting for it to be
+            # processed; close() bounds that wait.
+            self._stop_acceptors()
+
+    async def close(self, timeout: Optional[float] = None):
         """
-        from azure.servicebus.aio import ServiceBusClient
+        Settle everything still held by the consumer, after the worker has drained.
+        Groups never handed to the worker, and groups whose run has not finished within
+        `timeout`, are abandoned so Service Bus redelivers them.
+        """
+        self._stop_acceptors()
+        acceptors, self._acceptors = self._acceptors, []
+        self._stopped.clear()
+        if acceptors:
+            timeout = settings.EXECUTION_WORKER_DRAIN_TIMEOUT_SECONDS if timeout is None else timeout
+            _, pending = await asyncio.wait(acceptors, timeout=timeout)
+            if pending:
+                logger.warning(f"Abandoning messages held by {len(pending)} session acceptor(s) on shutdown")
+                for acceptor in pending:
+                    acceptor.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        if self._lock_renewer is not None:
+            await self._lock_renewer.close()
+            self._lock_renewer = None
+
+    def _stop_acceptors(self):
+        if self._groups is not None:
+            while not self._groups.empty():
+                processed = self._groups.get_nowait().get('processed')
+                if processed is not None and not processed.done():
+                    processed.set_result(False)
+        # Cancel once: a second cancellation makes an acceptor abandon its in-flight group.
+        for acceptor in self._acceptors:
+            if acceptor not in self._stopped:
+                self._stopped.add(acceptor)
+                acceptor.cancel()
+
+    async def _session_acceptor(self, index: int, groups: asyncio.Queue):
+        """Repeatedly accept the next available session, collect its group and hand it to the consumer."""
         from azure.servicebus import NEXT_AVAILABLE_SESSION
+        loop = asyncio.get_running_loop()
         while True:
             try:
-                async with ServiceBusClient.from_connection_string(settings.AZURE_SERVICEBUS_CONNECTION_STRING, keep_alive_interval=30) as client:
-                    # Try session-based approach first
+                client = None
+                async with service_bus_pool.lease() as client:
                     try:
                         session_receiver = client.get_queue_receiver(
                             settings.AZURE_SERVICEBUS_QUEUE_NAME,
                             session_id=NEXT_AVAILABLE_SESSION,
-                            max_wait_time=60  # Wait up to 60 seconds for a session to become available
+                            max_wait_time=60,  # Wait up to 60 seconds for a session to become available
+                            auto_lock_renewer=self._lock_renewer,
                         )
-                        
                         async with session_receiver:
-                            session_id = session_receiver.session.session_id
-                            logger.info(f"Processing session: {session_id}")
-                            
-                            # Collect messages from this session with brief wait for grouping
-                            messages = []
-                            
-                            # Collect messages in this session with grouping logic
-                            first_message_received = False
-
-                            while True:
-                                try:
-                                    # Determine wait time based on current state
-                                    if not first_message_received:
-                                        wait_time = 30  # First message: wait longer
-                                    else:
-                                        # Check if all messages so far are forwarded
-                                        all_forwarded = messages and all(
-                                            (dict(msg)).get('metadata', {}).get('forwarded', False)
-                                            for msg in messages
-                                        )
-                                        # Extended wait for forwarded message chains, regular wait otherwise
-                                        wait_time = 15 if all_forwarded else 3
-
-                                    batch = await session_receiver.receive_messages(max_message_count=10, max_wait_time=wait_time)
-
-                                    if not batch:
-                                        if first_message_received:
-                                            # Check if we should wait longer for forwarded chains
-                                            if messages:
-                                                all_forwarded = all(
-                                                    (dict(msg)).get('metadata', {}).get('forwarded', False)
-                                                    for msg in messages
-                                                )
-
-
-
-                                                if all_forwarded and wait_time < 20:
-                                                    # For forwarded chains, do one final long wait
-                                                    logger.info(f"Forwarded message chain detected, waiting an additional 20 seconds for more messages in session {session_id}")
-                                                    batch = await session_receiver.receive_messages(max_message_count=10, max_wait_time=20)
-                                                    if batch:
-                                                        # More messages arrived! Process them and continue
-                                                        for msg in batch:
-                                                            try:
-                                                                event = (dict(msg))
-                                                                messages.append(event)
-                                                                await session_receiver.complete_message(msg)
-                                                            except Exception as e:
-                                                                logger.error(f"Error processing message: {e}", exc_info=True)
-                                                                await session_receiver.abandon_message(msg)
-                                                        continue  # Continue the main loop
-
-                                            # We got some messages but now timeout - process what we have
-                                            break
-                                        else:
-                                            # No messages at all in this session, continue to next session
-                                            break
-
-                                    # Process the batch
-                                    for msg in batch:
-                                        try:
-                                            event = json.loads(str(msg))
-                                            messages.append(event)
-                                            await session_receiver.complete_message(msg)
-                                            first_message_received = True
-
-                                        except Exception as e:
-                                            logger.error(f"Error processing message: {e}", exc_info=True)
-                                            await session_receiver.abandon_message(msg)
-
-
-                                except Exception as batch_error:
-                                    logger.error(f"Error receiving message batch: {batch_error}", exc_info=True)
-                                    break
-                            
-                            if messages:
-                                yield {
-                                    'session_id': session_id,
-                                    'events': messages,
-                                    'is_grouped': len(messages) > 1
-                                }
-                    
+                            received: List[Any] = []
+                            processed = loop.create_future()
+                            settle = asyncio.create_task(self._settle(session_receiver, received, processed))
+                            try:
+                                group = await self._collect_session_group(session_receiver, received)
+                                if group:
+                                    group['processed'] = processed
+                                    await groups.put(group)
+                                else:
+                                    processed.set_result(False)
+                            except BaseException:
+                                if not processed.done():
+                                    processed.set_result(False)
+                                raise
+                            finally:
+                                # The session stays locked until its group has run, so its messages
+                                # are completed only after processing (ordering is kept by the worker).
+                                await self._await_settled([settle])
+
+                    except asyncio.CancelledError:
+                        raise
                     except Exception as session_error:
                         if "does not require sessions" in str(session_error) or "RequiresSession" in str(session_error):
                             logger.warning("Service Bus queue doesn't have sessions enabled, falling back to individual message processing")
-                            # Fall back to non-session processing
-                            receiver = client.get_queue_receiver(settings.AZURE_SERVICEBUS_QUEUE_NAME)
-                            async with receiver:
-                                logger.info("Using individual message processing (no sessions)")
-                                async for msg in receiver:
-                                    try:
-                                        event = json.loads(str(msg))
-                                        # Yield as single-message group for compatibility
-                                        yield {
-                                            'session_id': 'no-session',
-                                            'events': [event],
-                                            'is_grouped': False
-                                        }
-                                        await receiver.complete_message(msg)
-                                    except Exception as e:
-                                        logger.error(f"Error processing individual message: {e}", exc_info=True)
-                                        await receiver.abandon_message(msg)
-                            # return  # Exit the session retry loop
+                            await self._consume_without_sessions(client, groups)
                             await asyncio.sleep(1)  # brief pause before retrying sessions
-                            continue
                         elif "no messages available" not in str(session_error).lower():
                             if isinstance(session_error, OperationTimeoutError):
-                                logger.info("Session receive operation timed out, retrying...")
-                                await asyncio.sleep(1)
+                                logger.debug(f"Session acceptor {index}: receive operation timed out, retrying...")
                             else:
-                                logger.error(f"Session processing error: {session_error}", exc_info=True)
-                                await asyncio.sleep(1)
-                                continue
-            
+                                logger.error(f"Session acceptor {index} processing error: {session_error}", exc_info=True)
+                            await asyncio.sleep(1)
+
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Service Bus connection error in session consumer: {e}. Reconnecting in 10 seconds...", exc_info=True)
+                logger.error(f"Service Bus connection error in session acceptor {index}: {e}. Reconnecting in 10 seconds...", exc_info=True)
+                # Replaces only this client; receivers and senders still using it finish first.
+                await service_bus_pool.reset(client)
                 await asyncio.sleep(10)
 
+    async def _settle(self, receiver, messages: List[Any], processed: asyncio.Future):
+        """Complete `messages` once their group has been processed; abandon them otherwise."""
+        try:
+            success = await asyncio.shield(processed)
+        except asyncio.CancelledError:
+            success = False
+        for msg in messages:
+            try:
+                if success:
+                    await receiver.complete_message(msg)
+                else:
+                    await receiver.abandon_message(msg)
+            except Exception as e:
+                logger.error(f"Error settling message (completed={success}): {e}", exc_info=True)
+
+    async def _await_settled(self, settles: List[asyncio.Task]):
+        """
+        Wait for settle tasks before their receiver closes. On shutdown (first cancellation) keep
+        waiting for groups the worker is still running; a second cancellation abandons them.
+        """
+        if not settles:
+            return
+        waiter = asyncio.gather(*settles, return_exceptions=True)
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            try:
+                await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                for settle in settles:
+                    settle.cancel()
+                await waiter
+            raise
+
+    async def _collect_session_group(self, session_receiver, received: List[Any]) -> Optional[Dict[str, Any]]:
+        """
+        Collect messages from an accepted session until its debounce window closes.
+        The window is extended by the adaptive delay after each batch, capped at
+        EVENT_QUEUE_MAX_GROUP_WINDOW_SECONDS from the first message. Messages that parse are
+        appended to `received` unsettled; the caller settles them after processing.
+        """
+        session_id = session_receiver.session.session_id
+        logger.info(f"Processing session: {session_id}")
+
+        loop = asyncio.get_running_loop()
+        messages = []
+        window_started = None
+        wait_time = settings.EVENT_QUEUE_FIRST_MESSAGE_WAIT_SECONDS
+
+        while True:
+            try:
+                batch = await session_receiver.receive_messages(max_message_count=10, max_wait_time=wait_time)
+            except Exception as batch_error:
+                logger.error(f"Error receiving message batch: {batch_error}", exc_info=True)
+                break
+
+            if not batch:
+                # Window closed (or the session was empty)
+                break
+
+            for msg in batch:
+                try:
+                    event = json.loads(str(msg))
+                except Exception as e:
+                    logger.error(f"Error processing message: {e}", exc_info=True)
+                    await session_receiver.abandon_message(msg)
+                    continue
+                messages.append(event)
+                received.append(msg)
+
+            if not messages:
+                continue
+            if window_started is None:
+                window_started = loop.time()
+
+            remaining = settings.EVENT_QUEUE_MAX_GROUP_WINDOW_SECONDS - (loop.time() - window_started)
+            if remaining <= 0:
+                logger.info(f"Grouping window cap reached for session {session_id}")
+                break
+            wait_time = min(self._calculate_adaptive_delay(messages), remaining)
+
+        if not messages:
+            return None
+        return {
+            'session_id': session_id,
+            'events': messages,
+            'is_grouped': len(messages) > 1
+        }
+
+    async def _consume_without_sessions(self, client, groups: asyncio.Queue):
+        """Individual message processing for queues without sessions enabled."""
+        loop = asyncio.get_running_loop()
+        receiver = client.get_queue_receiver(
+            settings.AZURE_SERVICEBUS_QUEUE_NAME,
+            auto_lock_renewer=self._lock_renewer,
+        )
+        async with receiver:
+            logger.info("Using individual message processing (no sessions)")
+            settles = set()
+            try:
+                async for msg in receiver:
+                    try:
+                        event = json.loads(str(msg))
+                    except Exception as e:
+                        logger.error(f"Error processing individual message: {e}", exc_info=True)
+                        await receiver.abandon_message(msg)
+                        continue
+
+                    processed = loop.create_future()
+                    settle = asyncio.create_task(self._settle(receiver, [msg], processed))
+                    settles.add(settle)
+                    settle.add_done_callback(settles.discard)
+                    try:
+                        # Hand over as single-message group for compatibility
+                        await groups.put({
+                            'session_id': 'no-session',
+                            'events': [event],
+                            'is_grouped': False,
+                            'processed': processed,
+                        })
+                    except BaseException:
+                        if not processed.done():
+                            processed.set_result(False)
+                        raise
+            finally:
+                await self._await_settled(list(settles))
+
 def get_event_queue():
     if settings.QUEUE_MODE == 'in_memory':
         return InMemoryEventQueue()
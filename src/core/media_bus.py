@@ -1,19 +1,29 @@
 """
-Media Bus: In-memory reference system for media during agent execution.
+Media Bus: Reference system for media during agent execution.
 
 Provides a centralized way for agents to track and reference media that has been
-generated or received during the current conversation turn. This enables:
+generated or received during the conversation. This enables:
 - Using previous media to inspire new media
 - Referencing multiple generated items
 - Building on previous outputs
 
-The bus is execution-scoped and cleared after each conversation turn completes.
+Storage is pluggable (MEDIA_BUS_BACKEND):
+- "memory" (default): in-process and execution-scoped, cleared after each conversation turn.
+- "redis": a hash of references plus an insertion-ordered sorted set per conversation, shared
+  by every worker process and kept for MEDIA_BUS_REDIS_TTL_SECONDS, so media generated in one
+  turn is still there when the next turn lands on another pod or after a restart.
+
+Both backends index references by media_id and by insertion order, so lookups don't scan and
+listings don't sort. References without a URL are signed from their blob path when read, not
+when added. Whether a reference has been loaded into the model context is tracked per turn.
 """
 
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass, field
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, Set
+from dataclasses import dataclass, field, asdict, replace
 from datetime import datetime
-import uuid
+import itertools
+import json
 from src.utils.logging import setup_logger
 from src.config.settings import settings
 logger = setup_logger(__name__)
@@ -35,21 +45,202 @@ class MediaReference:
     metadata: Dict[str, Any] = field(default_factory=dict)
     container_name: Optional[str] = settings.AZURE_BLOB_CONTAINER_NAME  # Blob container name
 
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["timestamp"] = self.timestamp.isoformat()
+        data.pop("loaded_in_context")  # Turn-scoped, tracked by the MediaBus
+        return json.dumps(data, default=str)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "MediaReference":
+        data = json.loads(raw)
+        data["timestamp"] = datetime.fromisoformat(data["timestamp"])
+        return cls(**data)
+
+
+def _dedupe_key(ref: MediaReference) -> Optional[str]:
+    # The same stored file is re-added as history is rebuilt; keep its first media_id.
+    if ref.blob_path:
+        return f"blob:{ref.container_name}/{ref.blob_path}"
+    if ref.url:
+        return f"url:{ref.url}"
+    return None
+
+
+class MediaStore(ABC):
+    """Storage backend of the MediaBus: references per conversation, indexed by id and insertion order."""
+
+    # Whether the store only lives for one execution (cleared when the turn ends)
+    execution_scoped: bool = True
+
+    @abstractmethod
+    async def add(self, conversation_id: str, ref: MediaReference) -> str:
+        """Store `ref`, assigning its media_id (1, 2, ... per conversation); returns the id.
+        A reference to a file already in the conversation returns the existing id."""
+
+    @abstractmethod
+    async def get(self, conversation_id: str, media_id: str) -> Optional[MediaReference]:
+        ...
+
+    @abstractmethod
+    async def list(self, conversation_id: str, file_type: Optional[str] = None, limit: Optional[int] = None) -> List[MediaReference]:
+        """References of a conversation, most recent first."""
+
+    @abstractmethod
+    async def count_by_type(self, conversation_id: str) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    async def clear(self, conversation_id: str) -> int:
+        ...
+
+
+class InMemoryMediaStore(MediaStore):
+    """Per-process store: insertion-ordered dict by media_id plus per-type id lists."""
+
+    execution_scoped = True
+
+    def __init__(self):
+        # conversation_id -> media_id -> reference (dicts keep insertion order)
+        self._refs: Dict[str, Dict[str, MediaReference]] = {}
+        # conversation_id -> file_type -> media_ids in insertion order
+        self._by_type: Dict[str, Dict[str, List[str]]] = {}
+        # conversation_id -> dedupe key -> media_id
+        self._by_key: Dict[str, Dict[str, str]] = {}
+
+    async def add(self, conversation_id: str, ref: MediaReference) -> str:
+        refs = self._refs.setdefault(conversation_id, {})
+        keys = self._by_key.setdefault(conversation_id, {})
+        dedupe_key = _dedupe_key(ref)
+        if dedupe_key and dedupe_key in keys:
+            return keys[dedupe_key]
+
+        ref.media_id = str(len(refs) + 1)  # Use index as media ID
+        refs[ref.media_id] = ref
+        self._by_type.setdefault(conversation_id, {}).setdefault(ref.file_type, []).append(ref.media_id)
+        if dedupe_key:
+            keys[dedupe_key] = ref.media_id
+        return ref.media_id
+
+    async def get(self, conversation_id: str, media_id: str) -> Optional[MediaReference]:
+        return self._refs.get(conversation_id, {}).get(media_id)
+
+    async def list(self, conversation_id: str, file_type: Optional[str] = None, limit: Optional[int] = None) -> List[MediaReference]:
+        refs = self._refs.get(conversation_id)
+        if not refs:
+            return []
+        if file_type:
+            ordered = (refs[mid] for mid in reversed(self._by_type[conversation_id].get(file_type, [])))
+        else:
+            ordered = reversed(refs.values())
+        return list(itertools.islice(ordered, limit or None))
+
+    async def count_by_type(self, conversation_id: str) -> Dict[str, int]:
+        return {file_type: len(ids) for file_type, ids in self._by_type.get(conversation_id, {}).items()}
+
+    async def clear(self, conversation_id: str) -> int:
+        count = len(self._refs.pop(conversation_id, {}))
+        self._by_type.pop(conversation_id, None)
+        self._by_key.pop(conversation_id, None)
+        return count
+
+
+class RedisMediaStore(MediaStore):
+    """
+    Shared store. Per conversation:
+    - media_bus:{id}:refs   hash media_id -> reference JSON
+    - media_bus:{id}:order  sorted set of media_ids scored by sequence (insertion order)
+    - media_bus:{id}:keys   hash dedupe key -> media_id
+    - media_bus:{id}:seq    media_id counter
+    All four expire ttl_seconds after the conversation's last add.
+    """
+
+    execution_scoped = False
+    KEY_PREFIX = "media_bus:"
+
+    def __init__(self, ttl_seconds: int = 86400):
+        self.ttl_seconds = ttl_seconds
+
+    def _keys(self, conversation_id: str) -> Dict[str, str]:
+        base = f"{self.KEY_PREFIX}{conversation_id}"
+        return {name: f"{base}:{name}" for name in ("refs", "order", "keys", "seq")}
+
+    @staticmethod
+    def _redis():
+        from src.utils.redis_client import redis_client
+        return redis_client
+
+    async def add(self, conversation_id: str, ref: MediaReference) -> str:
+        redis_client = self._redis()
+        keys = self._keys(conversation_id)
+        dedupe_key = _dedupe_key(ref)
+        if dedupe_key:
+            existing = await redis_client.hget(keys["keys"], dedupe_key)
+            if existing:
+                return existing
+
+        seq = await redis_client.incr(keys["seq"])
+        ref.media_id = str(seq)
+        if dedupe_key and not await redis_client.hsetnx(keys["keys"], dedupe_key, ref.media_id):
+            # Added concurrently by another worker; use theirs.
+            return await redis_client.hget(keys["keys"], dedupe_key)
+
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(keys["refs"], ref.media_id, ref.to_json())
+            pipe.zadd(keys["order"], {ref.media_id: seq})
+            for key in keys.values():
+                pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+        return ref.media_id
+
+    async def get(self, conversation_id: str, media_id: str) -> Optional[MediaReference]:
+        raw = await self._redis().hget(self._keys(conversation_id)["refs"], media_id)
+        return MediaReference.from_json(raw) if raw else None
+
+    async def list(self, conversation_id: str, file_type: Optional[str] = None, limit: Optional[int] = None) -> List[MediaReference]:
+        redis_client = self._redis()
+        keys = self._keys(conversation_id)
+        # Without a type filter only the requested page is read.
+        end = limit - 1 if (limit and not file_type) else -1
+        media_ids = await redis_client.zrevrange(keys["order"], 0, end)
+        if not media_ids:
+            return []
+        refs = [MediaReference.from_json(raw) for raw in await redis_client.hmget(keys["refs"], media_ids) if raw]
+        if file_type:
+            refs = [r for r in refs if r.file_type == file_type]
+        return refs[:limit] if limit else refs
+
+    async def count_by_type(self, conversation_id: str) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for raw in await self._redis().hvals(self._keys(conversation_id)["refs"]):
+            file_type = MediaReference.from_json(raw).file_type
+            counts[file_type] = counts.get(file_type, 0) + 1
+        return counts
+
+    async def clear(self, conversation_id: str) -> int:
+        redis_client = self._redis()
+        keys = self._keys(conversation_id)
+        count = await redis_client.hlen(keys["refs"])
+        await redis_client.delete(*keys.values())
+        return count
+
+
 class MediaBus:
     """
-    In-memory media reference system for current execution.
+    Media reference system for agent execution.
 
-    Provides agent with access to media generated or received during
-    the current conversation turn. Cleared after execution completes.
+    Provides agent with access to media generated or received during the
+    conversation, on top of a MediaStore backend.
 
     This is NOT a storage system - it's a reference/catalog system.
     Actual media files are stored in blob storage; this tracks URLs and metadata.
     """
 
-    def __init__(self):
-        # Execution-scoped storage: conversation_id -> list of media references
-        self._storage: Dict[str, List[MediaReference]] = {}
-        logger.info("MediaBus initialized")
+    def __init__(self, store: Optional[MediaStore] = None):
+        self.store = store or InMemoryMediaStore()
+        # Turn-scoped: conversation_id -> media_ids already loaded into the model context
+        self._loaded_in_context: Dict[str, Set[str]] = {}
+        logger.info(f"MediaBus initialized ({type(self.store).__name__})")
 
     async def add_media(
         self,
@@ -69,7 +260,7 @@ class MediaBus:
 
         Args:
             conversation_id: The conversation this media belongs to
-            url: The blob URL (SAS URL for access)
+            url: The blob URL (SAS URL for access); if empty, signed from blob_path when read
             file_name: Name of the file
             file_type: Type (image, audio, video, document)
             description: Natural language description for the agent to understand context
@@ -79,23 +270,14 @@ class MediaBus:
             metadata: Additional metadata (prompts, generation params, etc.)
 
         Returns:
-            media_id: Unique identifier for this media reference
+            media_id: Identifier for this media reference (its position in the conversation)
         """
-        # media_id = str(uuid.uuid4())
         if file_type in {'image','photo'}:
             container_name = 'cdn-container'
-        media_id = str(len(self._storage.get(conversation_id, [])) + 1)  # Use index as media ID
 
-        if url is None and blob_path is not None:
-            ### generate SAS URL from blob path
-            try:
-                from src.utils.blob_utils import get_blob_sas_url
-                url = await get_blob_sas_url(blob_path, container_name=container_name)
-            except Exception as e:
-                logger.warning(f"Failed to generate SAS URL for blob_path {blob_path}: {e}")
         ### simply use the index as media id to make it easier to reference multiple media in order
         ref = MediaReference(
-            media_id=media_id,
+            media_id="",
             url=url,
             file_name=file_name,
             file_type=file_type,
@@ -108,11 +290,7 @@ class MediaBus:
             metadata=metadata or {},
             container_name=container_name
         )
-
-        if conversation_id not in self._storage:
-            self._storage[conversation_id] = []
-
-        self._storage[conversation_id].append(ref)
+        media_id = await self.store.add(conversation_id, ref)
 
         logger.info(
             f"Added media to bus: {media_id} ({file_type}) - {description[:50]}... "
@@ -121,29 +299,39 @@ class MediaBus:
 
         return media_id
 
-    def get_media(self, conversation_id: str, media_id: str) -> Optional[MediaReference]:
+    async def _for_reader(self, conversation_id: str, ref: MediaReference) -> MediaReference:
+        """A copy of `ref` with its URL signed if needed and this turn's context flag."""
+        url = ref.url
+        if not url and ref.blob_path:
+            try:
+                from src.utils.blob_utils import get_blob_sas_url
+                url = await get_blob_sas_url(ref.blob_path, container_name=ref.container_name)
+            except Exception as e:
+                logger.warning(f"Failed to generate SAS URL for blob_path {ref.blob_path}: {e}")
+        return replace(
+            ref,
+            url=url,
+            loaded_in_context=ref.media_id in self._loaded_in_context.get(conversation_id, ()),
+        )
+
+    async def get_media(self, conversation_id: str, media_id: str) -> Optional[MediaReference]:
         """
         Retrieve a specific media reference by ID.
 
         Args:
             conversation_id: The conversation ID
-            media_id: The unique media ID
+            media_id: The media ID
 
         Returns:
             MediaReference or None if not found
         """
-        if conversation_id not in self._storage:
-            logger.warning(f"Conversation {conversation_id} not found in media bus")
+        ref = await self.store.get(conversation_id, str(media_id))
+        if ref is None:
+            logger.warning(f"Media {media_id} not found in conversation {conversation_id}")
             return None
+        return await self._for_reader(conversation_id, ref)
 
-        for ref in self._storage[conversation_id]:
-            if ref.media_id == media_id:
-                return ref
-
-        logger.warning(f"Media {media_id} not found in conversation {conversation_id}")
-        return None
-
-    def list_media(
+    async def list_media(
         self,
         conversation_id: str,
         file_type: Optional[str] = None,
@@ -160,29 +348,13 @@ class MediaBus:
         Returns:
             List of media references, most recent first
         """
-        if conversation_id not in self._storage:
-            logger.debug(f"No media found for conversation {conversation_id}")
-            return []
-
-        refs = self._storage[conversation_id]
-
-        # Filter by type if specified
-        if file_type:
-            refs = [r for r in refs if r.file_type == file_type]
-
-        # Sort by timestamp, most recent first
-        refs = sorted(refs, key=lambda r: r.timestamp, reverse=True)
-
-        # Apply limit
-        if limit:
-            refs = refs[:limit]
-
+        refs = await self.store.list(conversation_id, file_type=file_type, limit=limit)
         logger.debug(f"Listed {len(refs)} media items for conversation {conversation_id}")
-        return refs
+        return [await self._for_reader(conversation_id, ref) for ref in refs]
 
-    def clear_conversation(self, conversation_id: str) -> int:
+    async def clear_conversation(self, conversation_id: str) -> int:
         """
-        Clear all media for a conversation (called after execution).
+        Clear all media for a conversation.
 
         Args:
             conversation_id: The conversation ID to clear
@@ -190,14 +362,26 @@ class MediaBus:
         Returns:
             Number of media items cleared
         """
-        if conversation_id in self._storage:
-            count = len(self._storage[conversation_id])
-            del self._storage[conversation_id]
+        self._loaded_in_context.pop(conversation_id, None)
+        count = await self.store.clear(conversation_id)
+        if count:
             logger.info(f"Cleared {count} media references from bus for conversation {conversation_id}")
-            return count
+        return count
+
+    async def end_turn(self, conversation_id: str) -> int:
+        """
+        Called after each execution. Clears the conversation from an execution-scoped store;
+        a shared store keeps it (until its TTL) for the next turn.
+
+        Returns:
+            Number of media items cleared
+        """
+        if self.store.execution_scoped:
+            return await self.clear_conversation(conversation_id)
+        self._loaded_in_context.pop(conversation_id, None)
         return 0
 
-    def get_stats(self, conversation_id: str) -> Dict[str, int]:
+    async def get_stats(self, conversation_id: str) -> Dict[str, int]:
         """
         Get statistics about media in the bus for a conversation.
 
@@ -207,40 +391,36 @@ class MediaBus:
         Returns:
             Dictionary with counts by type and total
         """
-        if conversation_id not in self._storage:
-            return {"total": 0}
-
-        refs = self._storage[conversation_id]
-        stats = {"total": len(refs)}
+        counts = await self.store.count_by_type(conversation_id)
+        return {"total": sum(counts.values()), **counts}
 
-        # Count by type
-        for ref in refs:
-            stats[ref.file_type] = stats.get(ref.file_type, 0) + 1
-
-        return stats
-
-    def has_media(self, conversation_id: str) -> bool:
+    async def has_media(self, conversation_id: str) -> bool:
         """Check if conversation has any media in the bus."""
-        return conversation_id in self._storage and len(self._storage[conversation_id]) > 0
+        return bool(await self.store.list(conversation_id, limit=1))
 
     def mark_loaded_in_context(self, conversation_id: str, media_id: str) -> bool:
         """
-        Mark a media item as loaded in conversation context.
+        Mark a media item as loaded in conversation context (for the current turn).
 
         Args:
             conversation_id: The conversation ID
             media_id: The media ID to mark
 
         Returns:
-            True if marked successfully, False if media not found
+            True if marked, False without a media_id
         """
-        ref = self.get_media(conversation_id, media_id)
-        if ref:
-            ref.loaded_in_context = True
-            logger.debug(f"Marked media {media_id} as loaded in context")
-            return True
-        return False
+        if not media_id:
+            return False
+        self._loaded_in_context.setdefault(conversation_id, set()).add(str(media_id))
+        logger.debug(f"Marked media {media_id} as loaded in context")
+        return True
+
+
+def _create_store() -> MediaStore:
+    if settings.MEDIA_BUS_BACKEND == "redis":
+        return RedisMediaStore(ttl_seconds=settings.MEDIA_BUS_REDIS_TTL_SECONDS)
+    return InMemoryMediaStore()
 
 
-# Global singleton instance (execution-scoped, cleared between runs)
-media_bus = MediaBus()
+# Global singleton instance
+media_bus = MediaBus(_create_store())
@@ -26,6 +26,7 @@ class AgentFinalResponse(BaseModel):
 class GraphConfig(BaseModel):
     """Configuration and context for a single graph execution."""
     llm_with_tools: Runnable 
+    tool_node: Runnable
     structured_llm: Runnable
     fast_llm: Runnable
     system_prompt: str
@@ -1,4 +1,5 @@
 from .call_model import call_model
 from .final_response import generate_final_response
 from .obtain_data import obtain_data
-from .should_continue_router import should_continue_router
\ No newline at end of file
+from .should_continue_router import should_continue_router
+from .execute_tools import execute_tools
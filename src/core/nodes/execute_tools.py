@@ -0,0 +1,11 @@
+from langchain_core.runnables import RunnableConfig
+from src.core.models.agent_runner_models import AgentState
+from src.utils.logging import setup_logger
+logger = setup_logger('execute_tools')
+async def execute_tools(state: AgentState, config: RunnableConfig):
+    """
+    Runs the per-turn ToolNode carried in the state's config.
+    Lets the graph be compiled once while each run brings its own tools.
+    """
+    tool_node = state['config'].tool_node
+    return await tool_node.ainvoke(state, config)
@@ -65,7 +65,7 @@ def _build_retry_message(error_details: ErrorDetails, attempt: int, max_attempts
     return msg
 
 
-def should_continue_router(state: AgentState) -> Command[Literal["obtain_data", "action", "finalize"]]:
+async def should_continue_router(state: AgentState) -> Command[Literal["obtain_data", "action", "finalize"]]:
     """
     Enhanced router with intelligent error handling.
     Directs the graph's flow by reading context from the state's config object.
@@ -89,7 +89,7 @@ def should_continue_router(state: AgentState) -> Command[Literal["obtain_data",
                         # now we must check if the media is added to context
                         conv_id = state.get('metadata', {}).get('conversation_id')
                         media_id = tool_response.result.get('media_id') 
-                        ref = media_bus.get_media(conv_id, media_id)
+                        ref = await media_bus.get_media(conv_id, media_id)
                         if ref.loaded_in_context:
                             continue
                         payload = tool_response.result.pop('payload',{})
@@ -11,13 +11,17 @@ Construction:
 call automatically includes them in the request body / query string.
 """
 
+import asyncio
+import copy
+import functools
 import json
 import mimetypes
 import os
 import time
 import uuid
+import weakref
 from datetime import date, datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Hashable, List, Optional
 
 import httpx
 
@@ -38,6 +42,7 @@ class _PraxosJSONEncoder(json.JSONEncoder):
         return super().default(o)
 
 from src.config.settings import settings
+from src.utils.ttl_cache import TTLCache
 from src.utils.logging import (
     praxos_logger,
     log_praxos_query_started,
@@ -61,6 +66,94 @@ from src.utils.logging import (
 )
 
 
+# One pooled keep-alive transport per event loop, shared by every PraxosClient instance.
+# (httpx connections are bound to the loop that opened them.)
+_shared_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_praxos_http_client() -> httpx.AsyncClient:
+    """The pooled httpx client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _shared_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(
+                max_connections=settings.PRAXOS_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.PRAXOS_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.PRAXOS_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+        _shared_http_clients[loop] = client
+    return client
+
+
+async def close_praxos_http_client() -> None:
+    """Close the pooled client of the running loop (call on shutdown)."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    client = _shared_http_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+class PraxosSearchCache:
+    """
+    Short-TTL cache of memory/file search results per user.
+
+    Keys carry a per-user generation; any write for the user bumps it, so results cached
+    before the write are never served again (they age out of the LRU on their own).
+    Callers build the key once with make_key before the request and store under that same
+    key, so a result fetched before a write lands under the pre-write generation.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self._cache = TTLCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self._generations: Dict[str, int] = {}
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join((query or "").split()).casefold()
+
+    def make_key(self, user_id: str, environment_id: str, kind: str, query: str, params: tuple) -> Hashable:
+        return (user_id, environment_id, self._generations.get(user_id, 0), kind, self.normalize_query(query), params)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        result = self._cache.get(key)
+        return copy.deepcopy(result) if result is not None else None
+
+    def set(self, key: Hashable, result: Dict[str, Any]):
+        self._cache.set(key, copy.deepcopy(result))
+
+    def invalidate_user(self, user_id: str):
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics for monitoring"""
+        return self._cache.get_stats()
+
+
+praxos_search_cache = PraxosSearchCache(
+    ttl_seconds=settings.PRAXOS_SEARCH_CACHE_TTL_SECONDS,
+    max_entries=settings.PRAXOS_SEARCH_CACHE_MAX_ENTRIES,
+)
+
+
+def _invalidates_search_cache(method):
+    """Marks a PraxosClient method as a memory write: cached searches for the user are dropped."""
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            praxos_search_cache.invalidate_user(self.user_id)
+
+    return wrapper
+
+
 class PraxosBridgeError(Exception):
     """Raised when the backend bridge returns a non-2xx response."""
 
@@ -90,7 +183,6 @@ class PraxosClient:
             )
         self.base_url = resolved.rstrip("/")
         self.timeout = timeout
-        self._client = httpx.AsyncClient(timeout=timeout)
 
     # Compatibility shim — older callers expected a truthy `.env` to know
     # the client was initialized. Kept so we don't have to touch every
@@ -100,7 +192,8 @@ class PraxosClient:
         return True
 
     async def aclose(self) -> None:
-        await self._client.aclose()
+        # The transport is pooled per process; see close_praxos_http_client.
+        return None
 
     async def __aenter__(self) -> "PraxosClient":
         return self
@@ -138,7 +231,9 @@ class PraxosClient:
         if data is not None:
             kwargs["data"] = data
 
-        resp = await self._client.request(method, self._url(path), **kwargs)
+        resp = await get_praxos_http_client().request(
+            method, self._url(path), timeout=self.timeout, **kwargs
+        )
         if resp.status_code >= 400:
             try:
                 payload = resp.json()
@@ -160,6 +255,7 @@ class PraxosClient:
     # Source creation: conversation / business-data / file
     # ------------------------------------------------------------------
 
+    @_invalidates_search_cache
     async def add_conversation(
         self,
         user_id: str,
@@ -234,6 +330,7 @@ class PraxosClient:
     ):
         return await self.add_conversation(user_id, content, source, metadata, user_record)
 
+    @_invalidates_search_cache
     async def add_email_conversation(
         self,
         messages: List,
@@ -283,6 +380,7 @@ class PraxosClient:
             praxos_logger.error(f"❌ Email conversation add failed: {e}")
             return {"error": str(e)}
 
+    @_invalidates_search_cache
     async def add_integration_capability(
         self, user_id: str, integration_type: str, capabilities: List[str]
     ):
@@ -325,6 +423,7 @@ class PraxosClient:
             log_praxos_add_integration_failed(user_id, integration_type, e, duration)
             return {"error": str(e)}
 
+    @_invalidates_search_cache
     async def add_business_data(
         self,
         data: Dict[str, Any],
@@ -383,6 +482,7 @@ class PraxosClient:
             "POST", "sources/file", params=params, files=files, data=form
         )
 
+    @_invalidates_search_cache
     async def add_file(
         self,
         file_path: str,
@@ -419,6 +519,7 @@ class PraxosClient:
             log_praxos_file_upload_failed(file_path, name, e, duration)
             return {"error": f"File upload failed: {str(e)}"}
 
+    @_invalidates_search_cache
     async def add_file_content(
         self,
         file_data: bytes,
@@ -606,6 +707,13 @@ class PraxosClient:
         exclude_seen: List[str] = None,
     ):
         """Direct search via POST /search with score filtering."""
+        cache_params = (top_k, search_modality, tuple(sorted(exclude_seen or [])))
+        cache_key = praxos_search_cache.make_key(self.user_id, self.environment_id, "search_memory", query, cache_params)
+        cached = praxos_search_cache.get(cache_key)
+        if cached is not None:
+            praxos_logger.info(f"search_memory cache hit for user {self.user_id}")
+            return cached
+
         start_time = time.time()
         log_praxos_query_started("system", query, "search_memory")
         try:
@@ -640,7 +748,7 @@ class PraxosClient:
             log_praxos_query_completed(
                 "system", query, len(qualified_results), duration, "search_memory"
             )
-            return {
+            response = {
                 "success": True,
                 "source_ids": source_ids,
                 "results": qualified_results,
@@ -649,6 +757,8 @@ class PraxosClient:
                 "sentences_count": len(extracted_sentences),
                 "raw_results": results,
             }
+            praxos_search_cache.set(cache_key, response)
+            return response
         except PraxosBridgeError as e:
             duration = time.time() - start_time
             log_praxos_query_failed("system", query, e, duration, "search_memory")
@@ -671,6 +781,13 @@ class PraxosClient:
         ``sync_file_for_semantic_search``. Returns chunk-level matches grouped
         by source_id so the caller can pick a file to retrieve.
         """
+        cache_params = (top_k, source_id)
+        cache_key = praxos_search_cache.make_key(self.user_id, self.environment_id, "file_search", query, cache_params)
+        cached = praxos_search_cache.get(cache_key)
+        if cached is not None:
+            praxos_logger.info(f"file_search cache hit for user {self.user_id}")
+            return cached
+
         start_time = time.time()
         log_praxos_query_started("system", query, "file_search")
         try:
@@ -719,13 +836,15 @@ class PraxosClient:
             log_praxos_query_completed(
                 "system", query, len(files), duration, "file_search"
             )
-            return {
+            response = {
                 "success": True,
                 "files": files,
                 "raw_hits": hits,
                 "count": len(files),
                 "hit_count": len(hits),
             }
+            praxos_search_cache.set(cache_key, response)
+            return response
         except PraxosBridgeError as e:
             duration = time.time() - start_time
             log_praxos_query_failed("system", query, e, duration, "file_search")
@@ -905,6 +1024,7 @@ class PraxosClient:
     # File sync helpers
     # ------------------------------------------------------------------
 
+    @_invalidates_search_cache
     async def sync_file_to_knowledge_graph(
         self,
         blob_path: str,
@@ -949,6 +1069,7 @@ class PraxosClient:
             log_praxos_file_upload_failed(blob_path, file_name, e, duration)
             return {"error": f"Knowledge-graph sync failed: {str(e)}"}
 
+    @_invalidates_search_cache
     async def sync_file_for_semantic_search(
         self,
         blob_path: str,
@@ -1022,6 +1143,7 @@ class PraxosClient:
     # Graph CRUD
     # ------------------------------------------------------------------
 
+    @_invalidates_search_cache
     async def create_entity_in_kg(
         self,
         entity_type: str,
@@ -1057,6 +1179,7 @@ class PraxosClient:
             praxos_logger.error(f"Failed to create entity: {e}")
             return {"error": str(e)}
 
+    @_invalidates_search_cache
     async def update_literal_value(
         self, node_id: str, new_value: Any, new_type: str = None
     ):
@@ -1081,6 +1204,7 @@ class PraxosClient:
             praxos_logger.error(f"Failed to update literal: {e}")
             return {"error": str(e)}
 
+    @_invalidates_search_cache
     async def update_entity_properties(
         self,
         node_id: str,
@@ -1116,6 +1240,7 @@ class PraxosClient:
             praxos_logger.error(f"Failed to update entity: {e}")
             return {"error": str(e)}
 
+    @_invalidates_search_cache
     async def delete_node_from_kg(
         self, node_id: str, cascade: bool = True, force: bool = False
     ):
@@ -1147,6 +1272,7 @@ class PraxosClient:
             praxos_logger.error(f"Failed to delete node: {e}")
             return {"error": str(e)}
 
+    @_invalidates_search_cache
     async def add_knowledge_chunk(
         self,
         text: str,
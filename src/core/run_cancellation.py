@@ -0,0 +1,203 @@
+"""
+Push-based cancellation of agent runs.
+
+A stop request sets `cancel_exec:{conversation_id}` (as before) and publishes the conversation id
+on CANCEL_CHANNEL. Each process keeps a registry of its active runs and one subscription on that
+channel (through the shared pubsub multiplexer), so a request reaches the run that owns the
+conversation immediately instead of waiting for a per-run polling loop.
+
+Two checks keep the Redis key authoritative for anything that only sets it:
+- the key is read once when a run starts (a stop pressed while the run was queued);
+- a single per-process poll MGETs the keys of all active runs every
+  CANCELLATION_POLL_INTERVAL_SECONDS. The stop button's writer lives outside this repo and only
+  sets the key, so until it publishes too this poll is what delivers cancellations; it runs at
+  the 0.5s of the old per-run poll, at the cost of one MGET per process instead of a GET per run.
+
+A cancelled run has its task cancelled in place, so the CancelledError lands inside whatever the
+graph is awaiting (a model call or an in-flight tool coroutine) rather than at the next graph step.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, Optional, Set
+
+from src.config.settings import settings
+from src.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+CANCEL_KEY_PREFIX = "cancel_exec:"
+CANCEL_CHANNEL = "cancel_exec"
+
+
+class ExecutionCancelledError(Exception):
+    """Exception raised when an agent execution is cancelled by the user."""
+    pass
+
+
+def cancel_key(conversation_id: str) -> str:
+    return f"{CANCEL_KEY_PREFIX}{conversation_id}"
+
+
+class ActiveRun:
+    """One agent run registered for cancellation."""
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.event = asyncio.Event()
+        self.cancelled_by: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def cancel(self, source: str):
+        if self.event.is_set():
+            return
+        self.cancelled_by = source
+        self.event.set()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def run(self, coro):
+        """
+        Await `coro` as a task that a cancellation request cancels where it stands.
+        Raises ExecutionCancelledError if the run was cancelled.
+        """
+        self._task = asyncio.ensure_future(coro)
+        if self.event.is_set():
+            self._task.cancel()
+        try:
+            return await self._task
+        except asyncio.CancelledError:
+            if self.event.is_set():
+                raise ExecutionCancelledError("Generation stopped by user.") from None
+            raise
+        finally:
+            self._task = None
+
+
+class RunCancellationService:
+    """Registry of the agent runs active in this process, cancelled by pub/sub or by one shared key poll."""
+
+    def __init__(self, poll_interval_seconds: float = 0.5, key_ttl_seconds: int = 300, reconnect_delay: float = 1.0):
+        self.poll_interval_seconds = poll_interval_seconds
+        self.key_ttl_seconds = key_ttl_seconds
+        self.reconnect_delay = reconnect_delay
+        self._runs: Dict[str, Set[ActiveRun]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._poller: Optional[asyncio.Task] = None
+        self.stats = {
+            'runs_tracked': 0,
+            'cancelled_by_pubsub': 0,
+            'cancelled_by_poll': 0,
+            'cancelled_at_start': 0,
+            'cancelled_locally': 0,
+            'polls': 0,
+        }
+
+    def _ensure_started(self):
+        # Started lazily on the loop that runs the agents.
+        loop = asyncio.get_running_loop()
+        if self._listener is None or self._listener.done() or self._listener.get_loop() is not loop:
+            self._listener = loop.create_task(self._listen())
+        if self._poller is None or self._poller.done() or self._poller.get_loop() is not loop:
+            self._poller = loop.create_task(self._poll())
+
+    @asynccontextmanager
+    async def track(self, conversation_id: str):
+        """Register a run for the duration of the block; yields its ActiveRun."""
+        self._ensure_started()
+        run = ActiveRun(conversation_id)
+        self._runs.setdefault(conversation_id, set()).add(run)
+        self.stats['runs_tracked'] += 1
+        try:
+            await self._check_keys([conversation_id], source='cancelled_at_start')
+            yield run
+        finally:
+            runs = self._runs.get(conversation_id)
+            if runs is not None:
+                runs.discard(run)
+                if not runs:
+                    del self._runs[conversation_id]
+
+    async def request_cancellation(self, conversation_id: str):
+        """Stop the runs of a conversation in every process."""
+        self._cancel_local(conversation_id, 'cancelled_locally')
+        from src.utils.redis_client import redis_client
+        await redis_client.set(cancel_key(conversation_id), "1", ex=self.key_ttl_seconds)
+        await redis_client.publish(CANCEL_CHANNEL, conversation_id)
+
+    def _cancel_local(self, conversation_id: str, source: str) -> int:
+        cancelled = 0
+        for run in tuple(self._runs.get(conversation_id, ())):
+            if not run.cancelled:
+                run.cancel(source)
+                cancelled += 1
+        if cancelled:
+            self.stats[source] += cancelled
+            logger.info(f"Cancelled {cancelled} run(s) of conversation {conversation_id} ({source})")
+        return cancelled
+
+    async def _check_keys(self, conversation_ids: Iterable[str], source: str):
+        conversation_ids = list(conversation_ids)
+        if not conversation_ids:
+            return
+        try:
+            from src.utils.redis_client import redis_client
+            values = await redis_client.mget([cancel_key(cid) for cid in conversation_ids])
+        except Exception as e:
+            logger.warning(f"Error checking cancellation flags: {e}")
+            return
+        for conversation_id, value in zip(conversation_ids, values):
+            if value:
+                self._cancel_local(conversation_id, source)
+
+    async def _listen(self):
+        from src.utils.redis_pubsub import redis_pubsub_multiplexer
+        while True:
+            try:
+                async with redis_pubsub_multiplexer.subscribe(CANCEL_CHANNEL) as subscription:
+                    while True:
+                        conversation_id = await subscription.get()
+                        self._cancel_local(conversation_id, 'cancelled_by_pubsub')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cancellation subscriber error, retrying in {self.reconnect_delay}s: {e}", exc_info=True)
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval_seconds)
+            if not self._runs:
+                continue
+            self.stats['polls'] += 1
+            await self._check_keys(tuple(self._runs), source='cancelled_by_poll')
+
+    async def close(self):
+        """Stop the subscriber and the poll (call on shutdown)."""
+        for task in (self._listener, self._poller):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._listener = None
+        self._poller = None
+
+    def get_state(self) -> Dict:
+        """Get registry state for monitoring"""
+        return {
+            'active_conversations': len(self._runs),
+            'active_runs': sum(len(runs) for runs in self._runs.values()),
+            'stats': self.stats.copy(),
+        }
+
+
+# Global instance
+run_cancellation = RunCancellationService(
+    poll_interval_seconds=settings.CANCELLATION_POLL_INTERVAL_SECONDS,
+    key_ttl_seconds=settings.CANCELLATION_KEY_TTL_SECONDS,
+)
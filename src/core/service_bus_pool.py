@@ -0,0 +1,183 @@
+"""
+Process-wide Azure Service Bus connection pool.
+Keeps one lazily-created ServiceBusClient and one sender per queue alive across publishes,
+and swaps in a fresh client when the AMQP connection drops.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+
+from src.config.settings import settings
+from src.utils.logging.base_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+
+class ServiceBusPool:
+    """
+    Shared Service Bus client and per-queue senders for the current process.
+
+    Users hold the client through a lease (`lease()`, or implicitly in `send`). `reset(client)`
+    swaps in a fresh client for new callers and retires the failing one, which is closed
+    only once its last lease is released, so a consumer error doesn't tear down connections
+    concurrent publishers or other receivers are still using.
+    """
+
+    def __init__(self, connection_string: Optional[str] = None, keep_alive_interval: int = 30):
+        self._connection_string = connection_string
+        self._keep_alive_interval = keep_alive_interval
+        self._client = None
+        self._senders: Dict[str, object] = {}
+        self._lock: Optional[asyncio.Lock] = None
+        # id(client) -> open leases, for the current client and retired ones still in use
+        self._leases: Dict[int, int] = {}
+        # id(client) -> (client, senders) waiting for their last lease to close
+        self._retired: Dict[int, Tuple[object, Dict[str, object]]] = {}
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Created lazily so the lock binds to the running loop (gunicorn --preload imports before fork).
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def get_client(self):
+        """Return the shared ServiceBusClient, creating it on first use."""
+        if self._client is not None:
+            return self._client
+        async with self._get_lock():
+            if self._client is None:
+                from azure.servicebus.aio import ServiceBusClient
+                self._client = ServiceBusClient.from_connection_string(
+                    self._connection_string or settings.AZURE_SERVICEBUS_CONNECTION_STRING,
+                    keep_alive_interval=self._keep_alive_interval,
+                )
+                logger.info("Created pooled Service Bus client")
+        return self._client
+
+    @asynccontextmanager
+    async def lease(self):
+        """Hold the shared client; a reset meanwhile closes it only after the lease is released."""
+        client = await self.get_client()
+        self._leases[id(client)] = self._leases.get(id(client), 0) + 1
+        try:
+            yield client
+        finally:
+            await self._release(client)
+
+    async def _release(self, client):
+        remaining = self._leases.get(id(client), 1) - 1
+        if remaining > 0:
+            self._leases[id(client)] = remaining
+            return
+        self._leases.pop(id(client), None)
+        retired = self._retired.pop(id(client), None)
+        if retired is not None:
+            await self._close_connections(*retired)
+
+    async def _get_sender(self, client, queue_name: str):
+        """Return the long-lived sender for a queue on `client`, creating it on first use."""
+        async with self._get_lock():
+            if client is self._client:
+                senders = self._senders
+            elif id(client) in self._retired:
+                # Retired while leased: its senders are closed along with it.
+                senders = self._retired[id(client)][1]
+            else:
+                raise RuntimeError("Service Bus client was closed")
+            sender = senders.get(queue_name)
+            if sender is None:
+                sender = client.get_queue_sender(queue_name)
+                senders[queue_name] = sender
+                logger.info(f"Created pooled Service Bus sender for queue: {queue_name}")
+        return sender
+
+    async def _with_sender(self, queue_name: str, operation: Callable[[object], Awaitable[T]], retries: int) -> T:
+        """Run `operation(sender)` under a lease, resetting the failing client and retrying."""
+        attempt = 0
+        while True:
+            async with self.lease() as client:
+                try:
+                    return await operation(await self._get_sender(client, queue_name))
+                except Exception as e:
+                    if attempt >= retries:
+                        raise
+                    attempt += 1
+                    logger.warning(f"Service Bus operation on {queue_name} failed ({e}), reconnecting (attempt {attempt}/{retries})")
+                    await self.reset(client)
+
+    async def send(self, queue_name: str, messages: Union[object, List[object]], retries: int = 1):
+        """
+        Send a message, list of messages or ServiceBusMessageBatch on the pooled sender.
+        On failure the client is reset and the send retried on a fresh connection.
+        """
+        await self._with_sender(queue_name, lambda sender: sender.send_messages(messages), retries)
+
+    async def create_message_batch(self, queue_name: str, retries: int = 1):
+        """Create a ServiceBusMessageBatch for a queue, reconnecting once on failure like `send`."""
+        return await self._with_sender(queue_name, lambda sender: sender.create_message_batch(), retries)
+
+    async def send_batched(self, queue_name: str, messages: List[object]) -> int:
+        """
+        Pack messages into as few ServiceBusMessageBatch sends as possible.
+        Returns the number of batches sent.
+        """
+        if not messages:
+            return 0
+
+        batches_sent = 0
+        batch = await self.create_message_batch(queue_name)
+        for message in messages:
+            try:
+                batch.add_message(message)
+            except ValueError:
+                # Batch is full (MessageSizeExceededError subclasses ValueError): flush and start a new one.
+                if len(batch) == 0:
+                    raise
+                await self.send(queue_name, batch)
+                batches_sent += 1
+                batch = await self.create_message_batch(queue_name)
+                batch.add_message(message)
+        if len(batch) > 0:
+            await self.send(queue_name, batch)
+            batches_sent += 1
+        return batches_sent
+
+    async def reset(self, client=None):
+        """
+        Retire `client` (default: the current one) so the next call reconnects. A client that
+        was already replaced is left alone; a retired one is closed once its last lease ends.
+        """
+        async with self._get_lock():
+            if self._client is None or (client is not None and client is not self._client):
+                return
+            client, self._client = self._client, None
+            senders, self._senders = self._senders, {}
+            if self._leases.get(id(client)):
+                self._retired[id(client)] = (client, senders)
+                return
+        await self._close_connections(client, senders)
+
+    async def _close_connections(self, client, senders: Dict[str, object]):
+        for queue_name, sender in senders.items():
+            try:
+                await sender.close()
+            except Exception as e:
+                logger.debug(f"Error closing Service Bus sender for {queue_name}: {e}")
+        try:
+            await client.close()
+        except Exception as e:
+            logger.debug(f"Error closing Service Bus client: {e}")
+
+    async def close(self):
+        """Release pooled connections (call on shutdown)."""
+        await self.reset()
+        retired, self._retired = self._retired, {}
+        for client, senders in retired.values():
+            await self._close_connections(client, senders)
+        logger.info("Service Bus pool closed")
+
+
+# Global instance
+service_bus_pool = ServiceBusPool()
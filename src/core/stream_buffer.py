@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 from typing import Dict, List, Optional
+import asyncio
 import json
+from src.config.settings import settings
 from src.utils.logging import setup_logger
 
 logger = setup_logger(__name__)
@@ -14,6 +16,10 @@ class StreamBuffer(ABC):
         """Write event to buffer"""
         pass
 
+    async def flush(self) -> None:
+        """Push out anything held back (no-op for unbuffered implementations)"""
+        pass
+
 
 class NoOpStreamBuffer(StreamBuffer):
     """Buffer that discards all events (batch mode)"""
@@ -24,16 +30,86 @@ class NoOpStreamBuffer(StreamBuffer):
 
 
 class RedisStreamBuffer(StreamBuffer):
-    """Buffer that publishes events to Redis channel"""
+    """
+    Buffer that publishes events to Redis channel.
+
+    Consecutive token events of the same type (message_token / thinking_token) are merged into
+    one event with the concatenated content and published when the coalescing window elapses or
+    the merged content reaches the byte threshold. Any other event flushes the pending tokens
+    first, so the order seen by the client is unchanged.
+    """
 
-    def __init__(self, redis_channel: str):
+    COALESCED_EVENT_TYPES = ("message_token", "thinking_token")
+
+    def __init__(self, redis_channel: str, window_seconds: Optional[float] = None, max_bytes: Optional[int] = None):
         self.channel = redis_channel
+        self.window_seconds = settings.STREAM_COALESCE_WINDOW_MS / 1000 if window_seconds is None else window_seconds
+        self.max_bytes = settings.STREAM_COALESCE_MAX_BYTES if max_bytes is None else max_bytes
+
+        self._pending: Optional[Dict] = None
+        self._pending_parts: List[str] = []
+        self._pending_bytes = 0
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.stats = {
+            'events_written': 0,
+            'publishes': 0,
+        }
         logger.info(f"RedisStreamBuffer initialized for channel: {redis_channel}")
 
     async def write(self, event: Dict) -> None:
+        self.stats['events_written'] += 1
+        if self.window_seconds > 0 and event.get("type") in self.COALESCED_EVENT_TYPES and isinstance(event.get("content"), str):
+            if self._pending is not None and not self._same_stream(self._pending, event):
+                await self.flush()
+            if self._pending is None:
+                self._pending = {k: v for k, v in event.items() if k != "content"}
+            self._pending_parts.append(event["content"])
+            self._pending_bytes += len(event["content"])
+            if self._pending_bytes >= self.max_bytes:
+                await self.flush()
+            elif self._timer is None:
+                self._timer = asyncio.create_task(self._flush_after_window())
+            return
+
+        async with self._lock:
+            await self._flush_locked()
+            await self._publish(event)
+
+    @staticmethod
+    def _same_stream(pending: Dict, event: Dict) -> bool:
+        return pending == {k: v for k, v in event.items() if k != "content"}
+
+    async def _flush_after_window(self):
+        try:
+            await asyncio.sleep(self.window_seconds)
+            self._timer = None
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+
+    async def flush(self) -> None:
+        async with self._lock:
+            await self._flush_locked()
+
+    async def _flush_locked(self):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        if self._pending is None:
+            return
+        event = self._pending
+        event["content"] = "".join(self._pending_parts)
+        self._pending = None
+        self._pending_parts = []
+        self._pending_bytes = 0
+        await self._publish(event)
+
+    async def _publish(self, event: Dict):
         from src.utils.redis_client import redis_client
         try:
             await redis_client.publish(self.channel, json.dumps(event))
+            self.stats['publishes'] += 1
         except Exception as e:
             logger.error(f"Error publishing to Redis: {e}", exc_info=True)
 
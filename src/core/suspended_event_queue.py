@@ -4,6 +4,7 @@ from datetime import datetime
 
 from src.config.settings import settings
 from src.utils.logging.base_logger import setup_logger
+from src.core.service_bus_pool import service_bus_pool
 
 
 logger = setup_logger(__name__)
@@ -30,24 +31,19 @@ class SuspendedEventQueue:
         Session ID is auto-generated based on user_id and source if not provided.
         This queue is just used of users who send a request when they don't have an active subscription, either thier trial period is ended or there is no billing information about them
         """
-        from azure.servicebus.aio import ServiceBusClient
         from azure.servicebus import ServiceBusMessage
         try:
             # Always ensure we have a session ID
             session_id = self._generate_session_id(event)
-            
-            async with ServiceBusClient.from_connection_string(settings.AZURE_SERVICEBUS_CONNECTION_STRING) as client:
-                sender = client.get_queue_sender(settings.AZURE_SERVICEBUS_SUSPENDED_QUEUE_NAME)
-                async with sender:
-                    suspended_message = {
-                        "event": event,
-                        "type": NORMAL_EVENT_KEY
-                    }
-                    message_body = json.dumps(suspended_message)
-                    message = ServiceBusMessage(message_body)
-                    message.session_id = session_id
-                    await sender.send_messages(message)
-                    logger.info(f"An event is suspended with session: {session_id}")
+
+            suspended_message = {
+                "event": event,
+                "type": NORMAL_EVENT_KEY
+            }
+            message = ServiceBusMessage(json.dumps(suspended_message))
+            message.session_id = session_id
+            await service_bus_pool.send(settings.AZURE_SERVICEBUS_SUSPENDED_QUEUE_NAME, message)
+            logger.info(f"An event is suspended with session: {session_id}")
         except Exception as e:
             logger.error(f"Failed to publish suspended event to Azure Service Bus: {e}", exc_info=True)
 
@@ -55,23 +51,18 @@ class SuspendedEventQueue:
         """
         Publish an event to the Service Bus queue, at a specific timestamp.
         """
-        from azure.servicebus.aio import ServiceBusClient
         from azure.servicebus import ServiceBusMessage
         try:
-            async with ServiceBusClient.from_connection_string(settings.AZURE_SERVICEBUS_CONNECTION_STRING) as client:
-                sender = client.get_queue_sender(settings.AZURE_SERVICEBUS_SUSPENDED_QUEUE_NAME)
-                async with sender:
-                    suspended_message = {
-                        "event": event,
-                        "type": SCHEDULE_EVENT_KEY,
-                        "schedule_time": timestamp.isoformat() if timestamp else None
-                    }
-                    message_body = json.dumps(suspended_message)
-                    message = ServiceBusMessage(message_body)
-                    message.session_id = self._generate_session_id(event)
-                    message.scheduled_enqueue_time_utc = timestamp
-                    await sender.send_messages(message)
-                    logger.info(f"Scheduled event to be enqueued at {timestamp.isoformat()}")
+            suspended_message = {
+                "event": event,
+                "type": SCHEDULE_EVENT_KEY,
+                "schedule_time": timestamp.isoformat() if timestamp else None
+            }
+            message = ServiceBusMessage(json.dumps(suspended_message))
+            message.session_id = self._generate_session_id(event)
+            message.scheduled_enqueue_time_utc = timestamp
+            await service_bus_pool.send(settings.AZURE_SERVICEBUS_SUSPENDED_QUEUE_NAME, message)
+            logger.info(f"Scheduled event to be enqueued at {timestamp.isoformat()}")
         except Exception as e:
             logger.error(f"Failed to publish scheduled event to Azure Service Bus: {e}", exc_info=True)
 
@@ -104,6 +95,8 @@ async def _process_suspended_events_background(user_id: str):
                             logger.info(f"Completed processing {messages_counter} suspended events for user {user_id}")
                             return
 
+                        # Immediate events are re-published together in one Service Bus batch
+                        normal_events = []
                         for msg in batch:
                             try:
                                 message_body = json.loads(str(msg))
@@ -116,7 +109,7 @@ async def _process_suspended_events_background(user_id: str):
                                     continue
                                 
                                 if message_type == NORMAL_EVENT_KEY:
-                                    await event_queue.publish(event)
+                                    normal_events.append(event)
                                 elif message_type == SCHEDULE_EVENT_KEY:
                                     schedule_time = message_body.get('schedule_time')
                                     if not schedule_time:
@@ -131,6 +124,8 @@ async def _process_suspended_events_background(user_id: str):
                                 logger.error(f"Error processing message: {e}", exc_info=True)
                                 await session_receiver.abandon_message(msg)
 
+                        await event_queue.publish_many(normal_events)
+
                     except Exception as batch_error:
                         logger.error(f"Error receiving message batch: {batch_error}", exc_info=True)
                         break
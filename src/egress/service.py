@@ -569,6 +569,13 @@ class EgressService:
         Routes the final response to the appropriate channel based on the event source.
         Handles location requests and sending in addition to text/media responses.
         """
+        # Anything the current turn has buffered must be in the conversation log before the user sees the reply.
+        from src.utils.message_write_buffer import flush_pending_messages
+        try:
+            await flush_pending_messages()
+        except Exception as e:
+            logger.error(f"Failed to flush buffered messages before egress: {e}", exc_info=True)
+
         source = event.get("source")
         ### cast to lower-case to avoid case sensitivity issues
         if source and isinstance(source, str):
@@ -0,0 +1,249 @@
+"""
+Media ingestion off the webhook request path.
+
+Messaging webhooks (Telegram, WhatsApp, iMessage) used to download every photo, voice note and
+document, validate it and upload it to blob storage before answering the platform, which held
+large videos open for seconds and invited platform retries. They now publish the event right
+away with a pending file reference (`pending_file_entry`), and the execution worker resolves
+those references here before the session is processed:
+
+- downloads run on a bounded pipeline (MEDIA_INGESTION_MAX_CONCURRENCY at a time);
+- storage goes through FileManager.receive_file, whose SHA-256 content dedupe lets forwarded
+  and re-sent files reuse the blob and document already stored for the user;
+- each resolved reference is replaced in the payload by the usual `to_event_file_entry()`
+  dict, so everything downstream sees the same event shape as before.
+"""
+import asyncio
+import mimetypes
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from src.config.settings import settings
+from src.utils.file_manager import file_manager
+from src.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+PENDING_KEY = "pending_media"
+
+
+def pending_file_entry(
+    platform: str,
+    file_type: str,
+    platform_type: Optional[str] = None,
+    caption: str = "",
+    file_name: Optional[str] = None,
+    mime_type: Optional[str] = None,
+    **ref: Any,
+) -> Dict:
+    """
+    A lightweight entry for an event's payload 'files' array, naming a file still held by the
+    platform. `ref` carries what the platform's fetcher needs (file_id, media_id, media_url, ...).
+    """
+    return {
+        'type': file_type,
+        'caption': caption,
+        'file_name': file_name,
+        'mime_type': mime_type,
+        PENDING_KEY: {'platform': platform, 'platform_type': platform_type or file_type, **ref},
+    }
+
+
+def is_pending(entry: Any) -> bool:
+    return isinstance(entry, dict) and PENDING_KEY in entry
+
+
+class MediaIngestionPipeline:
+    """Resolves pending file references in events: download, validate, dedupe, upload."""
+
+    def __init__(self, max_concurrency: int = 8):
+        self.max_concurrency = max(1, max_concurrency)
+        self._limit: Optional[asyncio.Semaphore] = None
+        self.stats = {
+            'ingested': 0,
+            'failed': 0,
+            'dropped_events': 0,
+            'total_seconds': 0.0,
+        }
+
+    async def resolve_events(self, events: List[dict]) -> List[dict]:
+        """Resolve the pending files of every event; events left with nothing to say are dropped."""
+        resolved = await asyncio.gather(*(self._resolve_event(event) for event in events))
+        return [event for event in resolved if event is not None]
+
+    async def _resolve_event(self, event: dict) -> Optional[dict]:
+        payload = event.get('payload')
+        items = payload if isinstance(payload, list) else [payload]
+        if not any(isinstance(item, dict) and any(is_pending(f) for f in item.get('files') or []) for item in items):
+            return event
+
+        user_id = event.get('user_id')
+        for item in items:
+            if not isinstance(item, dict) or not item.get('files'):
+                continue
+            entries = await asyncio.gather(*(
+                self.ingest(user_id, entry) if is_pending(entry) else self._passthrough(entry)
+                for entry in item['files']
+            ))
+            item['files'] = [entry for entry in entries if entry is not None]
+
+        if any(isinstance(item, dict) and (item.get('files') or item.get('text')) for item in items):
+            return event
+        self.stats['dropped_events'] += 1
+        logger.warning(f"Dropping event {event.get('metadata', {}).get('message_id')}: none of its files could be ingested")
+        return None
+
+    @staticmethod
+    async def _passthrough(entry: Dict) -> Dict:
+        return entry
+
+    async def ingest(self, user_id: str, entry: Dict) -> Optional[Dict]:
+        """Fetch and store one pending file; returns its event file entry, or None on failure."""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_concurrency)
+        ref = entry[PENDING_KEY]
+        platform = ref.get('platform')
+        fetched: Dict[str, Any] = {}
+        async with self._limit:
+            started = time.perf_counter()
+            try:
+                fetched = await self._fetch(user_id, entry)
+                if not fetched:
+                    raise IOError("download returned no file")
+                file_result = await file_manager.receive_file(
+                    user_id=user_id,
+                    platform=platform,
+                    file_bytes=fetched.get('file_bytes'),
+                    file_path=fetched.get('file_path'),
+                    filename=fetched.get('file_name'),
+                    mime_type=fetched.get('mime_type'),
+                    caption=entry.get('caption', ""),
+                    platform_file_id=fetched.get('platform_file_id'),
+                    platform_message_id=ref.get('message_id'),
+                    platform_type=ref.get('platform_type'),
+                    conversation_id=None,  # Not known until the agent run
+                    auto_add_to_media_bus=False,
+                    auto_cleanup=True,
+                    dedupe=True
+                )
+                self.stats['ingested'] += 1
+                logger.info(f"Ingested {platform} file {file_result.file_name} (type: {file_result.file_type})")
+                return file_result.to_event_file_entry()
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"Failed to ingest {platform} file {entry.get('file_name') or ref}: {e}", exc_info=True)
+                temp_path = fetched.get('file_path')
+                if temp_path and os.path.exists(temp_path):
+                    try:
+                        os.unlink(temp_path)
+                    except OSError:
+                        pass
+                return None
+            finally:
+                self.stats['total_seconds'] += time.perf_counter() - started
+
+    async def _fetch(self, user_id: str, entry: Dict) -> Dict[str, Any]:
+        platform = entry[PENDING_KEY].get('platform')
+        if platform == 'telegram':
+            return await self._fetch_telegram(entry)
+        if platform == 'whatsapp':
+            return await self._fetch_whatsapp(user_id, entry)
+        if platform == 'imessage':
+            return await self._fetch_imessage(entry)
+        raise ValueError(f"No media fetcher for platform {platform}")
+
+    async def _fetch_telegram(self, entry: Dict) -> Dict[str, Any]:
+        from src.integrations.telegram.client import TelegramClient
+        ref = entry[PENDING_KEY]
+        telegram_client = TelegramClient()
+        file_path_data = await telegram_client.get_file_path(ref['file_id'])
+        file_path = file_path_data["result"]["file_path"]
+        file_unique_id = file_path_data["result"]["file_unique_id"]
+        file_path_local = await telegram_client.download_file_to_temp_path(file_path, file_unique_id)
+
+        mime_type = entry.get('mime_type')
+        if not mime_type:
+            mime_type = mimetypes.guess_type(file_path_local)[0]
+        # Special handling for OGG audio
+        if mime_type is None and ('oga' in file_path_local or 'ogg' in file_path_local):
+            mime_type = 'audio/ogg'
+
+        return {
+            'file_path': file_path_local,
+            'file_name': entry.get('file_name') or f"telegram_{file_unique_id}",
+            'mime_type': mime_type,
+            'platform_file_id': file_unique_id,
+        }
+
+    async def _fetch_whatsapp(self, user_id: str, entry: Dict) -> Dict[str, Any]:
+        ref = entry[PENDING_KEY]
+        if ref.get('integration_id'):
+            from src.integrations.whatsapp_business.client import WhatsAppBusinessClient
+            from src.services.integration_service import integration_service
+            token_doc = await integration_service.get_integration_token(user_id, 'whatsapp_business', integration_id=ref['integration_id'])
+            if not token_doc:
+                raise ValueError("No token for WA Business")
+            whatsapp_client = WhatsAppBusinessClient(access_token=token_doc.get("access_token"), phone_number_id=ref['phone_number_id'])
+        else:
+            from src.integrations.whatsapp.client import WhatsAppClient
+            whatsapp_client = WhatsAppClient()
+
+        media_id = ref['media_id']
+        mime_type = entry.get('mime_type') or ""
+        extension = mimetypes.guess_extension(mime_type) or ''
+        file_path, _ = await whatsapp_client.download_media_by_id_to_file(media_id, extension)
+        if not file_path:
+            return {}
+        return {
+            'file_path': file_path,
+            # WhatsApp doesn't provide original filenames - generate one
+            'file_name': file_manager.generate_filename(
+                platform="whatsapp",
+                platform_file_id=media_id,
+                extension=extension,
+                mime_type=mime_type
+            ),
+            'mime_type': mime_type,
+            'platform_file_id': media_id,
+        }
+
+    async def _fetch_imessage(self, entry: Dict) -> Dict[str, Any]:
+        ref = entry[PENDING_KEY]
+        file_name = ref['media_url'].split("/")[-1]
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            response = await client.get(ref['media_url'])
+            response.raise_for_status()
+            file_bytes = response.content
+        if not file_bytes:
+            return {}
+
+        mime_type = mimetypes.guess_type(file_name)[0]
+        # Special handling for CAF audio (iMessage-specific)
+        if file_name.endswith('.caf'):
+            from src.utils.audio import caf_bytes_to_ogg_bytes
+            logger.info(f"Converting CAF audio to OGG for {file_name}")
+            file_bytes = await asyncio.to_thread(caf_bytes_to_ogg_bytes, file_bytes)
+            file_name = file_name.replace('.caf', '.ogg')
+            mime_type = 'audio/ogg'
+
+        return {
+            'file_bytes': file_bytes,
+            'file_name': file_name,
+            'mime_type': mime_type,
+            'platform_file_id': ref.get('message_id'),
+        }
+
+    def get_stats(self) -> Dict:
+        """Get pipeline statistics for monitoring"""
+        done = self.stats['ingested'] + self.stats['failed']
+        return {
+            **self.stats,
+            'avg_seconds': round(self.stats['total_seconds'] / done, 3) if done else 0.0,
+        }
+
+
+# Global instance
+media_ingestion_pipeline = MediaIngestionPipeline(max_concurrency=settings.MEDIA_INGESTION_MAX_CONCURRENCY)
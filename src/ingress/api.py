@@ -24,7 +24,7 @@ from src.ingress.webhook_handlers import mcp_handler
 from src.ingress.webhook_handlers import internal_handler
 from src.core import suspended_event_queue
 from src.utils.logging.base_logger import request_id_var, user_id_var, modality_var
-from src.utils.redis_client import subscribe_to_channel
+from src.utils.redis_pubsub import redis_pubsub_multiplexer
 from src.utils.logging import setup_logger
 from src.ingress.webhook_handlers.telegram_handler import set_telegram_webhook, telegram_scheduler
 from src.services.webhook_renewal import webhook_renewal_service
@@ -116,6 +116,15 @@ app.include_router(internal_handler.router, prefix="/internal")
 async def root():
     return {"message": "Hetairoi Agent Ingress is running."}
 
+@app.on_event("startup")
+async def ensure_database_indexes():
+    """Create any missing declared MongoDB indexes (idempotent)."""
+    from src.utils.database import db_manager
+    try:
+        await db_manager.initialize()
+    except Exception as e:
+        logger.error(f"Failed to ensure database indexes: {e}", exc_info=True)
+
 @app.on_event("startup")
 async def start_telegram_webhook_scheduler():
     """Start the Telegram webhook scheduler on application startup."""
@@ -140,6 +149,17 @@ async def shutdown_telegram_scheduler():
 
     webhook_renewal_service.shutdown()
 
+    from src.core.service_bus_pool import service_bus_pool
+    await service_bus_pool.close()
+
+    from src.utils.blob_utils import close_blob_service_client
+    await close_blob_service_client()
+
+    from src.core.praxos_client import close_praxos_http_client
+    await close_praxos_http_client()
+
+    await redis_pubsub_multiplexer.close()
+
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Cookie
 from typing import Optional
@@ -205,7 +225,6 @@ async def websocket_endpoint(ws: WebSocket, access_token: Optional[str] = Cookie
     conversation_id = ws.query_params.get("conversation_id")
 
     # ---- your normal logic below ----
-    pubsub = None
     try:
         # Use token + conversation_id for channel isolation
         if conversation_id:
@@ -216,47 +235,33 @@ async def websocket_endpoint(ws: WebSocket, access_token: Optional[str] = Cookie
             channel = f"ws-out:{token}"
             logger.info(f"WebSocket subscribed to user-level channel: {channel}")
 
-        pubsub = await subscribe_to_channel(channel)
-
-        async def redis_listener():
-            while True:
-                msg = await pubsub.get_message(
-                    ignore_subscribe_messages=True,
-                    timeout=None
-                )
-                if msg:
-                    data = msg["data"]
-                    if isinstance(data, bytes):
-                        try:
-                            data = data.decode("utf-8", errors="replace")
-                        except Exception:
-                            data = str(data)
+        # One shared pubsub connection per process; this socket just gets its channel's messages.
+        async with redis_pubsub_multiplexer.subscribe(channel) as subscription:
+
+            async def redis_listener():
+                while True:
+                    data = await subscription.get()
                     await ws.send_text(data)
-                else:
-                    # avoid busy loop when timeout=None yields no message
-                    await asyncio.sleep(0.01)
-
-        async def client_listener():
-            while True:
-                # drain client frames (optional: handle pings, simple cmds, etc.)
-                await ws.receive_text()
-
-        # Run both until one completes
-        done, pending = await asyncio.wait(
-            [asyncio.create_task(redis_listener()),
-             asyncio.create_task(client_listener())],
-            return_when=asyncio.FIRST_COMPLETED,
-        )
-        for t in pending:
-            t.cancel()
+
+            async def client_listener():
+                while True:
+                    # drain client frames (optional: handle pings, simple cmds, etc.)
+                    await ws.receive_text()
+
+            # Run both until one completes
+            done, pending = await asyncio.wait(
+                [asyncio.create_task(redis_listener()),
+                 asyncio.create_task(client_listener())],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for t in pending:
+                t.cancel()
 
     except WebSocketDisconnect:
         logger.info("WS disconnect token=%s", token[:8])
     except Exception:
         logger.exception("WS error token=%s", token[:8])
     finally:
-        if pubsub:
-            await pubsub.close()
         await ws.close()
         logger.info("WS closed token=%s", token[:8])
 # @app.websocket("/ws")
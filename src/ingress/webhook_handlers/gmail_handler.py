@@ -71,12 +71,12 @@ async def process_gmail_notification_task(parsed_message: Dict[str, Any]):
         checkpoint = await integration_service.get_gmail_checkpoint(user_id, user_email)
         if not checkpoint:
             # Seed once: store current mailbox historyId and exit (no backfill)
-            prof = gmail_integration.services[user_email].users().getProfile(userId="me").execute()
+            prof = await gmail_integration.get_profile(account=user_email)
             await integration_service.set_gmail_checkpoint(user_id, user_email, str(prof["historyId"]))
             logger.info(f"Seeded mailbox checkpoint for {user_email} at {prof['historyId']}")
             return
 
-        message_ids, new_checkpoint = gmail_integration.get_changed_message_ids_since(
+        message_ids, new_checkpoint = await gmail_integration.get_changed_message_ids_since(
             start_history_id=checkpoint,
             account=user_email,
             history_types=["messageAdded"],  # add "labelAdded" if INBOX transitions matter
@@ -84,7 +84,7 @@ async def process_gmail_notification_task(parsed_message: Dict[str, Any]):
 
         new_messages: List[Dict[str, Any]] = []
         if message_ids:
-            new_messages = gmail_integration.get_messages_by_ids(message_ids, account=user_email)
+            new_messages = await gmail_integration.get_messages_by_ids(message_ids, account=user_email)
 
         if new_checkpoint:
             await integration_service.set_gmail_checkpoint(user_id, user_email, new_checkpoint)
@@ -107,7 +107,7 @@ async def handle_chat_request(
 
     # Rate limiting for HTTP requests
     from src.utils.rate_limiter import rate_limiter
-    is_allowed, remaining = await rate_limiter.check_limit(user_id, "http_requests")
+    is_allowed, remaining = await rate_limiter.acquire(user_id, "http_requests")
     if not is_allowed:
         logger.warning(f"Rate limit exceeded for user {user_id} on HTTP requests")
         raise HTTPException(
@@ -115,9 +115,6 @@ async def handle_chat_request(
             detail="Rate limit exceeded. Please try again later."
         )
 
-    # Increment request count
-    await rate_limiter.increment_usage(user_id, "http_requests", 1)
-
     # Check number of files
     if len(files) > settings.MAX_FILES_PER_REQUEST:
         raise HTTPException(
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Request
 from src.integrations.telegram.client import TelegramClient
+from src.utils.circuit_breaker import publish_circuit_breaker_metrics
 from src.utils.logging import setup_logger
 
 logger = setup_logger(__name__)
@@ -39,3 +40,12 @@ How can I help you today?"""
     except Exception as e:
         logger.error(f"Error sending link notification: {e}")
         return {"status": "error", "message": str(e)}
+
+
+@router.get("/circuit-breakers")
+async def circuit_breaker_metrics():
+    """
+    Internal endpoint: circuit breaker state of this process and of every process that
+    published recently (execution workers publish periodically when state is shared).
+    """
+    return await publish_circuit_breaker_metrics()
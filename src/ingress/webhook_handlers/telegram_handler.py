@@ -12,11 +12,22 @@ from src.utils.database import db_manager
 from src.services.milestone_service import milestone_service
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import aiohttp
-from src.utils.file_manager import file_manager
+from src.ingest.media_ingestion import pending_file_entry
 
 logger = setup_logger(__name__)
 router = APIRouter()
 
+# Telegram message keys -> file types used in event payloads
+TELEGRAM_FILE_TYPES = {
+    'photo': 'image',
+    'image': 'image',
+    'sticker': 'image',
+    'video': 'video',
+    'voice': 'voice',
+    'audio': 'audio',
+    'document': 'document',
+}
+
 # Initialize scheduler for telegram webhook management
 telegram_scheduler = AsyncIOScheduler()
 
@@ -268,72 +279,41 @@ async def handle_telegram_webhook(request: Request, background_tasks: Background
             if key in ['photo','image','sticker'] and len(documents) > 1:
                 documents = [documents[-1]]  # Get the highest resolution photo only
             for document in documents:
-                file_id = document["file_id"]
-                mime_type = document.get("mime_type")
-                file_path_data = await telegram_client.get_file_path(file_id)
-                file_path = file_path_data["result"]["file_path"]
-                file_unique_id = file_path_data["result"]["file_unique_id"]
+                # The file is fetched and stored by the worker (media_ingestion); only reference it here.
                 caption = message.get("caption","")
-                logger.info(f"Received file from Telegram: {file_path}")
-                file_path_local = await telegram_client.download_file_to_temp_path(file_path, file_unique_id)
-                logger.info(f"Downloaded file from Telegram: {file_path_local}")
-
-                # Get MIME type
-                if not mime_type:
-                    mime_type_tuple = mimetypes.guess_type(file_path_local)
-                    mime_type = mime_type_tuple[0] if mime_type_tuple else None
-
-                # Special handling for OGG audio
-                if mime_type is None and ('oga' in file_path_local or 'ogg' in file_path_local):
-                    mime_type = 'audio/ogg'
-
-                # Get original filename
-                file_name_og = document.get("file_name", f"telegram_{file_unique_id}")
-
-                # Use FileManager for unified file handling
-                try:
-                    file_result = await file_manager.receive_file(
-                        user_id=user_id,
-                        platform="telegram",
-                        file_path=file_path_local,
-                        filename=file_name_og,
-                        mime_type=mime_type,
-                        caption=caption,
-                        platform_file_id=file_unique_id,
-                        platform_message_id=str(message["message_id"]),
-                        platform_type=key,  # Telegram type hint (photo, voice, video, etc.)
-                        conversation_id=None,  # Not known at webhook time
-                        auto_add_to_media_bus=False,  # Will be added later when conversation starts
-                        auto_cleanup=True  # FileManager will clean up temp file
-                    )
-
-                    # Publish event with FileResult
-                    event = {
-                        "user_id": user_id,
-                        'output_type': 'telegram',
-                        'output_chat_id': chat_id,
-                        'logging_context': {'user_id': user_id, 'request_id': str(request_id_var.get()), 'modality': modality_var.get() },
-                        "source": "telegram",
-                        "payload": {"files": [file_result.to_event_file_entry()]},
-                        "metadata": {
-                            'message_id': message["message_id"],
-                            'chat_id': chat_id,
-                            'source': 'telegram',
-                            'forwarded': forwarded,
-                            'forward_origin': forward_origin,
-                            'timestamp': message.get("date"),
-                            'active_output_channels': active_channels,
-                            'chat_context': chat_context,
-                            'context_boundary_id': f"telegram_{chat_id}" if is_group else None,
-                            'speaker_name': speaker_name,
-                            'trigger_agent': trigger_agent,
-                        }
+                file_entry = pending_file_entry(
+                    platform="telegram",
+                    file_type=TELEGRAM_FILE_TYPES.get(key, "document"),
+                    platform_type=key,  # Telegram type hint (photo, voice, video, etc.)
+                    caption=caption,
+                    file_name=document.get("file_name"),
+                    mime_type=document.get("mime_type"),
+                    file_id=document["file_id"],
+                    message_id=str(message["message_id"]),
+                )
+                event = {
+                    "user_id": user_id,
+                    'output_type': 'telegram',
+                    'output_chat_id': chat_id,
+                    'logging_context': {'user_id': user_id, 'request_id': str(request_id_var.get()), 'modality': modality_var.get() },
+                    "source": "telegram",
+                    "payload": {"files": [file_entry]},
+                    "metadata": {
+                        'message_id': message["message_id"],
+                        'chat_id': chat_id,
+                        'source': 'telegram',
+                        'forwarded': forwarded,
+                        'forward_origin': forward_origin,
+                        'timestamp': message.get("date"),
+                        'active_output_channels': active_channels,
+                        'chat_context': chat_context,
+                        'context_boundary_id': f"telegram_{chat_id}" if is_group else None,
+                        'speaker_name': speaker_name,
+                        'trigger_agent': trigger_agent,
                     }
-                    await event_queue.publish(event)
-                    logger.info(f"Published event for file: {file_result.file_name} (type: {file_result.file_type})")
-
-                except Exception as e:
-                    logger.error(f"Failed to process file {file_name_og}: {e}", exc_info=True)
+                }
+                await event_queue.publish(event)
+                logger.info(f"Published event for pending Telegram {key} {document['file_id']}")
 
     # Handle callback queries (button clicks)
     if "callback_query" in data:
@@ -17,7 +17,7 @@ import mimetypes
 from bson import ObjectId
 from src.utils.logging.base_logger import user_id_var, modality_var, request_id_var
 from src.services.milestone_service import milestone_service
-from src.utils.file_manager import file_manager
+from src.ingest.media_ingestion import pending_file_entry
 
 router = APIRouter()
 
@@ -213,65 +213,42 @@ async def handle_whatsapp_webhook(request: Request, background_tasks: Background
                             media_id = message.get(message_type, {}).get("id")
                             if media_id:
                                 mime_type_raw = message.get(message_type, {}).get("mime_type", "").split(';')[0]
-                                extension = mimetypes.guess_extension(mime_type_raw) or ''
-                                webhook_logger.info(f"Downloading media {media_id} of type {message_type} with extension {extension} and mime type {mime_type_raw} for user {user_record['_id']}")
-                                file_path, _ = await whatsapp_client.download_media_by_id_to_file(media_id, extension)
-                                if file_path:
-                                    try:
-                                        caption = message.get(message_type, {}).get("caption", "")
-
-                                        # WhatsApp doesn't provide original filenames - generate one
-                                        filename = file_manager.generate_filename(
-                                            platform="whatsapp",
-                                            platform_file_id=media_id,
-                                            extension=extension,
-                                            mime_type=mime_type_raw
-                                        )
-
-                                        # Use FileManager for unified file handling
-                                        file_result = await file_manager.receive_file(
-                                            user_id=str(user_record["_id"]),
-                                            platform="whatsapp",
-                                            file_path=file_path,
-                                            filename=filename,
-                                            mime_type=mime_type_raw,
-                                            caption=caption,
-                                            platform_file_id=media_id,
-                                            platform_message_id=message["id"],
-                                            platform_type=message_type,  # WhatsApp type hint (audio, voice, document, image, video)
-                                            conversation_id=None,  # Not known at webhook time
-                                            auto_add_to_media_bus=False,  # Will be added later when conversation starts
-                                            auto_cleanup=True  # FileManager will clean up temp file
-                                        )
-
-                                        # Publish event with FileResult
-                                        event = {
-                                            "user_id": str(user_record["_id"]),
-                                            'output_type': modality,
-                                            'output_phone_number': output_reference,
-                                            "source": modality,
-                                            "logging_context": {'user_id': str(user_record["_id"]), 'request_id': str(request_id_var.get()), 'modality': modality_var.get() },
-                                            "payload": {"files": [file_result.to_event_file_entry()]},
-                                            "metadata": {
-                                                "message_id": message["id"],
-                                                'source': modality,
-                                                'forwarded': forwarded,
-                                                'timestamp': message.get('timestamp'),
-                                                'integration_id': str(integration_record['_id']) if modality == 'whatsapp_business' else None,
-                                                'is_group': is_group,
-                                                'group_id': str(group_id) if is_group else None,
-                                                'active_output_channels': active_channels if is_group else None,
-                                                'chat_context': chat_context,
-                                                'context_boundary_id': f"whatsapp_{group_id}" if is_group else None,
-                                                'speaker_name': speaker_name,
-                                            }
-                                        }
-
-                                        await event_queue.publish(event)
-                                        webhook_logger.info(f"Published event for file: {file_result.file_name} (type: {file_result.file_type})")
-
-                                    except Exception as e:
-                                        webhook_logger.error(f"Failed to process WhatsApp file {media_id}: {e}", exc_info=True)
+                                caption = message.get(message_type, {}).get("caption", "")
+                                # The media is downloaded and stored by the worker (media_ingestion); only reference it here.
+                                file_entry = pending_file_entry(
+                                    platform="whatsapp",
+                                    file_type=message_type,
+                                    platform_type=message_type,  # WhatsApp type hint (audio, voice, document, image, video)
+                                    caption=caption,
+                                    mime_type=mime_type_raw,
+                                    media_id=media_id,
+                                    message_id=message["id"],
+                                    integration_id=str(integration_record['_id']) if modality == 'whatsapp_business' else None,
+                                    phone_number_id=str(receiving_phone_id),
+                                )
+                                event = {
+                                    "user_id": str(user_record["_id"]),
+                                    'output_type': modality,
+                                    'output_phone_number': output_reference,
+                                    "source": modality,
+                                    "logging_context": {'user_id': str(user_record["_id"]), 'request_id': str(request_id_var.get()), 'modality': modality_var.get() },
+                                    "payload": {"files": [file_entry]},
+                                    "metadata": {
+                                        "message_id": message["id"],
+                                        'source': modality,
+                                        'forwarded': forwarded,
+                                        'timestamp': message.get('timestamp'),
+                                        'integration_id': str(integration_record['_id']) if modality == 'whatsapp_business' else None,
+                                        'is_group': is_group,
+                                        'group_id': str(group_id) if is_group else None,
+                                        'active_output_channels': active_channels if is_group else None,
+                                        'chat_context': chat_context,
+                                        'context_boundary_id': f"whatsapp_{group_id}" if is_group else None,
+                                        'speaker_name': speaker_name,
+                                    }
+                                }
+                                await event_queue.publish(event)
+                                webhook_logger.info(f"Published event for pending WhatsApp {message_type} {media_id}")
 
                         elif message_type == "location":
                             location_data = message.get("location", {})
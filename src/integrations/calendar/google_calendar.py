@@ -1,8 +1,8 @@
 import asyncio
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from src.integrations.base_integration import BaseIntegration
+from src.integrations.google_api_executor import GoogleApiMixin, google_service_cache
 from src.config.settings import settings
 from src.services.integration_service import integration_service
 from src.utils.logging.base_logger import setup_logger
@@ -13,7 +13,7 @@ from datetime import datetime, timedelta
 
 logger = setup_logger('google_calendar_client')
 
-class GoogleCalendarIntegration(BaseIntegration):
+class GoogleCalendarIntegration(GoogleApiMixin, BaseIntegration):
     
     def __init__(self, user_id: str):
         super().__init__(user_id)
@@ -39,13 +39,13 @@ class GoogleCalendarIntegration(BaseIntegration):
             # Format for the Google Calendar API (RFC3339 timestamp)
             time_min = since.isoformat() + 'Z'
             
-            events_result = service.events().list(
+            events_result = await self._execute(service.events().list(
                 calendarId='primary',
                 timeMin=time_min,
                 maxResults=250,  # A reasonable limit for a sync operation
                 singleEvents=True,
                 orderBy='startTime'
-            ).execute()
+            ), resolved_account)
             
             events = events_result.get('items', [])
             
@@ -106,7 +106,7 @@ class GoogleCalendarIntegration(BaseIntegration):
             return False
 
         try:
-            service = build('calendar', 'v3', credentials=creds)
+            service = google_service_cache.get('calendar', 'v3')
             self.services[account_email] = service
             self.credentials[account_email] = creds
             if account_email not in self.connected_accounts:
@@ -135,9 +135,9 @@ class GoogleCalendarIntegration(BaseIntegration):
             raise Exception("No authenticated Google Calendar accounts found.")
         raise ValueError(f"Multiple accounts exist. Specify one with the 'account' parameter: {self.connected_accounts}")
 
-    async def _get_calendar_timezone(self, service: Any, calendar_id: str) -> str:
+    async def _get_calendar_timezone(self, service: Any, calendar_id: str, account: str) -> str:
         try:
-            calendar = service.calendars().get(calendarId=calendar_id).execute()
+            calendar = await self._execute(service.calendars().get(calendarId=calendar_id), account)
             timezone = calendar.get('timeZone', 'UTC')
 
             return timezone
@@ -151,14 +151,14 @@ class GoogleCalendarIntegration(BaseIntegration):
         logger.info(f"Fetching events from calendar '{calendar_id}' for account '{resolved_account}' between {time_min} and {time_max}")
         
         try:
-            events_result = service.events().list(
+            events_result = await self._execute(service.events().list(
                 calendarId=calendar_id,
                 maxResults=max_results,
                 singleEvents=True,
                 orderBy='startTime',
                 timeMin=time_min,
                 timeMax=time_max
-            ).execute()
+            ), resolved_account)
             
             items = events_result.get('items', [])
             return [{
@@ -206,7 +206,7 @@ class GoogleCalendarIntegration(BaseIntegration):
         service, resolved_account = self._get_service_for_account(account)
 
         # Dynamically get the calendar's timezone for accurate event creation
-        timezone = await self._get_calendar_timezone(service, calendar_id)
+        timezone = await self._get_calendar_timezone(service, calendar_id, resolved_account)
 
         event_body = {
             'summary': title,
@@ -224,11 +224,11 @@ class GoogleCalendarIntegration(BaseIntegration):
             logger.info(f"Creating recurring event with rules: {recurrence}")
 
         try:
-            created_event = service.events().insert(
+            created_event = await self._execute(service.events().insert(
                 calendarId=calendar_id,
                 body=event_body,
                 sendUpdates='all'
-            ).execute()
+            ), resolved_account)
             return {"status": "success", "event_link": created_event.get('htmlLink')}
         except HttpError as e:
             logger.error(f"Error creating event for {resolved_account}: {e}", exc_info=True)
@@ -254,20 +254,20 @@ class GoogleCalendarIntegration(BaseIntegration):
             if sync_token:
                 # Incremental sync using sync token
                 logger.info(f"Performing incremental sync for {resolved_account} with sync token")
-                events_result = service.events().list(
+                events_result = await self._execute(service.events().list(
                     calendarId='primary',
                     syncToken=sync_token
-                ).execute()
+                ), resolved_account)
             else:
                 # Initial sync - get recent events from last 7 days
                 time_min = (datetime.utcnow() - timedelta(days=7)).isoformat() + 'Z'
                 logger.info(f"Performing initial sync for {resolved_account} from {time_min}")
-                events_result = service.events().list(
+                events_result = await self._execute(service.events().list(
                     calendarId='primary',
                     timeMin=time_min,
                     singleEvents=True,
                     orderBy='startTime'
-                ).execute()
+                ), resolved_account)
 
             events = events_result.get('items', [])
             new_sync_token = events_result.get('nextSyncToken')
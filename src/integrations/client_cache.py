@@ -0,0 +1,185 @@
+"""
+Per-user cache of authenticated integration clients.
+
+Authenticating an integration costs a Mongo lookup, a token decrypt and often an OAuth
+refresh. The agent builds its tools on every run, so the authenticated clients are kept for
+INTEGRATION_CLIENT_CACHE_TTL_SECONDS and reused across runs of the same user:
+
+- An entry never outlives the access token it was authenticated with, unless the client
+  refreshes on its own (google-auth credentials with a refresh token).
+- A failed authentication (integration not connected) is remembered for the shorter
+  INTEGRATION_CLIENT_NEGATIVE_TTL_SECONDS; an authentication that raised is not cached.
+- Concurrent misses for the same user and integration share one authentication.
+- Integration record and token changes for a user drop all of that user's entries in every
+  process (`invalidate_user`): they bump a per-user version in Redis, and a hit whose entry was
+  built under an older version is treated as a miss. Concurrent lookups of one user share the
+  version read. Without Redis, invalidation only reaches the local process.
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from src.config.settings import settings
+from src.utils.logging.base_logger import setup_logger
+from src.utils.ttl_cache import TTLCache
+
+logger = setup_logger(__name__)
+
+VERSION_KEY_PREFIX = "integration_clients:version:"
+
+# Re-authenticate this long before the access token a cached client holds expires
+TOKEN_EXPIRY_MARGIN_SECONDS = 300
+
+
+def _as_naive_utc(value: Any) -> Optional[datetime]:
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def credential_expiry(client: Any) -> Optional[datetime]:
+    """Earliest expiry (naive UTC) of the access tokens a client holds and can't refresh by itself."""
+    expiries = []
+    token_expiry = _as_naive_utc(getattr(client, 'token_expiry', None))
+    if token_expiry is not None:
+        expiries.append(token_expiry)
+    credentials = getattr(client, 'credentials', None)
+    if isinstance(credentials, dict):
+        for creds in credentials.values():
+            if getattr(creds, 'refresh_token', None):
+                continue
+            expiry = _as_naive_utc(getattr(creds, 'expiry', None))
+            if expiry is not None:
+                expiries.append(expiry)
+    return min(expiries) if expiries else None
+
+
+class IntegrationClientCache:
+    """Authenticated integration clients keyed by (user_id, integration)."""
+
+    def __init__(self, ttl_seconds: float, negative_ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # (user_id, name) -> (loop, client, authenticated, shared version)
+        self._cache = TTLCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._version_reads: Dict[str, asyncio.Task] = {}
+        self._names: Set[str] = set()
+        self.stats = {'stale_hits': 0, 'version_errors': 0}
+
+        self.redis_client = None
+        try:
+            from src.utils.redis_client import redis_client
+            self.redis_client = redis_client
+        except Exception as e:
+            logger.warning(f"Redis not available for integration client invalidation: {e}. Invalidating locally only")
+
+    async def get_authenticated(self, user_id: str, name: str, factory: Callable[[str], Any]) -> Tuple[Any, bool]:
+        """
+        Return `(client, authenticated)` for the user's `name` integration, building the client
+        with `factory(user_id)` and calling its `authenticate()` only on a cache miss.
+        """
+        loop = asyncio.get_running_loop()
+        key = (user_id, name)
+        self._names.add(name)
+
+        shared_version = await self._shared_version(user_id)
+        entry = self._cache.get(key)
+        # Clients may hold loop-bound sessions, so entries are only reused on the loop that built them.
+        if entry is not None and entry[0] is loop:
+            if entry[3] == shared_version:
+                return entry[1], entry[2]
+            self.stats['stale_hits'] += 1
+            self._cache.invalidate(key)
+
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not loop:
+            version = self._cache.version(key)
+            task = loop.create_task(self._authenticate(key, factory, version, shared_version, loop))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _authenticate(self, key: Tuple[str, str], factory: Callable[[str], Any], version: int,
+                            shared_version: Optional[str], loop) -> Tuple[Any, bool]:
+        user_id, name = key
+        client = None
+        try:
+            try:
+                client = factory(user_id)
+                authenticated = (await client.authenticate()) is True
+            except Exception as e:
+                logger.error(f"Error authenticating {name} for user {user_id}: {e}", exc_info=True)
+                return client, False
+
+            ttl = self._entry_ttl(client, authenticated)
+            if ttl > 0:
+                self._cache.set(key, (loop, client, authenticated, shared_version), version=version, ttl_seconds=ttl)
+            return client, authenticated
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def _entry_ttl(self, client: Any, authenticated: bool) -> float:
+        if not authenticated:
+            return self.negative_ttl_seconds
+        ttl = self.ttl_seconds
+        expiry = credential_expiry(client)
+        if expiry is not None:
+            ttl = min(ttl, (expiry - datetime.utcnow()).total_seconds() - TOKEN_EXPIRY_MARGIN_SECONDS)
+        return ttl
+
+    async def _shared_version(self, user_id: str) -> Optional[str]:
+        """The user's version in Redis (None if never bumped or unreadable); one read per burst of lookups."""
+        if self.redis_client is None:
+            return None
+        loop = asyncio.get_running_loop()
+        task = self._version_reads.get(user_id)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(self._read_version(user_id))
+            self._version_reads[user_id] = task
+        return await asyncio.shield(task)
+
+    async def _read_version(self, user_id: str) -> Optional[str]:
+        try:
+            return await self.redis_client.get(f"{VERSION_KEY_PREFIX}{user_id}")
+        except Exception as e:
+            self.stats['version_errors'] += 1
+            logger.warning(f"Failed to read integration client version for user {user_id}: {e}")
+            return None
+        finally:
+            if self._version_reads.get(user_id) is asyncio.current_task():
+                del self._version_reads[user_id]
+
+    def invalidate(self, user_id: str, name: str):
+        self._cache.invalidate((user_id, name))
+
+    async def invalidate_user(self, user_id: str):
+        """Drop every cached client of a user, in every process (call when their integration records or tokens change)."""
+        for name in tuple(self._names):
+            self._cache.invalidate((user_id, name))
+        if self.redis_client is None:
+            return
+        key = f"{VERSION_KEY_PREFIX}{user_id}"
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.incr(key)
+                # Once every entry built under the old version has expired, the key can go.
+                pipe.expire(key, int(max(self.ttl_seconds, self.negative_ttl_seconds)) + 60)
+                await pipe.execute()
+        except Exception as e:
+            self.stats['version_errors'] += 1
+            logger.warning(f"Failed to bump integration client version for user {user_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics for monitoring"""
+        return {**self._cache.get_stats(), **self.stats, 'authenticating': len(self._inflight)}
+
+
+# Global instance
+integration_client_cache = IntegrationClientCache(
+    ttl_seconds=settings.INTEGRATION_CLIENT_CACHE_TTL_SECONDS,
+    negative_ttl_seconds=settings.INTEGRATION_CLIENT_NEGATIVE_TTL_SECONDS,
+    max_entries=settings.INTEGRATION_CLIENT_CACHE_MAX_ENTRIES,
+)
@@ -1,23 +1,22 @@
 import asyncio
 import base64
 import mimetypes
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from datetime import datetime, timedelta
-from typing import Any, List, Dict, Optional, Tuple
+from typing import Any, AsyncIterator, List, Dict, Optional, Tuple
 from email.message import EmailMessage
 from src.utils.blob_utils import upload_to_blob_storage,upload_bytes_to_blob_storage
 from src.utils.logging.base_logger import setup_logger
 from src.utils.rate_limiter import rate_limiter
 from src.utils.circuit_breaker import gmail_auth_breaker, gmail_api_breaker
 from src.integrations.base_integration import BaseIntegration
+from src.integrations.google_api_executor import GoogleApiMixin, google_service_cache
 from src.utils.database import db_manager
 from src.config.settings import settings
 from src.services.integration_service import integration_service
 from bson import ObjectId
 import quopri
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 import threading
 from html import unescape
 import re
@@ -25,7 +24,22 @@ from src.services.integration_service import integration_service
 
 logger = setup_logger(__name__)
 
-class GmailIntegration(BaseIntegration):
+# Gmail's batch endpoint accepts at most 100 calls per request
+_GMAIL_MAX_BATCH_SIZE = 100
+_GMAIL_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _is_retryable_gmail_error(error: Exception) -> bool:
+    """Rate-limit and transient server errors are worth retrying; anything else (404, 400...) is not."""
+    if not isinstance(error, HttpError):
+        return False
+    status = getattr(error.resp, 'status', None)
+    if status in _GMAIL_RETRYABLE_STATUSES:
+        return True
+    return status == 403 and 'ratelimitexceeded' in str(error).lower()
+
+
+class GmailIntegration(GoogleApiMixin, BaseIntegration):
     
 
     def __init__(self, user_id: str):
@@ -73,8 +87,8 @@ class GmailIntegration(BaseIntegration):
         try:
             from src.integrations.scope_validator import ScopeValidator
 
-            gmail_service = build('gmail', 'v1', credentials=creds)
-            people_service = build('people', 'v1', credentials=creds)
+            gmail_service = google_service_cache.get('gmail', 'v1')
+            people_service = google_service_cache.get('people', 'v1')
 
             # Create scope validator for this account
             token_scopes = creds.scopes or []
@@ -185,10 +199,10 @@ class GmailIntegration(BaseIntegration):
         encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
         create_message_request = {'raw': encoded_message}
         
-        sent_message = gmail_service.users().messages().send(
+        sent_message = await self._execute(gmail_service.users().messages().send(
             userId='me',
             body=create_message_request
-        ).execute()
+        ), resolved_account)
         
         return {"email_id": sent_message['id']}
 
@@ -207,24 +221,22 @@ class GmailIntegration(BaseIntegration):
         if source_folder:
             kwargs['labelIds'] = [source_folder]
 
-        results = gmail_service.users().messages().list(**kwargs).execute()
+        results = await self._execute(gmail_service.users().messages().list(**kwargs), resolved_account)
         messages = results.get('messages', [])
         
         if not messages:
             return []
 
         email_list = []
-        for msg in messages:
-            try:
-                msg_data = gmail_service.users().messages().get(userId='me', id=msg['id']).execute()
-                headers = {h['name']: h['value'] for h in msg_data['payload']['headers']}
-                email_list.append({
-                    "subject": headers.get('Subject', 'No Subject'),
-                    "snippet": msg_data.get('snippet', '')
-                })
-            except HttpError as e:
-                logger.error(f"Error fetching message {msg['id']} for account {resolved_account}: {e}")
-                continue
+        async for msg_data in self.iter_messages_batched(
+            [msg['id'] for msg in messages], account=resolved_account,
+            format='metadata', metadata_headers=['Subject']
+        ):
+            headers = {h['name']: h['value'] for h in msg_data['payload'].get('headers', [])}
+            email_list.append({
+                "subject": headers.get('Subject', 'No Subject'),
+                "snippet": msg_data.get('snippet', '')
+            })
         return email_list
 
     async def get_frequent_senders(self, days_back: int = 30, max_senders: int = 15, *, account: Optional[str] = None, source_folder: str = None) -> List[Dict[str, Any]]:
@@ -241,13 +253,13 @@ class GmailIntegration(BaseIntegration):
             kwargs['labelIds'] = [source_folder]
 
         try:
-            results = gmail_service.users().messages().list(**kwargs).execute()
+            results = await self._execute(gmail_service.users().messages().list(**kwargs), resolved_account)
             messages = results.get('messages', [])
 
             next_page_token = results.get('nextPageToken')
             if next_page_token and len(messages) < 1000:
                 kwargs['pageToken'] = next_page_token
-                results = gmail_service.users().messages().list(**kwargs).execute()
+                results = await self._execute(gmail_service.users().messages().list(**kwargs), resolved_account)
                 messages.extend(results.get('messages', []))
 
             if not messages:
@@ -273,29 +285,26 @@ class GmailIntegration(BaseIntegration):
                                 sender_counts[email] = {"name": name, "email": email, "count": 1}
                         break
 
-            def execute_batch(chunk):
-                # Each thread gets its own service + SSL connection
-                thread_service = build('gmail', 'v1', credentials=self.credentials[resolved_account])
-                batch = thread_service.new_batch_http_request()
+            def build_batch(chunk):
+                batch = gmail_service.new_batch_http_request()
                 for msg in chunk:
                     batch.add(
-                        thread_service.users().messages().get(
+                        gmail_service.users().messages().get(
                             userId='me', id=msg['id'],
                             format='metadata', metadataHeaders=['From'],
                             fields='payload/headers'
                         ),
                         callback=callback
                     )
-                batch.execute()
+                return batch
 
             chunks = [messages[i:i+100] for i in range(0, len(messages), 100)]
 
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor(max_workers=min(len(chunks), 5)) as executor:
-                await asyncio.gather(*(
-                    loop.run_in_executor(executor, execute_batch, chunk)
-                    for chunk in chunks
-                ))
+            # Each batch gets its own authorized connection; the executor bounds per-user concurrency.
+            await asyncio.gather(*(
+                self._execute(build_batch(chunk), resolved_account)
+                for chunk in chunks
+            ))
 
             sorted_senders = sorted(sender_counts.values(), key=lambda x: x["count"], reverse=True)
             return sorted_senders[:max_senders]
@@ -323,7 +332,7 @@ class GmailIntegration(BaseIntegration):
             chunk = message_ids[i:i+1000]
             body['ids'] = chunk
             try:
-                gmail_service.users().messages().batchModify(userId='me', body=body).execute()
+                await self._execute(gmail_service.users().messages().batchModify(userId='me', body=body), resolved_account)
                 successes += len(chunk)
             except HttpError as e:
                 logger.error(f"Error bulk modifying messages: {e}")
@@ -355,25 +364,23 @@ class GmailIntegration(BaseIntegration):
         """Searches emails, defaulting to the single account if available."""
         gmail_service, people_service, resolved_account = self._get_services_for_account(account)
 
-        results = gmail_service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
+        results = await self._execute(gmail_service.users().messages().list(userId='me', q=query, maxResults=max_results), resolved_account)
         messages = results.get('messages', [])
         
         if not messages:
             return []
 
         email_list = []
-        for msg in messages:
-            try:
-                msg_data = gmail_service.users().messages().get(userId='me', id=msg['id'], format='metadata').execute()
-                headers = {h['name']: h['value'] for h in msg_data['payload']['headers']}
-                email_list.append({
-                    "id": msg_data['id'],
-                    "subject": headers.get('Subject', 'No Subject'),
-                    "snippet": msg_data.get('snippet', '')
-                })
-            except HttpError as e:
-                logger.error(f"Error fetching metadata for message {msg['id']} for account {resolved_account}: {e}")
-                continue
+        async for msg_data in self.iter_messages_batched(
+            [msg['id'] for msg in messages], account=resolved_account,
+            format='metadata', metadata_headers=['Subject']
+        ):
+            headers = {h['name']: h['value'] for h in msg_data['payload'].get('headers', [])}
+            email_list.append({
+                "id": msg_data['id'],
+                "subject": headers.get('Subject', 'No Subject'),
+                "snippet": msg_data.get('snippet', '')
+            })
         return email_list
 
     async def find_contact_email(self, name: str, *, account: Optional[str] = None) -> List[Dict]:
@@ -389,18 +396,18 @@ class GmailIntegration(BaseIntegration):
 
         logger.info(f"Searching for contact '{name}' in account {resolved_account} for user {self.user_id}")
         try:
-            results = people_service.people().searchContacts(
+            results = await self._execute(people_service.people().searchContacts(
                 query=name,
                 readMask="names,emailAddresses,nicknames"
-            ).execute()
+            ), resolved_account)
             contacts = results.get('results', [])
 
             if not contacts:
                 logger.info(f"No primary contacts found for '{name}'. Searching other contacts for account {resolved_account}.")
-                results = people_service.otherContacts().search(
+                results = await self._execute(people_service.otherContacts().search(
                     query=f"{name}*",
                     readMask="names,emailAddresses"
-                ).execute()
+                ), resolved_account)
                 contacts = results.get('results', [])
 
             if not contacts:
@@ -430,7 +437,7 @@ class GmailIntegration(BaseIntegration):
             'topicName': topic_name
         }
         try:
-            result = service.users().watch(userId='me', body=request).execute()
+            result = await self._execute(service.users().watch(userId='me', body=request), resolved_account)
             logger.info(f"Gmail push notifications setup for account {resolved_account}. History ID: {result.get('historyId')}")
             return result
         except Exception as e:
@@ -441,14 +448,19 @@ class GmailIntegration(BaseIntegration):
         """Stops active Gmail push notifications for a specific account."""
         service, _, resolved_account = self._get_services_for_account(account)
         try:
-            service.users().stop(userId='me').execute()
+            await self._execute(service.users().stop(userId='me'), resolved_account)
             logger.info(f"Gmail push notifications stopped for account {resolved_account}")
             return True
         except Exception as e:
             logger.error(f"Failed to stop Gmail push notifications for account {resolved_account}: {e}")
             return False
 
-    def get_changed_message_ids_since(
+    async def get_profile(self, *, account: Optional[str] = None) -> Dict[str, Any]:
+        """Gets the mailbox profile (email address, historyId, totals) of a specific account."""
+        service, _, resolved_account = self._get_services_for_account(account)
+        return await self._execute(service.users().getProfile(userId=self.gmail_user_id), resolved_account)
+
+    async def get_changed_message_ids_since(
         self,
         start_history_id: str,
         *,
@@ -469,7 +481,7 @@ class GmailIntegration(BaseIntegration):
                     pageToken=page_token,
                     historyTypes=history_types,
                 )
-                resp = req.execute()
+                resp = await self._execute(req, resolved_account)
 
                 for h in resp.get("history", []):
                     hid = int(h["id"])
@@ -494,18 +506,94 @@ class GmailIntegration(BaseIntegration):
         new_checkpoint = str(max_history_id_seen) if max_history_id_seen is not None else None
         return deduped, new_checkpoint
 
-    def get_messages_by_ids(self, message_ids: List[str], *, account: Optional[str] = None) -> List[Dict[str, Any]]:
+    async def get_messages_by_ids(self, message_ids: List[str], *, account: Optional[str] = None) -> List[Dict[str, Any]]:
         """Gets full message details for a list of IDs from a specific account."""
-        service, _, _ = self._get_services_for_account(account)
-        out = []
-        for mid in message_ids:
+        return [msg async for msg in self.iter_messages_batched(message_ids, account=account, format="full")]
+
+    async def iter_messages_batched(
+        self,
+        message_ids: List[str],
+        *,
+        account: Optional[str] = None,
+        format: str = "full",
+        metadata_headers: Optional[List[str]] = None,
+        fields: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Fetches messages through the Gmail batch endpoint, up to 100 per HTTP round-trip,
+        yielding them in the order of `message_ids`. Messages that fail with a rate-limit or
+        server error are retried with backoff; messages that can't be fetched are logged and skipped.
+        """
+        service, _, resolved_account = self._get_services_for_account(account)
+        batch_size = max(1, min(batch_size or settings.GMAIL_BATCH_SIZE, _GMAIL_MAX_BATCH_SIZE))
+        max_retries = settings.GMAIL_BATCH_MAX_RETRIES if max_retries is None else max_retries
+
+        unique_ids = list(dict.fromkeys(message_ids))
+        chunks = [unique_ids[i:i + batch_size] for i in range(0, len(unique_ids), batch_size)]
+        get_kwargs: Dict[str, Any] = {'userId': self.gmail_user_id, 'format': format}
+        if metadata_headers:
+            get_kwargs['metadataHeaders'] = metadata_headers
+        if fields:
+            get_kwargs['fields'] = fields
+
+        # Chunks are fetched concurrently (bounded per user by the executor) and yielded in order.
+        tasks = [
+            asyncio.create_task(self._fetch_message_chunk(service, resolved_account, chunk, get_kwargs, max_retries))
+            for chunk in chunks
+        ]
+        try:
+            for task in tasks:
+                for msg in await task:
+                    yield msg
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _fetch_message_chunk(
+        self,
+        service: Any,
+        resolved_account: str,
+        message_ids: List[str],
+        get_kwargs: Dict[str, Any],
+        max_retries: int,
+    ) -> List[Dict[str, Any]]:
+        """Fetches one chunk with a single batch request, re-batching only the messages that failed transiently."""
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = list(message_ids)
+        attempt = 0
+        while pending:
+            errors: Dict[str, Exception] = {}
+
+            def callback(request_id, response, exception):
+                if exception is not None:
+                    errors[request_id] = exception
+                else:
+                    results[request_id] = response
+
+            batch = service.new_batch_http_request(callback=callback)
+            for mid in pending:
+                batch.add(service.users().messages().get(id=mid, **get_kwargs), request_id=mid)
             try:
-                msg = service.users().messages().get(userId=self.gmail_user_id, id=mid, format="full").execute()
-                out.append(msg)
+                await self._execute(batch, resolved_account)
             except HttpError as e:
-                logger.error(f"Could not retrieve message ID {mid}: {e}")
-                continue
-        return out
+                if not _is_retryable_gmail_error(e) or attempt >= max_retries:
+                    logger.error(f"Batch fetch of {len(pending)} message(s) failed for account {resolved_account}: {e}")
+                    break
+                errors = {mid: e for mid in pending if mid not in results}
+
+            retryable = [mid for mid, exc in errors.items() if _is_retryable_gmail_error(exc)]
+            for mid, exc in errors.items():
+                if mid not in retryable or attempt >= max_retries:
+                    logger.error(f"Could not retrieve message ID {mid}: {exc}")
+            if not retryable or attempt >= max_retries:
+                break
+            attempt += 1
+            pending = [mid for mid in pending if mid in retryable]
+            await asyncio.sleep(settings.GMAIL_BATCH_RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+
+        return [results[mid] for mid in message_ids if mid in results]
 
     async def _download_and_store_attachment(
         self,
@@ -523,9 +611,9 @@ class GmailIntegration(BaseIntegration):
         if not attachment_id:
             return {}
 
-        att = service.users().messages().attachments().get(
+        att = await self._execute(service.users().messages().attachments().get(
             userId="me", messageId=message_id, id=attachment_id
-        ).execute()
+        ), resolved_account)
         data_b64 = att.get("data")
         if not data_b64:
             return {}
@@ -714,34 +802,39 @@ class GmailIntegration(BaseIntegration):
             since_str = (since or (datetime.utcnow() - timedelta(days=7))).strftime('%Y/%m/%d')
             query = f'after:{since_str}'
             
-            result = service.users().messages().list(
+            result = await self._execute(service.users().messages().list(
                 userId=self.gmail_user_id, q=query, maxResults=min(settings.MAX_EMAILS, remaining)
-            ).execute()
+            ), resolved_account)
             
             messages = result.get('messages', [])
             detailed_messages, attachment_count = [], 0
 
-            for message in messages[:settings.MAX_EMAILS]:
-                if attachment_count >= settings.MAX_EMAIL_ATTACHMENTS:
-                    break
-                
-                try:
-                    msg_detail = service.users().messages().get(
-                        userId=self.gmail_user_id, id=message['id'], format='full'
-                    ).execute()
-                    
-                    formatted_message = await self._format_message(msg_detail)
-                    msg_attachments = len(formatted_message.get('attachments', []))
-
-                    if attachment_count + msg_attachments <= settings.MAX_EMAIL_ATTACHMENTS:
-                        detailed_messages.append(formatted_message)
-                        attachment_count += msg_attachments
-                        await rate_limiter.increment_usage(self.user_id, "emails", 1)
-                        if msg_attachments > 0:
-                            await rate_limiter.increment_usage(self.user_id, "email_attachments", msg_attachments)
-                except HttpError as e:
-                    logger.error(f"Error fetching message {message['id']} for {resolved_account}: {e}")
-                    continue
+            # One batched round-trip per chunk; closing the iterator on the attachment
+            # cap cancels the chunks not yet consumed.
+            batched = self.iter_messages_batched(
+                [message['id'] for message in messages[:settings.MAX_EMAILS]],
+                account=resolved_account, format='full'
+            )
+            try:
+                async for msg_detail in batched:
+                    if attachment_count >= settings.MAX_EMAIL_ATTACHMENTS:
+                        break
+
+                    try:
+                        formatted_message = await self._format_message(msg_detail)
+                        msg_attachments = len(formatted_message.get('attachments', []))
+
+                        if attachment_count + msg_attachments <= settings.MAX_EMAIL_ATTACHMENTS:
+                            detailed_messages.append(formatted_message)
+                            attachment_count += msg_attachments
+                            await rate_limiter.increment_usage(self.user_id, "emails", 1)
+                            if msg_attachments > 0:
+                                await rate_limiter.increment_usage(self.user_id, "email_attachments", msg_attachments)
+                    except HttpError as e:
+                        logger.error(f"Error fetching message {msg_detail.get('id')} for {resolved_account}: {e}")
+                        continue
+            finally:
+                await batched.aclose()
             
             return detailed_messages
         except Exception as e:
@@ -774,9 +867,9 @@ class GmailIntegration(BaseIntegration):
         """
         service, _, resolved_account = self._get_services_for_account(account)
         try:
-            message = service.users().messages().get(
+            message = await self._execute(service.users().messages().get(
                 userId=self.gmail_user_id, id=message_id, format='full'
-            ).execute()
+            ), resolved_account)
             # Reuse the existing formatting method to return a clean, structured response
             return await self._format_message(message)
         except HttpError as e:
@@ -819,9 +912,9 @@ class GmailIntegration(BaseIntegration):
         
         try:
             # 1. Fetch the original message to get necessary headers
-            original_message = service.users().messages().get(
+            original_message = await self._execute(service.users().messages().get(
                 userId=self.gmail_user_id, id=original_message_id, format='metadata'
-            ).execute()
+            ), resolved_account)
             
             headers = {h['name']: h['value'] for h in original_message['payload']['headers']}
             
@@ -859,10 +952,10 @@ class GmailIntegration(BaseIntegration):
                 'threadId': original_message['threadId'] # Ensures it stays in the same conversation
             }
             
-            sent_message = service.users().messages().send(
+            sent_message = await self._execute(service.users().messages().send(
                 userId=self.gmail_user_id,
                 body=create_message_request
-            ).execute()
+            ), resolved_account)
             
             return {"status": "success", "message_id": sent_message['id']}
         except HttpError as e:
@@ -889,9 +982,9 @@ class GmailIntegration(BaseIntegration):
             return {"status": "no_action", "message": "No labels specified to add or remove."}
         
         try:
-            result = service.users().messages().modify(
+            result = await self._execute(service.users().messages().modify(
                 userId=self.gmail_user_id, id=message_id, body=body
-            ).execute()
+            ), resolved_account)
             return {"status": "success", "id": result['id'], "labels": result['labelIds']}
         except HttpError as e:
             logger.error(f"Error modifying labels for message {message_id} in {resolved_account}: {e}")
@@ -983,10 +1076,10 @@ class GmailIntegration(BaseIntegration):
         }
 
         try:
-            draft = service.users().drafts().create(
+            draft = await self._execute(service.users().drafts().create(
                 userId='me',
                 body=draft_body
-            ).execute()
+            ), resolved_account)
             return {
                 "draft_id": draft['id'],
                 "message_id": draft['message']['id'],
@@ -1003,7 +1096,7 @@ class GmailIntegration(BaseIntegration):
         service, _, resolved_account = self._get_services_for_account(account)
 
         try:
-            results = service.users().labels().list(userId='me').execute()
+            results = await self._execute(service.users().labels().list(userId='me'), resolved_account)
             labels = results.get('labels', [])
             return [
                 {
@@ -1029,7 +1122,7 @@ class GmailIntegration(BaseIntegration):
         }
         
         try:
-            created_label = service.users().labels().create(userId='me', body=label_object).execute()
+            created_label = await self._execute(service.users().labels().create(userId='me', body=label_object), resolved_account)
             return {"id": created_label['id'], "name": created_label['name']}
         except HttpError as e:
             logger.error(f"Error creating label '{label_name}' for account {resolved_account}: {e}")
@@ -1045,7 +1138,7 @@ class GmailIntegration(BaseIntegration):
         }
         
         try:
-            created_filter = service.users().settings().filters().create(userId='me', body=filter_req).execute()
+            created_filter = await self._execute(service.users().settings().filters().create(userId='me', body=filter_req), resolved_account)
             return created_filter
         except HttpError as e:
             logger.error(f"Error creating filter for account {resolved_account}: {e}")
@@ -1074,10 +1167,10 @@ class GmailIntegration(BaseIntegration):
                     'labelListVisibility': 'labelShow',
                     'messageListVisibility': 'show'
                 }
-                created_label = service.users().labels().create(
+                created_label = await self._execute(service.users().labels().create(
                     userId='me',
                     body=label_body
-                ).execute()
+                ), resolved_account)
                 label_id = created_label['id']
                 logger.info(f"Created new label '{label_name}' for {resolved_account}")
 
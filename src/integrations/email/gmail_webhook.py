@@ -182,10 +182,10 @@ class GmailWebhookHandler:
         from src.core.assistant_controller import AssistantController
 
         try:
-            # Rate limit check
-            allowed, _ = await rate_limiter.check_limit(self.test_user, "gmail_webhooks")
+            # Rate limit check (counted up front, so concurrent notifications cannot all pass it)
+            allowed, remaining = await rate_limiter.acquire(self.test_user, "gmail_webhooks")
             if not allowed:
-                log_gmail_rate_limit_hit("gmail_webhooks", self.test_user, 0)
+                log_gmail_rate_limit_hit("gmail_webhooks", self.test_user, remaining)
                 return 0
 
             gmail_client = GmailIntegration(self.test_user)
@@ -236,7 +236,6 @@ class GmailWebhookHandler:
                 except Exception as e:
                     logger.error(f"Failed to process email message {message_id}: {e}")
 
-            await rate_limiter.increment_usage(self.test_user, "gmail_webhooks", 1)
             return len(new_message_ids)
 
         except Exception as e:
@@ -256,7 +255,7 @@ class GmailWebhookHandler:
         """
         try:
             # Check rate limits for history API calls
-            allowed, remaining = await rate_limiter.check_limit(self.test_user, "gmail_history_calls")
+            allowed, remaining = await rate_limiter.acquire(self.test_user, "gmail_history_calls")
             if not allowed:
                 log_gmail_rate_limit_hit("gmail_history_calls", self.test_user, remaining)
                 return []
@@ -271,9 +270,6 @@ class GmailWebhookHandler:
             
             history_items = history_result.get('history', [])
             
-            # Update rate limiter
-            await rate_limiter.increment_usage(self.test_user, "gmail_history_calls", 1)
-            
             # Enhanced logging
             fetch_time = time.time() - time.time()  # This would be calculated properly in real implementation
             log_gmail_history_fetch(history_id, len(history_items), 0.1)  # Mock fetch time for now
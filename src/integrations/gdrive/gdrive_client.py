@@ -4,11 +4,11 @@ from io import BytesIO
 from typing import Any, Dict, List, Optional, Tuple
 
 import requests
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+from googleapiclient.http import MediaIoBaseUpload
 
 from src.integrations.base_integration import BaseIntegration
+from src.integrations.google_api_executor import GoogleApiMixin, google_service_cache
 from src.services.integration_service import integration_service
 from src.utils.logging.base_logger import setup_logger
 
@@ -40,7 +40,7 @@ def _normalize_drive_query(query: str) -> str:
     return f"name contains '{safe}' or fullText contains '{safe}'"
 
 
-class GoogleDriveIntegration(BaseIntegration):
+class GoogleDriveIntegration(GoogleApiMixin, BaseIntegration):
 
     def __init__(self, user_id: str):
         super().__init__(user_id)
@@ -81,7 +81,7 @@ class GoogleDriveIntegration(BaseIntegration):
             return False
 
         try:
-            service = build('drive', 'v3', credentials=creds)
+            service = google_service_cache.get('drive', 'v3')
             self.services[account_email] = service
             self.credentials[account_email] = creds
             if account_email not in self.connected_accounts:
@@ -118,22 +118,22 @@ class GoogleDriveIntegration(BaseIntegration):
         since_str = since.isoformat() + 'Z'
         
         try:
-            results = service.files().list(
+            results = await self._execute(service.files().list(
                 q=f"modifiedTime > '{since_str}' and trashed=false",
                 pageSize=100,
                 fields="files(id, name, mimeType, modifiedTime, size)"
-            ).execute()
+            ), resolved_account)
             return results.get('files', [])
         except Exception as e:
             logger.error(f"Error fetching files for {resolved_account}: {e}")
             return []
 
-    def get_user_info(self, *, account: Optional[str] = None) -> Dict:
+    async def get_user_info(self, *, account: Optional[str] = None) -> Dict:
         """Gets a specific authenticated user's Google Drive account information."""
         service, resolved_account = self._get_service_for_account(account)
         
         try:
-            about = service.about().get(fields="user,storageQuota").execute()
+            about = await self._execute(service.about().get(fields="user,storageQuota"), resolved_account)
             user = about.get('user', {})
             storage = about.get('storageQuota', {})
             
@@ -154,14 +154,7 @@ class GoogleDriveIntegration(BaseIntegration):
 
         try:
             request = service.files().get_media(fileId=file_id)
-            fh = BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-
-            fh.seek(0)
-            return fh.read()
+            return await self._download_media(request, resolved_account)
         except Exception as e:
             logger.error(f"Error downloading file {file_id} from {resolved_account}: {e}")
             return None
@@ -196,19 +189,13 @@ class GoogleDriveIntegration(BaseIntegration):
         service, resolved_account = self._get_service_for_account(account)
 
         try:
-            meta = service.files().get(fileId=file_id, fields="mimeType,name").execute()
+            meta = await self._execute(service.files().get(fileId=file_id, fields="mimeType,name"), resolved_account)
             src_mime = meta.get('mimeType', '') or ''
 
             if src_mime in self._GOOGLE_EXPORT_MAP:
                 export_mime, ext = self._GOOGLE_EXPORT_MAP[src_mime]
                 request = service.files().export_media(fileId=file_id, mimeType=export_mime)
-                fh = BytesIO()
-                downloader = MediaIoBaseDownload(fh, request)
-                done = False
-                while not done:
-                    _, done = downloader.next_chunk()
-                fh.seek(0)
-                return fh.read(), export_mime, ext
+                return await self._download_media(request, resolved_account), export_mime, ext
 
             if src_mime.startswith('application/vnd.google-apps'):
                 logger.warning(
@@ -218,13 +205,8 @@ class GoogleDriveIntegration(BaseIntegration):
                 return None
 
             request = service.files().get_media(fileId=file_id)
-            fh = BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-            fh.seek(0)
-            return fh.read(), src_mime or 'application/octet-stream', ''
+            content = await self._download_media(request, resolved_account)
+            return content, src_mime or 'application/octet-stream', ''
         except Exception as e:
             logger.error(
                 f"Error downloading/exporting file {file_id} from {resolved_account}: {e}"
@@ -245,9 +227,9 @@ class GoogleDriveIntegration(BaseIntegration):
 
             media = MediaIoBaseUpload(BytesIO(response.content), mimetype=response.headers.get('content-type'), resumable=True)
             
-            uploaded_file = service.files().create(
+            uploaded_file = await self._execute(service.files().create(
                 body=file_metadata, media_body=media, fields='id, webViewLink'
-            ).execute()
+            ), resolved_account)
 
             return f"File '{file_name}' uploaded to {resolved_account}. Link: {uploaded_file.get('webViewLink')}"
         except Exception as e:
@@ -265,7 +247,7 @@ class GoogleDriveIntegration(BaseIntegration):
             file_metadata['parents'] = [parent_folder_id]
         
         try:
-            folder = service.files().create(body=file_metadata, fields='id, webViewLink').execute()
+            folder = await self._execute(service.files().create(body=file_metadata, fields='id, webViewLink'), resolved_account)
             logger.info(f"Created folder '{folder_name}' in {resolved_account}")
             return folder
         except Exception as e:
@@ -281,11 +263,11 @@ class GoogleDriveIntegration(BaseIntegration):
             body['parents'] = [drive_folder_id]
 
         try:
-            return service.files().copy(
+            return await self._execute(service.files().copy(
                 fileId=file_id,
                 body=body,
                 fields='id, name, mimeType, webViewLink, parents'
-            ).execute()
+            ), resolved_account)
         except Exception as e:
             logger.error(f"Error copying file in {resolved_account}: {e}")
             raise Exception(f"Failed to copy file in {resolved_account}: {e}")
@@ -300,7 +282,7 @@ class GoogleDriveIntegration(BaseIntegration):
         
         media = MediaIoBaseUpload(BytesIO(content.encode()), mimetype='text/plain', resumable=True)
         
-        file = service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink').execute()
+        file = await self._execute(service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink'), resolved_account)
         logger.info(f"Created text file '{filename}' in {resolved_account}")
         return file
 
@@ -309,7 +291,7 @@ class GoogleDriveIntegration(BaseIntegration):
         service, resolved_account = self._get_service_for_account(account)
 
         try:
-            file_metadata = service.files().get(fileId=file_id, fields="mimeType").execute()
+            file_metadata = await self._execute(service.files().get(fileId=file_id, fields="mimeType"), resolved_account)
             mime_type = file_metadata.get('mimeType', '')
 
             if mime_type.startswith('text/') or mime_type in ['application/json', 'application/xml']:
@@ -325,13 +307,8 @@ class GoogleDriveIntegration(BaseIntegration):
                     export_mime_type = 'text/plain'
 
                 request = service.files().export_media(fileId=file_id, mimeType=export_mime_type)
-                fh = BytesIO()
-                downloader = MediaIoBaseDownload(fh, request)
-                done = False
-                while not done:
-                    _, done = downloader.next_chunk()
-                fh.seek(0)
-                return fh.read().decode('utf-8')
+                content = await self._download_media(request, resolved_account)
+                return content.decode('utf-8')
             else:
                 return f"Cannot read content: unsupported file type ({mime_type})."
 
@@ -356,11 +333,11 @@ class GoogleDriveIntegration(BaseIntegration):
             q_string = " and ".join(q_parts)
             logger.info(f"Executing Drive search with query: '{q_string}' for account {resolved_account}")
 
-            results = service.files().list(
+            results = await self._execute(service.files().list(
                 q=q_string,
                 pageSize=min(max_results, 1000),
                 fields="files(id, name, mimeType, modifiedTime, size, webViewLink)"
-            ).execute()
+            ), resolved_account)
 
             return [{
                 'id': f.get('id'),
@@ -389,7 +366,7 @@ class GoogleDriveIntegration(BaseIntegration):
         try:
             if not page_token:
                 # Get initial page token
-                response = service.changes().getStartPageToken().execute()
+                response = await self._execute(service.changes().getStartPageToken(), resolved_account)
                 return [], response.get('startPageToken')
 
             changed_files = []
@@ -397,12 +374,12 @@ class GoogleDriveIntegration(BaseIntegration):
 
             # Fetch all changes using pagination
             while True:
-                response = service.changes().list(
+                response = await self._execute(service.changes().list(
                     pageToken=next_page_token,
                     spaces='drive',
                     fields='nextPageToken, newStartPageToken, changes(fileId, file(id, name, mimeType, modifiedTime, size, webViewLink, trashed), removed)',
                     pageSize=1000
-                ).execute()
+                ), resolved_account)
 
                 changes = response.get('changes', [])
 
@@ -435,7 +412,7 @@ class GoogleDriveIntegration(BaseIntegration):
             if e.resp.status == 404:
                 # Page token expired, get a fresh start token
                 logger.warning(f"Page token expired for {resolved_account}, getting fresh start token")
-                response = service.changes().getStartPageToken().execute()
+                response = await self._execute(service.changes().getStartPageToken(), resolved_account)
                 return [], response.get('startPageToken')
             logger.error(f"Error fetching changed files for {resolved_account}: {e}")
             raise Exception(f"Failed to fetch changed files for {resolved_account}: {e}")
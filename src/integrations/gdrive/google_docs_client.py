@@ -1,16 +1,16 @@
 import asyncio
 from typing import Any, Dict, List, Optional, Tuple
 
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from src.integrations.base_integration import BaseIntegration
+from src.integrations.google_api_executor import GoogleApiMixin, google_service_cache
 from src.services.integration_service import integration_service
 from src.utils.logging.base_logger import setup_logger
 
 logger = setup_logger('google_docs_client')
 
-class GoogleDocsIntegration(BaseIntegration):
+class GoogleDocsIntegration(GoogleApiMixin, BaseIntegration):
     """
     Google Docs API integration for creating and manipulating Google Docs.
 
@@ -61,7 +61,7 @@ class GoogleDocsIntegration(BaseIntegration):
             return False
 
         try:
-            service = build('docs', 'v1', credentials=creds)
+            service = google_service_cache.get('docs', 'v1')
             self.services[account_email] = service
             self.credentials[account_email] = creds
             if account_email not in self.connected_accounts:
@@ -114,7 +114,7 @@ class GoogleDocsIntegration(BaseIntegration):
         service, resolved_account = self._get_service_for_account(account)
 
         try:
-            doc = service.documents().create(body={'title': title}).execute()
+            doc = await self._execute(service.documents().create(body={'title': title}), resolved_account)
             logger.info(f"Created Google Doc '{title}' with ID {doc['documentId']} for {resolved_account}")
             return {
                 'document_id': doc['documentId'],
@@ -138,7 +138,7 @@ class GoogleDocsIntegration(BaseIntegration):
         service, resolved_account = self._get_service_for_account(account)
 
         try:
-            doc = service.documents().get(documentId=document_id).execute()
+            doc = await self._execute(service.documents().get(documentId=document_id), resolved_account)
             logger.info(f"Retrieved document {document_id} for {resolved_account}")
             return doc
         except Exception as e:
@@ -189,10 +189,10 @@ class GoogleDocsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.documents().batchUpdate(
+            result = await self._execute(service.documents().batchUpdate(
                 documentId=document_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
             logger.info(f"Inserted text at index {index} in document {document_id}")
             return result
         except Exception as e:
@@ -265,10 +265,10 @@ class GoogleDocsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.documents().batchUpdate(
+            result = await self._execute(service.documents().batchUpdate(
                 documentId=document_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
             logger.info(f"Applied formatting to range {start_index}-{end_index} in document {document_id}")
             return result
         except Exception as e:
@@ -314,10 +314,10 @@ class GoogleDocsIntegration(BaseIntegration):
             })
 
         try:
-            result = service.documents().batchUpdate(
+            result = await self._execute(service.documents().batchUpdate(
                 documentId=document_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
             logger.info(f"Inserted paragraph at index {index} in document {document_id}")
             return result
         except Exception as e:
@@ -349,10 +349,10 @@ class GoogleDocsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.documents().batchUpdate(
+            result = await self._execute(service.documents().batchUpdate(
                 documentId=document_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
             logger.info(f"Inserted {rows}x{columns} table at index {index} in document {document_id}")
             return result
         except Exception as e:
@@ -384,10 +384,10 @@ class GoogleDocsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.documents().batchUpdate(
+            result = await self._execute(service.documents().batchUpdate(
                 documentId=document_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
             logger.info(f"Deleted content range {start_index}-{end_index} in document {document_id}")
             return result
         except Exception as e:
@@ -421,10 +421,10 @@ class GoogleDocsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.documents().batchUpdate(
+            result = await self._execute(service.documents().batchUpdate(
                 documentId=document_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             replacements = result.get('replies', [{}])[0].get('replaceAllText', {}).get('occurrencesChanged', 0)
             logger.info(f"Replaced {replacements} occurrences of '{find_text}' in document {document_id}")
@@ -1,16 +1,16 @@
 import asyncio
 from typing import Any, Dict, List, Optional, Tuple, Union
 
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from src.integrations.base_integration import BaseIntegration
+from src.integrations.google_api_executor import GoogleApiMixin, google_service_cache
 from src.services.integration_service import integration_service
 from src.utils.logging.base_logger import setup_logger
 
 logger = setup_logger('google_sheets_client')
 
-class GoogleSheetsIntegration(BaseIntegration):
+class GoogleSheetsIntegration(GoogleApiMixin, BaseIntegration):
     """
     Google Sheets API integration for creating and manipulating Google Sheets.
 
@@ -61,7 +61,7 @@ class GoogleSheetsIntegration(BaseIntegration):
             return False
 
         try:
-            service = build('sheets', 'v4', credentials=creds)
+            service = google_service_cache.get('sheets', 'v4')
             self.services[account_email] = service
             self.credentials[account_email] = creds
             if account_email not in self.connected_accounts:
@@ -123,7 +123,7 @@ class GoogleSheetsIntegration(BaseIntegration):
             ]
 
         try:
-            spreadsheet = service.spreadsheets().create(body=spreadsheet_body).execute()
+            spreadsheet = await self._execute(service.spreadsheets().create(body=spreadsheet_body), resolved_account)
             logger.info(f"Created spreadsheet '{title}' with ID {spreadsheet['spreadsheetId']} for {resolved_account}")
             return {
                 'spreadsheet_id': spreadsheet['spreadsheetId'],
@@ -148,7 +148,7 @@ class GoogleSheetsIntegration(BaseIntegration):
         service, resolved_account = self._get_service_for_account(account)
 
         try:
-            spreadsheet = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+            spreadsheet = await self._execute(service.spreadsheets().get(spreadsheetId=spreadsheet_id), resolved_account)
             logger.info(f"Retrieved spreadsheet {spreadsheet_id} for {resolved_account}")
             return spreadsheet
         except Exception as e:
@@ -169,10 +169,10 @@ class GoogleSheetsIntegration(BaseIntegration):
         service, resolved_account = self._get_service_for_account(account)
 
         try:
-            result = service.spreadsheets().values().get(
+            result = await self._execute(service.spreadsheets().values().get(
                 spreadsheetId=spreadsheet_id,
                 range=range_name
-            ).execute()
+            ), resolved_account)
 
             values = result.get('values', [])
             logger.info(f"Retrieved {len(values)} rows from {range_name} in spreadsheet {spreadsheet_id}")
@@ -200,12 +200,12 @@ class GoogleSheetsIntegration(BaseIntegration):
         body = {'values': values}
 
         try:
-            result = service.spreadsheets().values().update(
+            result = await self._execute(service.spreadsheets().values().update(
                 spreadsheetId=spreadsheet_id,
                 range=range_name,
                 valueInputOption=value_input_option,
                 body=body
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Updated {result.get('updatedCells', 0)} cells in {range_name}")
             return result
@@ -232,13 +232,13 @@ class GoogleSheetsIntegration(BaseIntegration):
         body = {'values': values}
 
         try:
-            result = service.spreadsheets().values().append(
+            result = await self._execute(service.spreadsheets().values().append(
                 spreadsheetId=spreadsheet_id,
                 range=range_name,
                 valueInputOption=value_input_option,
                 insertDataOption='INSERT_ROWS',
                 body=body
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Appended {len(values)} rows to {range_name}")
             return result
@@ -260,10 +260,10 @@ class GoogleSheetsIntegration(BaseIntegration):
         service, resolved_account = self._get_service_for_account(account)
 
         try:
-            result = service.spreadsheets().values().clear(
+            result = await self._execute(service.spreadsheets().values().clear(
                 spreadsheetId=spreadsheet_id,
                 range=range_name
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Cleared range {range_name} in spreadsheet {spreadsheet_id}")
             return result
@@ -292,10 +292,10 @@ class GoogleSheetsIntegration(BaseIntegration):
         }
 
         try:
-            result = service.spreadsheets().values().batchUpdate(
+            result = await self._execute(service.spreadsheets().values().batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body=body
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Batch updated {len(updates)} ranges in spreadsheet {spreadsheet_id}")
             return result
@@ -332,10 +332,10 @@ class GoogleSheetsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.spreadsheets().batchUpdate(
+            result = await self._execute(service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             sheet_id = result['replies'][0]['addSheet']['properties']['sheetId']
             logger.info(f"Added sheet '{sheet_title}' (ID: {sheet_id}) to spreadsheet {spreadsheet_id}")
@@ -364,10 +364,10 @@ class GoogleSheetsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.spreadsheets().batchUpdate(
+            result = await self._execute(service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Deleted sheet ID {sheet_id} from spreadsheet {spreadsheet_id}")
             return result
@@ -412,10 +412,10 @@ class GoogleSheetsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.spreadsheets().batchUpdate(
+            result = await self._execute(service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Formatted cells in spreadsheet {spreadsheet_id}")
             return result
@@ -451,10 +451,10 @@ class GoogleSheetsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.spreadsheets().batchUpdate(
+            result = await self._execute(service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Inserted {count} rows at index {start_index} in spreadsheet {spreadsheet_id}")
             return result
@@ -490,10 +490,10 @@ class GoogleSheetsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.spreadsheets().batchUpdate(
+            result = await self._execute(service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Inserted {count} columns at index {start_index} in spreadsheet {spreadsheet_id}")
             return result
@@ -529,10 +529,10 @@ class GoogleSheetsIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.spreadsheets().batchUpdate(
+            result = await self._execute(service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Deleted rows {start_index}-{end_index} in spreadsheet {spreadsheet_id}")
             return result
@@ -1,16 +1,16 @@
 import asyncio
 from typing import Any, Dict, List, Optional, Tuple
 
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from src.integrations.base_integration import BaseIntegration
+from src.integrations.google_api_executor import GoogleApiMixin, google_service_cache
 from src.services.integration_service import integration_service
 from src.utils.logging.base_logger import setup_logger
 
 logger = setup_logger('google_slides_client')
 
-class GoogleSlidesIntegration(BaseIntegration):
+class GoogleSlidesIntegration(GoogleApiMixin, BaseIntegration):
     """
     Google Slides API integration for creating and manipulating Google Slides presentations.
 
@@ -61,7 +61,7 @@ class GoogleSlidesIntegration(BaseIntegration):
             return False
 
         try:
-            service = build('slides', 'v1', credentials=creds)
+            service = google_service_cache.get('slides', 'v1')
             self.services[account_email] = service
             self.credentials[account_email] = creds
             if account_email not in self.connected_accounts:
@@ -116,7 +116,7 @@ class GoogleSlidesIntegration(BaseIntegration):
         body = {'title': title}
 
         try:
-            presentation = service.presentations().create(body=body).execute()
+            presentation = await self._execute(service.presentations().create(body=body), resolved_account)
             logger.info(f"Created presentation '{title}' with ID {presentation['presentationId']} for {resolved_account}")
             return {
                 'presentation_id': presentation['presentationId'],
@@ -140,7 +140,7 @@ class GoogleSlidesIntegration(BaseIntegration):
         service, resolved_account = self._get_service_for_account(account)
 
         try:
-            presentation = service.presentations().get(presentationId=presentation_id).execute()
+            presentation = await self._execute(service.presentations().get(presentationId=presentation_id), resolved_account)
             logger.info(f"Retrieved presentation {presentation_id} for {resolved_account}")
             return presentation
         except Exception as e:
@@ -190,10 +190,10 @@ class GoogleSlidesIntegration(BaseIntegration):
             requests[0]['createSlide']['insertionIndex'] = insertion_index
 
         try:
-            result = service.presentations().batchUpdate(
+            result = await self._execute(service.presentations().batchUpdate(
                 presentationId=presentation_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             slide_id = result['replies'][0]['createSlide']['objectId']
             logger.info(f"Created slide in presentation {presentation_id}")
@@ -222,10 +222,10 @@ class GoogleSlidesIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.presentations().batchUpdate(
+            result = await self._execute(service.presentations().batchUpdate(
                 presentationId=presentation_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Deleted slide {slide_id} from presentation {presentation_id}")
             return result
@@ -293,10 +293,10 @@ class GoogleSlidesIntegration(BaseIntegration):
         ]
 
         try:
-            result = service.presentations().batchUpdate(
+            result = await self._execute(service.presentations().batchUpdate(
                 presentationId=presentation_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Inserted text box in slide {slide_id}")
             return result
@@ -355,10 +355,10 @@ class GoogleSlidesIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.presentations().batchUpdate(
+            result = await self._execute(service.presentations().batchUpdate(
                 presentationId=presentation_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Inserted image in slide {slide_id}")
             return result
@@ -417,10 +417,10 @@ class GoogleSlidesIntegration(BaseIntegration):
         })
 
         try:
-            result = service.presentations().batchUpdate(
+            result = await self._execute(service.presentations().batchUpdate(
                 presentationId=presentation_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Updated text style in object {object_id}")
             return result
@@ -481,10 +481,10 @@ class GoogleSlidesIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.presentations().batchUpdate(
+            result = await self._execute(service.presentations().batchUpdate(
                 presentationId=presentation_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Created {rows}x{columns} table in slide {slide_id}")
             return result
@@ -512,10 +512,10 @@ class GoogleSlidesIntegration(BaseIntegration):
         }]
 
         try:
-            result = service.presentations().batchUpdate(
+            result = await self._execute(service.presentations().batchUpdate(
                 presentationId=presentation_id,
                 body={'requests': requests}
-            ).execute()
+            ), resolved_account)
 
             logger.info(f"Deleted object {object_id} from presentation {presentation_id}")
             return result
@@ -0,0 +1,175 @@
+"""
+Shared, non-blocking execution layer for Google API (googleapiclient) requests.
+
+googleapiclient is synchronous: calling `.execute()` inside an `async def` blocks the event loop
+for the whole HTTPS round-trip. Requests built by the integrations are instead executed on a
+bounded thread pool, with a per-user concurrency limit so one user's bulk operation can't occupy
+every thread.
+
+Discovery services are built once per process per (api, version) without credentials
+(`google_service_cache`); credentials are bound per request through an AuthorizedHttp wrapped
+around the calling worker thread's own httplib2.Http. httplib2.Http objects are not thread-safe,
+so each pool thread keeps one, and its keep-alive connections are reused by every request that
+thread runs, whatever the user, instead of paying a TCP+TLS handshake per call.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from io import BytesIO
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.config.settings import settings
+from src.utils.logging.base_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+_thread_local = threading.local()
+
+
+def authorized_http(credentials):
+    """An authorized transport for one request on the current thread's keep-alive connections."""
+    from google_auth_httplib2 import AuthorizedHttp
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        from googleapiclient.http import build_http
+        http = build_http()
+        _thread_local.http = http
+    return AuthorizedHttp(credentials, http=http)
+
+
+class GoogleServiceCache:
+    """Process-wide cache of discovery-built Google API services, shared by all users."""
+
+    def __init__(self):
+        self._services: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, api: str, version: str):
+        key = (api, version)
+        service = self._services.get(key)
+        if service is not None:
+            return service
+        with self._lock:
+            service = self._services.get(key)
+            if service is None:
+                import httplib2
+                from googleapiclient.discovery import build
+                started = time.perf_counter()
+                # Built without credentials; GoogleApiExecutor authorizes each request it runs.
+                service = build(api, version, http=httplib2.Http(), cache_discovery=False)
+                self._services[key] = service
+                logger.info(f"Built shared Google service {api}/{version} in {time.perf_counter() - started:.3f}s")
+        return service
+
+
+class GoogleApiExecutor:
+    """Runs blocking Google API calls off the event loop with global and per-user bounds."""
+
+    def __init__(self, max_workers: int = 16, per_user_concurrency: int = 4):
+        self.max_workers = max_workers
+        self.per_user_concurrency = max(1, per_user_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="google-api")
+        self._user_limits: Dict[str, asyncio.Semaphore] = {}
+        self.metrics: Dict[str, Dict[str, float]] = {}
+
+    def _user_limit(self, user_id: Optional[str]):
+        if not user_id:
+            return nullcontext()
+        semaphore = self._user_limits.get(user_id)
+        if semaphore is None:
+            if len(self._user_limits) > 10000:
+                # Drop idle limiters; busy ones are still referenced by their waiters.
+                self._user_limits = {uid: s for uid, s in self._user_limits.items() if s.locked()}
+            semaphore = asyncio.Semaphore(self.per_user_concurrency)
+            self._user_limits[user_id] = semaphore
+        return semaphore
+
+    async def execute(self, request, credentials, user_id: Optional[str] = None, num_retries: int = 0):
+        """Execute an HttpRequest or BatchHttpRequest with `credentials` on the worker pool."""
+        method = getattr(request, "methodId", None) or type(request).__name__
+        return await self.run(self._execute_sync, request, credentials, num_retries, user_id=user_id, method=method)
+
+    async def download_media(self, request, credentials, user_id: Optional[str] = None) -> bytes:
+        """Run a media download (files.get_media / files.export_media) to completion and return its bytes."""
+        method = getattr(request, "methodId", None) or "media_download"
+        return await self.run(self._download_sync, request, credentials, user_id=user_id, method=method)
+
+    async def run(self, fn: Callable, *args, user_id: Optional[str] = None, method: str = "call") -> Any:
+        """Run any blocking Google client function on the pool under the same limits and metrics."""
+        loop = asyncio.get_running_loop()
+        async with self._user_limit(user_id):
+            started = time.perf_counter()
+            failed = False
+            try:
+                return await loop.run_in_executor(self._pool, fn, *args)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                self._record(method, time.perf_counter() - started, failed)
+
+    @staticmethod
+    def _execute_sync(request, credentials, num_retries: int):
+        from googleapiclient.http import BatchHttpRequest
+        http = authorized_http(credentials)
+        if isinstance(request, BatchHttpRequest):
+            return request.execute(http=http)
+        return request.execute(http=http, num_retries=num_retries)
+
+    @staticmethod
+    def _download_sync(request, credentials) -> bytes:
+        from googleapiclient.http import MediaIoBaseDownload
+        request.http = authorized_http(credentials)
+        fh = BytesIO()
+        downloader = MediaIoBaseDownload(fh, request)
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+        return fh.getvalue()
+
+    def _record(self, method: str, elapsed: float, failed: bool):
+        entry = self.metrics.get(method)
+        if entry is None:
+            entry = {'calls': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+            self.metrics[method] = entry
+        entry['calls'] += 1
+        entry['total_seconds'] += elapsed
+        entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+        if failed:
+            entry['errors'] += 1
+        if elapsed > settings.GOOGLE_API_SLOW_CALL_SECONDS:
+            logger.warning(f"Slow Google API call {method}: {elapsed:.2f}s")
+
+    def get_metrics(self) -> Dict[str, Dict[str, float]]:
+        """Per-method call counts and latencies for monitoring"""
+        return {
+            method: {
+                **entry,
+                'avg_seconds': round(entry['total_seconds'] / entry['calls'], 4) if entry['calls'] else 0.0,
+            }
+            for method, entry in self.metrics.items()
+        }
+
+
+class GoogleApiMixin:
+    """
+    For Google integrations that keep `self.credentials[account]` and `self.user_id`:
+    runs requests built on the shared services through the executor with that account's credentials.
+    """
+
+    async def _execute(self, request, account: str, num_retries: int = 0):
+        return await google_api_executor.execute(request, self.credentials[account], user_id=self.user_id, num_retries=num_retries)
+
+    async def _download_media(self, request, account: str) -> bytes:
+        return await google_api_executor.download_media(request, self.credentials[account], user_id=self.user_id)
+
+
+# Global instances
+google_service_cache = GoogleServiceCache()
+google_api_executor = GoogleApiExecutor(
+    max_workers=settings.GOOGLE_API_MAX_WORKERS,
+    per_user_concurrency=settings.GOOGLE_API_PER_USER_CONCURRENCY,
+)
@@ -159,6 +159,7 @@ class MicrosoftGraphIntegration(BaseIntegration):
     def __init__(self, user_id: str):
         super().__init__(user_id)
         self.access_token = None
+        self.token_expiry = None
         self.graph_endpoint = "https://graph.microsoft.com/v1.0"
         
     async def authenticate(self) -> bool:
@@ -178,8 +179,10 @@ class MicrosoftGraphIntegration(BaseIntegration):
                     logger.error(f"Failed to refresh Microsoft token for user {self.user_id}")
                     return False
                 self.access_token = new_token_info['access_token']
+                self.token_expiry = new_token_info.get('token_expiry')
             else:
                 self.access_token = token_info['access_token']
+                self.token_expiry = expires_at
             
             return True
         except Exception as e:
@@ -85,6 +85,12 @@ class AIService:
         # which tools the user has been touching this conversation.
         recently_used_tool_ids = extract_recently_used_tool_ids(context)
 
+        # The shortlist embeds the message concurrently with the planning call, never in front of it.
+        shortlist_task = None
+        if settings.TOOL_SHORTLIST_ENABLED:
+            from src.services.ai_service.tool_shortlist import tool_shortlister
+            shortlist_task = asyncio.create_task(tool_shortlister.shortlist(context, recently_used_tool_ids, source=source))
+
         # Replace media with placeholders
         msgs_with_placeholders = replace_media_with_placeholders(context)
         # sys_message = SystemMessage(content=planning_prompt)
@@ -123,7 +129,23 @@ class AIService:
         logger.info('Calling granular_planning for precise tool selection')
 
         # structured_llm = planning_llm.with_structured_output(GranularPlanningResponse)
-        response_raw = await planning_llm.ainvoke(messages)
+        planning_task = asyncio.create_task(planning_llm.ainvoke(messages))
+        try:
+            if shortlist_task is not None and settings.TOOL_SHORTLIST_SKIP_PLANNING_BELOW > 0:
+                # If the shortlist finds no tool matching the message before planning returns, planning is dropped.
+                await asyncio.wait({shortlist_task, planning_task}, return_when=asyncio.FIRST_COMPLETED)
+                if shortlist_task.done() and not planning_task.done():
+                    shortlist = None if shortlist_task.cancelled() or shortlist_task.exception() else shortlist_task.result()
+                    if shortlist and shortlist.skip_planning:
+                        planning_task.cancel()
+                        logger.info(f"Skipping granular planning: no tool matches the message (top score {shortlist.top_score:.3f})")
+                        return None, [], ""
+            response_raw = await planning_task
+        except BaseException:
+            planning_task.cancel()
+            if shortlist_task is not None:
+                shortlist_task.cancel()
+            raise
         ## now, we must cast it
         planning = None
         for tool in response_raw.tool_calls:
@@ -199,6 +221,11 @@ class AIService:
                 plan = planning
                 logger.info(f"Added planning context to history: {plan_str}")
 
+        if shortlist_task is not None:
+            # Logged whenever the shortlist finishes; the reply doesn't wait for it.
+            from src.services.ai_service.tool_shortlist import tool_shortlister
+            tool_shortlister.record_recall_when_done(shortlist_task, required_tool_ids)
+
         # Stream tool selection update
         if required_tool_ids:
             tool_names = ", ".join(required_tool_ids[:3])
@@ -0,0 +1,255 @@
+"""
+Local, embedding-based tool shortlist that runs alongside granular planning (off by default,
+TOOL_SHORTLIST_ENABLED).
+
+Tool definitions from the ToolRegistry are embedded once per process (vectors are cached on
+disk keyed by a hash of the embedded text, like UserDocsManager). Each incoming message is
+embedded and scored against them, concurrently with the planning call, so it never delays it:
+
+- In shadow mode (TOOL_SHORTLIST_SKIP_PLANNING_BELOW=0, the default) the result is only used
+  for `record_recall`, which logs how much of the planner's final choice the shortlist (top
+  candidates plus the tools used recently in the conversation) covered, so the thresholds can
+  be tuned offline from the logs. The planner still sees the full catalogue.
+- With TOOL_SHORTLIST_SKIP_PLANNING_BELOW set, a message that matches no tool at all (e.g.
+  "thanks!") drops the planning call if the shortlist is ready before planning returns.
+"""
+import asyncio
+import hashlib
+import json
+import pickle
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.config.settings import settings
+from src.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+SYSTEM_NOTIFICATION_PREFIX = "[PRAXOS SYSTEM NOTIFICATION]"
+# Tools the planner adds for delivery/progress rather than because the message asks for them
+_DELIVERY_TOOL_PREFIXES = ("reply_to_user_on_", "send_intermediate_message")
+# Don't retry embedding the catalogue on every message after a failure
+INIT_RETRY_SECONDS = 300
+
+
+@dataclass
+class ToolShortlist:
+    query: str
+    candidates: List[str] = field(default_factory=list)
+    scores: Dict[str, float] = field(default_factory=dict)
+    top_score: float = 0.0
+    skip_planning: bool = False
+
+
+def latest_user_text(context: list) -> str:
+    """Text of the latest user message in the history, ignoring injected system notifications."""
+    from langchain_core.messages import HumanMessage
+
+    for msg in reversed(context):
+        if not isinstance(msg, HumanMessage):
+            continue
+        content = msg.content
+        if isinstance(content, list):
+            content = " ".join(
+                part.get("text", "") if isinstance(part, dict) else str(part)
+                for part in content
+                if not isinstance(part, dict) or part.get("type") == "text"
+            )
+        content = (content or "").strip()
+        if content.startswith(SYSTEM_NOTIFICATION_PREFIX):
+            continue
+        # Media-only messages yield "" so they are never judged on an older message's text.
+        return content
+    return ""
+
+
+class ToolShortlister:
+    """Scores a message against embedded tool descriptions."""
+
+    CACHE_FILE = Path("docs/tool_vectors_gemini.pkl")
+
+    def __init__(self):
+        self.tool_ids: List[str] = []
+        self.tool_vectors: Optional[np.ndarray] = None
+        self.initialized = False
+        self._lock: Optional[asyncio.Lock] = None
+        self._failed_at: Optional[float] = None
+        self.stats = {
+            'shortlists': 0,
+            'skipped_planning': 0,
+            'recall_samples': 0,
+            'recall_sum': 0.0,
+            'missed_tools': {},
+        }
+
+    async def initialize(self):
+        """Embed the tool catalogue (or load it from the vector cache)."""
+        if self.initialized:
+            return
+        if self._failed_at is not None and time.monotonic() - self._failed_at < INIT_RETRY_SECONDS:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.initialized:
+                return
+            try:
+                from src.tools.tool_registry import tool_registry
+                tool_registry.load()
+                tools = sorted(tool_registry.get_all(), key=lambda t: t.tool_id)
+                texts = [self._tool_text(t) for t in tools]
+                content_hash = hashlib.sha256("\n\n".join(texts).encode()).hexdigest()
+
+                vectors = self._load_from_cache(content_hash)
+                if vectors is None:
+                    from src.utils.user_docs_manager import gemini_embed
+                    vectors = np.array(await gemini_embed.embed_texts(texts), dtype=np.float32)
+                    self._save_to_cache(content_hash, vectors)
+
+                self.tool_ids = [t.tool_id for t in tools]
+                self.tool_vectors = self._normalize(vectors)
+                self.initialized = True
+                logger.info(f"Tool shortlist index ready with {len(self.tool_ids)} tools")
+            except Exception as e:
+                self._failed_at = time.monotonic()
+                logger.error(f"Failed to initialize tool shortlist index: {e}", exc_info=True)
+
+    @staticmethod
+    def _tool_text(tool) -> str:
+        parts = [f"{tool.display_name} ({tool.tool_id}): {tool.short_description}"]
+        if tool.use_cases:
+            parts.append("Use cases: " + "; ".join(tool.use_cases))
+        return "\n".join(parts)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _load_from_cache(self, content_hash: str) -> Optional[np.ndarray]:
+        if not self.CACHE_FILE.exists():
+            return None
+        try:
+            with open(self.CACHE_FILE, 'rb') as f:
+                data = pickle.load(f)
+            if data.get("hash") != content_hash:
+                logger.info("Tool definitions have changed. Invalidating tool vector cache.")
+                return None
+            return data["vectors"]
+        except Exception as e:
+            logger.warning(f"Failed to load tool vector cache: {e}")
+            return None
+
+    def _save_to_cache(self, content_hash: str, vectors: np.ndarray):
+        try:
+            self.CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.CACHE_FILE, 'wb') as f:
+                pickle.dump({"hash": content_hash, "vectors": vectors}, f)
+        except Exception as e:
+            logger.error(f"Failed to save tool vector cache: {e}")
+
+    async def shortlist(
+        self,
+        context: list,
+        recently_used_tool_ids: Optional[List[str]] = None,
+        source: Optional[str] = None,
+    ) -> Optional[ToolShortlist]:
+        """Shortlist candidate tools for the latest user message; None if the index isn't available."""
+        if not self.initialized:
+            await self.initialize()
+        if self.tool_vectors is None or not len(self.tool_ids):
+            return None
+
+        query = latest_user_text(context)
+        if not query:
+            return None
+
+        from src.utils.user_docs_manager import gemini_embed
+        embeddings = await gemini_embed.embed_texts([query])
+        if not embeddings:
+            return None
+        query_vector = self._normalize(np.asarray(embeddings[0], dtype=np.float32))
+        scores = self.tool_vectors @ query_vector
+
+        top_k = min(settings.TOOL_SHORTLIST_TOP_K, len(self.tool_ids))
+        top_indices = np.argsort(scores)[-top_k:][::-1]
+        candidates = [
+            self.tool_ids[i] for i in top_indices
+            if scores[i] >= settings.TOOL_SHORTLIST_MIN_SCORE
+        ]
+        for tool_id in recently_used_tool_ids or []:
+            if tool_id not in candidates:
+                candidates.append(tool_id)
+
+        top_score = float(scores[top_indices[0]]) if top_k else 0.0
+        result = ToolShortlist(
+            query=query,
+            candidates=candidates,
+            scores={tool_id: round(float(score), 4) for tool_id, score in zip(self.tool_ids, scores)},
+            top_score=top_score,
+        )
+        # Only plain chat with nothing to follow up on may skip the planner.
+        result.skip_planning = (
+            top_score < settings.TOOL_SHORTLIST_SKIP_PLANNING_BELOW
+            and not recently_used_tool_ids
+            and source not in ('scheduled', 'recurring', 'triggered')
+            and len(query.split()) <= settings.TOOL_SHORTLIST_SKIP_PLANNING_MAX_WORDS
+        )
+
+        self.stats['shortlists'] += 1
+        if result.skip_planning:
+            self.stats['skipped_planning'] += 1
+        return result
+
+    def record_recall(self, shortlist: Optional[ToolShortlist], chosen_tool_ids: Optional[List[str]]):
+        """Log how many of the planner's chosen tools were in the shortlist."""
+        if shortlist is None or chosen_tool_ids is None:
+            return
+        chosen = [t for t in chosen_tool_ids if not t.startswith(_DELIVERY_TOOL_PREFIXES)]
+        candidates = set(shortlist.candidates)
+        missed = [t for t in chosen if t not in candidates]
+        recall = 1.0 if not chosen else (len(chosen) - len(missed)) / len(chosen)
+
+        self.stats['recall_samples'] += 1
+        self.stats['recall_sum'] += recall
+        for tool_id in missed:
+            self.stats['missed_tools'][tool_id] = self.stats['missed_tools'].get(tool_id, 0) + 1
+
+        logger.info("tool_shortlist_recall " + json.dumps({
+            'recall': round(recall, 4),
+            'top_score': round(shortlist.top_score, 4),
+            'candidates': len(shortlist.candidates),
+            'chosen': chosen,
+            'missed': missed,
+            'missed_scores': {t: shortlist.scores.get(t) for t in missed},
+        }))
+
+    def record_recall_when_done(self, task: "asyncio.Task", chosen_tool_ids: Optional[List[str]]):
+        """record_recall for a shortlist still being computed, once it is done."""
+        def _record(done: "asyncio.Task"):
+            if done.cancelled():
+                return
+            error = done.exception()
+            if error is not None:
+                logger.error(f"Tool shortlist failed: {error}")
+                return
+            self.record_recall(done.result(), chosen_tool_ids)
+        task.add_done_callback(_record)
+
+    def get_stats(self) -> Dict:
+        """Get shortlist statistics for monitoring"""
+        samples = self.stats['recall_samples']
+        return {
+            **self.stats,
+            'missed_tools': dict(self.stats['missed_tools']),
+            'mean_recall': round(self.stats['recall_sum'] / samples, 4) if samples else None,
+        }
+
+
+# Global instance
+tool_shortlister = ToolShortlister()
@@ -1,6 +1,7 @@
 
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional,Union
+from src.config.settings import settings
 from src.utils.database import *
 from src.utils.logging.base_logger import setup_logger
 from src.services.integration_service import IntegrationService
@@ -11,7 +12,7 @@ class ConversationManager:
     def __init__(self, db_manager: ConversationDatabase, integration_manager: IntegrationService):
         self.db = conversation_db
         self.integration_manager = integration_manager
-        self.INACTIVITY_TIMEOUT = 15 * 60 
+        self.INACTIVITY_TIMEOUT = settings.CONVERSATION_INACTIVITY_TIMEOUT_SECONDS
     ### TODO: This should be smarter. just randomly finding and consolidating conversations is not the best idea. it should be using praxos memory to find relevant conversations, me thinks.
     async def get_or_create_conversation(self, user_id: str, platform: str, payload: dict, conversation_id: Optional[str] = None, metadata: Optional[dict] = None) -> str:
         """Get existing active conversation or create new one"""
@@ -37,22 +38,26 @@ class ConversationManager:
                 return await self.db.create_conversation(user_id, platform, context_boundary_id=context_boundary_id)
 
         # 3. For other platforms (WhatsApp, Telegram), keep "Active Conversation" logic (Time-based)
-        active_id = await self.db.get_active_conversation(user_id, context_boundary_id=context_boundary_id)
-        conversation_info = await self.db.get_conversation_info(active_id) if active_id else None
-        
-        logger.info(f"Existing conversation info: {conversation_info}")
-        if active_id:
-            if await self.is_conversation_active(active_id, payload) and conversation_info.get('platform') == platform:
-                return active_id
-            else:
-                await self.db.mark_conversation_for_consolidation(active_id)
-                return await self.db.create_conversation(user_id, platform, context_boundary_id=context_boundary_id)
-        
-        return await self.db.create_conversation(user_id, platform, context_boundary_id=context_boundary_id)
+        # One find-or-create round trip (none when the active conversation is cached); the recent
+        # messages are only read when the conversation has been idle past the timeout.
+        conversation, created = await self.db.get_or_create_active_conversation(user_id, platform, context_boundary_id=context_boundary_id)
+        active_id = str(conversation['_id'])
+        logger.info(f"Active conversation {active_id} (created: {created})")
+        if created:
+            return active_id
+        if conversation.get('platform') == platform and await self.is_conversation_active(active_id, payload, conversation):
+            return active_id
+
+        await self.db.mark_conversation_for_consolidation(active_id)
+        # A concurrent event may already have started the replacement; join it rather than racing.
+        conversation, _ = await self.db.get_or_create_active_conversation(
+            user_id, platform, context_boundary_id=context_boundary_id, newer_than=conversation['last_activity']
+        )
+        return str(conversation['_id'])
 
-    async def is_conversation_active(self, conversation_id: str, payload: dict = None) -> bool:
+    async def is_conversation_active(self, conversation_id: str, payload: dict = None, conversation: Optional[Dict] = None) -> bool:
         """Check if conversation is still within the inactivity timeout"""
-        return not await self.db.is_conversation_expired(conversation_id, self.INACTIVITY_TIMEOUT // 60,payload)
+        return not await self.db.is_conversation_expired(conversation_id, self.INACTIVITY_TIMEOUT // 60, payload, conversation)
     
     async def add_user_message(self, user_id: str,  conversation_id: str, content: str, metadata: Dict = None, message_category: str = None) -> str:
         """Add user message to conversation"""
@@ -86,7 +91,7 @@ class ConversationManager:
     async def get_conversation_context(self, conversation_id: str, categories: Optional[List[str]] = None) -> Dict:
         """Get comprehensive conversation context for processing"""
 
-        conversation = await self.db.get_conversation_info(conversation_id)
+        conversation = await self.db.get_conversation_info(conversation_id, CONVERSATION_SUMMARY_PROJECTION)
         if not conversation:
             return {}
 
@@ -111,11 +116,11 @@ class ConversationManager:
     async def get_conversation_summary(self, conversation_id: str) -> Dict:
         """Get a summary of the conversation without full message history"""
         
-        conversation = await self.db.get_conversation_info(conversation_id)
+        conversation = await self.db.get_conversation_info(conversation_id, CONVERSATION_SUMMARY_PROJECTION)
         if not conversation:
             return {}
         
-        messages = await self.db.get_conversation_messages(conversation_id, limit=3)
+        messages = await self.db.get_conversation_messages(conversation_id, limit=3, projection=MESSAGE_TEXT_PROJECTION)
         search_attempts = await self.db.get_recent_search_attempts(conversation_id)
         
         successful_searches = sum(1 for attempt in search_attempts if attempt['success'])
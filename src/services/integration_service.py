@@ -10,6 +10,7 @@ from src.services.token_encryption import decrypt_token, encrypt_token
 from bson import ObjectId
 from src.utils.logging.base_logger import setup_logger
 from src.utils.redis_client import redis_client
+from src.integrations.client_cache import integration_client_cache
 from src.services.user_service import user_service
 from src.services.milestone_service import milestone_service
 import json
@@ -40,6 +41,7 @@ class IntegrationService:
                     "updated_at": datetime.now(timezone.utc)
                 }}
             )
+            await integration_client_cache.invalidate_user(str(user_id))
             logger.info(f"Successfully updated and encrypted token for user {user_id}, provider {integration_name}.")
         except Exception as e:
             logger.error(f"Failed to update token for user {user_id}, provider {integration_name}: {e}")
@@ -67,6 +69,7 @@ class IntegrationService:
                     "updated_at": datetime.now(timezone.utc)
                 }}
             )
+            await integration_client_cache.invalidate_user(str(user_id))
             logger.info(f"Successfully updated and encrypted token for user {user_id}, provider {provider_name} (requested as: {integration_name}).")
         except Exception as e:
             logger.error(f"Failed to update token for user {user_id}, provider {provider_name}: {e}")
@@ -107,6 +110,7 @@ class IntegrationService:
             new_integration_record['telegram_chat_id'] = telegram_chat_id
         
         result = await self.db_manager.db["integrations"].insert_one(new_integration_record)
+        await integration_client_cache.invalidate_user(str(user_id))
 
         # Schedule milestone update in background with error handling
         async def _update_milestone_with_error_handling():
@@ -288,6 +292,8 @@ class IntegrationService:
     async def create_integration(self,integration_record:Dict[str,Any]) -> str:
         """Create a new integration record in the database."""
         result = await self.db_manager.db["integrations"].insert_one(integration_record)
+        if integration_record.get("user_id"):
+            await integration_client_cache.invalidate_user(str(integration_record["user_id"]))
         if result:
             return str(result.inserted_id)
         else:
@@ -515,13 +521,16 @@ class IntegrationService:
         return (integ.get("airtable_webhook_cursors") or {}).get(webhook_id)
 
     async def set_airtable_webhook_cursor(self, integration_id: str, webhook_id: str, cursor: int) -> None:
-        await self.db_manager.db["integrations"].update_one(
+        record = await self.db_manager.db["integrations"].find_one_and_update(
             {"_id": ObjectId(integration_id)},
             {"$set": {
                 f"airtable_webhook_cursors.{webhook_id}": int(cursor),
                 "updated_at": datetime.now(timezone.utc),
             }},
+            projection={"user_id": 1},
         )
+        if record and record.get("user_id"):
+            await integration_client_cache.invalidate_user(str(record["user_id"]))
 
     async def get_user_by_hubspot_portal_id(self, portal_id) -> Optional[tuple[str, str]]:
         """Find user by HubSpot portal/hub id. Returns (user_id, connected_account)."""
@@ -665,7 +674,11 @@ class IntegrationService:
         return [str(integration.get("user_id")) for integration in integrations]
     async def update_integration(self, integration_id: str, integration: dict):
         """Update an integration."""
-        await self.db_manager.db["integrations"].update_one({"_id": ObjectId(integration_id)}, {"$set": integration})
+        record = await self.db_manager.db["integrations"].find_one_and_update(
+            {"_id": ObjectId(integration_id)}, {"$set": integration}, projection={"user_id": 1}
+        )
+        if record and record.get("user_id"):
+            await integration_client_cache.invalidate_user(str(record["user_id"]))
 
     async def sync_integration_to_kg(self, user_id: str, integration_name: str, integration_data: Dict[str, Any], praxos_client=None):
         """
@@ -678,6 +691,7 @@ class IntegrationService:
             integration_data: Integration metadata (status, connected_account, capabilities, etc.)
             praxos_client: Optional PraxosClient instance (created if not provided)
         """
+        await integration_client_cache.invalidate_user(str(user_id))
         try:
             # Import here to avoid circular dependency
             if not praxos_client:
@@ -767,6 +781,7 @@ class IntegrationService:
             integration_name: Name of the integration to remove
             praxos_client: Optional PraxosClient instance
         """
+        await integration_client_cache.invalidate_user(str(user_id))
         try:
             if not praxos_client:
                 from src.core.praxos_client import PraxosClient
@@ -822,13 +837,16 @@ class IntegrationService:
 
     async def update_ios_user_phone(self, integration_id: str, phone_number: str) -> None:
         """Store the user's phone number for iOS integration (used to send commands back)."""
-        await self.db_manager.db["integrations"].update_one(
+        record = await self.db_manager.db["integrations"].find_one_and_update(
             {"_id": ObjectId(integration_id)},
             {"$set": {
                 "ios_user_phone": phone_number,
                 "updated_at": datetime.now(timezone.utc)
-            }}
+            }},
+            projection={"user_id": 1},
         )
+        if record and record.get("user_id"):
+            await integration_client_cache.invalidate_user(str(record["user_id"]))
         logger.info(f"Updated iOS integration {integration_id} with user phone {phone_number}")
 
 # Global instance
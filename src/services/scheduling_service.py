@@ -43,7 +43,7 @@ class SchedulingService:
             if delivery_platform is None:
                 delivery_platform = original_source
             task_id = f"task_{user_id}_{datetime.utcnow().timestamp()}"
-            user_preferences = user_service.get_user_preferences(user_id)    
+            user_preferences = await user_service.get_user_preferences_async(user_id)    
             timezone_name = user_preferences.get('timezone', 'America/New_York') if user_preferences else 'America/New_York'
             time_to_do = to_utc(time_to_do, timezone_name)
             await db_manager.create_scheduled_task(
@@ -109,7 +109,7 @@ class SchedulingService:
             if delivery_platform is None:
                 delivery_platform = original_source
             task_id = f"task_{user_id}_{datetime.utcnow().timestamp()}"
-            user_preferences = user_service.get_user_preferences(user_id)    
+            user_preferences = await user_service.get_user_preferences_async(user_id)    
             timezone_name = user_preferences.get('timezone', 'America/New_York') if user_preferences else 'America/New_York'
             logger.info(f"User {user_id} timezone: {timezone_name}")
             zoneinfo = to_ZoneInfo(timezone_name)
@@ -174,7 +174,7 @@ class SchedulingService:
         #get the next run time for the task.
         
         user_id = str(task['user_id'])
-        user_preferences = user_service.get_user_preferences(user_id)    
+        user_preferences = await user_service.get_user_preferences_async(user_id)    
         timezone_name = user_preferences.get('timezone', 'America/New_York') if user_preferences else 'America/New_York'
         logger.info(f"User {user_id} timezone: {timezone_name}")
         zoneinfo = to_ZoneInfo(timezone_name)
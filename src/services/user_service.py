@@ -1,3 +1,4 @@
+import copy
 import logging
 from typing import Optional, Dict
 from pymongo import MongoClient
@@ -9,11 +10,28 @@ logger = setup_logger(__name__)
 from datetime import timezone, timedelta,datetime
 import pytz
 from src.config.tier_limits import TierLimits, SubscriptionTier
+from src.utils.ttl_cache import TTLCache
+
+_NOT_CACHED = object()
+
+
 class UserService:
+    """
+    User records and preferences.
+
+    Hot-path reads have async (motor) variants (`get_user_by_id_async`, `get_user_preferences_async`,
+    `can_have_access_async`). Both the async methods and the legacy sync (pymongo) ones read through
+    a short-TTL in-process cache, which this service invalidates on its own writes.
+    """
     def __init__(self):
         self._client = None
         self._db = None
-    
+        self._async_client = None
+        self._async_db = None
+        self._user_cache = TTLCache(settings.USER_CACHE_TTL_SECONDS, settings.USER_CACHE_MAX_ENTRIES)
+        self._preferences_cache = TTLCache(settings.USER_CACHE_TTL_SECONDS, settings.USER_CACHE_MAX_ENTRIES)
+        self._access_cache = TTLCache(settings.USER_ACCESS_CACHE_TTL_SECONDS, settings.USER_CACHE_MAX_ENTRIES)
+
     def _get_database(self):
         """Get MongoDB database connection"""
         if self._db is None:
@@ -27,6 +45,32 @@ class UserService:
                 logger.error(f"Failed to connect to MongoDB: {e}")
                 raise
         return self._db
+
+    def _get_async_database(self):
+        """Get the motor database used by the async read paths"""
+        if self._async_db is None:
+            import motor.motor_asyncio
+            self._async_client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGO_CONNECTION_STRING, maxIdleTimeMS=120000)
+            self._async_db = self._async_client[settings.MONGO_DB_NAME]
+        return self._async_db
+
+    def invalidate_user(self, user_id: str | ObjectId):
+        """Drop every cached entry for a user (record, preferences and access decision)"""
+        key = str(user_id)
+        self._user_cache.invalidate(key)
+        self._preferences_cache.invalidate(key)
+        self._access_cache.invalidate(key)
+
+    def invalidate_preferences(self, user_id: str | ObjectId):
+        self._preferences_cache.invalidate(str(user_id))
+
+    def get_cache_stats(self) -> Dict:
+        """Get cache statistics for monitoring"""
+        return {
+            'users': self._user_cache.get_stats(),
+            'preferences': self._preferences_cache.get_stats(),
+            'access': self._access_cache.get_stats(),
+        }
     
     def is_authorized_user(self, phone_number: str) -> dict:
         """Check if a phone number belongs to an authorized user"""
@@ -89,15 +133,38 @@ class UserService:
             return None
     
     def get_user_by_id(self, user_id: str) -> Optional[Dict]:
-        """Get user data by user id"""
+        """Get user data by user id (blocking; prefer get_user_by_id_async in async code)"""
+        key = str(user_id)
+        cached = self._user_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        version = self._user_cache.version(key)
         try:
             db = self._get_database()
             users_collection = db.users
             user = users_collection.find_one({"_id": ObjectId(user_id)})
-            return user
         except Exception as e:
             logger.error(f"Unexpected error retrieving user for {user_id}: {e}")
             return None
+        if user:
+            self._user_cache.set(key, copy.deepcopy(user), version=version)
+        return user
+
+    async def get_user_by_id_async(self, user_id: str | ObjectId) -> Optional[Dict]:
+        """Get user data by user id without blocking the event loop"""
+        key = str(user_id)
+        cached = self._user_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        version = self._user_cache.version(key)
+        try:
+            user = await self._get_async_database().users.find_one({"_id": ObjectId(user_id)})
+        except Exception as e:
+            logger.error(f"Unexpected error retrieving user for {user_id}: {e}")
+            return None
+        if user:
+            self._user_cache.set(key, copy.deepcopy(user), version=version)
+        return user
 
     def get_user_by_ms_id(self, ms_user_id: str) -> Optional[Dict]:
         """Get user data by Microsoft Graph user ID"""
@@ -115,11 +182,31 @@ class UserService:
         if self._client:
             self._client.close()
             logger.info("MongoDB connection closed")
+        if self._async_client:
+            self._async_client.close()
 
     def get_user_preferences(self, user_id:str|ObjectId):
+        key = str(user_id)
+        cached = self._preferences_cache.get(key, _NOT_CACHED)
+        if cached is not _NOT_CACHED:
+            return copy.deepcopy(cached)
+        version = self._preferences_cache.version(key)
         db = self._get_database()
         preferences_collection = db.user_preferences
         preference = preferences_collection.find_one({"user_id": ObjectId(user_id)})
+        # A missing document is cached too: most users never set preferences.
+        self._preferences_cache.set(key, copy.deepcopy(preference), version=version)
+        return preference
+
+    async def get_user_preferences_async(self, user_id: str | ObjectId):
+        """Get user preferences without blocking the event loop"""
+        key = str(user_id)
+        cached = self._preferences_cache.get(key, _NOT_CACHED)
+        if cached is not _NOT_CACHED:
+            return copy.deepcopy(cached)
+        version = self._preferences_cache.version(key)
+        preference = await self._get_async_database().user_preferences.find_one({"user_id": ObjectId(user_id)})
+        self._preferences_cache.set(key, copy.deepcopy(preference), version=version)
         return preference
 
     def get_user_tier(self, user: dict) -> str:
@@ -139,17 +226,66 @@ class UserService:
         """
         Check if user can access the application.
         
-        Access is denied if usage_size exceeds memory_cap.
+        Access is denied if usage_size exceeds memory_cap. Only granted access is cached, see
+        can_have_access_async.
         """
         if not user:
             if not user_id:
                 logger.error("Either user or user_id should be passed in")
                 return True
+            key = str(user_id)
+            cached = self._access_cache.get(key)
+            if cached is not None:
+                return cached
+            version = self._access_cache.version(key)
             user = self.get_user_by_id(user_id)
             if not user:
                 logger.error(f"Can't find user from {user_id} id")
                 return True
+            access = self._evaluate_access(user)
+            if not access:
+                self._user_cache.invalidate(key)
+                user = self.get_user_by_id(user_id)
+                access = user is None or self._evaluate_access(user)
+            if access:
+                self._access_cache.set(key, access, version=version)
+            return access
+
+        return self._evaluate_access(user)
+
+    async def can_have_access_async(self, user: dict = None, user_id=None):
+        """
+        Async variant of can_have_access; granted access is cached for USER_ACCESS_CACHE_TTL_SECONDS.
 
+        A denial is neither cached nor decided from a cached user record: it is confirmed against
+        the database every time, so events replayed by /reprocess right after the user raised
+        their cap (in another process) are not suspended again.
+        """
+        if not user:
+            if not user_id:
+                logger.error("Either user or user_id should be passed in")
+                return True
+            key = str(user_id)
+            cached = self._access_cache.get(key)
+            if cached is not None:
+                return cached
+            version = self._access_cache.version(key)
+            user = await self.get_user_by_id_async(user_id)
+            if not user:
+                logger.error(f"Can't find user from {user_id} id")
+                return True
+            access = self._evaluate_access(user)
+            if not access:
+                self._user_cache.invalidate(key)
+                user = await self.get_user_by_id_async(user_id)
+                access = user is None or self._evaluate_access(user)
+            if access:
+                self._access_cache.set(key, access, version=version)
+            return access
+
+        return self._evaluate_access(user)
+
+    def _evaluate_access(self, user: dict) -> bool:
         # Get user's tier
         tier = self.get_user_tier(user)
         logger.info(f"User {str(user.get('_id'))} is on {tier} tier")
@@ -221,6 +357,7 @@ class UserService:
             update_doc,
             upsert=True
         )
+        self.invalidate_preferences(user_id)
 
         return result.modified_count > 0 or result.upserted_id is not None
 
@@ -262,6 +399,7 @@ class UserService:
             update_doc,
             upsert=True,  # harmless if doc doesn't exist; no annotations will be created
         )
+        self.invalidate_preferences(user_id)
 
         return result.modified_count > 0 or result.upserted_id is not None
 
@@ -316,6 +454,7 @@ class UserService:
             update_doc,
             upsert=True
         )
+        self.invalidate_preferences(user_id)
 
         return result.modified_count > 0 or result.upserted_id is not None
 
@@ -374,6 +513,7 @@ class UserService:
             {"_id": ObjectId(user_id)},
             {"$set": {"needs_first_interaction": False}}
         )
+        self.invalidate_user(user_id)
 
         return result.modified_count > 0
 
@@ -16,9 +16,20 @@ Scope:
 
 Providers without renewal needs (Notion, Dropbox, HubSpot, Slack, Discord,
 Trello) are intentionally ignored.
+
+Scheduling: each integration carries `webhook_next_renewal_at`, the time its
+earliest subscription enters the renewal window. A pass only loads the
+integrations that are due (or have never been scheduled), renews them with
+per-provider concurrency limits, and writes the next due time back. Because
+the schedule lives in Mongo, a restart picks up where the last pass left off
+instead of re-renewing everything. A provider answering 429 is left alone
+until its Retry-After passes.
 """
 
+import asyncio
+import hashlib
 import os
+import time
 import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional
@@ -35,7 +46,17 @@ logger = setup_logger(__name__)
 
 # Re-register when the existing subscription expires within this window.
 RENEW_WHEN_LESS_THAN = timedelta(hours=24)
-SCAN_INTERVAL_MINUTES = 60
+SCAN_INTERVAL_MINUTES = 15
+
+# Due times are pulled forward by up to this much (stable per integration) to spread renewals.
+SCHEDULE_JITTER = timedelta(hours=2)
+# Look at every integration at least this often, in case webhook_info was rewritten elsewhere.
+MAX_RECHECK_INTERVAL = timedelta(hours=12)
+# Retry delay after a failed renewal.
+RETRY_FAILED_AFTER = timedelta(minutes=30)
+MAX_INTEGRATIONS_PER_PASS = 500
+PROVIDER_CONCURRENCY = {"google": 8, "microsoft": 4, "airtable": 2}
+DEFAULT_RETRY_AFTER_SECONDS = 60
 
 # TTLs we ask for at renewal time. Each must stay under the provider's cap.
 GOOGLE_DRIVE_TTL = timedelta(days=6)
@@ -65,17 +86,43 @@ def _parse_expiration(value: Any) -> Optional[datetime]:
     return None
 
 
-def _expires_soon(expiration: Optional[datetime]) -> bool:
+def _expires_soon(expiration: Optional[datetime], jitter: timedelta = timedelta(0)) -> bool:
+    """Whether a subscription is inside its renew window (widened by the integration's jitter)."""
     if not expiration:
         return False
     if expiration.tzinfo is None:
         expiration = expiration.replace(tzinfo=timezone.utc)
-    return (expiration - datetime.now(timezone.utc)) <= RENEW_WHEN_LESS_THAN
+    return (expiration - datetime.now(timezone.utc)) <= RENEW_WHEN_LESS_THAN + jitter
+
+
+def _jitter(integration_id: str) -> timedelta:
+    digest = hashlib.sha256(integration_id.encode()).digest()
+    return SCHEDULE_JITTER * (int.from_bytes(digest[:4], "big") / 0xFFFFFFFF)
+
+
+def _service_provider(service: str, name: Optional[str]) -> str:
+    if service.startswith("airtable:"):
+        return "airtable"
+    if service in ("outlook", "onedrive"):
+        return "microsoft"
+    if service == "calendar" and (name and name.startswith("microsoft") or name == "outlook"):
+        return "microsoft"
+    return "google"
+
+
+def _retry_after_seconds(response: httpx.Response) -> float:
+    try:
+        return max(1.0, float(response.headers.get("Retry-After", DEFAULT_RETRY_AFTER_SECONDS)))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER_SECONDS
 
 
 class WebhookRenewalService:
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
+        self._provider_limits: Dict[str, asyncio.Semaphore] = {}
+        # provider -> monotonic time until which it asked us to back off
+        self._backoff_until: Dict[str, float] = {}
 
     def start(self):
         self.scheduler.add_job(
@@ -98,30 +145,123 @@ class WebhookRenewalService:
         logger.info("Webhook renewal scheduler stopped")
 
     async def renew_all(self):
-        cursor = db_manager.db["integrations"].find(
-            {"webhook_info": {"$exists": True, "$ne": None}}
+        # Due-date scan is served by the webhook_next_renewal_at index (db_indexes). The index
+        # is not sparse, so integrations never scheduled (field missing, matched by None)
+        # are read through it too.
+        integrations = db_manager.db["integrations"]
+
+        now = datetime.now(timezone.utc)
+        cursor = integrations.find({
+            "webhook_info": {"$exists": True, "$ne": None},
+            "$or": [
+                {"webhook_next_renewal_at": {"$lte": now}},
+                {"webhook_next_renewal_at": None},
+            ],
+        }).sort("webhook_next_renewal_at", 1).limit(MAX_INTEGRATIONS_PER_PASS)
+        due = await cursor.to_list(length=MAX_INTEGRATIONS_PER_PASS)
+        if not due:
+            return
+
+        outcomes = await asyncio.gather(*(self._process_integration(integration) for integration in due))
+        renewed = sum(r for r, _ in outcomes)
+        failed = sum(f for _, f in outcomes)
+        logger.info(
+            f"Webhook renewal pass complete: integrations_due={len(due)}, renewed={renewed}, failed={failed}"
         )
+
+    async def _process_integration(self, integration: Dict[str, Any]) -> tuple:
+        """Renew the expiring subscriptions of one integration and schedule its next pass."""
         renewed = 0
         failed = 0
-        async for integration in cursor:
-            for service, expiry in self._expiring_services(integration):
-                try:
-                    ok = await self._renew(integration, service, expiry)
-                except Exception as e:
-                    logger.error(
-                        f"Renewal threw for integration={integration.get('_id')} service={service}: {e}",
-                        exc_info=True,
-                    )
-                    ok = False
-                if ok:
-                    renewed += 1
-                else:
-                    failed += 1
-        if renewed or failed:
-            logger.info(f"Webhook renewal pass complete: renewed={renewed}, failed={failed}")
+        services = self._expiring_services(integration)
+        # Sequential within an integration: its services share one credential refresh.
+        results = [await self._renew_limited(integration, service, expiry) for service, expiry in services]
+        for ok in results:
+            if ok:
+                renewed += 1
+            else:
+                failed += 1
+
+        try:
+            await self._schedule_next(integration, failed_providers={
+                _service_provider(service, integration.get("name"))
+                for (service, _), ok in zip(services, results) if not ok
+            })
+        except Exception as e:
+            logger.error(f"Failed to schedule next webhook renewal for integration={integration.get('_id')}: {e}")
+        return renewed, failed
+
+    async def _renew_limited(self, integration: Dict[str, Any], service: str, expiry: Optional[datetime]) -> bool:
+        provider = _service_provider(service, integration.get("name"))
+        semaphore = self._provider_limits.get(provider)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(PROVIDER_CONCURRENCY.get(provider, 2))
+            self._provider_limits[provider] = semaphore
+        async with semaphore:
+            if self._backoff_until.get(provider, 0) > time.monotonic():
+                # Deferred; _schedule_next retries after the provider's Retry-After.
+                return False
+            try:
+                return await self._renew(integration, service, expiry)
+            except Exception as e:
+                logger.error(
+                    f"Renewal threw for integration={integration.get('_id')} service={service}: {e}",
+                    exc_info=True,
+                )
+                return False
+
+    async def _schedule_next(self, integration: Dict[str, Any], failed_providers: set):
+        """Persist when this integration next needs attention."""
+        integrations = db_manager.db["integrations"]
+        current = await integrations.find_one(
+            {"_id": integration["_id"]},
+            projection={"name": 1, "webhook_info": 1},
+        )
+        if not current:
+            return
+
+        now = datetime.now(timezone.utc)
+        next_due = now + MAX_RECHECK_INTERVAL
+        expiries = [expiry for _, expiry in self._service_expiries(current) if expiry]
+        if expiries:
+            earliest = min(e if e.tzinfo else e.replace(tzinfo=timezone.utc) for e in expiries)
+            next_due = min(next_due, earliest - RENEW_WHEN_LESS_THAN - _jitter(str(integration["_id"])))
+        if failed_providers:
+            retry_at = now + RETRY_FAILED_AFTER
+            for provider in failed_providers:
+                backoff = self._backoff_until.get(provider, 0) - time.monotonic()
+                if backoff > 0:
+                    retry_at = max(retry_at, now + timedelta(seconds=backoff))
+            next_due = max(next_due, retry_at)
+
+        await integrations.update_one(
+            {"_id": integration["_id"]},
+            {"$set": {"webhook_next_renewal_at": next_due}},
+        )
+
+    def _note_rate_limit(self, provider: str, response: httpx.Response):
+        """Back off a provider that throttled us, for as long as it asked."""
+        throttled = response.status_code == 429 or (
+            response.status_code == 403 and "ratelimitexceeded" in response.text.lower()
+        )
+        if not throttled:
+            return
+        retry_after = _retry_after_seconds(response)
+        self._backoff_until[provider] = max(self._backoff_until.get(provider, 0), time.monotonic() + retry_after)
+        logger.warning(f"{provider} is rate limiting webhook renewals; backing off for {retry_after:.0f}s")
 
     def _expiring_services(self, integration: Dict[str, Any]) -> List[tuple]:
         """Yield (service_key, expiration_dt) tuples that need renewal."""
+        # Same per-integration jitter as _schedule_next, so an integration woken
+        # early by its jitter renews then instead of being re-scheduled every pass.
+        jitter = _jitter(str(integration["_id"]))
+        return [
+            (key, expiry) for key, expiry in self._service_expiries(integration)
+            if _expires_soon(expiry, jitter)
+        ]
+
+    def _service_expiries(self, integration: Dict[str, Any]) -> List[tuple]:
+        """(service_key, expiration_dt) for every renewable subscription on the integration."""
         out: List[tuple] = []
         webhook_info = integration.get("webhook_info") or {}
         name = integration.get("name")
@@ -136,15 +276,11 @@ class WebhookRenewalService:
             # under .calendar too. Use the integration name to route correctly.
             if key == "calendar" and name and name not in ("google", "microsoft", "google_calendar", "outlook"):
                 continue
-            expiry = _parse_expiration(entry.get("webhook_expiration"))
-            if _expires_soon(expiry):
-                out.append((key, expiry))
+            out.append((key, _parse_expiration(entry.get("webhook_expiration"))))
 
         airtable = webhook_info.get("airtable") or {}
         for hook in airtable.get("webhooks", []) or []:
-            expiry = _parse_expiration(hook.get("expiration_time"))
-            if _expires_soon(expiry):
-                out.append((f"airtable:{hook.get('webhook_id')}", expiry))
+            out.append((f"airtable:{hook.get('webhook_id')}", _parse_expiration(hook.get("expiration_time"))))
 
         return out
 
@@ -207,6 +343,7 @@ class WebhookRenewalService:
                 json=watch_request,
             )
             if response.status_code != 200:
+                self._note_rate_limit("google", response)
                 logger.error(f"Gmail re-watch failed: {response.status_code} - {response.text}")
                 return False
             data = response.json()
@@ -242,6 +379,7 @@ class WebhookRenewalService:
                 params={"pageToken": page_token, "supportsAllDrives": "true"},
             )
             if response.status_code != 200:
+                self._note_rate_limit("google", response)
                 logger.error(f"Drive re-watch failed: {response.status_code} - {response.text}")
                 return False
             data = response.json()
@@ -272,6 +410,7 @@ class WebhookRenewalService:
                 json=watch_request,
             )
             if response.status_code != 200:
+                self._note_rate_limit("google", response)
                 logger.error(f"Calendar re-watch failed: {response.status_code} - {response.text}")
                 return False
             data = response.json()
@@ -314,6 +453,7 @@ class WebhookRenewalService:
                 json={"expirationDateTime": new_expiry.isoformat().replace("+00:00", "Z")},
             )
             if response.status_code not in (200, 204):
+                self._note_rate_limit("microsoft", response)
                 logger.error(f"MS {service_key} renewal failed: {response.status_code} - {response.text}")
                 return False
 
@@ -344,6 +484,7 @@ class WebhookRenewalService:
                 headers={"Authorization": f"Bearer {access_token}"},
             )
             if response.status_code != 200:
+                self._note_rate_limit("airtable", response)
                 logger.error(f"Airtable refresh failed for {webhook_id}: {response.status_code} - {response.text}")
                 return False
             data = response.json()
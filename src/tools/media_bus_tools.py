@@ -68,7 +68,7 @@ def create_media_bus_tools(conversation_id: str, user_id: str, tool_registry = N
             # Validate limit
             limit = max(1, min(limit, 50))
 
-            refs = media_bus.list_media(
+            refs = await media_bus.list_media(
                 conversation_id,
                 file_type=media_type,
                 limit=limit
@@ -188,7 +188,7 @@ def create_media_bus_tools(conversation_id: str, user_id: str, tool_registry = N
             new_img = generate_image("Like the image I just loaded, but with darker colors")
         """
         try:
-            ref = media_bus.get_media(conversation_id, media_id)
+            ref = await media_bus.get_media(conversation_id, media_id)
             
             if not ref:
                 raise Exception(f"Media not found with ID: {media_id}")
@@ -322,7 +322,7 @@ def create_media_bus_tools(conversation_id: str, user_id: str, tool_registry = N
             # Validate limit
             limit = max(1, min(limit, 20))
 
-            refs = media_bus.list_media(
+            refs = await media_bus.list_media(
                 conversation_id,
                 file_type="image",
                 limit=limit
@@ -135,7 +135,7 @@ def create_media_generation_tools(
                 logger.info(f"Downloading {len(media_ids)} reference images from media bus")
                 for mid in media_ids:
                     try:
-                        ref = media_bus.get_media(conversation_id, mid)
+                        ref = await media_bus.get_media(conversation_id, mid)
                         logger.info(f"Fetched media {mid} from media bus: {ref}")
                         if ref and ref.file_type in {"image", "photo"} and ref.url:
                             # Download image bytes
@@ -471,7 +471,7 @@ def create_media_generation_tools(
                 logger.info(f"Downloading {len(media_ids)} reference images from media bus")
                 for mid in media_ids:
                     try:
-                        ref = media_bus.get_media(conversation_id, mid)
+                        ref = await media_bus.get_media(conversation_id, mid)
                         logger.info(f"Fetched media {mid} from media bus: {ref}")
                         if ref and ref.file_type in {"image", "photo"} and ref.url:
                             # Download image bytes
@@ -18,6 +18,7 @@ from src.integrations.trello.trello_client import TrelloIntegration
 from src.integrations.hubspot.hubspot_client import HubSpotIntegration
 from src.integrations.airtable.airtable_client import AirtableIntegration
 from src.core.praxos_client import PraxosClient
+from src.integrations.client_cache import integration_client_cache
 
 # Tool Module Imports
 from src.tools.google_calendar import create_calendar_tools
@@ -336,76 +337,40 @@ class AgentToolsFactory:
          # If no specific tools requested, authenticate all (backward compatibility)
         if required_tool_ids is None:
             needs_gmail = needs_gcal = needs_gdrive = needs_gdocs = needs_gsheets = needs_gslides = needs_outlook = needs_notion = needs_dropbox = needs_trello = needs_hubspot = needs_airtable = True
-        # Only authenticate integrations that are actually needed
-        auth_tasks = []
+        # Only authenticate integrations that are actually needed; authenticated clients are
+        # reused across runs of the same user (see integration_client_cache).
+        integration_classes = [
+            ('gcal', needs_gcal, GoogleCalendarIntegration),
+            ('gmail', needs_gmail, GmailIntegration),
+            ('gdrive', needs_gdrive, GoogleDriveIntegration),
+            ('gdocs', needs_gdocs, GoogleDocsIntegration),
+            ('gsheets', needs_gsheets, GoogleSheetsIntegration),
+            ('gslides', needs_gslides, GoogleSlidesIntegration),
+            ('outlook', needs_outlook, MicrosoftGraphIntegration),
+            ('notion', needs_notion, NotionIntegration),
+            ('dropbox', needs_dropbox, DropboxIntegration),
+            ('trello', needs_trello, TrelloIntegration),
+            ('hubspot', needs_hubspot, HubSpotIntegration),
+            ('airtable', needs_airtable, AirtableIntegration),
+        ]
+        wanted = [(name, cls) for name, needed, cls in integration_classes if needed]
+
+        logger.info(f"Authenticating {len(wanted)} integrations based on required tools")
+
+        results = await asyncio.gather(*(
+            integration_client_cache.get_authenticated(user_id, name, cls)
+            for name, cls in wanted
+        ), return_exceptions=True)
         integration_map = {}
-
-        if needs_gcal:
-            gcal_integration = GoogleCalendarIntegration(user_id)
-            auth_tasks.append(gcal_integration.authenticate())
-            integration_map['gcal'] = (len(auth_tasks) - 1, gcal_integration)
-
-        if needs_gmail:
-            gmail_integration = GmailIntegration(user_id)
-            auth_tasks.append(gmail_integration.authenticate())
-            integration_map['gmail'] = (len(auth_tasks) - 1, gmail_integration)
-
-        if needs_gdrive:
-            gdrive_integration = GoogleDriveIntegration(user_id)
-            auth_tasks.append(gdrive_integration.authenticate())
-            integration_map['gdrive'] = (len(auth_tasks) - 1, gdrive_integration)
-
-        if needs_gdocs:
-            gdocs_integration = GoogleDocsIntegration(user_id)
-            auth_tasks.append(gdocs_integration.authenticate())
-            integration_map['gdocs'] = (len(auth_tasks) - 1, gdocs_integration)
-
-        if needs_gsheets:
-            gsheets_integration = GoogleSheetsIntegration(user_id)
-            auth_tasks.append(gsheets_integration.authenticate())
-            integration_map['gsheets'] = (len(auth_tasks) - 1, gsheets_integration)
-
-        if needs_gslides:
-            gslides_integration = GoogleSlidesIntegration(user_id)
-            auth_tasks.append(gslides_integration.authenticate())
-            integration_map['gslides'] = (len(auth_tasks) - 1, gslides_integration)
-
-        if needs_outlook:
-            outlook_integration = MicrosoftGraphIntegration(user_id)
-            auth_tasks.append(outlook_integration.authenticate())
-            integration_map['outlook'] = (len(auth_tasks) - 1, outlook_integration)
-
-        if needs_notion:
-            notion_integration = NotionIntegration(user_id)
-            auth_tasks.append(notion_integration.authenticate())
-            integration_map['notion'] = (len(auth_tasks) - 1, notion_integration)
-
-        if needs_dropbox:
-            dropbox_integration = DropboxIntegration(user_id)
-            auth_tasks.append(dropbox_integration.authenticate())
-            integration_map['dropbox'] = (len(auth_tasks) - 1, dropbox_integration)
-
-        if needs_trello:
-            trello_integration = TrelloIntegration(user_id)
-            auth_tasks.append(trello_integration.authenticate())
-            integration_map['trello'] = (len(auth_tasks) - 1, trello_integration)
-        if needs_hubspot:
-            hubspot_integration = HubSpotIntegration(user_id)
-            auth_tasks.append(hubspot_integration.authenticate())
-            integration_map['hubspot'] = (len(auth_tasks) - 1, hubspot_integration)
-
-        if needs_airtable:
-            airtable_integration = AirtableIntegration(user_id)
-            auth_tasks.append(airtable_integration.authenticate())
-            integration_map['airtable'] = (len(auth_tasks) - 1, airtable_integration)
-
-        logger.info(f"Authenticating {len(auth_tasks)} integrations based on required tools")
-
-        # Authenticate only the needed integrations
-        if auth_tasks:
-            authenticated_integrations = await asyncio.gather(*auth_tasks, return_exceptions=True)
-        else:
-            authenticated_integrations = []
+        authenticated_integrations = []
+        for idx, ((name, _), result) in enumerate(zip(wanted, results)):
+            if isinstance(result, BaseException):
+                # One failing integration must not take the other tools down with it
+                logger.error(f"Error authenticating {name} for user {user_id}: {result}", exc_info=result)
+                result = (None, False)
+            integration, authenticated = result
+            integration_map[name] = (idx, integration)
+            authenticated_integrations.append(authenticated)
 
         # Load tools for authenticated integrations
         if 'gcal' in integration_map:
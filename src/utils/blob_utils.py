@@ -2,30 +2,42 @@ from azure.storage.blob.aio import BlobServiceClient
 from azure.servicebus.aio import ServiceBusClient
 from src.config.settings import settings
 import base64
+import os
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Optional, Tuple, Union
 from azure.servicebus import ServiceBusMessage
-from azure.storage.blob import BlobSasPermissions, generate_blob_sas
-from datetime import datetime, timedelta
+from src.utils.sas_signer import blob_sas_signer
 
+# Process-wide async client: one HTTP connection pool reused by every blob call.
+_blob_service_client: Optional[BlobServiceClient] = None
 
-async def get_blob_sas_url(blob_name: str, container_name: str = None) -> str:
-    """Generates a SAS URL for a blob."""
-    if container_name is None:
-        container_name = settings.AZURE_BLOB_CONTAINER_NAME
 
-    blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-    async with blob_service_client:
-        blob_client = blob_service_client.get_blob_client(container_name, blob_name)
-
-        sas_token = generate_blob_sas(
-            account_name=blob_service_client.account_name,
-            container_name=container_name,
-            blob_name=blob_name,
-            account_key=blob_service_client.credential.account_key,
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(hours=48)
+def get_blob_service_client() -> BlobServiceClient:
+    """Returns the shared BlobServiceClient, creating it on first use."""
+    global _blob_service_client
+    if _blob_service_client is None:
+        _blob_service_client = BlobServiceClient.from_connection_string(
+            settings.AZURE_STORAGE_CONNECTION_STRING,
+            max_chunk_get_size=settings.BLOB_STREAM_CHUNK_SIZE,
+            max_block_size=settings.BLOB_STREAM_CHUNK_SIZE,
         )
+    return _blob_service_client
+
+
+async def close_blob_service_client():
+    """Closes the shared BlobServiceClient (call on shutdown)."""
+    global _blob_service_client
+    client, _blob_service_client = _blob_service_client, None
+    if client is not None:
+        await client.close()
 
-        return f"{blob_client.url}?{sas_token}"
+
+async def get_blob_sas_url(blob_name: str, container_name: str = None) -> str:
+    """Generates a SAS URL for a blob (signed locally, cached until close to expiry)."""
+    return blob_sas_signer.sign(blob_name, container_name)
+
+async def get_blob_sas_urls(blobs: Iterable[Tuple[str, Optional[str]]]) -> Dict[Tuple[str, str], str]:
+    """Generates SAS URLs for many (blob_name, container_name) pairs, keyed by (container_name, blob_name)."""
+    return blob_sas_signer.sign_many(blobs)
 
 async def get_cdn_url(blob_name: str, container_name: str = "cdn-container") -> str:
     """
@@ -45,15 +57,7 @@ async def get_cdn_url(blob_name: str, container_name: str = "cdn-container") ->
 
 async def upload_to_blob_storage(file_path: str, blob_name: str, container_name: str = None):
     """Uploads a file to Azure Blob Storage."""
-    if container_name is None:
-        container_name = settings.AZURE_BLOB_CONTAINER_NAME
-
-    blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-    async with blob_service_client:
-        container_client = blob_service_client.get_container_client(container_name)
-        with open(file_path, "rb") as data:
-            await container_client.upload_blob(name=blob_name, data=data, overwrite=True)
-    return blob_name
+    return await upload_stream_to_blob_storage(file_path, blob_name, container_name=container_name)
 
 
 from azure.storage.blob import ContentSettings
@@ -63,14 +67,51 @@ async def upload_bytes_to_blob_storage(data: bytes, blob_name: str, content_type
     if container_name is None:
         container_name = settings.AZURE_BLOB_CONTAINER_NAME
 
-    blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-    async with blob_service_client:
-        container_client = blob_service_client.get_container_client(container_name)
+    container_client = get_blob_service_client().get_container_client(container_name)
+    await container_client.upload_blob(
+        name=blob_name,
+        data=data,
+        overwrite=True,
+        content_settings=ContentSettings(content_type=content_type)
+    )
+    return blob_name
+
+async def upload_stream_to_blob_storage(
+    source: Union[str, AsyncIterable[bytes]],
+    blob_name: str,
+    content_type: Optional[str] = None,
+    container_name: str = None,
+    length: Optional[int] = None,
+):
+    """
+    Uploads a file path or an async iterator of byte chunks to Azure Blob Storage.
+
+    The SDK stages the data as blocks of BLOB_STREAM_CHUNK_SIZE, so the whole file is
+    never held in memory.
+    """
+    if container_name is None:
+        container_name = settings.AZURE_BLOB_CONTAINER_NAME
+
+    container_client = get_blob_service_client().get_container_client(container_name)
+    content_settings = ContentSettings(content_type=content_type) if content_type else None
+
+    if isinstance(source, str):
+        with open(source, "rb") as data:
+            await container_client.upload_blob(
+                name=blob_name,
+                data=data,
+                length=length if length is not None else os.path.getsize(source),
+                overwrite=True,
+                content_settings=content_settings,
+                max_concurrency=settings.BLOB_MAX_CONCURRENCY,
+            )
+    else:
         await container_client.upload_blob(
             name=blob_name,
-            data=data,
+            data=source,
+            length=length,
             overwrite=True,
-            content_settings=ContentSettings(content_type=content_type)
+            content_settings=content_settings,
         )
     return blob_name
 
@@ -88,50 +129,74 @@ async def upload_image_to_cdn(data: bytes, blob_name: str, content_type: str = "
     """
     await upload_bytes_to_blob_storage(data, blob_name, content_type, container_name="cdn-container")
     return await get_cdn_url(blob_name, container_name="cdn-container")
-async def download_from_blob_storage_and_encode_to_base64(blob_name: str, container_name: str = None) -> str:
-    """Downloads a file from Azure Blob Storage and encodes it to base64."""
+
+async def iter_blob_chunks(blob_name: str, container_name: str = None) -> AsyncIterator[bytes]:
+    """Streams a blob from Azure Blob Storage as chunks of at most BLOB_STREAM_CHUNK_SIZE bytes."""
     if container_name is None:
         container_name = settings.AZURE_BLOB_CONTAINER_NAME
 
-    blob_service_client = BlobServiceClient.from_connection_string(
-        settings.AZURE_STORAGE_CONNECTION_STRING
-    )
-    async with blob_service_client:
-        container_client = blob_service_client.get_container_client(container_name)
-        blob_client = container_client.get_blob_client(blob_name)
+    blob_client = get_blob_service_client().get_blob_client(container_name, blob_name)
+    downloader = await blob_client.download_blob(max_concurrency=settings.BLOB_MAX_CONCURRENCY)
+    async for chunk in downloader.chunks():
+        yield chunk
+
+async def download_blob_to_file(blob_name: str, file_path: str, container_name: str = None) -> int:
+    """Streams a blob straight to a file on disk. Returns the number of bytes written."""
+    if container_name is None:
+        container_name = settings.AZURE_BLOB_CONTAINER_NAME
 
-        # Download the blob as bytes
-        downloader = await blob_client.download_blob()
-        data = await downloader.readall()
+    blob_client = get_blob_service_client().get_blob_client(container_name, blob_name)
+    downloader = await blob_client.download_blob(max_concurrency=settings.BLOB_MAX_CONCURRENCY)
+    with open(file_path, "wb") as f:
+        return await downloader.readinto(f)
+
+async def encode_base64_stream(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """
+    Base64-encodes a byte stream incrementally.
+
+    Chunks are re-aligned to multiples of 3 bytes so the concatenated output equals
+    base64 of the whole stream; only one chunk is held at a time.
+    """
+    remainder = b""
+    async for chunk in chunks:
+        if remainder:
+            chunk = remainder + chunk
+        cut = len(chunk) - (len(chunk) % 3)
+        remainder = chunk[cut:]
+        if cut:
+            yield base64.b64encode(chunk[:cut]).decode("ascii")
+    if remainder:
+        yield base64.b64encode(remainder).decode("ascii")
+
+async def iter_blob_base64(blob_name: str, container_name: str = None) -> AsyncIterator[str]:
+    """Streams a blob as base64 text pieces."""
+    async for piece in encode_base64_stream(iter_blob_chunks(blob_name, container_name)):
+        yield piece
+
+async def download_from_blob_storage_and_encode_to_base64(blob_name: str, container_name: str = None) -> str:
+    """Downloads a file from Azure Blob Storage and encodes it to base64."""
+    # Encode chunk by chunk: the raw bytes are never held in full alongside the encoded copy.
+    pieces = [piece async for piece in iter_blob_base64(blob_name, container_name)]
+    return "".join(pieces)
 
-        # Encode to base64
-        return base64.b64encode(data).decode("utf-8")
 async def download_from_blob_storage(blob_name: str, container_name: str = None) -> str:
     """Downloads a file from Azure Blob Storage and encodes it to base64."""
     if container_name is None:
         container_name = settings.AZURE_BLOB_CONTAINER_NAME
 
-    blob_service_client = BlobServiceClient.from_connection_string(
-        settings.AZURE_STORAGE_CONNECTION_STRING
-    )
-    async with blob_service_client:
-        container_client = blob_service_client.get_container_client(container_name)
-        blob_client = container_client.get_blob_client(blob_name)
-        
-        # Download the blob as bytes
-        downloader = await blob_client.download_blob()
-        data = await downloader.readall()
-        ## return bytes
-        return data
+    blob_client = get_blob_service_client().get_blob_client(container_name, blob_name)
+
+    # Download the blob as bytes
+    downloader = await blob_client.download_blob(max_concurrency=settings.BLOB_MAX_CONCURRENCY)
+    data = await downloader.readall()
+    ## return bytes
+    return data
 
 
 async def upload_json_to_blob_storage(json_data: dict, blob_name: str):
     """Uploads JSON data to Azure Blob Storage."""
     import json
-    blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-    async with blob_service_client:
-        container_client = blob_service_client.get_container_client(settings.AZURE_BLOB_CONTAINER_NAME)
-        data = json.dumps(json_data,default=str).encode('utf-8')
-        await container_client.upload_blob(name=blob_name, data=data, overwrite=True, content_settings=ContentSettings(content_type="application/json"))
+    container_client = get_blob_service_client().get_container_client(settings.AZURE_BLOB_CONTAINER_NAME)
+    data = json.dumps(json_data,default=str).encode('utf-8')
+    await container_client.upload_blob(name=blob_name, data=data, overwrite=True, content_settings=ContentSettings(content_type="application/json"))
     return blob_name
-    
\ No newline at end of file
@@ -1,17 +1,91 @@
 """
 Circuit breaker pattern implementation for Gmail webhook resilience.
 Prevents cascade failures and provides graceful degradation.
+
+With CIRCUIT_BREAKER_SHARED_STATE, each breaker's state, failure count and half-open probe
+lease live in Redis, so a failing downstream trips the breaker in every gunicorn worker and
+pod at once, and while half-open only the process holding the lease sends a probe. Every
+transition is one Lua script call (atomic across processes). Processes check against a cached
+copy of the shared state that is refreshed in the background at most every
+CIRCUIT_BREAKER_SYNC_INTERVAL_SECONDS, so checking a closed breaker never waits on Redis; only
+failures and half-open probes do. If Redis is unavailable a breaker falls back to its local state.
 """
+import json
+import os
+import socket
 import time
 import asyncio
 import logging
-from typing import Callable, Any, Dict, Optional
+from typing import Callable, Any, Dict, List, Optional
 from enum import Enum
 from dataclasses import dataclass
 
+from src.config.settings import settings
 from src.utils.logging.base_logger import setup_logger
 logger = setup_logger(__name__)
 
+# KEYS: state hash, probe lease.
+# ARGV: action (read/probe/success/failure), failure_threshold, success_threshold,
+#       timeout_ms, reset_timeout_ms, probe_lease_ms.
+# Returns {state, failure_count, success_count, last_failure_ms, granted, circuit_opens, circuit_closes}.
+CIRCUIT_BREAKER_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local action = ARGV[1]
+local failure_threshold = tonumber(ARGV[2])
+local success_threshold = tonumber(ARGV[3])
+local timeout = tonumber(ARGV[4])
+local reset_timeout = tonumber(ARGV[5])
+local lease = tonumber(ARGV[6])
+
+local h = redis.call('HMGET', KEYS[1], 'state', 'failure_count', 'success_count', 'last_failure_ms')
+local state = h[1] or 'closed'
+local failures = tonumber(h[2]) or 0
+local successes = tonumber(h[3]) or 0
+local last_failure = tonumber(h[4]) or 0
+local granted = 1
+
+if state == 'open' and now - last_failure >= timeout then
+  state = 'half_open'
+  successes = 0
+elseif state == 'closed' and last_failure > 0 and now - last_failure >= reset_timeout then
+  failures = 0
+end
+
+if action == 'probe' then
+  if state == 'open' then
+    granted = 0
+  elseif state == 'half_open' and not redis.call('SET', KEYS[2], '1', 'NX', 'PX', lease) then
+    granted = 0
+  end
+elseif action == 'failure' then
+  failures = failures + 1
+  last_failure = now
+  if state == 'half_open' or (state == 'closed' and failures >= failure_threshold) then
+    state = 'open'
+    successes = 0
+    redis.call('HINCRBY', KEYS[1], 'circuit_opens', 1)
+    redis.call('DEL', KEYS[2])
+  end
+elseif action == 'success' and state == 'half_open' then
+  successes = successes + 1
+  redis.call('DEL', KEYS[2])
+  if successes >= success_threshold then
+    state = 'closed'
+    failures = 0
+    successes = 0
+    redis.call('HINCRBY', KEYS[1], 'circuit_closes', 1)
+  end
+end
+
+if action ~= 'read' then
+  redis.call('HSET', KEYS[1], 'state', state, 'failure_count', failures,
+             'success_count', successes, 'last_failure_ms', last_failure)
+end
+local counts = redis.call('HMGET', KEYS[1], 'circuit_opens', 'circuit_closes')
+return {state, failures, successes, last_failure, granted, tonumber(counts[1]) or 0, tonumber(counts[2]) or 0}
+"""
+
 class CircuitState(Enum):
     CLOSED = "closed"      # Normal operation
     OPEN = "open"          # Failing, requests blocked
@@ -23,6 +97,7 @@ class CircuitBreakerConfig:
     timeout: float = 60.0               # Seconds to wait before half-open
     success_threshold: int = 2          # Successes to close from half-open
     reset_timeout: float = 300.0        # Seconds to reset failure count
+    probe_lease: float = 30.0           # Seconds a process holds the shared half-open probe
 
 class CircuitBreaker:
     """
@@ -30,9 +105,13 @@ class CircuitBreaker:
     Prevents repeated calls to failing services and provides graceful degradation.
     """
     
-    def __init__(self, name: str, config: CircuitBreakerConfig = None):
+    def __init__(self, name: str, config: CircuitBreakerConfig = None, shared: Optional[bool] = None,
+                 sync_interval: Optional[float] = None):
         self.name = name
         self.config = config or CircuitBreakerConfig()
+        self.shared = settings.CIRCUIT_BREAKER_SHARED_STATE if shared is None else shared
+        self.sync_interval = (settings.CIRCUIT_BREAKER_SYNC_INTERVAL_SECONDS
+                              if sync_interval is None else sync_interval)
         
         # State tracking
         self.state = CircuitState.CLOSED
@@ -47,8 +126,29 @@ class CircuitBreaker:
             'successful_requests': 0,
             'failed_requests': 0,
             'circuit_opens': 0,
-            'circuit_closes': 0
+            'circuit_closes': 0,
+            'redis_calls': 0,
+            'redis_errors': 0
         }
+
+        # Shared state (CIRCUIT_BREAKER_SHARED_STATE)
+        self.redis_client = None
+        self._script = None
+        self._synced_at = 0.0  # monotonic
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.shared_stats = {'circuit_opens': 0, 'circuit_closes': 0}
+        if self.shared:
+            try:
+                from src.utils.redis_client import redis_client
+                self.redis_client = redis_client
+                self._script = redis_client.register_script(CIRCUIT_BREAKER_SCRIPT)
+            except Exception as e:
+                logger.warning(f"Redis not available for circuit breaker {name}: {e}. Using local state")
+                self.shared = False
+
+    def _keys(self) -> List[str]:
+        # Hash tag keeps both keys in one cluster slot, as the script needs.
+        return [f"circuit_breaker:{{{self.name}}}:state", f"circuit_breaker:{{{self.name}}}:probe"]
     
     async def call(self, func: Callable, *args, **kwargs) -> Any:
         """
@@ -66,10 +166,7 @@ class CircuitBreaker:
         """
         self.stats['total_requests'] += 1
         
-        # Check if circuit should transition states
-        await self._check_state_transition()
-        
-        if self.state == CircuitState.OPEN:
+        if not await self._allow_request():
             logger.warning(f"Circuit breaker {self.name} is OPEN, request blocked")
             raise CircuitBreakerOpenError(f"Circuit breaker {self.name} is open")
         
@@ -89,8 +186,22 @@ class CircuitBreaker:
             await self._record_failure(e)
             raise
     
+    async def _allow_request(self) -> bool:
+        """Whether a request may go through now"""
+        # Check if circuit should transition states
+        await self._check_state_transition()
+
+        if self.shared and self.state == CircuitState.HALF_OPEN:
+            # Only the process holding the probe lease tries the downstream
+            granted = await self._sync('probe')
+            if granted is not None:
+                return granted
+        return self.state != CircuitState.OPEN
+
     async def _check_state_transition(self):
         """Check if circuit breaker should change state"""
+        if self.shared:
+            self._schedule_refresh()
         current_time = time.time()
         
         if self.state == CircuitState.OPEN:
@@ -113,6 +224,8 @@ class CircuitBreaker:
         self.last_success_time = time.time()
         
         if self.state == CircuitState.HALF_OPEN:
+            if self.shared and await self._sync('success') is not None:
+                return
             self.success_count += 1
             logger.debug(f"Circuit breaker {self.name} half-open success: {self.success_count}")
             
@@ -126,11 +239,14 @@ class CircuitBreaker:
     async def _record_failure(self, exception: Exception):
         """Record failed operation"""
         self.stats['failed_requests'] += 1
+        logger.warning(f"Circuit breaker {self.name} recorded failure: {exception}")
+
+        if self.shared and await self._sync('failure') is not None:
+            return
+
         self.failure_count += 1
         self.last_failure_time = time.time()
         
-        logger.warning(f"Circuit breaker {self.name} recorded failure: {exception}")
-        
         if self.state == CircuitState.CLOSED:
             if self.failure_count >= self.config.failure_threshold:
                 logger.error(f"Circuit breaker {self.name} transitioning to OPEN")
@@ -143,6 +259,56 @@ class CircuitBreaker:
             self.success_count = 0
             self.stats['circuit_opens'] += 1
     
+    def _schedule_refresh(self):
+        """Refresh the cached shared state in the background once it is older than sync_interval"""
+        if time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._synced_at = time.monotonic()
+        self._refresh_task = asyncio.create_task(self._sync('read'))
+
+    async def _sync(self, action: str) -> Optional[bool]:
+        """
+        Run one shared transition and adopt the resulting state.
+        Returns whether the request is granted (for 'probe'), or None if Redis failed.
+        """
+        args = [
+            action,
+            self.config.failure_threshold,
+            self.config.success_threshold,
+            int(self.config.timeout * 1000),
+            int(self.config.reset_timeout * 1000),
+            max(1, int(self.config.probe_lease * 1000)),
+        ]
+        try:
+            self.stats['redis_calls'] += 1
+            result = await self._script(keys=self._keys(), args=args)
+        except Exception as e:
+            self.stats['redis_errors'] += 1
+            logger.error(f"Circuit breaker {self.name} shared state {action} failed: {e}, using local state")
+            return None
+
+        state, failures, successes, last_failure_ms, granted, opens, closes = result
+        self._apply(CircuitState(state), int(failures), int(successes), int(last_failure_ms) / 1000)
+        self.shared_stats = {'circuit_opens': int(opens), 'circuit_closes': int(closes)}
+        self._synced_at = time.monotonic()
+        return bool(int(granted))
+
+    def _apply(self, state: CircuitState, failure_count: int, success_count: int, last_failure_time: float):
+        """Adopt the shared state, counting the transitions this process sees"""
+        if state != self.state:
+            log = logger.error if state == CircuitState.OPEN else logger.info
+            log(f"Circuit breaker {self.name} transitioning to {state.name} (shared)")
+            if state == CircuitState.OPEN:
+                self.stats['circuit_opens'] += 1
+            elif state == CircuitState.CLOSED:
+                self.stats['circuit_closes'] += 1
+        self.state = state
+        self.failure_count = failure_count
+        self.success_count = success_count
+        self.last_failure_time = last_failure_time
+
     def get_state(self) -> Dict[str, Any]:
         """Get current circuit breaker state"""
         return {
@@ -156,13 +322,16 @@ class CircuitBreaker:
                 'failure_threshold': self.config.failure_threshold,
                 'timeout': self.config.timeout,
                 'success_threshold': self.config.success_threshold,
-                'reset_timeout': self.config.reset_timeout
+                'reset_timeout': self.config.reset_timeout,
+                'probe_lease': self.config.probe_lease
             },
-            'stats': self.stats.copy()
+            'stats': self.stats.copy(),
+            'shared': self.shared,
+            'shared_stats': self.shared_stats.copy() if self.shared else None
         }
     
     def reset(self):
-        """Reset circuit breaker to initial state"""
+        """Reset circuit breaker to initial state (this process only; see reset_shared)"""
         logger.info(f"Circuit breaker {self.name} manually reset")
         self.state = CircuitState.CLOSED
         self.failure_count = 0
@@ -170,6 +339,12 @@ class CircuitBreaker:
         self.last_failure_time = 0
         self.last_success_time = 0
 
+    async def reset_shared(self):
+        """Reset the circuit breaker in every process"""
+        self.reset()
+        if self.shared:
+            await self.redis_client.delete(*self._keys())
+
 class CircuitBreakerOpenError(Exception):
     """Raised when circuit breaker is open and blocks requests"""
     pass
@@ -213,6 +388,69 @@ def get_all_circuit_breakers() -> Dict[str, CircuitBreaker]:
         'pubsub': pubsub_breaker
     }
 
+async def publish_circuit_breaker_metrics(ttl_seconds: int = 300) -> Dict[str, Dict[str, Any]]:
+    """
+    Publish this process's snapshot of every circuit breaker and return the snapshots of all
+    processes that published within ttl_seconds, keyed by "host:pid".
+    Without shared state only this process's snapshot is returned.
+    """
+    breakers = get_all_circuit_breakers()
+    for breaker in breakers.values():
+        if breaker.shared:
+            await breaker._sync('read')
+    process = f"{socket.gethostname()}:{os.getpid()}"
+    snapshot = {
+        'published_at': time.time(),
+        'breakers': {name: breaker.get_state() for name, breaker in breakers.items()},
+    }
+    if not any(breaker.shared for breaker in breakers.values()):
+        return {process: snapshot}
+
+    redis_client = next(b.redis_client for b in breakers.values() if b.shared)
+    key = "circuit_breaker:metrics"
+    try:
+        await redis_client.hset(key, process, json.dumps(snapshot))
+        await redis_client.expire(key, ttl_seconds)
+        published = await redis_client.hgetall(key)
+    except Exception as e:
+        logger.error(f"Failed to publish circuit breaker metrics: {e}")
+        return {process: snapshot}
+
+    snapshots = {}
+    stale = []
+    for name, raw in published.items():
+        entry = json.loads(raw)
+        if time.time() - entry.get('published_at', 0) > ttl_seconds:
+            stale.append(name)
+        else:
+            snapshots[name] = entry
+    if stale:
+        await redis_client.hdel(key, *stale)
+    return snapshots
+
+
+async def run_circuit_breaker_metrics_publisher(interval_seconds: Optional[float] = None):
+    """
+    Publish this process's circuit breaker snapshot every interval_seconds until cancelled,
+    warning about breakers that are not closed in any process.
+    """
+    interval = interval_seconds or settings.CIRCUIT_BREAKER_METRICS_INTERVAL_SECONDS
+    ttl_seconds = max(300, int(interval * 3))
+    while True:
+        try:
+            snapshots = await publish_circuit_breaker_metrics(ttl_seconds=ttl_seconds)
+            tripped = sorted({
+                f"{name}={state['state']}"
+                for snapshot in snapshots.values()
+                for name, state in snapshot['breakers'].items()
+                if state['state'] != CircuitState.CLOSED.value
+            })
+            if tripped:
+                logger.warning(f"Circuit breakers not closed across {len(snapshots)} process(es): {', '.join(tripped)}")
+        except Exception as e:
+            logger.error(f"Circuit breaker metrics publisher error: {e}")
+        await asyncio.sleep(interval)
+
 async def test_circuit_breaker():
     """Test circuit breaker functionality"""
     logger.info("🔧 Testing Circuit Breaker...")
@@ -0,0 +1,226 @@
+"""
+Incremental cache of the recent message window of each conversation.
+
+Every agent run rebuilds the conversation history from the last N messages. Rather than
+re-reading all N from Mongo each turn, the raw message documents of the window are kept per
+(conversation, category filter) together with its high-water mark, the newest message
+timestamp. A later read only fetches the messages at or after that mark, merges them in and
+trims the window back to N, so the Mongo read per turn is proportional to what is new.
+Alongside the raw window, file_msg_utils.get_conversation_history keeps the model messages it
+built and normalized from it (`get_built` / `set_built`), so it only builds and normalizes the
+messages added since the previous turn.
+
+- The window lives in-process (TTLCache) and, with HISTORY_CACHE_REDIS_ENABLED, in Redis too,
+  so a conversation whose turns land on different workers still reads incrementally.
+- The fetch starts HISTORY_CACHE_OVERLAP_SECONDS before the mark, and documents already in
+  the window are dropped by _id, so messages buffered with a slightly older timestamp are
+  not lost.
+- Anything that edits messages already in a window (consolidation, media descriptions,
+  async tool results, deletion) must call `invalidate(conversation_id)`; entries also expire.
+  With HISTORY_CACHE_REDIS_ENABLED, invalidation bumps a per-conversation version in Redis
+  and every read checks it, so an edit made on another worker is seen on the next read rather
+  than when the local window expires. Without it the cache is process-local: reads make no
+  Redis calls and invalidation only reaches the current worker.
+"""
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+
+from src.config.settings import settings
+from src.utils.logging.base_logger import setup_logger
+from src.utils.ttl_cache import TTLCache
+
+logger = setup_logger(__name__)
+
+REDIS_KEY_PREFIX = "history_window:"
+VERSION_KEY_PREFIX = "history_version:"
+
+
+def _categories_key(categories: Optional[List[str]]) -> str:
+    # None and [] both mean "all categories" to get_conversation_messages.
+    return ",".join(sorted(categories)) if categories else "*"
+
+
+def _sort_key(doc: Dict[str, Any]) -> Tuple:
+    return (doc.get("timestamp"), str(doc.get("_id")))
+
+
+class ConversationHistoryCache:
+    """Raw message windows keyed by (conversation_id, categories), refreshed incrementally."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, redis_enabled: bool = False, overlap_seconds: float = 5.0):
+        self.ttl_seconds = ttl_seconds
+        self.redis_enabled = redis_enabled
+        self.overlap = timedelta(seconds=overlap_seconds)
+        # conversation_id -> (shared version, {categories_key: (limit, [message docs])}, {built key: value})
+        self._local = TTLCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self.stats = {
+            'full_loads': 0,
+            'incremental_loads': 0,
+            'redis_hits': 0,
+            'stale_windows': 0,
+            'messages_fetched': 0,
+            'messages_reused': 0,
+        }
+
+    @staticmethod
+    def _redis():
+        try:
+            from src.utils.redis_client import redis_client
+            return redis_client
+        except Exception:
+            return None
+
+    async def get_messages(self, db, conversation_id: str, limit: int = 50, categories: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Same result as `db.get_conversation_messages(conversation_id, limit, categories)`:
+        the newest `limit` messages, oldest first. Callers must not mutate the documents.
+        """
+        conversation_id = str(conversation_id)
+        cat_key = _categories_key(categories)
+        version = self._local.version(conversation_id)
+        shared_version, redis_window = await self._redis_read(conversation_id, cat_key)
+
+        entry = self._local.get(conversation_id)
+        windows, built = {}, {}
+        if entry is not None:
+            if entry[0] == shared_version:
+                windows, built = entry[1], entry[2]
+            else:
+                # Invalidated by another worker since this window was built
+                self.stats['stale_windows'] += 1
+        window = windows.get(cat_key)
+        if window is None and redis_window is not None:
+            window = redis_window
+            self.stats['redis_hits'] += 1
+
+        if window is not None and window[0] == limit and window[1]:
+            cached = window[1]
+            since = cached[-1]["timestamp"] - self.overlap
+            fetched = await db.get_conversation_messages_since(conversation_id, since, limit=limit, categories=categories)
+            known = {doc["_id"] for doc in cached}
+            fresh = [doc for doc in fetched if doc["_id"] not in known]
+            messages = sorted(cached + fresh, key=_sort_key)[-limit:] if fresh else cached
+            changed = bool(fresh)
+            self.stats['incremental_loads'] += 1
+            self.stats['messages_fetched'] += len(fetched)
+            self.stats['messages_reused'] += len(messages) - len(fresh)
+        else:
+            messages = await db.get_conversation_messages(conversation_id, limit=limit, categories=categories)
+            changed = True
+            self.stats['full_loads'] += 1
+            self.stats['messages_fetched'] += len(messages)
+
+        if version == self._local.version(conversation_id):
+            entry = self._local.get(conversation_id)
+            if entry is not None and entry[0] == shared_version:
+                windows, built = dict(entry[1]), entry[2]
+            else:
+                windows, built = {}, {}
+            windows[cat_key] = (limit, messages)
+            self._local.set(conversation_id, (shared_version, windows, built), version=version)
+            if self.redis_enabled and changed:
+                await self._redis_set(conversation_id, cat_key, limit, messages, shared_version)
+        return list(messages)
+
+    def local_version(self, conversation_id: Any) -> int:
+        """Token for `set_built`; read it before `get_messages`."""
+        return self._local.version(str(conversation_id))
+
+    def get_built(self, conversation_id: Any, key: Any) -> Any:
+        """What `set_built` stored for the conversation's current window, or None."""
+        entry = self._local.get(str(conversation_id))
+        return entry[2].get(key) if entry is not None else None
+
+    def set_built(self, conversation_id: Any, key: Any, value: Any, version: int):
+        """
+        Store a value derived from the window `get_messages` just returned. Dropped when the
+        conversation was invalidated since `version` was read; dropped with the window later.
+        """
+        conversation_id = str(conversation_id)
+        entry = self._local.get(conversation_id)
+        if entry is None or version != self._local.version(conversation_id):
+            return
+        built = dict(entry[2])
+        built[key] = value
+        self._local.set(conversation_id, (entry[0], entry[1], built), version=version)
+
+    async def invalidate(self, conversation_id: Any):
+        """Drop every cached window of a conversation, in every worker."""
+        conversation_id = str(conversation_id)
+        self._local.invalidate(conversation_id)
+        if not self.redis_enabled:
+            return
+        redis_client = self._redis()
+        if redis_client is None:
+            return
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.incr(VERSION_KEY_PREFIX + conversation_id)
+                pipe.expire(VERSION_KEY_PREFIX + conversation_id, int(self.ttl_seconds))
+                pipe.delete(REDIS_KEY_PREFIX + conversation_id)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to invalidate cached history of {conversation_id} in Redis: {e}")
+
+    async def invalidate_for_messages(self, messages_collection, message_ids: List[Any]):
+        """Invalidate the conversations that own the given message ids."""
+        if not message_ids:
+            return
+        obj_ids = [mid if isinstance(mid, ObjectId) else ObjectId(mid) for mid in message_ids]
+        try:
+            conversation_ids = await messages_collection.distinct("conversation_id", {"_id": {"$in": obj_ids}})
+        except Exception as e:
+            logger.warning(f"Could not resolve conversations to invalidate, clearing history cache: {e}")
+            self._local.clear()
+            return
+        for conversation_id in conversation_ids:
+            await self.invalidate(conversation_id)
+
+    async def _redis_read(self, conversation_id: str, cat_key: str) -> Tuple[Optional[str], Optional[Tuple[int, List[Dict]]]]:
+        """The conversation's shared version and its window in Redis (one round trip; none when disabled)."""
+        if not self.redis_enabled:
+            return None, None
+        redis_client = self._redis()
+        if redis_client is None:
+            return None, None
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(VERSION_KEY_PREFIX + conversation_id)
+                pipe.hget(REDIS_KEY_PREFIX + conversation_id, cat_key)
+                shared_version, raw = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to read cached history of {conversation_id} from Redis: {e}")
+            return None, None
+        if not raw:
+            return shared_version, None
+        data = json_util.loads(raw)
+        if data.get("version") != shared_version:
+            return shared_version, None
+        return shared_version, (data["limit"], data["messages"])
+
+    async def _redis_set(self, conversation_id: str, cat_key: str, limit: int, messages: List[Dict], shared_version: Optional[str]):
+        try:
+            from src.utils.redis_client import redis_client
+            key = REDIS_KEY_PREFIX + conversation_id
+            payload = json_util.dumps({"limit": limit, "messages": messages, "version": shared_version})
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.hset(key, cat_key, payload)
+                pipe.expire(key, int(self.ttl_seconds))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to store history of {conversation_id} in Redis: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics for monitoring"""
+        return {**self.stats, 'local': self._local.get_stats()}
+
+
+# Global instance
+conversation_history_cache = ConversationHistoryCache(
+    ttl_seconds=settings.HISTORY_CACHE_TTL_SECONDS,
+    max_entries=settings.HISTORY_CACHE_MAX_ENTRIES,
+    redis_enabled=settings.HISTORY_CACHE_REDIS_ENABLED,
+    overlap_seconds=settings.HISTORY_CACHE_OVERLAP_SECONDS,
+)
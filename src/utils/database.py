@@ -6,12 +6,28 @@ import json
 from datetime import datetime, timedelta,timezone
 from typing import Dict, List, Optional, Any
 from bson import ObjectId
-from pymongo.errors import OperationFailure,BulkWriteError
-from pymongo import InsertOne, UpdateOne
+from pymongo.errors import OperationFailure,BulkWriteError,DuplicateKeyError
+from pymongo import InsertOne, UpdateOne, ReturnDocument
 from src.config.settings import settings
 from src.utils.logging.base_logger import setup_logger
 from src.services.ai_service.ai_service import ai_service
 from src.services.message_encryption import message_encryption
+from src.utils.message_write_buffer import get_active_write_buffer, flush_pending_messages
+from src.utils.conversation_history_cache import conversation_history_cache
+from src.utils.db_indexes import check_query_plans, ensure_indexes
+from src.utils.ttl_cache import TTLCache
+from src.integrations.client_cache import integration_client_cache
+
+# Field projections for the message readers, so callers that only need a few fields
+# don't pull large content/metadata blobs over the wire.
+MESSAGE_TEXT_PROJECTION = {"role": 1, "content": 1, "timestamp": 1}
+MESSAGE_CONSOLIDATION_PROJECTION = {**MESSAGE_TEXT_PROJECTION, "metadata.inserted_id": 1}
+CONVERSATION_SUMMARY_PROJECTION = {"user_id": 1, "platform": 1, "name": 1, "status": 1, "start_time": 1, "last_activity": 1}
+ACTIVE_CONVERSATION_PROJECTION = {"platform": 1, "last_activity": 1, "expires_at": 1}
+# Per active_key version in Redis, bumped by whichever worker retires the key's conversation
+ACTIVE_VERSION_KEY_PREFIX = "active_conversation_version:"
+# Returned when the shared version cannot be read; never equal to a cached one
+_VERSION_UNAVAILABLE = object()
 
 class ConversationDatabase:
     def __init__(self, connection_string: str = settings.MONGO_CONNECTION_STRING, db_name: str = settings.MONGO_DB_NAME):
@@ -22,27 +38,19 @@ class ConversationDatabase:
         self.messages = self.db["messages"]
         self.search_attempts = self.db["search_attempts"]
         self.message_status = self.db["message_status"]
+        self.consolidation_leases = self.db["consolidation_leases"]
         self.logger = setup_logger(__name__)
+        self.inactivity_timeout = timedelta(seconds=settings.CONVERSATION_INACTIVITY_TIMEOUT_SECONDS)
+        # active_key -> (shared version, {_id, platform, last_activity, expires_at} of the active conversation)
+        self._active_conversations = TTLCache(
+            ttl_seconds=settings.ACTIVE_CONVERSATION_CACHE_TTL_SECONDS,
+            max_entries=settings.ACTIVE_CONVERSATION_CACHE_MAX_ENTRIES,
+        )
 
 
-    async def _create_index_if_not_exists(self, collection, keys, **kwargs):
-        """Helper to create an index and ignore NamespaceExists error."""
-        try:
-            await collection.create_index(keys, **kwargs)
-        except OperationFailure as e:
-            if e.code != 48: # NamespaceExists error code
-                raise
-
     async def init_database(self):
-        """Initialize indexes for collections."""
-        # Index for finding active conversations for a user, sorted by recent activity
-        await self._create_index_if_not_exists(self.conversations, [("user_id", 1), ("status", 1), ("last_activity", -1)])
-        
-        # Existing indexes
-        await self._create_index_if_not_exists(self.conversations, [("last_activity", 1)])
-        await self._create_index_if_not_exists(self.messages, [("conversation_id", 1)])
-        await self._create_index_if_not_exists(self.search_attempts, [("conversation_id", 1)])
-        await self._create_index_if_not_exists(self.message_status, [("message_id", 1)])
+        """Initialize indexes for collections (see db_indexes for the declarations)."""
+        return await ensure_indexes(self.db)
 
     async def store_message_status(self, message_id: str, conversation_id: str, platform: str, 
                                    status: str, error_info: str = None):
@@ -73,11 +81,13 @@ class ConversationDatabase:
 
     async def create_conversation(self, user_id: str, platform: str, context_boundary_id: Optional[str] = None) -> str:
         """Create a new conversation and return its ID."""
+        now = datetime.utcnow()
         doc = {
             "user_id": ObjectId(user_id),
             "platform": platform,
-            "start_time": datetime.utcnow(),
-            "last_activity": datetime.utcnow(),
+            "start_time": now,
+            "last_activity": now,
+            "expires_at": now + self.inactivity_timeout,
             "status": "active",
             "metadata": {},
             "name": None  # Will be populated by auto-namer
@@ -104,9 +114,122 @@ class ConversationDatabase:
         )
         return str(convo["_id"]) if convo else None
 
-    async def get_conversation_info(self, conversation_id: str) -> Optional[Dict]:
-        """Get conversation information by ID."""
-        return await self.conversations.find_one({"_id": ObjectId(conversation_id)})
+    @staticmethod
+    def _active_conversation_owner(user_id: str, context_boundary_id: Optional[str] = None):
+        """Key and query of the active conversation of a user's DMs or of a group chat."""
+        if context_boundary_id:
+            return f"boundary:{context_boundary_id}", {"context_boundary_id": context_boundary_id, "status": "active"}
+        # Explicitly avoid returning group chats for DM queries
+        return f"user:{user_id}", {"user_id": ObjectId(user_id), "status": "active", "context_boundary_id": {"$exists": False}}
+
+    async def get_or_create_active_conversation(
+        self,
+        user_id: str,
+        platform: str,
+        context_boundary_id: Optional[str] = None,
+        newer_than: Optional[datetime] = None
+    ):
+        """
+        Return (conversation, created): the active conversation of the user (or of the context
+        boundary), created if there is none, in one find_one_and_update with upsert.
+        The conversation holds only _id, platform, last_activity and expires_at.
+
+        New conversations carry `active_key`, which has a unique partial index, so concurrent
+        events of the same user cannot create two conversations; the loser of the race reads
+        the winner's. A conversation served from the in-process cache is never past expires_at,
+        and is only served while the key's shared version in Redis is the one it was cached
+        under, so a conversation retired by another worker is not reused.
+
+        `newer_than` skips active conversations last active at or before it (used right after
+        retiring one, so an older leftover active conversation is not picked up instead); such a
+        leftover that still holds the key is retired too, so the new conversation can take it.
+        """
+        key, query = self._active_conversation_owner(user_id, context_boundary_id)
+        now = datetime.utcnow()
+        local_version = self._active_conversations.version(key)
+        shared_version = await self._active_version(key)
+        if newer_than is not None:
+            query["last_activity"] = {"$gt": newer_than}
+        else:
+            cached = self._active_conversations.get(key)
+            if cached is not None and cached[0] == shared_version and cached[1]["expires_at"] > now:
+                return dict(cached[1]), False
+
+        new_id = ObjectId()
+        doc = {
+            "_id": new_id,
+            "user_id": ObjectId(user_id),
+            "platform": platform,
+            "start_time": now,
+            "last_activity": now,
+            "expires_at": now + self.inactivity_timeout,
+            "metadata": {},
+            "name": None,  # Will be populated by auto-namer
+            "active_key": key,
+        }
+        if context_boundary_id:
+            doc["context_boundary_id"] = context_boundary_id
+        for field, value in query.items():
+            if not isinstance(value, dict):
+                doc.pop(field, None)  # Inserted from the query's equality fields
+
+        for attempt in range(3):
+            try:
+                conversation = await self._find_or_insert_active(query, doc)
+                break
+            except DuplicateKeyError:
+                if attempt == 2:
+                    raise
+                # Either another event of this user created it first (the query finds it now), or
+                # the key is held by an older active conversation that `newer_than` skips, e.g. a
+                # WhatsApp conversation left behind a newer (keyless) websocket one: retire it.
+                holder = await self.conversations.find_one({"active_key": key}, ACTIVE_CONVERSATION_PROJECTION)
+                if holder is not None and newer_than is not None and holder["last_activity"] <= newer_than:
+                    self.logger.info(f"Retiring older active conversation {holder['_id']} holding {key}")
+                    await self.mark_conversation_for_consolidation(str(holder["_id"]))
+
+        created = conversation["_id"] == new_id
+        if not conversation.get("expires_at"):
+            conversation["expires_at"] = conversation["last_activity"] + self.inactivity_timeout
+        if shared_version is not _VERSION_UNAVAILABLE:
+            self._active_conversations.set(key, (shared_version, conversation), version=local_version)
+        return dict(conversation), created
+
+    async def _active_version(self, key: str) -> Any:
+        """Shared version of an active_key (None until its conversation is first retired)."""
+        try:
+            from src.utils.redis_client import redis_client
+            return await redis_client.get(ACTIVE_VERSION_KEY_PREFIX + key)
+        except Exception as e:
+            self.logger.warning(f"Failed to read active conversation version of {key}: {e}")
+            return _VERSION_UNAVAILABLE
+
+    async def _retire_active_key(self, key: str):
+        """Drop the cached active conversation of `key` in this and every other worker."""
+        self._active_conversations.invalidate(key)
+        try:
+            from src.utils.redis_client import redis_client
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.incr(ACTIVE_VERSION_KEY_PREFIX + key)
+                # Outlives every entry cached under the previous version
+                pipe.expire(ACTIVE_VERSION_KEY_PREFIX + key, max(int(settings.ACTIVE_CONVERSATION_CACHE_TTL_SECONDS), 1))
+                await pipe.execute()
+        except Exception as e:
+            self.logger.warning(f"Failed to bump active conversation version of {key}: {e}")
+
+    async def _find_or_insert_active(self, query: Dict, doc: Dict) -> Dict:
+        return await self.conversations.find_one_and_update(
+            query,
+            {"$setOnInsert": doc},
+            sort=[("last_activity", -1)],
+            projection=ACTIVE_CONVERSATION_PROJECTION,
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def get_conversation_info(self, conversation_id: str, projection: Optional[Dict] = None) -> Optional[Dict]:
+        """Get conversation information by ID (only the `projection` fields, if given)."""
+        return await self.conversations.find_one({"_id": ObjectId(conversation_id)}, projection)
 
     async def update_conversation_praxos_source_id(self, conversation_id: str, source_id: str):
         """Update the Praxos source ID for a conversation."""
@@ -145,11 +268,22 @@ class ConversationDatabase:
             "timestamp": datetime.utcnow(),
             "is_consolidated": False
         }
+        # Inside an agent turn the write is batched with the rest of the turn (see message_write_buffer).
+        buffer = get_active_write_buffer()
+        if buffer is not None:
+            message_id = buffer.add(message_doc)
+            if message_id is not None:
+                return message_id
+
         result = await self.messages.insert_one(message_doc)
-        
+
+        now = datetime.utcnow()
+        activity = {"last_activity": now, "expires_at": now + self.inactivity_timeout}
+        if role == 'user':
+            activity["last_user_activity"] = now
         await self.conversations.update_one(
             {"_id": ObjectId(conversation_id)},
-            {"$set": {"last_activity": datetime.utcnow()}}
+            {"$set": activity}
         )
         return str(result.inserted_id)
 
@@ -157,18 +291,22 @@ class ConversationDatabase:
         self,
         conversation_id: str,
         limit: int = 50,
-        categories: Optional[List[str]] = None
+        categories: Optional[List[str]] = None,
+        projection: Optional[Dict] = None
     ) -> List[Dict]:
-        """Get messages that haven't been consolidated yet."""
+        """Get messages that haven't been consolidated yet (only the `projection` fields, if given)."""
+        await flush_pending_messages()
+        # Point values rather than $ne so the index on (conversation_id, is_consolidated, timestamp)
+        # also provides the sort order.
         query = {
             "conversation_id": ObjectId(conversation_id),
-            "is_consolidated": {"$ne": True}
+            "is_consolidated": {"$in": [False, None]}
         }
 
         if categories is not None and len(categories) > 0:
             query["message_category"] = {"$in": categories}
 
-        cursor = self.messages.find(query).sort("timestamp", 1).limit(limit)
+        cursor = self.messages.find(query, projection).sort("timestamp", 1).limit(limit)
         return await cursor.to_list(length=limit)
 
     async def mark_messages_consolidated(self, message_ids: List[str]):
@@ -181,12 +319,14 @@ class ConversationDatabase:
             {"_id": {"$in": obj_ids}},
             {"$set": {"is_consolidated": True}}
         )
+        await conversation_history_cache.invalidate_for_messages(self.messages, obj_ids)
 
     async def get_conversation_messages(
         self,
         conversation_id: str,
         limit: int = 50,
-        categories: Optional[List[str]] = None
+        categories: Optional[List[str]] = None,
+        projection: Optional[Dict] = None
     ) -> List[Dict]:
         """
         Get the most recent messages for a conversation, ordered by timestamp (oldest first).
@@ -198,22 +338,47 @@ class ConversationDatabase:
                        If None, returns all categories (for backward compatibility).
                        If empty list, returns all categories.
                        If specified, only returns messages in those categories.
+            projection: Fields to return (e.g. MESSAGE_TEXT_PROJECTION); full documents if None.
 
         Returns:
             List of message dictionaries in chronological order (oldest to newest)
         """
+        await flush_pending_messages()
         query = {"conversation_id": ObjectId(conversation_id)}
 
         # Filter by categories if specified
         if categories is not None and len(categories) > 0:
             query["message_category"] = {"$in": categories}
 
-        cursor = self.messages.find(query).sort("timestamp", -1).limit(limit)
+        cursor = self.messages.find(query, projection).sort("timestamp", -1).limit(limit)
         messages = await cursor.to_list(length=limit)
         return list(reversed(messages))  # Reverse to get chronological order (oldest to newest)
 
+    async def get_conversation_messages_since(
+        self,
+        conversation_id: str,
+        since: datetime,
+        limit: int = 50,
+        categories: Optional[List[str]] = None,
+        projection: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Get the most recent messages of a conversation with a timestamp at or after `since`,
+        oldest first. Used to extend a cached history window with only the new messages.
+        """
+        await flush_pending_messages()
+        query = {"conversation_id": ObjectId(conversation_id), "timestamp": {"$gte": since}}
+
+        if categories is not None and len(categories) > 0:
+            query["message_category"] = {"$in": categories}
+
+        cursor = self.messages.find(query, projection).sort("timestamp", -1).limit(limit)
+        messages = await cursor.to_list(length=limit)
+        return list(reversed(messages))
+
     async def get_recent_messages(self, user_id: str, limit: int = 10) -> List[Dict]:
         """Get the most recent messages for a user."""
+        await flush_pending_messages()
         cursor = self.messages.find(
             {"user_id": ObjectId(user_id)}
         ).sort("timestamp", -1).limit(limit)
@@ -239,6 +404,7 @@ class ConversationDatabase:
             )
         if operations:
             result = await self.messages.bulk_write(operations)
+            await conversation_history_cache.invalidate_for_messages(self.messages, list(messages_dict))
             return result
             # self.logger.info(f"Bulk updated {result.modified_count} messages.")
         return None
@@ -271,24 +437,92 @@ class ConversationDatabase:
 
     async def mark_conversation_for_consolidation(self, conversation_id: str):
         """Mark a conversation as ready for consolidation."""
-        await self.conversations.update_one(
+        conversation = await self.conversations.find_one_and_update(
             {"_id": ObjectId(conversation_id)},
-            {"$set": {"status": "ready_for_consolidation"}}
+            {"$set": {"status": "ready_for_consolidation"}, "$unset": {"active_key": ""}},
+            projection={"user_id": 1, "context_boundary_id": 1}
         )
+        if conversation:
+            key, _ = self._active_conversation_owner(conversation.get("user_id"), conversation.get("context_boundary_id"))
+            await self._retire_active_key(key)
+
+    # Ready conversations with activity since their last consolidation pass
+    PENDING_CONSOLIDATION_QUERY = {
+        "status": "ready_for_consolidation",
+        "$or": [
+            {"consolidated_at": {"$exists": False}},
+            {"$expr": {"$gt": ["$last_activity", "$consolidated_at"]}},
+        ],
+    }
 
     async def get_conversations_to_consolidate(self) -> List[Dict]:
         """Get conversations that are ready for consolidation."""
         cursor = self.conversations.find(
-            {"status": "ready_for_consolidation"}
+            self.PENDING_CONSOLIDATION_QUERY
         ).sort("last_activity", 1)
         return await cursor.to_list(length=100)
 
+    async def get_users_pending_consolidation(self, limit: int = 100) -> List[Dict]:
+        """Users with conversations waiting for consolidation, the longest-waiting first."""
+        pipeline = [
+            {"$match": self.PENDING_CONSOLIDATION_QUERY},
+            {"$group": {"_id": "$user_id", "oldest_activity": {"$min": "$last_activity"}, "conversations": {"$sum": 1}}},
+            {"$sort": {"oldest_activity": 1}},
+            {"$limit": limit},
+        ]
+        return await self.conversations.aggregate(pipeline).to_list(length=limit)
+
+    async def get_user_conversations_to_consolidate(self, user_id: Any, limit: int = 100) -> List[Dict]:
+        """A user's conversations waiting for consolidation, in activity order."""
+        cursor = self.conversations.find(
+            {**self.PENDING_CONSOLIDATION_QUERY, "user_id": user_id}
+        ).sort("last_activity", 1)
+        return await cursor.to_list(length=limit)
+
+    async def get_consolidation_backlog(self) -> Dict:
+        """Number of conversations waiting for consolidation and the activity time of the oldest."""
+        pending = await self.conversations.count_documents(self.PENDING_CONSOLIDATION_QUERY)
+        oldest = await self.conversations.find_one(
+            self.PENDING_CONSOLIDATION_QUERY,
+            projection={"last_activity": 1},
+            sort=[("last_activity", 1)],
+        )
+        return {"pending": pending, "oldest_activity": oldest["last_activity"] if oldest else None}
+
+    async def set_conversation_consolidated_at(self, conversation_id: str, consolidated_at: datetime):
+        """Record how far a conversation has been consolidated; later activity makes it pending again."""
+        await self.conversations.update_one(
+            {"_id": ObjectId(conversation_id)},
+            {"$set": {"consolidated_at": consolidated_at}}
+        )
+
+    async def acquire_consolidation_lease(self, user_id: str, owner: str, lease_seconds: float) -> bool:
+        """
+        Take (or extend, if already held by `owner`) the consolidation lease of a user.
+        Returns False while another worker holds an unexpired lease.
+        """
+        now = datetime.utcnow()
+        try:
+            await self.consolidation_leases.update_one(
+                {"_id": user_id, "$or": [{"lease_until": {"$lt": now}}, {"owner": owner}]},
+                {"$set": {"owner": owner, "lease_until": now + timedelta(seconds=lease_seconds), "renewed_at": now}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # The lease document exists and is held by someone else.
+            return False
+
+    async def release_consolidation_lease(self, user_id: str, owner: str):
+        """Release a user's consolidation lease if `owner` still holds it."""
+        await self.consolidation_leases.delete_one({"_id": user_id, "owner": owner})
+
     async def mark_conversation_consolidated(self, conversation_id: str):
         """Mark a conversation as consolidated."""
         try:
             result = await self.conversations.update_one(
                 {"_id": ObjectId(conversation_id)},
-                {"$set": {"status": "consolidated"}}
+                {"$set": {"status": "consolidated"}, "$unset": {"active_key": ""}}
             )
             if result.modified_count > 0:
                 self.logger.info(f"Successfully marked conversation {conversation_id} as consolidated.")
@@ -303,16 +537,20 @@ class ConversationDatabase:
         """Get a user by phone number."""
         return await self.users.find_one({"phone_number": phone_number})
     
-    async def is_conversation_expired(self, conversation_id: str, timeout_minutes:int,payload:dict) -> bool:
-        """Check if a conversation has exceeded the inactivity timeout."""
-        conversation = await self.get_conversation_info(conversation_id)
+    async def is_conversation_expired(self, conversation_id: str, timeout_minutes:int,payload:dict, conversation: Optional[Dict] = None) -> bool:
+        """
+        Check if a conversation has exceeded the inactivity timeout. Pass `conversation` (with
+        last_activity) when it is already loaded; the recent messages are only read once the
+        timeout has passed.
+        """
+        if conversation is None:
+            conversation = await self.get_conversation_info(conversation_id, {"last_activity": 1})
         self.logger.info(f"Checking if conversation {conversation_id} is expired. Last activity: {conversation['last_activity'] if conversation else 'N/A'}")
         if not conversation:
             return True
         
         last_activity = conversation['last_activity']
         timeout_delta = timedelta(minutes=timeout_minutes)
-        messages = await self.get_conversation_messages(conversation_id,6)
         input_text = ''
         if isinstance(payload, list):
             ### this is not really the best way to do it, but for now, we'll just concatenate all text parts.
@@ -332,6 +570,7 @@ class ConversationDatabase:
                 return True
 
             self.logger.info(f"Input text for timeout check: {input_text}")
+            messages = await self.get_conversation_messages(conversation_id, 6, projection=MESSAGE_TEXT_PROJECTION)
             ## here, we will add further intelligence.
             prompt = f"User has been inactive for {timeout_minutes} minutes."
             if messages:
@@ -364,6 +603,8 @@ class ConversationDatabase:
             # Delete associated data
             await self.search_attempts.delete_many({"conversation_id": {"$in": old_convo_ids}})
             await self.messages.delete_many({"conversation_id": {"$in": old_convo_ids}})
+            for cid in old_convo_ids:
+                await conversation_history_cache.invalidate(cid)
             
             # Delete the conversations themselves
             await self.conversations.delete_many({"_id": {"$in": [ObjectId(cid) for cid in old_convo_ids]}})
@@ -390,23 +631,12 @@ class DatabaseManager:
         self.messages = self.db["messages"]
         self.agent_triggers = self.db["agent_triggers"]
         self.tool_monitor_collection = self.db["user_tool_monitor"]
-    async def _create_index_if_not_exists(self, collection, keys, **kwargs):
-        """Helper to create an index and ignore NamespaceExists error."""
-        try:
-            await collection.create_index(keys, **kwargs)
-        except OperationFailure as e:
-            # Error code 48 is NamespaceExists, which can happen in Cosmos DB
-            # when the collection already exists. We can safely ignore it.
-            if e.code != 48:
-                raise
-
     async def initialize(self):
-        """MongoDB is schema-less, so we just need to ensure indexes if needed."""
-        await self._create_index_if_not_exists(self.integrations, [("user_id", 1), ("type", 1)], unique=True)
-        await self._create_index_if_not_exists(self.integration_tokens, [("user_id", 1), ("provider", 1)], unique=True)
-        await self._create_index_if_not_exists(self.rate_limits, [("user_id", 1), ("resource_type", 1), ("reset_date", 1)], unique=True)
-        await self._create_index_if_not_exists(self.agent_schedules, [("user_id", 1)])
-        await self._create_index_if_not_exists(self.agent_schedules, [("next_run", 1)])
+        """MongoDB is schema-less, so we just need to ensure indexes (declared in db_indexes)."""
+        result = await ensure_indexes(self.db)
+        if settings.DB_CHECK_QUERY_PLANS:
+            result['query_plans'] = await check_query_plans(self.db)
+        return result
 
     # Auth token management
     async def store_auth_token(self, user_id: str, service: str, access_token: str, 
@@ -430,6 +660,7 @@ class DatabaseManager:
                 }
             },upsert=True
         )
+        await integration_client_cache.invalidate_user(str(user_id))
 
     async def get_auth_token(self, user_id: str, service: str) -> Optional[Dict]:
         """Retrieve OAuth tokens."""
@@ -456,6 +687,7 @@ class DatabaseManager:
                 }
             }
         )
+        await integration_client_cache.invalidate_user(str(user_id))
 
     async def get_last_sync(self, user_id: str, integration_type: str) -> Optional[datetime]:
         """Get last sync timestamp from the integrations collection."""
@@ -738,6 +970,8 @@ class DatabaseManager:
                 "metadata.last_sync_ref": sync_ref,
             }},
         )
+        for conversation_id in await self.messages.distinct("conversation_id", {"metadata.inserted_id": document_id}):
+            await conversation_history_cache.invalidate(conversation_id)
     async def insert_or_reject_items(
         self,
         items: List[Dict[str, Any]],
@@ -0,0 +1,184 @@
+"""
+Declared MongoDB indexes, matched to the query shapes that use them.
+
+Every hot read is listed next to the index that serves it, so a query that changes its filter
+or sort order has an obvious place to update. `ensure_indexes(db)` creates them all and is
+safe to run on every startup (API and workers): create_index is a no-op for an index that
+already exists, and a conflict with an index created by hand is logged instead of stopping
+the process. Indexes are never dropped here; ones left over from older declarations are only
+reported, so they can be removed by hand once nothing reads through them.
+
+`check_query_plans(db)` explains each hot query shape and reports those whose winning plan
+scans the collection or sorts in memory.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from src.utils.logging.base_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# NamespaceExists (Cosmos DB raises it when the collection already exists)
+NAMESPACE_EXISTS = 48
+# An index with these keys or this name already exists with different options
+INDEX_CONFLICT_CODES = (85, 86)
+
+
+@dataclass
+class IndexSpec:
+    collection: str
+    keys: List[Tuple[str, int]]
+    options: Dict[str, Any] = field(default_factory=dict)
+    serves: str = ""
+
+
+INDEXES: List[IndexSpec] = [
+    # conversations
+    IndexSpec("conversations", [("user_id", 1), ("status", 1), ("last_activity", -1)],
+              serves="get_active_conversation (DMs): newest active conversation of a user"),
+    IndexSpec("conversations", [("context_boundary_id", 1), ("status", 1), ("last_activity", -1)],
+              serves="get_active_conversation (group chats)"),
+    IndexSpec("conversations", [("status", 1), ("last_activity", 1)],
+              serves="consolidation backlog scans, oldest activity first"),
+    IndexSpec("conversations", [("last_activity", 1)],
+              serves="cleanup_old_conversations"),
+    IndexSpec("conversations", [("active_key", 1)],
+              {"unique": True, "partialFilterExpression": {"active_key": {"$exists": True}}},
+              serves="one active conversation per user/context boundary (get_or_create_active_conversation)"),
+    # messages
+    IndexSpec("messages", [("conversation_id", 1), ("timestamp", -1)],
+              serves="get_conversation_messages / _since: newest N of a conversation"),
+    IndexSpec("messages", [("conversation_id", 1), ("is_consolidated", 1), ("timestamp", 1)],
+              serves="get_unconsolidated_messages"),
+    IndexSpec("messages", [("user_id", 1), ("timestamp", -1)],
+              serves="get_recent_messages"),
+    # search_attempts / message_status
+    IndexSpec("search_attempts", [("conversation_id", 1), ("timestamp", -1)],
+              serves="get_recent_search_attempts"),
+    IndexSpec("message_status", [("message_id", 1), ("timestamp", -1)],
+              serves="get_message_status"),
+    IndexSpec("message_status", [("conversation_id", 1), ("status", 1), ("timestamp", -1)],
+              serves="get_failed_messages"),
+    # integrations and system data (DatabaseManager)
+    IndexSpec("integrations", [("user_id", 1), ("type", 1)], {"unique": True}),
+    # Not sparse: the due scan also looks up integrations with no webhook_next_renewal_at yet.
+    # An older sparse index on this key is reported as a conflict; drop it by hand.
+    IndexSpec("integrations", [("webhook_next_renewal_at", 1)],
+              serves="webhook renewal due-date scan"),
+    IndexSpec("integration_tokens", [("user_id", 1), ("provider", 1)], {"unique": True}),
+    IndexSpec("rate_limits", [("user_id", 1), ("resource_type", 1), ("reset_date", 1)], {"unique": True}),
+    IndexSpec("agent_schedules", [("user_id", 1)]),
+    IndexSpec("agent_schedules", [("next_run", 1)]),
+    IndexSpec("sources", [("user_id", 1), ("content_sha256", 1)],
+              serves="content-hash dedupe of received files (FileManager.receive_file)"),
+]
+
+
+@dataclass
+class QueryShape:
+    name: str
+    collection: str
+    filter: Dict[str, Any]
+    sort: List[Tuple[str, int]]
+    projection: Optional[Dict[str, Any]] = None
+    limit: int = 50
+
+
+def _hot_queries() -> List[QueryShape]:
+    # Sample values only; the plan depends on the shape, not on the values.
+    oid = ObjectId()
+    now = datetime.utcnow()
+    return [
+        QueryShape("active_conversation", "conversations",
+                   {"user_id": oid, "status": "active", "context_boundary_id": {"$exists": False}},
+                   [("last_activity", -1)], limit=1),
+        QueryShape("conversation_messages", "messages",
+                   {"conversation_id": oid}, [("timestamp", -1)]),
+        QueryShape("conversation_messages_since", "messages",
+                   {"conversation_id": oid, "timestamp": {"$gte": now}}, [("timestamp", -1)]),
+        QueryShape("unconsolidated_messages", "messages",
+                   {"conversation_id": oid, "is_consolidated": {"$in": [False, None]}}, [("timestamp", 1)], limit=100),
+        QueryShape("recent_search_attempts", "search_attempts",
+                   {"conversation_id": str(oid)}, [("timestamp", -1)], limit=5),
+    ]
+
+
+async def ensure_indexes(db, indexes: Optional[List[IndexSpec]] = None) -> Dict[str, Any]:
+    """
+    Create the declared indexes that are missing. Returns what happened, including the
+    existing indexes that are no longer declared.
+    """
+    indexes = INDEXES if indexes is None else indexes
+    result = {'ensured': 0, 'conflicts': [], 'failed': [], 'undeclared': {}}
+    for spec in indexes:
+        try:
+            await db[spec.collection].create_index(spec.keys, **spec.options)
+            result['ensured'] += 1
+        except OperationFailure as e:
+            if e.code == NAMESPACE_EXISTS:
+                result['ensured'] += 1
+            elif e.code in INDEX_CONFLICT_CODES:
+                result['conflicts'].append(f"{spec.collection} {spec.keys}")
+                logger.warning(f"Index {spec.keys} on {spec.collection} conflicts with an existing index: {e}")
+            else:
+                result['failed'].append(f"{spec.collection} {spec.keys}")
+                logger.error(f"Failed to create index {spec.keys} on {spec.collection}: {e}")
+
+    declared: Dict[str, set] = {}
+    for spec in indexes:
+        declared.setdefault(spec.collection, set()).add(tuple(spec.keys))
+    for collection, keys in declared.items():
+        try:
+            existing = await db[collection].index_information()
+        except OperationFailure:
+            continue
+        extra = [
+            name for name, info in existing.items()
+            if name != "_id_" and tuple((k, d if isinstance(d, str) else int(d)) for k, d in info["key"]) not in keys
+        ]
+        if extra:
+            result['undeclared'][collection] = extra
+
+    logger.info(
+        f"Ensured {result['ensured']}/{len(indexes)} indexes"
+        + (f"; undeclared: {result['undeclared']}" if result['undeclared'] else "")
+    )
+    return result
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            stages.append(node["stage"])
+        # Classic plans nest through inputStage(s); SBE plans wrap them in queryPlan.
+        for key in ("inputStage", "queryPlan"):
+            if key in node:
+                stack.append(node[key])
+        stack.extend(node.get("inputStages", []))
+    return stages
+
+
+async def check_query_plans(db) -> Dict[str, Dict[str, Any]]:
+    """
+    Explain every hot query shape. A shape is covered when its winning plan reads through an
+    index (no COLLSCAN) and takes its order from the index (no blocking SORT).
+    """
+    report = {}
+    for shape in _hot_queries():
+        cursor = db[shape.collection].find(shape.filter, shape.projection).sort(shape.sort).limit(shape.limit)
+        explained = await cursor.explain()
+        stages = _plan_stages(explained.get("queryPlanner", {}).get("winningPlan", {}))
+        covered = "COLLSCAN" not in stages and "SORT" not in stages
+        report[shape.name] = {'covered': covered, 'stages': stages}
+        if not covered:
+            logger.warning(f"Query {shape.name} on {shape.collection} is not index-covered: {stages}")
+    return report
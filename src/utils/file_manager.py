@@ -11,8 +11,11 @@ Key features:
 - Integrates with media bus for agent access
 - Replaces build_payload_entry() logic
 - Consistent file type detection and blob path generation
+- Content-hash dedupe: a file the user already sent reuses its blob and document
 """
 
+import asyncio
+import hashlib
 import os
 import mimetypes
 from typing import Optional, Dict, List, Tuple
@@ -22,6 +25,7 @@ from datetime import datetime
 
 from src.utils.blob_utils import (
     upload_bytes_to_blob_storage,
+    upload_stream_to_blob_storage,
     upload_to_blob_storage,
     download_from_blob_storage_and_encode_to_base64,
     get_cdn_url,
@@ -30,6 +34,7 @@ from src.utils.blob_utils import (
 # NOTE: db_manager imported lazily to avoid circular import
 # (database.py -> ai_service -> file_msg_utils -> file_manager -> database.py)
 from src.core.media_bus import media_bus
+from src.utils.media_payload_cache import media_payload_cache
 from src.config.settings import settings
 from src.utils.logging.base_logger import setup_logger
 import re
@@ -43,6 +48,21 @@ def _get_db_manager():
     return db_manager
 
 
+def _sha256_of_path(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def content_sha256(file_bytes: Optional[bytes] = None, file_path: Optional[str] = None) -> str:
+    """SHA-256 of a file's content, hashed off the event loop."""
+    if file_bytes is not None:
+        return await asyncio.to_thread(lambda: hashlib.sha256(file_bytes).hexdigest())
+    return await asyncio.to_thread(_sha256_of_path, file_path)
+
+
 @dataclass
 class FileResult:
     """
@@ -419,13 +439,14 @@ class FileManager:
         metadata: Optional[Dict] = None,
         conversation_id: Optional[str] = None,
         auto_add_to_media_bus: bool = True,
-        auto_cleanup: bool = True
+        auto_cleanup: bool = True,
+        dedupe: bool = False
     ) -> FileResult:
         """
         Unified file reception handler for all platforms.
 
         This is the main entry point for file handling. It:
-        1. Reads file bytes (from bytes or path)
+        1. Takes file bytes, or streams from a path without loading it into memory
         2. Detects file type using unified detection
         3. Uploads to appropriate blob container
         4. Creates MongoDB document with consistent schema
@@ -437,7 +458,7 @@ class FileManager:
             user_id: User ID
             platform: Platform name (telegram, whatsapp, imessage, praxos_web)
             file_bytes: File content as bytes (preferred)
-            file_path: Path to file on disk (will be read if file_bytes not provided)
+            file_path: Path to file on disk (streamed to storage if file_bytes not provided)
             filename: Original filename (if not provided, will be generated)
             mime_type: MIME type
             caption: File caption/description
@@ -448,6 +469,8 @@ class FileManager:
             conversation_id: Optional conversation ID for media bus registration
             auto_add_to_media_bus: If True and conversation_id provided, add to media bus
             auto_cleanup: Whether to delete temp files after upload
+            dedupe: Reuse the user's existing document when one has the same content (SHA-256),
+                platform and file type. Ignored when metadata is given.
 
         Returns:
             FileResult with all file information
@@ -473,9 +496,13 @@ class FileManager:
         if platform not in valid_platforms:
             self.logger.warning(f"Unknown platform: {platform}. Proceeding anyway.")
 
-        # Read file if only path provided
+        # If only a path is provided, the file is streamed to blob storage instead of read
+        # into memory; validation only needs a head/tail sample.
         file_size = None
-        if file_path and not file_bytes:
+        validation_sample = None
+        stream_from_path = bool(file_path and not file_bytes)
+        if stream_from_path:
+            from src.utils.file_validator import file_validator
             try:
                 # Check file exists first
                 if not os.path.exists(file_path):
@@ -485,8 +512,7 @@ class FileManager:
                 if not os.access(file_path, os.R_OK):
                     raise IOError(f"File not readable: {file_path}")
 
-                with open(file_path, 'rb') as f:
-                    file_bytes = f.read()
+                validation_sample = file_validator.read_validation_sample(file_path)
                 file_size = os.path.getsize(file_path)
 
                 if file_size == 0:
@@ -505,6 +531,7 @@ class FileManager:
         if not file_size:
             file_size = len(file_bytes) if file_bytes else 0
 
+        sha256 = await content_sha256(file_bytes=file_bytes or None, file_path=file_path if stream_from_path else None)
         # Auto-detect MIME type if not provided
         if not mime_type and filename:
             guessed_mime = mimetypes.guess_type(filename)[0]
@@ -525,7 +552,7 @@ class FileManager:
         from src.utils.file_validator import file_validator
 
         is_valid, actual_mime, error_reason = file_validator.validate_file_content(
-            file_bytes=file_bytes,
+            file_bytes=validation_sample if stream_from_path else file_bytes,
             claimed_mime=mime_type,
             filename=filename
         )
@@ -548,6 +575,34 @@ class FileManager:
             platform_type=platform_type
         )
 
+        # Forwarded / re-sent files: reuse the blob and document already stored for this user
+        # on the same platform with the same detected type.
+        # Callers passing metadata need their own document, so they never reuse one.
+        if dedupe and not metadata:
+            existing = await self._find_by_content_hash(user_id, sha256, platform=platform, file_type=file_type)
+            if existing is not None:
+                file_result = await self._file_result_from_document(
+                    existing,
+                    caption=caption,
+                    platform_file_id=platform_file_id,
+                    platform_message_id=platform_message_id,
+                )
+                self.logger.info(
+                    f"Reusing stored file {file_result.inserted_id} for identical upload from {platform} "
+                    f"({file_size} bytes, sha256 {sha256[:12]})"
+                )
+                if conversation_id and auto_add_to_media_bus:
+                    try:
+                        await self.add_to_media_bus(file_result, conversation_id)
+                    except Exception as e:
+                        self.logger.error(f"Failed to add file to media bus: {e}")
+                if auto_cleanup and file_path:
+                    try:
+                        os.unlink(file_path)
+                    except Exception as e:
+                        self.logger.warning(f"Failed to cleanup temp file {file_path}: {e}")
+                return file_result
+
         self.logger.info(
             f"Processing file: {filename} | "
             f"Type: {file_type} | "
@@ -564,12 +619,21 @@ class FileManager:
 
         # Upload to blob storage
         try:
-            blob_path = await upload_bytes_to_blob_storage(
-                data=file_bytes,
-                blob_name=blob_name,
-                content_type=mime_type,
-                container_name=container
-            )
+            if stream_from_path:
+                blob_path = await upload_stream_to_blob_storage(
+                    source=file_path,
+                    blob_name=blob_name,
+                    content_type=mime_type,
+                    container_name=container,
+                    length=file_size
+                )
+            else:
+                blob_path = await upload_bytes_to_blob_storage(
+                    data=file_bytes,
+                    blob_name=blob_name,
+                    content_type=mime_type,
+                    container_name=container
+                )
             self.logger.info(f"Uploaded to blob storage: {blob_path} (container: {container or 'default'})")
         except ValueError as e:
             # Blob storage validation error
@@ -592,6 +656,7 @@ class FileManager:
             "file_name": filename,
             "caption": caption,
             "size": file_size,
+            "content_sha256": sha256,
             "created_at": datetime.utcnow().isoformat(),
         }
 
@@ -663,6 +728,56 @@ class FileManager:
 
         return file_result
 
+    async def _find_by_content_hash(self, user_id: str, sha256: str, platform: str, file_type: str) -> Optional[Dict]:
+        """The user's most recent stored file with this content, platform and type, if any."""
+        try:
+            return await _get_db_manager().documents.find_one(
+                {
+                    "user_id": ObjectId(user_id),
+                    "content_sha256": sha256,
+                    "platform": platform,
+                    "type": file_type,
+                    "blob_path": {"$exists": True},
+                },
+                sort=[("_id", -1)],
+            )
+        except Exception as e:
+            # Dedupe is an optimization; fall through to a normal upload.
+            self.logger.warning(f"Content-hash lookup failed, uploading anyway: {e}")
+            return None
+
+    async def _file_result_from_document(
+        self,
+        doc: Dict,
+        caption: str = "",
+        platform_file_id: Optional[str] = None,
+        platform_message_id: Optional[str] = None,
+    ) -> FileResult:
+        """FileResult for an existing document, carrying the new message's caption and ids."""
+        url = None
+        if doc.get("type") == 'image':
+            try:
+                url = await get_cdn_url(doc["blob_path"], container_name='cdn-container')
+            except Exception as e:
+                self.logger.warning(f"Failed to get CDN URL: {e}")
+        return FileResult(
+            inserted_id=str(doc["_id"]),
+            blob_path=doc.get("blob_path"),
+            file_name=doc.get("file_name"),
+            file_type=doc.get("type", "file"),
+            mime_type=doc.get("mime_type"),
+            size=doc.get("size", 0),
+            user_id=str(doc.get("user_id")),
+            platform=doc.get("platform"),
+            url=url,
+            caption=caption,
+            container_name=self._determine_container(doc.get("type", "file")) or settings.AZURE_BLOB_CONTAINER_NAME,
+            platform_file_id=platform_file_id or doc.get("platform_file_id"),
+            platform_message_id=platform_message_id or doc.get("platform_message_id"),
+            created_at=doc.get("created_at"),
+            metadata=doc.get("metadata") or {},
+        )
+
     async def receive_multiple_files(
         self,
         user_id: str,
@@ -740,8 +855,8 @@ class FileManager:
                 self.logger.debug(f"Built image payload with CDN URL")
 
             elif ftype in {"voice", "audio", "video"}:
-                # Download and encode to base64 for LLM processing
-                data_b64 = await download_from_blob_storage_and_encode_to_base64(blob_path)
+                # Download and encode to base64 for LLM processing (cached across turns)
+                data_b64 = await self._get_encoded_blob(blob_path, force_download)
                 payload = {
                     "type": "media",
                     "data": data_b64,
@@ -750,8 +865,8 @@ class FileManager:
                 self.logger.debug(f"Built {ftype} payload with base64 encoding")
 
             elif ftype in {"document", "file"}:
-                # Documents: download and encode
-                data_b64 = await download_from_blob_storage_and_encode_to_base64(blob_path)
+                # Documents: download and encode (cached across turns)
+                data_b64 = await self._get_encoded_blob(blob_path, force_download)
                 payload = {
                     "type": "file",
                     "source_type": "base64",
@@ -769,11 +884,34 @@ class FileManager:
             self.logger.error(f"Failed to build payload for {file_result.file_name}: {e}")
             return None
 
+    async def _get_encoded_blob(self, blob_path: str, force_download: bool = False) -> str:
+        """Base64 payload for a blob in the default container, served from the media payload cache."""
+        if force_download:
+            return await download_from_blob_storage_and_encode_to_base64(blob_path)
+        return await media_payload_cache.get_or_load(
+            settings.AZURE_BLOB_CONTAINER_NAME,
+            blob_path,
+            lambda: download_from_blob_storage_and_encode_to_base64(blob_path),
+        )
+
+    def build_description_payload(self, file_result: FileResult, auto_description: str) -> Dict:
+        """Text stand-in for a media payload, built from the file's cached auto_description."""
+        caption_part = f" Caption: {file_result.caption}." if file_result.caption else ""
+        return {
+            "type": "text",
+            "text": (
+                f"[Earlier {file_result.file_type} '{file_result.file_name}' (not re-attached; "
+                f"fetch it from the media bus if its full content is needed).{caption_part} "
+                f"Description: {auto_description}]"
+            ),
+        }
+
     async def build_payload_from_id(
         self,
         inserted_id: str,
         conversation_id: Optional[str] = None,
-        add_to_media_bus: bool = False
+        add_to_media_bus: bool = False,
+        prefer_description: bool = False
     ) -> Tuple[Optional[Dict], Optional[FileResult]]:
         """
         Build payload from MongoDB document ID.
@@ -784,6 +922,8 @@ class FileManager:
             inserted_id: MongoDB document ID
             conversation_id: Optional conversation ID for media bus
             add_to_media_bus: If True and conversation_id provided, add to media bus
+            prefer_description: If True and the document already has an auto_description,
+                return it as a text payload instead of downloading the media
 
         Returns:
             Tuple of (payload_dict, file_result) or (None, None) if not found
@@ -815,7 +955,11 @@ class FileManager:
             )
 
             # Build payload
-            payload = await self.build_payload(file_result)
+            auto_description = document.get("auto_description")
+            if prefer_description and auto_description:
+                payload = self.build_description_payload(file_result, auto_description)
+            else:
+                payload = await self.build_payload(file_result)
 
             # Add to media bus if requested
             if add_to_media_bus and conversation_id:
@@ -4,6 +4,8 @@ from ast import Dict
 
 from typing import Any, List, Optional,Dict, Tuple
 from datetime import datetime
+from dataclasses import dataclass
+import copy
 
 from bson import ObjectId
 from src.services.output_generator.generator import OutputGenerator
@@ -15,7 +17,10 @@ import asyncio
 from src.core.media_bus import media_bus
 from src.config.settings import settings
 from src.core.models.agent_runner_models import AgentFinalResponse
-from src.utils.file_manager import file_manager
+from src.utils.file_manager import FileResult, file_manager
+from src.utils.media_payload_cache import media_payload_cache
+from src.utils.conversation_history_cache import conversation_history_cache
+from src.utils.history_normalization import extend_history, normalize_history
 logger = setup_logger(__name__)
 
 #### prefix reconstruction utilities
@@ -194,16 +199,18 @@ async def build_payload_entry(file: Dict[str, Any], add_to_media_bus=False, conv
         logger.error(f"Error building payload entry: {e}", exc_info=True)
         return None, None
 
-async def build_payload_entry_from_inserted_id(inserted_id: str, add_to_media_bus:bool=False, conversation_id: str = None) -> Tuple[Optional[Dict[str, Any]],Optional[Dict[str, Any]]]:
+async def build_payload_entry_from_inserted_id(inserted_id: str, add_to_media_bus:bool=False, conversation_id: str = None, prefer_description: bool = False) -> Tuple[Optional[Dict[str, Any]],Optional[Dict[str, Any]]]:
     """
     Build payload from MongoDB document ID.
 
     UPDATED: Now uses FileManager's efficient method (no redundant database calls).
+    With prefer_description, files that already have an auto_description come back as text.
     """
     payload, file_result = await file_manager.build_payload_from_id(
         inserted_id=inserted_id,
         conversation_id=conversation_id if add_to_media_bus else None,
-        add_to_media_bus=add_to_media_bus
+        add_to_media_bus=add_to_media_bus,
+        prefer_description=prefer_description
     )
 
     # Convert FileResult to dict for backward compatibility
@@ -587,6 +594,38 @@ async def process_media_output(conversation_manager:Any,final_response:AgentFina
 
 
 
+@dataclass
+class _HistoryEntry:
+    """A message document built for the history; kept across turns while its inputs are unchanged."""
+    prefer_description: bool
+    message: Optional[BaseMessage]  # None when the document yields no message
+    file_result: Optional[FileResult]  # media to re-register with the media bus on reuse
+
+
+def _build_text_message(msg: Dict[str, Any], include_prefix: bool) -> BaseMessage:
+    content = msg.get("content", "")
+    role = msg.get("role")
+    metadata = msg.get("metadata", {})
+    # Check if this is a tool result message
+    if role == "assistant" and metadata.get("message_type") == "tool_result":
+        tool_name = metadata.get("tool_name", "unknown_tool")
+        tool_call_id = metadata.get("tool_call_id", "")
+        # Reconstruct as proper ToolMessage
+        return ToolMessage(content=content, tool_call_id=tool_call_id, name=tool_name)
+    if role == "assistant" and metadata.get("tool_calls"):
+        # Reconstruct as AIMessage with tool_calls
+        return AIMessage(content=content, tool_calls=metadata.get("tool_calls", []))
+    if role == "user":
+        # Reconstruct prefix for user messages if requested
+        if include_prefix and metadata:
+            prefix = reconstruct_message_prefix(metadata)
+            if prefix:
+                content = prefix + content
+        return HumanMessage(content=content)
+    # Regular assistant message
+    return AIMessage(content=content)
+
+
 async def get_conversation_history(
     conversation_manager: Any,
     conversation_id: str,
@@ -609,160 +648,98 @@ async def get_conversation_history(
     Returns:
         List of BaseMessage objects in chronological order
     """
-    context = await conversation_manager.get_conversation_context(conversation_id, categories=categories)
-    raw_msgs: List[Dict[str, Any]] = context.get("messages", [])
-    n = len(raw_msgs)
-    has_media = False
-    history_slots: List[Optional[BaseMessage]] = [None] * n
-    fetch_tasks: List[Any] = []
-    task_meta: List[Tuple[int, str]] = []  # (index, role)
-    cache: Dict[str, Any] = {}  # inserted_id -> task to dedupe identical media
+    # Only the messages added since the previous turn are read from Mongo, built and normalized;
+    # the result of the previous turn is kept next to the raw window and extended.
+    built_key = (tuple(sorted(categories)) if categories else None, include_prefix)
+    version = conversation_history_cache.local_version(conversation_id)
+    raw_msgs: List[Dict[str, Any]] = await conversation_history_cache.get_messages(
+        conversation_manager.db, conversation_id, categories=categories
+    )
+    previous = conversation_history_cache.get_built(conversation_id, built_key)
+    previous_entries, previous_history = previous if previous is not None else ({}, None)
 
     media_types = {"voice", "audio", "video", "image", "document", "file"}
+    has_media = any(msg.get("message_type") in media_types for msg in raw_msgs)
+
+    # With MEDIA_HISTORY_INLINE_RECENT set, only the most recent media messages are re-attached in
+    # full; older ones fall back to their cached auto_description (when one exists) instead of
+    # re-downloading the blob. Unset (0), every media message is attached in full.
+    inline_recent = settings.MEDIA_HISTORY_INLINE_RECENT
+    media_indices = [i for i, msg in enumerate(raw_msgs) if msg.get("message_type") in media_types]
+    described_media_indices = set(media_indices[:-inline_recent]) if inline_recent > 0 else set()
+
+    entries: Dict[Any, _HistoryEntry] = {}
+    built_ids: List[Any] = []  # docs built this turn rather than reused
+    reused_media: List[FileResult] = []
+    fetch_index: Dict[Tuple[str, bool], int] = {}  # (inserted_id, prefer_description) -> fetch, to dedupe downloads
+    media_meta: List[Tuple[Any, str, bool, int]] = []  # (doc id, role, prefer_description, fetch index)
 
     for i, msg in enumerate(raw_msgs):
+        doc_id = msg.get("_id")
         msg_type = msg.get("message_type")
-        role = msg.get("role")
-        metadata = msg.get("metadata", {})
+        prefer_description = i in described_media_indices
+
+        entry = previous_entries.get(doc_id)
+        if entry is not None and entry.prefer_description == prefer_description:
+            entries[doc_id] = entry
+            if entry.file_result is not None:
+                reused_media.append(entry.file_result)
+            continue
+        built_ids.append(doc_id)
 
         if msg_type == "text":
-            content = msg.get("content", "")
-            # Check if this is a tool result message
-            if role == "assistant" and metadata.get("message_type") == "tool_result":
-                tool_name = metadata.get("tool_name", "unknown_tool")
-                tool_call_id = metadata.get("tool_call_id", "")
-                # Reconstruct as proper ToolMessage
-                history_slots[i] = ToolMessage(content=content, tool_call_id=tool_call_id, name=tool_name)
-            
-            elif role == "assistant" and metadata.get("tool_calls"):
-                # Reconstruct as AIMessage with tool_calls
-                tool_calls = metadata.get("tool_calls", [])
-                history_slots[i] = AIMessage(content=content, tool_calls=tool_calls)
-                
-            elif role == "user":
-                # Reconstruct prefix for user messages if requested
-                if include_prefix and metadata:
-                    prefix = reconstruct_message_prefix(metadata)
-                    if prefix:
-                        content = prefix + content
-                history_slots[i] = HumanMessage(content=content)
-            else:
-                # Regular assistant message
-                history_slots[i] = AIMessage(content=content)
+            entries[doc_id] = _HistoryEntry(False, _build_text_message(msg, include_prefix), None)
             continue
 
         if msg_type in media_types:
-            has_media = True
             inserted_id = (msg.get("metadata") or {}).get("inserted_id")
             if not inserted_id:
                 logger.warning(f"Media message missing inserted_id at index {i}")
+                entries[doc_id] = _HistoryEntry(prefer_description, None, None)
                 continue
 
             # De-duplicate downloads for the same inserted_id
-            task = cache.get(inserted_id)
-            if task is None:
-                task = build_payload_entry_from_inserted_id(inserted_id, add_to_media_bus=True, conversation_id=conversation_id)
-                cache[inserted_id] = task
-
-            fetch_tasks.append(task)
-            task_meta.append((i, role))
+            index = fetch_index.setdefault((inserted_id, prefer_description), len(fetch_index))
+            media_meta.append((doc_id, msg.get("role"), prefer_description, index))
             continue
 
         logger.warning(f"Unknown message_type '{msg_type}' at index {i}")
-
-    # Run all media fetches concurrently, keeping order by input task list
-    results = await _gather_bounded(fetch_tasks, limit=max_concurrency)
-
-    # Place media messages back into the original positions and populate media bus
-    
-
-    for (i, role), (payload,file_info) in zip(task_meta, results):
-        if isinstance(payload, Exception) or payload is None:
-            logger.warning(f"Failed to build payload for message at index {i}")
+        entries[doc_id] = _HistoryEntry(False, None, None)
+
+    # Fetch the new media and re-register the reused ones: the media bus only holds the
+    # current turn's files.
+    fetches = [
+        file_manager.build_payload_from_id(inserted_id, conversation_id=conversation_id, add_to_media_bus=True, prefer_description=prefer)
+        for inserted_id, prefer in fetch_index
+    ]
+    registrations = [file_manager.add_to_media_bus(file_result, conversation_id) for file_result in reused_media]
+    results = await _gather_bounded(fetches + registrations, limit=max_concurrency)
+
+    for doc_id, role, prefer_description, index in media_meta:
+        result = results[index]
+        payload, file_result = result if not isinstance(result, Exception) else (None, None)
+        if payload is None:
+            # Not cached, so the next turn tries again
+            logger.warning(f"Failed to build payload for message {doc_id}")
             continue
-
         msg_obj = HumanMessage(content=[payload]) if role == "user" else AIMessage(content=[payload])
-        history_slots[i] = msg_obj
+        entries[doc_id] = _HistoryEntry(prefer_description, msg_obj, file_result)
 
-        # Add media to bus for agent reference
-        try:
-            raw_msg = raw_msgs[i]
-            msg_type = raw_msg.get("message_type")
-            inserted_id = (raw_msg.get("metadata") or {}).get("inserted_id")
-            container_name = 'cdn-container' if msg_type in {'image', 'photo'} else settings.AZURE_BLOB_CONTAINER_NAME
-            # Try to extract URL from payload
-            media_url = None
-            if payload.get("type") == "image_url":
-                media_url = payload.get("image_url")
-
-            # Get file info from database if we have inserted_id
-            if inserted_id and media_url:
-                # Add to media bus
-                file_name = media_url.split('/')[-1] if '/' in media_url else "media_file"
-                caption = raw_msg.get("content", "")  # Use message content as description
-                
-                # media_bus.add_media(
-                #     conversation_id=conversation_id,
-                #     url=media_url,
-                #     file_name=file_name,
-                #     file_type=msg_type,
-                #     description=f"User uploaded {msg_type}" + (f": {caption}" if caption else ""),
-                #     source="uploaded",
-                #     blob_path=file_info.get('blob_path'),  # Would need to extract from database
-                #     mime_type=file_info.get('mime_type'),  # Would need to extract from database
-                #     metadata={"inserted_id": inserted_id, "from_history": True},
-                #     container_name=container_name,
-                # )
-                logger.debug(f"Added historical media to bus: {msg_type} - {file_name}")
-        except Exception as e:
-            logger.warning(f"Could not add media to bus: {e}")
+    logger.info(f"Fetched {len(fetch_index)} media payloads, reused {len(reused_media)} (payload cache: {media_payload_cache.get_stats()})")
 
-    logger.info(f"Fetched and reconstructed {len(fetch_tasks)} media messages")
-    
-    valid_history = []
-    history_slots_clean = [m for m in history_slots if m is not None]
-
-    made_tool_calls = set()
-    for msg in history_slots_clean:
-        if isinstance(msg, AIMessage) and getattr(msg, 'tool_calls', None):
-            for tc in msg.tool_calls:
-                made_tool_calls.add(tc.get('id'))
-                
-    answered_tool_calls = set()
-    for msg in history_slots_clean:
-        if isinstance(msg, ToolMessage) and getattr(msg, 'tool_call_id', None) in made_tool_calls:
-            answered_tool_calls.add(msg.tool_call_id)
-            logger.info(f"Tool call with ID {msg.tool_call_id} was made and has a corresponding tool result message.")
-    for msg in history_slots_clean:
-        if isinstance(msg, AIMessage) and getattr(msg, 'tool_calls', None):
-            valid_calls = [tc for tc in msg.tool_calls if tc.get('id') in answered_tool_calls]
-            if valid_calls:
-                msg.tool_calls = valid_calls
-                valid_history.append(msg)
-            else:
-                msg.tool_calls = []
-                if not msg.content:
-                    logger.info("AIMessage had tool calls but none were answered, and no content. Adding placeholder content.")
-                    msg.content = "I tried to call a tool but there was an error."
-                valid_history.append(msg)
-        elif isinstance(msg, ToolMessage):
-            if getattr(msg, 'tool_call_id', None) in answered_tool_calls:
-                valid_history.append(msg)
-        else:
-            valid_history.append(msg)
-
-    # Final normalization pass for Gemini API strictness:
-    # A function call turn (AIMessage with tool_calls) MUST NOT be the first message 
-    # and MUST NOT immediately follow a SystemMessage.
-    final_history = []
-    for msg in valid_history:
-        if isinstance(msg, AIMessage) and getattr(msg, 'tool_calls', None):
-            if not final_history:
-                final_history.append(HumanMessage(content="(System initialized)"))
-            elif getattr(final_history[-1], 'type', '') == 'system' or isinstance(final_history[-1], SystemMessage):
-                final_history.append(HumanMessage(content="(System instruction acknowledged)"))
-        final_history.append(msg)
+    doc_ids = [msg.get("_id") for msg in raw_msgs]
+    slots = [(doc_id, entries[doc_id].message) for doc_id in doc_ids if doc_id in entries and entries[doc_id].message is not None]
+    history = None
+    if previous_history is not None and set(built_ids).isdisjoint(previous_history.doc_ids):
+        built = set(built_ids)
+        history = extend_history(previous_history, doc_ids, [slot for slot in slots if slot[0] in built])
+    if history is None:
+        history = normalize_history(doc_ids, slots)
+
+    conversation_history_cache.set_built(conversation_id, built_key, (entries, history), version)
 
+    # Callers own what is returned; the cached messages stay untouched.
+    final_history = [copy.deepcopy(msg) for _, msg in history.messages]
     return final_history, has_media
 
 
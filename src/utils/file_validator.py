@@ -274,6 +274,23 @@ class FileValidator:
         logger.info(f"File validation passed: {filename} - {actual_mime or claimed_mime}")
         return True, actual_mime or claimed_mime, None
 
+    @staticmethod
+    def read_validation_sample(file_path: str, head_bytes: int = 1024 * 1024, tail_bytes: int = 8192) -> bytes:
+        """
+        Read just enough of a file on disk for validate_file_content.
+
+        Magic detection only looks at the start of the file and the polyglot checks look at
+        the first and last 8KB, so head + tail is equivalent to validating the whole file
+        without loading it into memory.
+        """
+        size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            if size <= head_bytes + tail_bytes:
+                return f.read()
+            head = f.read(head_bytes)
+            f.seek(size - tail_bytes)
+            return head + f.read(tail_bytes)
+
     def _is_mime_allowed(self, mime_type: str) -> bool:
         """Check if MIME type is in allowed list"""
         for category, config in ALLOWED_FILE_TYPES.items():
@@ -0,0 +1,168 @@
+"""
+Tool-call pairing and Gemini ordering rules for conversation history rebuilt from Mongo.
+
+`normalize_history` applies them to a whole window. `extend_history` advances the result of a
+previous turn to the current window: it drops the messages that fell out of the front and
+normalizes only the messages added at the end, returning None when that could differ from
+normalizing the whole window (the caller then falls back to `normalize_history`).
+
+Neither mutates the messages it is given: a message whose unanswered tool calls are stripped
+is copied first, so built messages can be cached and normalized again on a later turn.
+"""
+import copy
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from src.utils.logging.base_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# (id of the source message document, message); placeholders inserted by the ordering rules
+# have no source document and carry None.
+Slot = Tuple[Optional[Any], BaseMessage]
+
+
+@dataclass
+class NormalizedHistory:
+    doc_ids: List[Any]
+    messages: List[Slot]
+    # tool call id -> number of AIMessages in the window that made it
+    made: Counter
+    # tool call ids made in the window that have a ToolMessage in the window
+    answered: Set[str]
+    # doc id -> tool call ids it made / the tool call id it answers, before validation
+    calls: Dict[Any, List[str]]
+    answers: Dict[Any, str]
+
+
+def _tool_call_ids(msg: BaseMessage) -> List[str]:
+    if isinstance(msg, AIMessage) and getattr(msg, 'tool_calls', None):
+        return [tc.get('id') for tc in msg.tool_calls]
+    return []
+
+
+def _answer_id(msg: BaseMessage) -> Optional[str]:
+    return getattr(msg, 'tool_call_id', None) if isinstance(msg, ToolMessage) else None
+
+
+def _validate(msg: BaseMessage, answered: Set[str]) -> Optional[BaseMessage]:
+    """Keep only answered tool calls, and only tool results whose call is in the window."""
+    if isinstance(msg, AIMessage) and getattr(msg, 'tool_calls', None):
+        valid_calls = [tc for tc in msg.tool_calls if tc.get('id') in answered]
+        if len(valid_calls) == len(msg.tool_calls):
+            return msg
+        msg = copy.deepcopy(msg)
+        if valid_calls:
+            msg.tool_calls = valid_calls
+        else:
+            msg.tool_calls = []
+            if not msg.content:
+                logger.info("AIMessage had tool calls but none were answered, and no content. Adding placeholder content.")
+                msg.content = "I tried to call a tool but there was an error."
+        return msg
+    if isinstance(msg, ToolMessage):
+        return msg if _answer_id(msg) in answered else None
+    return msg
+
+
+def _append(messages: List[Slot], doc_id: Any, msg: BaseMessage):
+    """
+    Gemini API strictness: a function call turn (AIMessage with tool_calls) MUST NOT be the
+    first message and MUST NOT immediately follow a SystemMessage.
+    """
+    if isinstance(msg, AIMessage) and getattr(msg, 'tool_calls', None):
+        if not messages:
+            messages.append((None, HumanMessage(content="(System initialized)")))
+        else:
+            previous = messages[-1][1]
+            if getattr(previous, 'type', '') == 'system' or isinstance(previous, SystemMessage):
+                messages.append((None, HumanMessage(content="(System instruction acknowledged)")))
+    messages.append((doc_id, msg))
+
+
+def normalize_history(doc_ids: List[Any], slots: List[Slot]) -> NormalizedHistory:
+    """Normalize a whole window; `slots` are the built messages of `doc_ids`, oldest first."""
+    calls = {doc_id: ids for doc_id, msg in slots if (ids := _tool_call_ids(msg))}
+    answers = {doc_id: answer for doc_id, msg in slots if (answer := _answer_id(msg)) is not None}
+    made = Counter(call_id for ids in calls.values() for call_id in ids)
+    answered = {answer for answer in answers.values() if answer in made}
+
+    messages: List[Slot] = []
+    for doc_id, msg in slots:
+        validated = _validate(msg, answered)
+        if validated is not None:
+            _append(messages, doc_id, validated)
+    return NormalizedHistory(list(doc_ids), messages, made, answered, calls, answers)
+
+
+def extend_history(previous: NormalizedHistory, doc_ids: List[Any], fresh: List[Slot]) -> Optional[NormalizedHistory]:
+    """
+    Advance `previous` to the window `doc_ids`, which must be the previous window minus some of
+    its oldest messages plus new ones; `fresh` are the built messages of the new ones.
+    Returns None when only a full `normalize_history` gives the right result.
+    """
+    if not doc_ids:
+        return None
+    try:
+        start = previous.doc_ids.index(doc_ids[0])
+    except ValueError:
+        return None
+    kept = len(previous.doc_ids) - start
+    if doc_ids[:kept] != previous.doc_ids[start:]:
+        return None
+    trimmed = previous.doc_ids[:start]
+    trimmed_ids = set(trimmed)
+
+    made = previous.made.copy()
+    for doc_id in trimmed:
+        for call_id in previous.calls.get(doc_id, ()):
+            made[call_id] -= 1
+            if made[call_id] <= 0:
+                del made[call_id]
+    for doc_id in trimmed:
+        if previous.answers.get(doc_id) in made:
+            # A result left the window while its call stayed: that call is now unanswered.
+            return None
+    answered = {call_id for call_id in previous.answered if call_id in made}
+
+    fresh_answers = [answer for _, msg in fresh if (answer := _answer_id(msg)) is not None]
+    for answer in fresh_answers:
+        if answer in made and answer not in answered:
+            # Answers a call already stripped from an earlier message.
+            return None
+    kept_answers = {answer for doc_id, answer in previous.answers.items() if doc_id not in trimmed_ids}
+    for _, msg in fresh:
+        for call_id in _tool_call_ids(msg):
+            if call_id in kept_answers and call_id not in answered:
+                # A result already dropped as unanswered would now be answered.
+                return None
+        made.update(_tool_call_ids(msg))
+    answered.update(answer for answer in fresh_answers if answer in made)
+
+    if trimmed:
+        # Placeholders depend on what precedes each call turn, which trimming and dropped
+        # results change, so they are re-derived for the kept messages.
+        messages: List[Slot] = []
+        for doc_id, msg in previous.messages:
+            if doc_id is None or doc_id in trimmed_ids:
+                continue
+            if isinstance(msg, ToolMessage) and _answer_id(msg) not in answered:
+                continue
+            _append(messages, doc_id, msg)
+    else:
+        messages = list(previous.messages)
+
+    calls = {doc_id: ids for doc_id, ids in previous.calls.items() if doc_id not in trimmed_ids}
+    answers = {doc_id: a for doc_id, a in previous.answers.items() if doc_id not in trimmed_ids}
+    for doc_id, msg in fresh:
+        if ids := _tool_call_ids(msg):
+            calls[doc_id] = ids
+        if (answer := _answer_id(msg)) is not None:
+            answers[doc_id] = answer
+        validated = _validate(msg, answered)
+        if validated is not None:
+            _append(messages, doc_id, validated)
+    return NormalizedHistory(list(doc_ids), messages, made, answered, calls, answers)
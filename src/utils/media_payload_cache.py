@@ -0,0 +1,264 @@
+"""
+Content-addressed cache for base64-encoded media payloads.
+
+Conversation history is rebuilt every turn, and every media message in the window used to
+re-download its blob and re-encode it. Blob paths are unique per upload (see
+FileManager._generate_blob_path), so an encoded payload keyed by container + blob path
+(optionally pinned to an etag) can be reused until evicted.
+
+Two tiers:
+- In-process LRU bounded by total bytes and per-item size.
+- Optional on-disk tier (MEDIA_PAYLOAD_CACHE_DIR), read back through mmap, for payloads
+  evicted from memory or shared by processes on the same pod.
+"""
+import asyncio
+import hashlib
+import mmap
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.config.settings import settings
+from src.utils.logging.base_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class MediaPayloadCache:
+    """Bounded, size-aware LRU of encoded media payloads with an optional disk tier."""
+
+    def __init__(
+        self,
+        max_bytes: int,
+        max_item_bytes: int,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 0,
+    ):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        # key -> (etag, data_b64)
+        self._memory: "OrderedDict[str, Tuple[Optional[str], str]]" = OrderedDict()
+        self._memory_bytes = 0
+        # path -> size, LRU order
+        self._disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'bytes_served_from_cache': 0,
+            'bytes_loaded': 0,
+            'evictions': 0,
+            'skipped_too_large': 0,
+        }
+
+        if self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                self._load_disk_index()
+            except OSError as e:
+                logger.warning(f"Media payload disk cache disabled, cannot create {self.disk_dir}: {e}")
+                self.disk_dir = None
+
+    def _load_disk_index(self):
+        """Index files left by earlier processes, oldest first, so the disk bound holds across restarts."""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".b64"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._disk_index[path] = size
+            self._disk_bytes += size
+
+    @staticmethod
+    def make_key(container_name: Optional[str], blob_path: str) -> str:
+        return f"{container_name or settings.AZURE_BLOB_CONTAINER_NAME}/{blob_path}"
+
+    async def get_or_load(
+        self,
+        container_name: Optional[str],
+        blob_path: str,
+        loader: Callable[[], Awaitable[str]],
+        etag: Optional[str] = None,
+    ) -> str:
+        """
+        Return the cached base64 payload for a blob, or run `loader` once and cache its result.
+        Concurrent requests for the same blob share a single load.
+        """
+        key = self.make_key(container_name, blob_path)
+
+        cached = await self._get(key, etag)
+        if cached is not None:
+            return cached
+
+        # The load runs in its own task so cancelling one waiter doesn't cancel it for the others.
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._load(key, container_name, blob_path, loader, etag))
+            # Retrieve a failure even if every waiter was cancelled, so it doesn't warn at GC.
+            inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+            self._inflight[key] = inflight
+        return await asyncio.shield(inflight)
+
+    async def _load(
+        self,
+        key: str,
+        container_name: Optional[str],
+        blob_path: str,
+        loader: Callable[[], Awaitable[str]],
+        etag: Optional[str],
+    ) -> str:
+        try:
+            self.stats['misses'] += 1
+            data_b64 = await loader()
+            self.stats['bytes_loaded'] += len(data_b64)
+            await self.put(container_name, blob_path, data_b64, etag=etag)
+            return data_b64
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _get(self, key: str, etag: Optional[str]) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            cached_etag, data_b64 = entry
+            if etag and cached_etag and etag != cached_etag:
+                self._evict_memory(key)
+            else:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                self.stats['bytes_served_from_cache'] += len(data_b64)
+                return data_b64
+
+        data_b64 = await self._read_disk(key, etag)
+        if data_b64 is not None:
+            self.stats['disk_hits'] += 1
+            self.stats['bytes_served_from_cache'] += len(data_b64)
+            self._put_memory(key, etag, data_b64)
+            return data_b64
+        return None
+
+    async def put(self, container_name: Optional[str], blob_path: str, data_b64: str, etag: Optional[str] = None):
+        key = self.make_key(container_name, blob_path)
+        size = len(data_b64)
+        if size > self.max_item_bytes:
+            self.stats['skipped_too_large'] += 1
+            logger.debug(f"Media payload for {key} ({size} bytes) exceeds per-item limit, not cached")
+            return
+        self._put_memory(key, etag, data_b64)
+        await self._write_disk(key, etag, data_b64)
+
+    def _put_memory(self, key: str, etag: Optional[str], data_b64: str):
+        if key in self._memory:
+            self._evict_memory(key, count=False)
+        self._memory[key] = (etag, data_b64)
+        self._memory_bytes += len(data_b64)
+        while self._memory_bytes > self.max_bytes and self._memory:
+            oldest = next(iter(self._memory))
+            self._evict_memory(oldest)
+
+    def _evict_memory(self, key: str, count: bool = True):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[1])
+            if count:
+                self.stats['evictions'] += 1
+
+    def _disk_path(self, key: str, etag: Optional[str]) -> str:
+        digest = hashlib.sha256(f"{key}|{etag or ''}".encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.b64")
+
+    # Disk IO runs in a worker thread; the index is only touched on the event loop.
+
+    async def _read_disk(self, key: str, etag: Optional[str]) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key, etag)
+        try:
+            data_b64 = await asyncio.to_thread(self._read_file, path)
+        except (FileNotFoundError, ValueError):
+            # ValueError: empty file cannot be mapped
+            return None
+        except OSError as e:
+            logger.warning(f"Failed reading media payload disk cache {path}: {e}")
+            return None
+        if path in self._disk_index:
+            self._disk_index.move_to_end(path)
+        return data_b64
+
+    @staticmethod
+    def _read_file(path: str) -> str:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[:].decode("ascii")
+
+    @staticmethod
+    def _write_file(path: str, data_b64: str):
+        tmp_path = f"{path}.{os.getpid()}.{id(data_b64)}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data_b64.encode("ascii"))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove_files(paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def _write_disk(self, key: str, etag: Optional[str], data_b64: str):
+        if not self.disk_dir or self.disk_max_bytes <= 0:
+            return
+        path = self._disk_path(key, etag)
+        try:
+            await asyncio.to_thread(self._write_file, path, data_b64)
+        except OSError as e:
+            logger.warning(f"Failed writing media payload disk cache {path}: {e}")
+            return
+
+        previous_size = self._disk_index.pop(path, None)
+        if previous_size is not None:
+            self._disk_bytes -= previous_size
+        self._disk_index[path] = len(data_b64)
+        self._disk_bytes += len(data_b64)
+        evicted = []
+        while self._disk_bytes > self.disk_max_bytes and self._disk_index:
+            old_path, old_size = self._disk_index.popitem(last=False)
+            self._disk_bytes -= old_size
+            evicted.append(old_path)
+        if evicted:
+            await asyncio.to_thread(self._remove_files, evicted)
+
+    def clear(self):
+        self._memory.clear()
+        self._memory_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics for monitoring"""
+        lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        return {
+            **self.stats,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_bytes,
+            'disk_entries': len(self._disk_index),
+            'disk_bytes': self._disk_bytes,
+        }
+
+
+# Singleton instance
+media_payload_cache = MediaPayloadCache(
+    max_bytes=settings.MEDIA_PAYLOAD_CACHE_MAX_BYTES,
+    max_item_bytes=settings.MEDIA_PAYLOAD_CACHE_MAX_ITEM_BYTES,
+    disk_dir=settings.MEDIA_PAYLOAD_CACHE_DIR,
+    disk_max_bytes=settings.MEDIA_PAYLOAD_CACHE_DISK_MAX_BYTES,
+)
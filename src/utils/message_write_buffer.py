@@ -0,0 +1,200 @@
+"""
+Per-turn write-behind buffer for conversation messages.
+
+An agent turn persists every user message, tool call, tool result, reasoning block and final
+response one by one. Inside `buffered_message_writes(...)`, ConversationDatabase.add_message
+queues the document instead and the buffer writes it with a single ordered insert_many plus
+one last_activity/expires_at update per conversation.
+
+Guarantees:
+- Message ids are assigned client-side (ObjectId) so add_message still returns the final id
+  immediately, and a retried insert is idempotent.
+- Documents are inserted in the order they were added (ordered insert_many); on a partial
+  failure the unwritten tail stays queued in order.
+- Pending documents are flushed at most MESSAGE_WRITE_BUFFER_FLUSH_INTERVAL_SECONDS after
+  they were added, when MESSAGE_WRITE_BUFFER_MAX_PENDING is reached, before any egress send
+  (`flush_pending_messages`), before message reads, and when the turn ends.
+"""
+import asyncio
+from datetime import timedelta
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from src.config.settings import settings
+from src.utils.logging.base_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+_active_buffer: ContextVar[Optional["MessageWriteBuffer"]] = ContextVar("message_write_buffer", default=None)
+
+
+class MessageWriteBuffer:
+    """Coalesces message inserts of one agent turn into batched writes."""
+
+    def __init__(
+        self,
+        messages_collection,
+        conversations_collection,
+        flush_interval: float = 1.0,
+        max_pending: int = 50,
+    ):
+        self.messages = messages_collection
+        self.conversations = conversations_collection
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self.inactivity_timeout = timedelta(seconds=settings.CONVERSATION_INACTIVITY_TIMEOUT_SECONDS)
+
+        self._loop = asyncio.get_running_loop()
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._background: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self.stats = {
+            'buffered': 0,
+            'flushes': 0,
+            'inserted': 0,
+        }
+
+    def add(self, message_doc: Dict[str, Any]) -> Optional[str]:
+        """
+        Queue a message document and return its id, or None if the buffer can't take it
+        (closed, or called from another event loop) and the caller should write directly.
+        """
+        if self._closed:
+            return None
+        try:
+            if asyncio.get_running_loop() is not self._loop:
+                return None
+        except RuntimeError:
+            return None
+
+        message_doc.setdefault("_id", ObjectId())
+        self._pending.append(message_doc)
+        self.stats['buffered'] += 1
+
+        if len(self._pending) >= self.max_pending:
+            self._flush_soon()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(self.flush_interval, self._flush_soon)
+        return str(message_doc["_id"])
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def _flush_soon(self):
+        self._cancel_timer()
+        if self._background is None or self._background.done():
+            self._background = self._loop.create_task(self._flush_in_background())
+
+    async def _flush_in_background(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            # Documents stay queued; the next flush (at the latest when the turn ends) retries them.
+            logger.error(f"Background flush of buffered messages failed: {e}", exc_info=True)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def flush(self) -> int:
+        """Write all pending documents. Returns the number inserted."""
+        async with self._lock:
+            self._cancel_timer()
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            written = 0
+            try:
+                while written < len(batch):
+                    try:
+                        await self.messages.insert_many(batch[written:], ordered=True)
+                        written = len(batch)
+                    except BulkWriteError as e:
+                        write_errors = e.details.get("writeErrors") or []
+                        if not write_errors or write_errors[0].get("code") != DUPLICATE_KEY_ERROR:
+                            written += e.details.get("nInserted", 0)
+                            raise
+                        # Persisted by an earlier attempt whose acknowledgement was lost; skip it.
+                        written += write_errors[0]["index"] + 1
+            except Exception:
+                # Keep the unwritten tail ahead of anything added meanwhile.
+                self._pending[:0] = batch[written:]
+                raise
+
+            activity: Dict[ObjectId, Dict[str, Any]] = {}
+            for doc in batch:
+                fields = activity.setdefault(doc["conversation_id"], {})
+                fields["last_activity"] = max(fields.get("last_activity", doc["timestamp"]), doc["timestamp"])
+                if doc.get("role") == "user":
+                    fields["last_user_activity"] = max(fields.get("last_user_activity", doc["timestamp"]), doc["timestamp"])
+            for conv_id, fields in activity.items():
+                fields["expires_at"] = fields["last_activity"] + self.inactivity_timeout
+                await self.conversations.update_one(
+                    {"_id": conv_id},
+                    {"$max": fields}
+                )
+
+            self.stats['flushes'] += 1
+            self.stats['inserted'] += len(batch)
+            return len(batch)
+
+    async def close(self):
+        """Stop buffering and flush what is left."""
+        self._closed = True
+        self._cancel_timer()
+        await self.flush()
+        if self._background is not None and not self._background.done():
+            await self._background
+
+
+def get_active_write_buffer() -> Optional[MessageWriteBuffer]:
+    """The write buffer of the turn running in the current context, if any."""
+    return _active_buffer.get()
+
+
+async def flush_pending_messages():
+    """Flush the current turn's buffered messages (no-op outside a buffered turn)."""
+    buffer = _active_buffer.get()
+    if buffer is not None:
+        # Also waits for a background flush that is already writing.
+        await buffer.flush()
+
+
+@asynccontextmanager
+async def buffered_message_writes(conversation_db):
+    """
+    Buffer ConversationDatabase.add_message calls made in this context (and tasks spawned
+    from it) for the duration of the block. Everything is flushed on exit.
+    """
+    existing = _active_buffer.get()
+    if existing is not None:
+        yield existing
+        return
+
+    buffer = MessageWriteBuffer(
+        conversation_db.messages,
+        conversation_db.conversations,
+        flush_interval=settings.MESSAGE_WRITE_BUFFER_FLUSH_INTERVAL_SECONDS,
+        max_pending=settings.MESSAGE_WRITE_BUFFER_MAX_PENDING,
+    )
+    token = _active_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _active_buffer.reset(token)
+        try:
+            await buffer.close()
+        except Exception as e:
+            logger.error(f"Failed to flush {buffer.pending_count} buffered message(s) at end of turn: {e}", exc_info=True)
+        logger.debug(f"Message write buffer closed: {buffer.stats}")
@@ -1,133 +1,278 @@
-from datetime import datetime, timedelta
-from typing import Dict, DefaultDict, Optional
-from collections import defaultdict
+"""
+Per-user rate limiting shared by all pods.
+
+Each resource has one or more limits (e.g. per hour and per minute), enforced with GCRA: a
+limit of N per period stores one "theoretical arrival time" (TAT) per user and resource, and a
+request fits while consuming it keeps the TAT within one period of now. Unlike fixed hourly
+windows this allows no 2x burst at window boundaries.
+
+All limits of a resource are checked and consumed atomically by one Lua script (one Redis
+round trip, no GET/INCR race between concurrent webhooks); either every limit is consumed or
+none is. To let bursts of checks for the same user skip Redis, an acquire may take up to
+RATE_LIMITER_LOCAL_RESERVATION extra tokens (off by default), spent locally for
+RATE_LIMITER_RESERVATION_SECONDS. Tokens are only reserved for a user and resource already
+acquired within that window, since unused reserved tokens are lost: spaced-out traffic
+consumes exactly what it uses, and a burst loses at most one reservation when it ends.
+Redis errors fail open; without Redis (local development) the same algorithm runs in memory.
+"""
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
 from src.config.settings import settings
 from src.utils.logging.base_logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Script modes
+DRY_RUN = 0  # report whether `min` tokens fit, consume nothing
+ACQUIRE = 1  # consume between `min` and `max` tokens if at least `min` fit
+FORCE = 2    # consume `max` tokens even past the limit (usage recorded after the fact)
+
+# KEYS: one TAT key per limit.
+# ARGV: min, max, mode, then (period_ms, interval_ms) per limit.
+# Returns {granted, remaining, retry_after_ms}.
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local want_min = tonumber(ARGV[1])
+local want_max = tonumber(ARGV[2])
+local mode = tonumber(ARGV[3])
+local tats, periods, intervals = {}, {}, {}
+local fits_all = want_max
+local retry_after = 0
+for i = 1, #KEYS do
+  local period = tonumber(ARGV[2 + 2 * i])
+  local interval = tonumber(ARGV[3 + 2 * i])
+  local tat = tonumber(redis.call('GET', KEYS[i])) or now
+  if tat < now then tat = now end
+  local fits = math.floor((period - (tat - now)) / interval)
+  if fits < fits_all then fits_all = fits end
+  if fits < want_min then
+    local wait = tat + want_min * interval - period - now
+    if wait > retry_after then retry_after = wait end
+  end
+  tats[i], periods[i], intervals[i] = tat, period, interval
+end
+
+local granted = 0
+if mode == 2 then
+  granted = want_max
+elseif fits_all >= want_min then
+  granted = math.max(fits_all, 0)
+  if granted > want_max then granted = want_max end
+end
+
+local consumed = 0
+if mode > 0 then consumed = granted end
+local remaining = nil
+for i = 1, #KEYS do
+  local new_tat = tats[i] + consumed * intervals[i]
+  if consumed > 0 then
+    redis.call('SET', KEYS[i], tostring(new_tat), 'PX', math.max(1, math.ceil(new_tat - now)))
+  end
+  local left = math.floor((periods[i] - (new_tat - now)) / intervals[i])
+  if remaining == nil or left < remaining then remaining = left end
+end
+return {granted, math.max(remaining or 0, 0), math.ceil(retry_after)}
+"""
+
+
+def resource_limits() -> Dict[str, List[Tuple[int, int]]]:
+    """Limits per resource type as (max_count, period_seconds) pairs."""
+    limits = {
+        "emails": [(settings.MAX_EMAILS, 3600)],
+        "email_attachments": [(settings.MAX_EMAIL_ATTACHMENTS, 3600)],
+        "whatsapp_messages": [(settings.MAX_WHATSAPP_MESSAGES, 3600)],
+        "telegram_messages": [(settings.MAX_WHATSAPP_MESSAGES, 3600)],
+        "gmail_webhooks": [(settings.MAX_GMAIL_WEBHOOKS_PER_HOUR, 3600)],
+        "gmail_history_calls": [(settings.MAX_HISTORY_CALLS_PER_HOUR, 3600)],
+        "http_requests": [(1000, 3600)],  # 1000 HTTP requests per hour per user
+        "file_uploads": [(100, 3600)],    # 100 file uploads per hour per user
+    }
+    if settings.RATE_LIMIT_HTTP_REQUESTS_PER_MINUTE > 0:
+        limits["http_requests"].append((settings.RATE_LIMIT_HTTP_REQUESTS_PER_MINUTE, 60))
+    return limits
+
+
 class RateLimiter:
     """
     Rate limiter using Redis for distributed rate limiting across pods.
     Falls back to in-memory for local development.
     """
 
-    def __init__(self):
-        # In-memory fallback for local dev
-        self.usage_counts = defaultdict(lambda: defaultdict(int))
-        self.reset_times = defaultdict(lambda: defaultdict(lambda: datetime.utcnow()))
+    def __init__(self, local_reservation: int = 0, reservation_seconds: float = 2.0, redis_client=None):
+        self.limits = resource_limits()
+        self.local_reservation = max(0, local_reservation)
+        self.reservation_seconds = reservation_seconds
+        # (user_id, resource_type) -> [tokens, expires_at (monotonic), remaining when reserved]
+        self._reserved: Dict[Tuple[str, str], List[float]] = {}
+        # (user_id, resource_type) -> last acquire that went to Redis (monotonic)
+        self._last_acquired: Dict[Tuple[str, str], float] = {}
+        # In-memory fallback for local dev: TAT key -> TAT (ms)
+        self._memory_tats: Dict[str, float] = {}
         self.use_redis = False
         self.redis_client = None
+        self._script = None
+        self.stats = {
+            'redis_calls': 0,
+            'local_hits': 0,
+            'denied': 0,
+            'errors': 0,
+        }
 
         # Try to use Redis for distributed rate limiting
         try:
-            from src.utils.redis_client import redis_client
+            if redis_client is None:
+                from src.utils.redis_client import redis_client
             if redis_client:
                 self.redis_client = redis_client
+                self._script = redis_client.register_script(GCRA_SCRIPT)
                 self.use_redis = True
                 logger.info("Rate limiter using Redis (distributed)")
         except Exception as e:
             logger.warning(f"Redis not available for rate limiting: {e}. Using in-memory (local only)")
 
+    @staticmethod
+    def _key(user_id: str, resource_type: str, period: int) -> str:
+        # Hash tag keeps all keys of a user in one cluster slot, as the script needs.
+        return f"rate_limit:{{{user_id}}}:{resource_type}:{period}"
+
     async def check_limit(self, user_id: str, resource_type: str) -> tuple[bool, int]:
         """
-        Check if user has exceeded rate limit for resource type.
+        Check if user has exceeded rate limit for resource type, without consuming.
         Returns (is_allowed, remaining_count)
         """
-        limits = {
-            "emails": settings.MAX_EMAILS,
-            "email_attachments": settings.MAX_EMAIL_ATTACHMENTS,
-            "whatsapp_messages": settings.MAX_WHATSAPP_MESSAGES,
-            "telegram_messages": settings.MAX_WHATSAPP_MESSAGES,
-            "gmail_webhooks": settings.MAX_GMAIL_WEBHOOKS_PER_HOUR,
-            "gmail_history_calls": settings.MAX_HISTORY_CALLS_PER_HOUR,
-            "http_requests": 1000,  # 1000 HTTP requests per hour per user
-            "file_uploads": 100,    # 100 file uploads per hour per user
-        }
-
-        if resource_type not in limits:
+        if resource_type not in self.limits:
             return True, float('inf')
+        reservation = self._reservation(user_id, resource_type)
+        if reservation is not None and reservation[0] >= 1:
+            self.stats['local_hits'] += 1
+            return True, int(reservation[2] + reservation[0])
+        granted, remaining, _ = await self._run(user_id, resource_type, 1, 1, DRY_RUN)
+        return granted >= 1, remaining
 
-        max_limit = limits[resource_type]
-
-        if self.use_redis:
-            return await self._check_limit_redis(user_id, resource_type, max_limit)
-        else:
-            return await self._check_limit_memory(user_id, resource_type, max_limit)
-
-    async def _check_limit_redis(self, user_id: str, resource_type: str, max_limit: int) -> tuple[bool, int]:
-        """Redis-based rate limiting (works across pods)"""
-        try:
-            # Key format: rate_limit:{user_id}:{resource_type}:{hour}
-            # Using hour-based windows
-            now = datetime.utcnow()
-            hour_key = now.strftime('%Y%m%d%H')
-            redis_key = f"rate_limit:{user_id}:{resource_type}:{hour_key}"
-
-            # Direct async call
-            count_str = await self.redis_client.get(redis_key)
-            current_count = int(count_str) if count_str else 0
+    async def acquire(self, user_id: str, resource_type: str, count: int = 1) -> tuple[bool, int]:
+        """
+        Check and consume `count` units atomically (all limits of the resource, or none).
+        Returns (is_allowed, remaining_count)
+        """
+        if resource_type not in self.limits:
+            return True, float('inf')
+        reservation = self._reservation(user_id, resource_type)
+        if reservation is not None and reservation[0] >= count:
+            reservation[0] -= count
+            self.stats['local_hits'] += 1
+            return True, int(reservation[2] + reservation[0])
 
-            is_allowed = current_count < max_limit
-            remaining = max_limit - current_count
+        granted, remaining, retry_after_ms = await self._run(
+            user_id, resource_type, count, count + self._reservation_size(user_id, resource_type), ACQUIRE
+        )
+        if granted < count:
+            self.stats['denied'] += 1
+            logger.debug(f"Rate limit hit for {user_id} on {resource_type}; retry in {retry_after_ms}ms")
+            return False, remaining
+        if granted > count:
+            self._reserved[(user_id, resource_type)] = [
+                granted - count, time.monotonic() + self.reservation_seconds, remaining
+            ]
+        return True, remaining + (granted - count)
 
-            return is_allowed, remaining
+    async def increment_usage(self, user_id: str, resource_type: str, count: int = 1):
+        """Record usage after the fact (consumed even past the limit)."""
+        if resource_type not in self.limits:
+            return
+        reservation = self._reservation(user_id, resource_type)
+        if reservation is not None and reservation[0] >= count:
+            reservation[0] -= count
+            self.stats['local_hits'] += 1
+            return
+        await self._run(user_id, resource_type, count, count, FORCE)
 
-        except Exception as e:
-            logger.error(f"Redis rate limit check failed: {e}, allowing request")
-            return True, max_limit  # Fail open
+    def _reservation_size(self, user_id: str, resource_type: str) -> int:
+        """Extra tokens to reserve: only for a user and resource acquired within the window."""
+        if not self.local_reservation:
+            return 0
+        key = (user_id, resource_type)
+        now = time.monotonic()
+        previous = self._last_acquired.get(key)
+        if len(self._last_acquired) > 10000:
+            self._last_acquired = {
+                k: t for k, t in self._last_acquired.items() if now - t < self.reservation_seconds
+            }
+        self._last_acquired[key] = now
+        if previous is None or now - previous >= self.reservation_seconds:
+            return 0
+        return self.local_reservation
 
-    def _check_limit_memory(self, user_id: str, resource_type: str, max_limit: int) -> tuple[bool, int]:
-        """In-memory rate limiting (local dev only)"""
-        current_count = self.usage_counts[user_id][resource_type]
+    def _reservation(self, user_id: str, resource_type: str) -> Optional[List[float]]:
+        key = (user_id, resource_type)
+        reservation = self._reserved.get(key)
+        if reservation is None:
+            return None
+        if reservation[0] <= 0 or reservation[1] <= time.monotonic():
+            del self._reserved[key]
+            return None
+        return reservation
 
-        # Reset count if it's a new day (simple daily reset)
-        now = datetime.utcnow()
-        reset_time = self.reset_times[user_id][resource_type]
+    async def _run(self, user_id: str, resource_type: str, want_min: int, want_max: int, mode: int) -> Tuple[int, int, int]:
+        limits = self.limits[resource_type]
+        keys = [self._key(user_id, resource_type, period) for _, period in limits]
+        args = [want_min, want_max, mode]
+        for max_count, period in limits:
+            period_ms = period * 1000
+            args.extend([period_ms, period_ms / max(max_count, 1)])
 
-        # Handle case where reset_time might be default value
-        if isinstance(reset_time, datetime) and now.date() > reset_time.date():
-            self.usage_counts[user_id][resource_type] = 0
-            self.reset_times[user_id][resource_type] = now
-            current_count = 0
-        elif not isinstance(reset_time, datetime):
-            # Initialize reset time if not set properly
-            self.reset_times[user_id][resource_type] = now
+        if self.use_redis:
+            try:
+                self.stats['redis_calls'] += 1
+                granted, remaining, retry_after = await self._script(keys=keys, args=args)
+                return int(granted), int(remaining), int(retry_after)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Redis rate limit check failed: {e}, allowing request")
+                return want_max, min(m for m, _ in limits), 0  # Fail open
+        return self._run_memory(keys, args)
 
-        is_allowed = current_count < max_limit
-        remaining = max_limit - current_count
+    def _run_memory(self, keys: List[str], args: List[float]) -> Tuple[int, int, int]:
+        """In-memory GCRA (local dev only); same semantics as GCRA_SCRIPT."""
+        now = time.time() * 1000
+        want_min, want_max, mode = args[0], args[1], args[2]
+        limits = [(args[3 + 2 * i], args[4 + 2 * i]) for i in range(len(keys))]
+        tats = [max(self._memory_tats.get(key, now), now) for key in keys]
 
-        return is_allowed, remaining
+        fits_all = want_max
+        retry_after = 0.0
+        for tat, (period, interval) in zip(tats, limits):
+            fits = math.floor((period - (tat - now)) / interval)
+            fits_all = min(fits_all, fits)
+            if fits < want_min:
+                retry_after = max(retry_after, tat + want_min * interval - period - now)
 
-    async def increment_usage(self, user_id: str, resource_type: str, count: int = 1):
-        """Increment usage count for user and resource type"""
-        if self.use_redis:
-            await self._increment_redis(user_id, resource_type, count)
+        if mode == FORCE:
+            granted = want_max
+        elif fits_all >= want_min:
+            granted = min(max(fits_all, 0), want_max)
         else:
-            self._increment_memory(user_id, resource_type, count)
+            granted = 0
 
-    async def _increment_redis(self, user_id: str, resource_type: str, count: int):
-        """Increment in Redis"""
-        try:
-            now = datetime.utcnow()
-            hour_key = now.strftime('%Y%m%d%H')
-            redis_key = f"rate_limit:{user_id}:{resource_type}:{hour_key}"
-
-            # Increment counter
-            await self.redis_client.incrby(redis_key, count)
-            # Set expiry to 2 hours (allow for clock skew)
-            await self.redis_client.expire(redis_key, 7200)
-
-        except Exception as e:
-            logger.error(f"Redis increment failed: {e}")
+        consumed = granted if mode != DRY_RUN else 0
+        remaining = None
+        for key, tat, (period, interval) in zip(keys, tats, limits):
+            new_tat = tat + consumed * interval
+            if consumed:
+                self._memory_tats[key] = new_tat
+            left = math.floor((period - (new_tat - now)) / interval)
+            remaining = left if remaining is None else min(remaining, left)
+        return granted, max(remaining or 0, 0), math.ceil(retry_after)
 
-    def _increment_memory(self, user_id: str, resource_type: str, count: int):
-        """Increment in memory"""
-        self.usage_counts[user_id][resource_type] += count
+    def get_stats(self) -> Dict:
+        """Get limiter statistics for monitoring"""
+        return {**self.stats, 'local_reservations': len(self._reserved)}
 
-        # Set reset time if not set
-        if resource_type not in self.reset_times[user_id]:
-            self.reset_times[user_id][resource_type] = datetime.utcnow()
 
 # Global rate limiter instance
-rate_limiter = RateLimiter()
\ No newline at end of file
+rate_limiter = RateLimiter(
+    local_reservation=settings.RATE_LIMITER_LOCAL_RESERVATION,
+    reservation_seconds=settings.RATE_LIMITER_RESERVATION_SECONDS,
+)
@@ -0,0 +1,187 @@
+"""
+Per-process Redis pub/sub multiplexer.
+
+Instead of one pubsub connection per websocket, every channel a process listens on is
+subscribed on a single shared connection. One listener task blocks on that connection and
+dispatches each message in-process to the queues of the local subscribers of its channel.
+Channels are subscribed when their first local subscriber arrives and unsubscribed when the
+last one leaves, so a process only receives traffic for the sockets it actually holds.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Set
+
+from src.config.settings import settings
+from src.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ChannelSubscription:
+    """A single local consumer of a channel."""
+
+    def __init__(self, channel: str, max_queue: int):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def _deliver(self, data: str):
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # Same at-most-once semantics as Redis pub/sub for a slow consumer.
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning(f"Subscriber on {self.channel} is not keeping up; dropped {self.dropped} message(s)")
+
+    async def get(self) -> str:
+        """Wait for the next message on the channel."""
+        return await self.queue.get()
+
+
+class RedisPubSubMultiplexer:
+    """Shares one Redis pubsub connection between all local subscribers of this process."""
+
+    def __init__(self, max_queue: int = 1000, reconnect_delay: float = 1.0):
+        self.max_queue = max_queue
+        self.reconnect_delay = reconnect_delay
+        self._pubsub = None
+        self._subscribers: Dict[str, Set[ChannelSubscription]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._has_subscriptions: Optional[asyncio.Event] = None
+
+        self.stats = {
+            'messages_received': 0,
+            'messages_dispatched': 0,
+            'reconnects': 0,
+        }
+
+    def _ensure_primitives(self):
+        # Created lazily so they bind to the running loop.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+            self._has_subscriptions = asyncio.Event()
+
+    def _get_pubsub(self):
+        if self._pubsub is None:
+            from src.utils.redis_client import redis_client
+            self._pubsub = redis_client.pubsub()
+        return self._pubsub
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        """Subscribe to a channel for the duration of the block; yields a ChannelSubscription."""
+        subscription = await self.add_subscriber(channel)
+        try:
+            yield subscription
+        finally:
+            await self.remove_subscriber(subscription)
+
+    async def add_subscriber(self, channel: str) -> ChannelSubscription:
+        self._ensure_primitives()
+        subscription = ChannelSubscription(channel, self.max_queue)
+        async with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is None:
+                subscribers = set()
+                self._subscribers[channel] = subscribers
+                await self._get_pubsub().subscribe(channel)
+                logger.info(f"Multiplexer subscribed to Redis channel '{channel}' ({len(self._subscribers)} active)")
+            subscribers.add(subscription)
+            self._has_subscriptions.set()
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.create_task(self._listen())
+        return subscription
+
+    async def remove_subscriber(self, subscription: ChannelSubscription):
+        self._ensure_primitives()
+        async with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if subscribers:
+                return
+            del self._subscribers[subscription.channel]
+            if not self._subscribers:
+                self._has_subscriptions.clear()
+            try:
+                await self._get_pubsub().unsubscribe(subscription.channel)
+            except Exception as e:
+                logger.warning(f"Failed to unsubscribe from Redis channel '{subscription.channel}': {e}")
+
+    async def _listen(self):
+        """Blocking read loop on the shared connection; idles on an event when nothing is subscribed."""
+        while True:
+            try:
+                await self._has_subscriptions.wait()
+                # timeout=None blocks on the socket; None comes back only for (un)subscribe confirmations.
+                message = await self._get_pubsub().get_message(ignore_subscribe_messages=True, timeout=None)
+                if message is None:
+                    continue
+                self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis pubsub listener error, reconnecting in {self.reconnect_delay}s: {e}", exc_info=True)
+                self.stats['reconnects'] += 1
+                await asyncio.sleep(self.reconnect_delay)
+                await self._reconnect()
+
+    def _dispatch(self, message: dict):
+        self.stats['messages_received'] += 1
+        channel = message.get("channel")
+        if isinstance(channel, bytes):
+            channel = channel.decode("utf-8", errors="replace")
+        data = message.get("data")
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", errors="replace")
+        for subscription in tuple(self._subscribers.get(channel, ())):
+            subscription._deliver(data)
+            self.stats['messages_dispatched'] += 1
+
+    async def _reconnect(self):
+        async with self._lock:
+            old, self._pubsub = self._pubsub, None
+            if old is not None:
+                try:
+                    await old.close()
+                except Exception:
+                    pass
+            channels = list(self._subscribers)
+            if channels:
+                try:
+                    await self._get_pubsub().subscribe(*channels)
+                    logger.info(f"Resubscribed {len(channels)} Redis channel(s) after reconnect")
+                except Exception as e:
+                    logger.error(f"Failed to resubscribe Redis channels: {e}")
+
+    async def close(self):
+        """Stop the listener and release the shared connection (call on shutdown)."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.close()
+            except Exception:
+                pass
+            self._pubsub = None
+        self._subscribers.clear()
+
+    def get_state(self) -> Dict:
+        """Get multiplexer state for monitoring"""
+        return {
+            'channels': len(self._subscribers),
+            'subscribers': sum(len(s) for s in self._subscribers.values()),
+            'stats': self.stats.copy(),
+        }
+
+
+# Global instance
+redis_pubsub_multiplexer = RedisPubSubMultiplexer(max_queue=settings.WS_SUBSCRIBER_QUEUE_SIZE)
@@ -0,0 +1,154 @@
+"""
+Local SAS URL signing for Azure Blob Storage.
+
+A SAS token is an HMAC over the resource path and permissions using the account key, so it
+needs no network round trip. The storage connection string is parsed once per process, and
+signed URLs are cached per (container, blob) until they get close to expiring.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import quote
+
+from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+from src.config.settings import settings
+from src.utils.logging.base_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def parse_storage_connection_string(connection_string: str) -> Dict[str, str]:
+    """Split an Azure Storage connection string into its key/value parts."""
+    parts = {}
+    for segment in connection_string.split(';'):
+        if not segment.strip() or '=' not in segment:
+            continue
+        key, value = segment.split('=', 1)
+        parts[key.strip()] = value.strip()
+    return parts
+
+
+class BlobSasSigner:
+    """Signs read-only blob SAS URLs locally and caches them until shortly before expiry."""
+
+    def __init__(
+        self,
+        connection_string: Optional[str] = None,
+        expiry_hours: float = 48,
+        min_remaining_seconds: float = 6 * 3600,
+        max_entries: int = 10000,
+    ):
+        self._connection_string = connection_string
+        self.expiry = timedelta(hours=expiry_hours)
+        self.min_remaining_seconds = min_remaining_seconds
+        self.max_entries = max_entries
+
+        self._account_name: Optional[str] = None
+        self._account_key: Optional[str] = None
+        self._account_url: Optional[str] = None
+
+        # (container, blob) -> (url, expires_at epoch seconds)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self.stats = {
+            'hits': 0,
+            'signed': 0,
+            'evictions': 0,
+        }
+
+    def _ensure_credentials(self):
+        if self._account_key is not None:
+            return
+        conn = parse_storage_connection_string(
+            self._connection_string or settings.AZURE_STORAGE_CONNECTION_STRING or ""
+        )
+        account_name = conn.get('AccountName')
+        account_key = conn.get('AccountKey')
+        if not account_name or not account_key:
+            raise ValueError("Storage connection string must contain AccountName and AccountKey to sign SAS URLs")
+
+        blob_endpoint = conn.get('BlobEndpoint')
+        if blob_endpoint:
+            account_url = blob_endpoint.rstrip('/')
+        else:
+            protocol = conn.get('DefaultEndpointsProtocol', 'https')
+            suffix = conn.get('EndpointSuffix', 'core.windows.net')
+            account_url = f"{protocol}://{account_name}.blob.{suffix}"
+
+        self._account_name = account_name
+        self._account_url = account_url
+        self._account_key = account_key
+
+    def blob_url(self, container_name: str, blob_name: str) -> str:
+        """Unsigned blob URL, encoded the same way BlobClient.url is."""
+        self._ensure_credentials()
+        return f"{self._account_url}/{quote(container_name)}/{quote(blob_name, safe='~/')}"
+
+    def sign(self, blob_name: str, container_name: Optional[str] = None) -> str:
+        """Return a read SAS URL for a blob, reusing a cached one that is still valid long enough."""
+        if container_name is None:
+            container_name = settings.AZURE_BLOB_CONTAINER_NAME
+
+        key = (container_name, blob_name)
+        now = time.time()
+        entry = self._cache.get(key)
+        if entry is not None:
+            url, expires_at = entry
+            if expires_at - now > self.min_remaining_seconds:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return url
+            del self._cache[key]
+
+        self._ensure_credentials()
+        expiry = datetime.utcnow() + self.expiry
+        sas_token = generate_blob_sas(
+            account_name=self._account_name,
+            container_name=container_name,
+            blob_name=blob_name,
+            account_key=self._account_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=expiry
+        )
+        url = f"{self.blob_url(container_name, blob_name)}?{sas_token}"
+        self.stats['signed'] += 1
+
+        self._cache[key] = (url, now + self.expiry.total_seconds())
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.stats['evictions'] += 1
+        return url
+
+    def sign_many(self, blobs: Iterable[Tuple[str, Optional[str]]]) -> Dict[Tuple[str, str], str]:
+        """
+        Sign several blobs at once.
+
+        Args:
+            blobs: (blob_name, container_name) pairs; container_name may be None for the default container
+
+        Returns:
+            Dict mapping (container_name, blob_name) to its SAS URL
+        """
+        urls = {}
+        for blob_name, container_name in blobs:
+            container_name = container_name or settings.AZURE_BLOB_CONTAINER_NAME
+            key = (container_name, blob_name)
+            if key not in urls:
+                urls[key] = self.sign(blob_name, container_name)
+        return urls
+
+    def invalidate(self, blob_name: str, container_name: Optional[str] = None):
+        self._cache.pop((container_name or settings.AZURE_BLOB_CONTAINER_NAME, blob_name), None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get signer statistics for monitoring"""
+        return {**self.stats, 'cached_urls': len(self._cache)}
+
+
+# Singleton instance
+blob_sas_signer = BlobSasSigner(
+    expiry_hours=settings.BLOB_SAS_EXPIRY_HOURS,
+    min_remaining_seconds=settings.BLOB_SAS_MIN_REMAINING_SECONDS,
+    max_entries=settings.BLOB_SAS_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,79 @@
+"""
+Small in-process TTL cache for read-through caching of hot lookups.
+Entries expire after a fixed TTL, the cache is bounded LRU, and a version counter per key
+keeps a read that started before an invalidation from re-populating stale data.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire `ttl_seconds` after they were stored."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # key -> (expires_at, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._versions: Dict[Hashable, int] = {}
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'evictions': 0,
+        }
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.stats['misses'] += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats['misses'] += 1
+            return default
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return value
+
+    def version(self, key: Hashable) -> int:
+        """Token to pass to `set` so a load that raced an invalidation is discarded."""
+        return self._versions.get(key, 0)
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        if version is not None and version != self._versions.get(key, 0):
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate(self, key: Hashable):
+        self._versions[key] = self._versions.get(key, 0) + 1
+        if len(self._versions) > self.max_entries * 2:
+            # Versions only need to outlive in-flight loads; drop them wholesale when they pile up.
+            self._versions.clear()
+        if self._entries.pop(key, None) is not None:
+            self.stats['invalidations'] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._versions.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics for monitoring"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self._entries),
+            'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+        }
@@ -1,7 +1,13 @@
 import asyncio
+import os
+import socket
+import time
+import uuid
 from datetime import datetime
-from typing import Dict, List, Optional
-from src.utils.database import ConversationDatabase
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from src.config.settings import settings
+from src.utils.database import ConversationDatabase, MESSAGE_CONSOLIDATION_PROJECTION
 from src.core.praxos_client import PraxosClient
 from src.services.user_service import user_service
 from src.services.ai_service.ai_service import ai_service
@@ -12,11 +18,37 @@ class ConversationConsolidator:
     def __init__(self, db_manager: ConversationDatabase):
         self.db = db_manager
         self.logger = setup_logger("conversation_consolidator")
+        # Identifies this worker's leases in Mongo
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.max_concurrent_users = max(1, settings.CONSOLIDATION_MAX_CONCURRENT_USERS)
+        self.lease_seconds = settings.CONSOLIDATION_LEASE_SECONDS
+        self._praxos_limit: Optional[asyncio.Semaphore] = None
+        self._blob_limit: Optional[asyncio.Semaphore] = None
+        self.metrics = {
+            'cycles': 0,
+            'conversations_consolidated': 0,
+            'conversations_failed': 0,
+            'users_skipped_leased': 0,
+            'users_in_flight': 0,
+            'last_cycle_seconds': 0.0,
+            'last_cycle_users': 0,
+            'last_consolidation_lag_seconds': None,
+            'max_consolidation_lag_seconds': 0.0,
+        }
+
+    def _ensure_limits(self):
+        # Created lazily so they bind to the running loop.
+        if self._praxos_limit is None:
+            self._praxos_limit = asyncio.Semaphore(settings.CONSOLIDATION_PRAXOS_CONCURRENCY)
+            self._blob_limit = asyncio.Semaphore(settings.CONSOLIDATION_BLOB_CONCURRENCY)
 
     
     async def consolidate_conversation(self, conversation_id: int) -> bool:
         """Consolidate a single conversation to Praxos"""
+        self._ensure_limits()
         try:
+            # Activity after this point leaves the conversation pending for the next pass.
+            pass_started_at = datetime.utcnow()
             conversation = await self.db.get_conversation_info(conversation_id)
             ### now that we have this, we can 
             if not conversation:
@@ -25,10 +57,13 @@ class ConversationConsolidator:
             logger.info(f"Found conversation {conversation_id}")
             # Get only unconsolidated messages
             message_dict = {} 
-            messages = await self.db.get_unconsolidated_messages(conversation_id, limit=100)
+            messages = await self.db.get_unconsolidated_messages(
+                conversation_id, limit=100, projection=MESSAGE_CONSOLIDATION_PROJECTION
+            )
             
             if not messages:
                 logger.info(f"No new messages to consolidate for conversation {conversation_id}")
+                await self.db.set_conversation_consolidated_at(conversation_id, pass_started_at)
                 return True
 
             try:
@@ -116,7 +151,8 @@ class ConversationConsolidator:
                             logger.info(f"Ingesting document to Praxos: {file_name}")
 
                             # Download from blob storage
-                            file_bytes = await download_from_blob_storage(blob_path)
+                            async with self._blob_limit:
+                                file_bytes = await download_from_blob_storage(blob_path)
 
                             # Create temp file for Praxos add_file (requires path)
                             with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file_name}") as tmp:
@@ -125,11 +161,12 @@ class ConversationConsolidator:
 
                             try:
                                 # Send to Praxos with conversation context
-                                result = await praxos_client.add_file(
-                                    file_path=tmp_path,
-                                    name=file_name,
-                                    description=f"Document from conversation {conversation_id}: {file_doc.get('caption', file_name)}"
-                                )
+                                async with self._praxos_limit:
+                                    result = await praxos_client.add_file(
+                                        file_path=tmp_path,
+                                        name=file_name,
+                                        description=f"Document from conversation {conversation_id}: {file_doc.get('caption', file_name)}"
+                                    )
 
                                 if result and result.get('success'):
                                     source_id = result['id']
@@ -168,22 +205,23 @@ class ConversationConsolidator:
                 user_id=str(user_record["_id"]),
                 environment_id=str(user_record["environment_id"]),
             )
-            source_data = await praxos_client.add_conversation(
-                    user_id=conversation_user_id,
-                    source='conversation_summary',
-                    messages=messages,
-                    metadata={
-                        'conversation_id': conversation_id,
-                        'message_count': len(messages),
-                        'search_attempts': len(search_attempts),
-                        'platform': conversation['platform'],
-                        'start_time': conversation['start_time'],
-                        'end_time': conversation['last_activity'],
-                        'origin': 'conversation'
-                    },
-                    user_record=user_record,
-                    conversation_id=conversation_id
-                )
+            async with self._praxos_limit:
+                source_data = await praxos_client.add_conversation(
+                        user_id=conversation_user_id,
+                        source='conversation_summary',
+                        messages=messages,
+                        metadata={
+                            'conversation_id': conversation_id,
+                            'message_count': len(messages),
+                            'search_attempts': len(search_attempts),
+                            'platform': conversation['platform'],
+                            'start_time': conversation['start_time'],
+                            'end_time': conversation['last_activity'],
+                            'origin': 'conversation'
+                        },
+                        user_record=user_record,
+                        conversation_id=conversation_id
+                    )
             
             # Mark these specific messages as consolidated
             await self.db.mark_messages_consolidated(messages_to_mark)
@@ -191,6 +229,11 @@ class ConversationConsolidator:
             source_id = source_data.get('id', '')
             await self.db.update_conversation_praxos_source_id(conversation_id, source_id)
 
+            # A full page means more unconsolidated messages remain; keep it pending.
+            if len(messages) < 100:
+                await self.db.set_conversation_consolidated_at(conversation_id, pass_started_at)
+            self._record_lag(conversation)
+
             logger.info(f"Successfully consolidated {len(messages)} messages for conversation {conversation_id}")
             return True
             
@@ -312,59 +355,124 @@ class ConversationConsolidator:
             return "Unknown duration"
     
     async def consolidate_all_ready_conversations(self) -> Dict:
-        """Consolidate all conversations ready for consolidation"""
-        conversations = await self.db.get_conversations_to_consolidate()
+        """
+        Consolidate all conversations ready for consolidation.
+
+        Users are handed to a pool of CONSOLIDATION_MAX_CONCURRENT_USERS workers. Each user's
+        conversations are consolidated in activity order under a Mongo lease, so several worker
+        processes can share the backlog without consolidating the same user twice.
+        """
+        started = time.perf_counter()
+        users = await self.db.get_users_pending_consolidation(limit=settings.CONSOLIDATION_USERS_PER_CYCLE)
 
         results = {
-            'total': len(conversations),
+            'total': 0,
             'successful': 0,
             'failed': 0,
+            'users': len(users),
+            'users_skipped': 0,
             'errors': []
         }
-        self.logger.info(f"Consolidating {len(conversations)} conversations")
-        for conversation in conversations:
-            conversation_id = str(conversation['_id'])
-            try:
-                success = await self.consolidate_conversation(conversation_id)
-                if success:
-                    results['successful'] += 1
-                else:
-                    results['failed'] += 1
-                    results['errors'].append(f"Conversation {conversation_id}: Unknown error")
-            except Exception as e:
-                results['failed'] += 1
-                results['errors'].append(f"Conversation {conversation_id}: {str(e)}")
-        
+        self.logger.info(f"Consolidating conversations of {len(users)} users with {self.max_concurrent_users} workers")
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for user in users:
+            queue.put_nowait(user["_id"])
+
+        async def worker():
+            while True:
+                try:
+                    user_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._consolidate_user_under_lease(user_id, results)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.max_concurrent_users, len(users)))))
+
+        self.metrics['cycles'] += 1
+        self.metrics['last_cycle_users'] = len(users)
+        self.metrics['last_cycle_seconds'] = round(time.perf_counter() - started, 3)
+        self.logger.info(
+            f"Consolidation cycle done in {self.metrics['last_cycle_seconds']}s: "
+            f"{results['successful']} succeeded, {results['failed']} failed, {results['users_skipped']} users leased elsewhere"
+        )
         return results
-    
+
     async def consolidate_user_conversations(self, user_id: str) -> Dict:
         """Consolidate all ready conversations for a specific user"""
-        conversations = await self.db.get_conversations_to_consolidate()
-        user_conversations = [conv for conv in conversations if conv['user_id'] == user_id]
-        
         results = {
             'user_id': user_id,
-            'total': len(user_conversations),
+            'total': 0,
             'successful': 0,
             'failed': 0,
+            'users_skipped': 0,
             'errors': []
         }
-        
-        for conversation in user_conversations:
-            conversation_id = str(conversation['_id'])
-            try:
-                success = await self.consolidate_conversation(conversation_id)
-                if success:
-                    results['successful'] += 1
-                else:
+        owner_id = ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id
+        await self._consolidate_user_under_lease(owner_id, results)
+        return results
+
+    async def _consolidate_user_under_lease(self, user_id: Any, results: Dict):
+        """Consolidate one user's pending conversations in order while holding their lease."""
+        lease_key = str(user_id)
+        if not await self.db.acquire_consolidation_lease(lease_key, self.worker_id, self.lease_seconds):
+            results['users_skipped'] += 1
+            self.metrics['users_skipped_leased'] += 1
+            return
+
+        self.metrics['users_in_flight'] += 1
+        try:
+            conversations = await self.db.get_user_conversations_to_consolidate(user_id)
+            for conversation in conversations:
+                conversation_id = str(conversation['_id'])
+                # Renew before each conversation; stop if the lease was lost (e.g. we stalled past it).
+                if not await self.db.acquire_consolidation_lease(lease_key, self.worker_id, self.lease_seconds):
+                    self.logger.warning(f"Lost consolidation lease for user {lease_key}, leaving the rest to its new owner")
+                    break
+                results['total'] += 1
+                try:
+                    success = await self.consolidate_conversation(conversation_id)
+                    if success:
+                        results['successful'] += 1
+                        self.metrics['conversations_consolidated'] += 1
+                    else:
+                        results['failed'] += 1
+                        self.metrics['conversations_failed'] += 1
+                        results['errors'].append(f"Conversation {conversation_id}: Unknown error")
+                except Exception as e:
                     results['failed'] += 1
-                    results['errors'].append(f"Conversation {conversation_id}: Unknown error")
+                    self.metrics['conversations_failed'] += 1
+                    results['errors'].append(f"Conversation {conversation_id}: {str(e)}")
+        except Exception as e:
+            self.logger.error(f"Error consolidating conversations of user {lease_key}: {e}", exc_info=True)
+            results['errors'].append(f"User {lease_key}: {str(e)}")
+        finally:
+            self.metrics['users_in_flight'] -= 1
+            try:
+                await self.db.release_consolidation_lease(lease_key, self.worker_id)
             except Exception as e:
-                results['failed'] += 1
-                results['errors'].append(f"Conversation {conversation_id}: {str(e)}")
-        
-        return results
-    
+                # The lease expires on its own.
+                self.logger.warning(f"Failed to release consolidation lease for user {lease_key}: {e}")
+
+    def _record_lag(self, conversation: Dict):
+        last_activity = conversation.get('last_activity')
+        if not isinstance(last_activity, datetime):
+            return
+        lag = (datetime.utcnow() - last_activity).total_seconds()
+        self.metrics['last_consolidation_lag_seconds'] = round(lag, 1)
+        self.metrics['max_consolidation_lag_seconds'] = max(self.metrics['max_consolidation_lag_seconds'], round(lag, 1))
+
+    async def get_metrics(self) -> Dict:
+        """Queue depth, consolidation lag and throughput counters for monitoring"""
+        backlog = await self.db.get_consolidation_backlog()
+        oldest = backlog['oldest_activity']
+        return {
+            **self.metrics,
+            'worker_id': self.worker_id,
+            'queue_depth': backlog['pending'],
+            'oldest_pending_lag_seconds': round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0.0,
+        }
+
     async def get_consolidation_statistics(self) -> Dict:
         """Get statistics about conversations ready for consolidation"""
         conversations = await self.db.get_conversations_to_consolidate()
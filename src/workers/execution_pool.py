@@ -0,0 +1,115 @@
+"""
+Bounded, session-ordered execution pool for the execution worker.
+Runs up to N sessions concurrently while keeping strictly one in-flight run per session.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from src.utils.logging.base_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class SessionExecutionPool:
+    """
+    Executes session work concurrently with per-session ordering.
+
+    - At most `max_concurrency` submissions are admitted at any time. `submit` waits for a
+      free slot, which applies backpressure to the caller (the queue consumer stops pulling).
+    - Work for the same session key is serialized in submission order through a FIFO lock.
+    - `drain` waits for in-flight work to finish on shutdown, cancelling anything left
+      after the timeout.
+    """
+
+    def __init__(self, max_concurrency: int, drain_timeout: float = 120.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.drain_timeout = drain_timeout
+
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._session_pending: Dict[str, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = False
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+        }
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def submit(self, session_key: str, work: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """
+        Schedule `work` for `session_key`, waiting for a free slot first.
+        Returns the task running the work.
+        """
+        if self._closed:
+            raise RuntimeError("SessionExecutionPool is draining and no longer accepts work")
+
+        await self._slots.acquire()
+
+        lock = self._session_locks.get(session_key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._session_locks[session_key] = lock
+        self._session_pending[session_key] = self._session_pending.get(session_key, 0) + 1
+
+        task = asyncio.create_task(self._run(session_key, lock, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.stats['submitted'] += 1
+        return task
+
+    async def _run(self, session_key: str, lock: asyncio.Lock, work: Callable[[], Awaitable[Any]]):
+        try:
+            async with lock:
+                await work()
+            self.stats['completed'] += 1
+        except asyncio.CancelledError:
+            self.stats['cancelled'] += 1
+            logger.warning(f"Execution for session {session_key} was cancelled")
+            raise
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error(f"Unhandled error executing session {session_key}: {e}", exc_info=True)
+        finally:
+            self._release(session_key)
+
+    def _release(self, session_key: str):
+        remaining = self._session_pending.get(session_key, 1) - 1
+        if remaining <= 0:
+            self._session_pending.pop(session_key, None)
+            self._session_locks.pop(session_key, None)
+        else:
+            self._session_pending[session_key] = remaining
+        self._slots.release()
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Stop accepting work and wait for in-flight sessions, cancelling stragglers after the timeout."""
+        self._closed = True
+        timeout = self.drain_timeout if timeout is None else timeout
+        if not self._tasks:
+            return
+
+        logger.info(f"Draining execution pool: waiting up to {timeout}s for {len(self._tasks)} in-flight session(s)")
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if pending:
+            logger.warning(f"Execution pool drain timed out, cancelling {len(pending)} session(s)")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info(f"Execution pool drained: {self.stats}")
+
+    def get_state(self) -> Dict[str, Any]:
+        """Get current pool state for monitoring"""
+        return {
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self.in_flight,
+            'active_sessions': len(self._session_locks),
+            'draining': self._closed,
+            'stats': self.stats.copy(),
+        }
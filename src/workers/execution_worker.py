@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime
 from importlib import metadata
 from typing import Optional
@@ -13,6 +14,11 @@ from src.services.scheduling_service import scheduling_service
 from src.ingest.ingestion_worker import InitialIngestionCoordinator
 from src.egress.service import egress_service
 from src.utils.database import conversation_db, db_manager
+from src.utils.conversation_history_cache import conversation_history_cache
+from src.ingest.media_ingestion import media_ingestion_pipeline
+from src.utils.message_write_buffer import buffered_message_writes
+from src.workers.execution_pool import SessionExecutionPool
+from src.config.settings import settings
 import uuid
 logger = setup_logger(__name__)
 
@@ -20,55 +26,116 @@ class ExecutionWorker:
     """
     Listens to the event queue and triggers the appropriate action based on the event source.
     """
-    def __init__(self):
+    def __init__(self, max_concurrency: Optional[int] = None):
         
         self.ingestion_coordinator = InitialIngestionCoordinator()
+        self.pool = SessionExecutionPool(
+            max_concurrency=max_concurrency or settings.EXECUTION_WORKER_CONCURRENCY,
+            drain_timeout=settings.EXECUTION_WORKER_DRAIN_TIMEOUT_SECONDS,
+        )
 
     async def run(self):
-        """Main loop to consume events from the queue and execute them."""
-        logger.info("Starting execution worker...")
-        async for session_data in event_queue.consume():
-            if not session_data:
-                continue
-            
-            session_id = session_data.get('session_id')
-            events = session_data.get('events', [])
-            is_grouped = session_data.get('is_grouped', False)
-            
-            if not events:
-                continue
-                
-            
-            # Handle grouped messages (WhatsApp/Telegram rapid messages or forwards)
-            if is_grouped and len(events) > 1:
-                ### now, we put the metadata for logging.
-                
-                logger.info(f"Processing session {session_id} with {len(events)} event(s), grouped: {is_grouped}")
-                logging_context = events[0].get('logging_context', {})
+        """Main loop to consume events from the queue and execute them through the session pool."""
+        logger.info(f"Starting execution worker with concurrency {self.pool.max_concurrency}...")
+        if settings.TOOL_SHORTLIST_ENABLED:
+            from src.services.ai_service.tool_shortlist import tool_shortlister
+            # Embed the tool catalogue up front instead of on the first run.
+            asyncio.create_task(tool_shortlister.initialize())
+        from src.utils.circuit_breaker import run_circuit_breaker_metrics_publisher
+        metrics_publisher = asyncio.create_task(run_circuit_breaker_metrics_publisher())
+        try:
+            async for session_data in event_queue.consume():
+                if not session_data:
+                    continue
+
+                events = session_data.get('events', [])
+                if not events:
+                    self.mark_processed(session_data, True)
+                    continue
+
+                session_key = self.get_session_key(session_data)
+                try:
+                    # submit() waits for a free slot, so a full pool stops us pulling from the queue.
+                    task = await self.pool.submit(session_key, lambda data=session_data: self.run_session(data))
+                except BaseException:
+                    self.mark_processed(session_data, False)
+                    raise
+                # Covers runs cancelled by the drain before they started.
+                task.add_done_callback(lambda _, data=session_data: self.mark_processed(data, False))
+        finally:
+            metrics_publisher.cancel()
+            await self.pool.drain()
+            # Completes what ran and abandons what didn't, so it is redelivered.
+            await event_queue.close()
+            from src.core.run_cancellation import run_cancellation
+            await run_cancellation.close()
+
+    @staticmethod
+    def mark_processed(session_data: dict, success: bool):
+        """Tell the queue whether a consumed group ran, so it completes or abandons its messages."""
+        processed = session_data.get('processed')
+        if processed is not None and not processed.done():
+            processed.set_result(success)
+
+    async def run_session(self, session_data: dict):
+        success = False
+        try:
+            await self.process_session(session_data)
+            success = True
+        finally:
+            self.mark_processed(session_data, success)
+
+    def get_session_key(self, session_data: dict) -> str:
+        """Key used to serialize runs: the Service Bus session, else source_user_id as in the queue."""
+        session_id = session_data.get('session_id')
+        if session_id and session_id != 'no-session':
+            return session_id
+        first_event = session_data.get('events', [{}])[0]
+        user_id = first_event.get('user_id')
+        source = first_event.get('source', 'unknown')
+        return f"{source}_{user_id}" if user_id else f"system_{source}"
+
+    async def process_session(self, session_data: dict):
+        """Process one consumed session: a group of related events or a sequence of single events."""
+        session_id = session_data.get('session_id')
+        events = session_data.get('events', [])
+        is_grouped = session_data.get('is_grouped', False)
+
+        # Webhooks publish media as pending references; download and store them before processing.
+        events = await media_ingestion_pipeline.resolve_events(events)
+        if not events:
+            return
+
+        # Handle grouped messages (WhatsApp/Telegram rapid messages or forwards)
+        if is_grouped and len(events) > 1:
+            ### now, we put the metadata for logging.
+
+            logger.info(f"Processing session {session_id} with {len(events)} event(s), grouped: {is_grouped}")
+            logging_context = events[0].get('logging_context', {})
+            if logging_context:
+                #{'user_id': str(user_record["_id"]), 'request_id': str(request_id_var.get()), 'modality': modality_var.get() }
+                user_id_var.set(logging_context.get('user_id','annonymous'))
+                request_id_var.set(logging_context.get('request_id',uuid.uuid4().hex))
+                modality_var.set(logging_context.get('modality','no_modality'))
+            else:
+                user_id_var.set(events[0].get('user_id','annonymous'))
+                request_id_var.set(uuid.uuid4().hex)
+                modality_var.set(events[0].get('source','no_modality'))
+            await self.handle_grouped_events(events, session_id)
+        else:
+            # Single event processing (existing logic)
+            for event in events:
+                logging_context = event.get('logging_context', {})
                 if logging_context:
                     #{'user_id': str(user_record["_id"]), 'request_id': str(request_id_var.get()), 'modality': modality_var.get() }
                     user_id_var.set(logging_context.get('user_id','annonymous'))
                     request_id_var.set(logging_context.get('request_id',uuid.uuid4().hex))
                     modality_var.set(logging_context.get('modality','no_modality'))
                 else:
-                    user_id_var.set(events[0].get('user_id','annonymous'))
+                    user_id_var.set(event.get('user_id','annonymous'))
                     request_id_var.set(uuid.uuid4().hex)
-                    modality_var.set(events[0].get('source','no_modality'))
-                await self.handle_grouped_events(events, session_id)
-            else:
-                # Single event processing (existing logic)
-                for event in events:
-                    logging_context = event.get('logging_context', {})
-                    if logging_context:
-                        #{'user_id': str(user_record["_id"]), 'request_id': str(request_id_var.get()), 'modality': modality_var.get() }
-                        user_id_var.set(logging_context.get('user_id','annonymous'))
-                        request_id_var.set(logging_context.get('request_id',uuid.uuid4().hex))
-                        modality_var.set(logging_context.get('modality','no_modality'))
-                    else:
-                        user_id_var.set(event.get('user_id','annonymous'))
-                        request_id_var.set(uuid.uuid4().hex)
-                        modality_var.set(event.get('source','no_modality'))
-                    await self.handle_single_event(event)
+                    modality_var.set(event.get('source','no_modality'))
+                await self.handle_single_event(event)
 
     async def handle_grouped_events(self, events, session_id):
         """Handle multiple related events as a group (e.g., forwarded messages)"""
@@ -182,6 +249,7 @@ class ExecutionWorker:
                     "metadata.asynchronous_task_recieved_at": datetime.utcnow()
                 }}
             )
+            await conversation_history_cache.invalidate(conversation_id)
 
         requested_tasks = await conversation_db.messages.find({
             "conversation_id": ObjectId(conversation_id),
@@ -294,16 +362,19 @@ class ExecutionWorker:
                     stream_buffer = NoOpStreamBuffer()
                     logger.info(f"Using NoOpStreamBuffer for {source}")
 
-                self.langgraph_agent_runner = LangGraphAgentRunner(trace_id=f"exec-{str(event['user_id'])}-{datetime.utcnow().isoformat()}", has_media=has_media)
+                # Local, not an attribute: several sessions run concurrently on this worker.
+                langgraph_agent_runner = LangGraphAgentRunner(trace_id=f"exec-{str(event['user_id'])}-{datetime.utcnow().isoformat()}", has_media=has_media)
                 trigger_agent = event.get("metadata", {}).get("trigger_agent", True)
-                result = await self.langgraph_agent_runner.run(
-                    user_context=user_context,
-                    input=event["payload"],
-                    source=source,
-                    metadata=event.get("metadata", {}),
-                    stream_buffer=stream_buffer,  # NEW parameter
-                    trigger_agent=trigger_agent
-                )
+                # Messages of the whole turn are written in batches; leaving the block flushes them before egress.
+                async with buffered_message_writes(conversation_db):
+                    result = await langgraph_agent_runner.run(
+                        user_context=user_context,
+                        input=event["payload"],
+                        source=source,
+                        metadata=event.get("metadata", {}),
+                        stream_buffer=stream_buffer,  # NEW parameter
+                        trigger_agent=trigger_agent
+                    )
                 if trigger_agent:
                     await self.post_process_langgraph_response(result, event, typing_task_id)
                 else:
@@ -504,5 +575,8 @@ class ExecutionWorker:
 
 async def execution_task():
     """Entry point for the execution worker background task."""
+    # Pay the model-client and graph-compile cost at startup instead of on the first turn.
+    from src.core.agent_runtime import agent_runtime
+    agent_runtime.ensure_built()
     worker = ExecutionWorker()
     await worker.run()
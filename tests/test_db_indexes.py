@@ -0,0 +1,40 @@
+"""
+Declared indexes against a real MongoDB: every hot query shape must be index-covered.
+
+Skipped unless MONGO_TEST_URI points at a disposable mongod, e.g.
+    MONGO_TEST_URI=mongodb://localhost:27017 python -m pytest tests/test_db_indexes.py
+A uniquely named database is created for the run and dropped afterwards.
+"""
+import asyncio
+import os
+import uuid
+
+import pytest
+
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI")
+if not MONGO_TEST_URI:
+    pytest.skip("MONGO_TEST_URI is not set", allow_module_level=True)
+
+motor_asyncio = pytest.importorskip("motor.motor_asyncio")
+
+from src.utils.db_indexes import INDEXES, check_query_plans, ensure_indexes
+
+
+def test_hot_queries_are_index_covered():
+    async def run():
+        client = motor_asyncio.AsyncIOMotorClient(MONGO_TEST_URI, serverSelectionTimeoutMS=5000)
+        db_name = f"test_db_indexes_{uuid.uuid4().hex[:12]}"
+        try:
+            db = client[db_name]
+            ensured = await ensure_indexes(db)
+            report = await check_query_plans(db)
+            return ensured, report
+        finally:
+            await client.drop_database(db_name)
+            client.close()
+
+    ensured, report = asyncio.run(run())
+    assert ensured['ensured'] == len(INDEXES)
+    assert not ensured['conflicts'] and not ensured['failed']
+    uncovered = {name: plan['stages'] for name, plan in report.items() if not plan['covered']}
+    assert not uncovered
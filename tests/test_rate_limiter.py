@@ -0,0 +1,135 @@
+"""
+GCRA rate limiter against fakeredis with Lua scripting (fakeredis[lua]).
+
+Run from the repository root: python -m pytest tests
+"""
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from src.utils.rate_limiter import RateLimiter
+
+LIMITS = {
+    "single": [(5, 3600)],
+    "multi": [(10, 3600), (3, 60)],
+}
+
+
+def make_limiter(use_redis: bool = True, **kwargs) -> RateLimiter:
+    client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    limiter = RateLimiter(redis_client=client, **kwargs)
+    limiter.limits = dict(LIMITS)
+    limiter.use_redis = use_redis
+    return limiter
+
+
+@pytest.mark.parametrize("use_redis", [True, False])
+def test_concurrent_acquire_at_limit(use_redis):
+    limiter = make_limiter(use_redis)
+
+    async def run():
+        return await asyncio.gather(*(limiter.acquire("u1", "single") for _ in range(20)))
+
+    results = asyncio.run(run())
+    assert sum(allowed for allowed, _ in results) == 5
+    assert limiter.stats['denied'] == 15
+
+
+@pytest.mark.parametrize("use_redis", [True, False])
+def test_multi_limit_all_or_nothing(use_redis):
+    limiter = make_limiter(use_redis)
+
+    async def run():
+        # 4 fits the hourly limit but not the per-minute one: nothing may be consumed
+        denied, _ = await limiter.acquire("u1", "multi", count=4)
+        allowed, remaining = await limiter.acquire("u1", "multi", count=3)
+        exhausted, _ = await limiter.acquire("u1", "multi")
+        return denied, allowed, remaining, exhausted
+
+    denied, allowed, remaining, exhausted = asyncio.run(run())
+    assert not denied
+    assert allowed and remaining == 0
+    assert not exhausted
+
+
+@pytest.mark.parametrize("use_redis", [True, False])
+def test_dry_run_does_not_consume(use_redis):
+    limiter = make_limiter(use_redis)
+
+    async def run():
+        checks = [await limiter.check_limit("u1", "single") for _ in range(10)]
+        acquires = [await limiter.acquire("u1", "single") for _ in range(6)]
+        return checks, acquires
+
+    checks, acquires = asyncio.run(run())
+    assert all(allowed and remaining == 5 for allowed, remaining in checks)
+    assert [allowed for allowed, _ in acquires] == [True] * 5 + [False]
+
+
+def test_increment_usage_consumes_past_limit():
+    limiter = make_limiter()
+
+    async def run():
+        await limiter.increment_usage("u1", "single", count=7)
+        return await limiter.check_limit("u1", "single")
+
+    assert asyncio.run(run()) == (False, 0)
+
+
+def test_users_are_independent():
+    limiter = make_limiter()
+
+    async def run():
+        for _ in range(5):
+            await limiter.acquire("u1", "single")
+        return await limiter.acquire("u1", "single"), await limiter.acquire("u2", "single")
+
+    (u1_allowed, _), (u2_allowed, _) = asyncio.run(run())
+    assert not u1_allowed and u2_allowed
+
+
+def test_reservation_serves_bursts_locally():
+    limiter = make_limiter(local_reservation=2, reservation_seconds=60)
+
+    async def run():
+        return [await limiter.acquire("u1", "single") for _ in range(6)]
+
+    results = asyncio.run(run())
+    # 1st: no reservation; 2nd: reserves 2 more; 3rd-4th: local; 5th: Redis; 6th: over the limit
+    assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+    assert limiter.stats['local_hits'] == 2
+    assert limiter.stats['redis_calls'] == 4
+
+
+def test_spaced_acquires_consume_only_what_they_use():
+    limiter = make_limiter(local_reservation=4, reservation_seconds=0.02)
+
+    async def run():
+        results = []
+        for _ in range(5):
+            results.append(await limiter.acquire("u1", "single"))
+            await asyncio.sleep(0.03)
+        return results
+
+    results = asyncio.run(run())
+    assert all(allowed for allowed, _ in results)
+    assert limiter.stats['local_hits'] == 0
+
+
+def test_reserved_tokens_expire():
+    limiter = make_limiter(local_reservation=2, reservation_seconds=0.05)
+
+    async def run():
+        await limiter.acquire("u1", "single")
+        await limiter.acquire("u1", "single")  # reserves 2
+        assert limiter.get_stats()['local_reservations'] == 1
+        await asyncio.sleep(0.06)
+        return await limiter.acquire("u1", "single")
+
+    allowed, _ = asyncio.run(run())
+    # 1 + (1 + 2 lost) + 1 = 5: the limit is reached but not exceeded
+    assert allowed
+    assert limiter.stats['local_hits'] == 0